@@ -4,10 +4,16 @@ AI模型模块
 """
 from .simple_predictor import SimplePricePredictor, PatternRecognizer
 from .gemini_analyzer import GeminiAnalyzer, GeminiFastAnalyzer
+from .model_registry import ModelRegistry, model_registry
+from .ml_predictor import MLPricePredictor, ml_predictor
 
 __all__ = [
     'SimplePricePredictor',
     'PatternRecognizer',
     'GeminiAnalyzer',
-    'GeminiFastAnalyzer'
+    'GeminiFastAnalyzer',
+    'ModelRegistry',
+    'model_registry',
+    'MLPricePredictor',
+    'ml_predictor'
 ]
\ No newline at end of file
@@ -4,8 +4,11 @@ Gemini AI 分析模块
 """
 import os
 import json
+import asyncio
 import logging
-from typing import Dict, List, Optional, Any
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime
 import pandas as pd
 import numpy as np
@@ -20,6 +23,28 @@ from backend.config import settings
 
 logger = logging.getLogger(__name__)
 
+# 快速信号需要的特征列（由特征库提供）
+SIGNAL_FEATURES = ['price_change', 'volume_ratio', 'rsi', 'macd']
+
+
+def quick_signal_inputs(latest: pd.Series) -> Dict:
+    """
+    把特征库中最新交易日的特征整理为 quick_signal 的输入
+
+    参数:
+        latest: 包含 close 和 SIGNAL_FEATURES 的一行特征（缺失值使用中性默认值）
+    """
+    def value(column, default):
+        return float(latest[column]) if pd.notna(latest.get(column)) else default
+
+    return {
+        'price': value('close', 0),
+        'change_pct': value('price_change', 0) * 100,
+        'volume_ratio': value('volume_ratio', 1.0),
+        'rsi': value('rsi', 50),
+        'macd': value('macd', 0)
+    }
+
 
 class GeminiAnalyzer:
     """Gemini 主分析器 - 用于深度股票分析"""
@@ -27,6 +52,10 @@ class GeminiAnalyzer:
     def __init__(self):
         """初始化 Gemini 客户端"""
         self.api_key = settings.gemini_api_key
+        self.timeout = settings.gemini_timeout
+        self.concurrency = max(1, settings.gemini_concurrency)
+        # 每个事件循环一个信号量，限制同时进行的异步请求数
+        self._semaphores = weakref.WeakKeyDictionary()
         if not self.api_key:
             logger.warning("GEMINI_API_KEY 未设置，Gemini 功能将不可用")
             self.client = None
@@ -253,42 +282,12 @@ class GeminiAnalyzer:
             return {"error": "Gemini 客户端未初始化"}
         
         try:
-            prompt = f"""
-            基于以下数据快速判断股票 {code} 的交易信号：
-            
-            价格: {latest_data.get('price', 0)}
-            涨跌幅: {latest_data.get('change_pct', 0)}%
-            成交量比: {latest_data.get('volume_ratio', 1)}
-            RSI: {latest_data.get('rsi', 50)}
-            MACD: {latest_data.get('macd', 0)}
-            
-            请直接返回JSON格式：
-            - signal: BUY/HOLD/SELL
-            - strength: 1-10的信号强度
-            - reason: 简短理由（50字内）
-            """
-            
             response = self.client.models.generate_content(
                 model=self.fast_model,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    temperature=0.3,
-                    response_mime_type="application/json",
-                    max_output_tokens=200
-                )
+                contents=self._signal_prompt(code, latest_data),
+                config=self._signal_config()
             )
-            
-            try:
-                result = json.loads(response.text) if response.text else {"signal": "HOLD", "strength": 5, "reason": "无响应"}
-            except (json.JSONDecodeError, AttributeError):
-                result = {"signal": "HOLD", "strength": 5, "reason": "解析失败"}
-            
-            return {
-                "status": "success",
-                "code": code,
-                **result,
-                "timestamp": datetime.now().isoformat()
-            }
+            return self._signal_result(code, response)
             
         except Exception as e:
             logger.error(f"快速信号生成失败: {e}")
@@ -298,6 +297,76 @@ class GeminiAnalyzer:
                 "error": str(e)
             }
     
+    async def quick_signal_async(self, code: str, latest_data: Dict, timeout: Optional[float] = None) -> Dict:
+        """
+        快速生成交易信号（异步，不阻塞事件循环）
+        
+        同时进行的请求数受 GEMINI_CONCURRENCY 限制；拿到并发名额后超过 timeout 秒没有返回的请求被取消，
+        返回 HOLD 和超时错误。调用方被取消时（如客户端断开）请求随之取消。
+        
+        参数:
+            code: 股票代码
+            latest_data: 最新数据（价格、成交量、技术指标等）
+            timeout: 单次请求超时（秒），默认为配置中的 GEMINI_TIMEOUT
+        """
+        if not self.client:
+            return {"error": "Gemini 客户端未初始化"}
+        
+        timeout = self.timeout if timeout is None else timeout
+        async with self._semaphore():
+            try:
+                response = await asyncio.wait_for(
+                    self.client.aio.models.generate_content(
+                        model=self.fast_model,
+                        contents=self._signal_prompt(code, latest_data),
+                        config=self._signal_config(timeout)
+                    ),
+                    timeout
+                )
+                return self._signal_result(code, response)
+                
+            except asyncio.TimeoutError:
+                logger.warning(f"快速信号请求超时: {code}（{timeout} 秒）")
+                return {
+                    "status": "error",
+                    "signal": "HOLD",
+                    "error": f"请求超时（{timeout} 秒）"
+                }
+            except Exception as e:
+                logger.error(f"快速信号生成失败: {e}")
+                return {
+                    "status": "error",
+                    "signal": "HOLD",
+                    "error": str(e)
+                }
+    
+    def quick_signals(self, items: List[Tuple[str, Dict]]) -> List[Dict]:
+        """
+        并发生成多只股票的快速信号（线程池，供后台任务等同步代码调用）
+        
+        参数:
+            items: [(股票代码, 最新数据)]
+        
+        返回:
+            与 items 顺序一致的信号列表
+        """
+        if not items:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(items))) as pool:
+            return list(pool.map(lambda item: self.quick_signal(*item), items))
+    
+    async def quick_signals_async(self, items: List[Tuple[str, Dict]]) -> List[Dict]:
+        """
+        并发生成多只股票的快速信号（异步，总耗时约为最慢的一次请求）
+        
+        参数:
+            items: [(股票代码, 最新数据)]
+        
+        返回:
+            与 items 顺序一致的信号列表
+        """
+        return list(await asyncio.gather(*(self.quick_signal_async(code, data) for code, data in items)))
+    
     def batch_analyze(self, stock_list: List[Dict]) -> List[Dict]:
         """
         批量分析股票
@@ -308,9 +377,74 @@ class GeminiAnalyzer:
         if not self.client:
             return [{"error": "Gemini 客户端未初始化"}]
         
-        results = []
-        for stock in stock_list[:20]:  # 限制批量分析数量
-            result = self.quick_signal(
+        return self.quick_signals(self._batch_items(stock_list))
+    
+    async def batch_analyze_async(self, stock_list: List[Dict]) -> List[Dict]:
+        """
+        批量分析股票（异步，各股票的请求并发进行）
+        
+        参数:
+            stock_list: 股票列表，每项包含 code, price, change_pct 等
+        """
+        if not self.client:
+            return [{"error": "Gemini 客户端未初始化"}]
+        
+        return await self.quick_signals_async(self._batch_items(stock_list))
+    
+    def _semaphore(self) -> asyncio.Semaphore:
+        """当前事件循环的并发信号量"""
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.concurrency)
+        return semaphore
+    
+    def _signal_prompt(self, code: str, latest_data: Dict) -> str:
+        """快速信号的提示词"""
+        return f"""
+            基于以下数据快速判断股票 {code} 的交易信号：
+            
+            价格: {latest_data.get('price', 0)}
+            涨跌幅: {latest_data.get('change_pct', 0)}%
+            成交量比: {latest_data.get('volume_ratio', 1)}
+            RSI: {latest_data.get('rsi', 50)}
+            MACD: {latest_data.get('macd', 0)}
+            
+            请直接返回JSON格式：
+            - signal: BUY/HOLD/SELL
+            - strength: 1-10的信号强度
+            - reason: 简短理由（50字内）
+            """
+    
+    def _signal_config(self, timeout: Optional[float] = None) -> types.GenerateContentConfig:
+        """快速信号的生成参数（请求超时只作用于快速信号，主模型的深度分析不受 GEMINI_TIMEOUT 限制）"""
+        timeout = self.timeout if timeout is None else timeout
+        return types.GenerateContentConfig(
+            temperature=0.3,
+            response_mime_type="application/json",
+            max_output_tokens=200,
+            http_options=types.HttpOptions(timeout=int(timeout * 1000))
+        )
+    
+    def _signal_result(self, code: str, response: Any) -> Dict:
+        """解析快速信号的响应"""
+        try:
+            result = json.loads(response.text) if response.text else {"signal": "HOLD", "strength": 5, "reason": "无响应"}
+        except (json.JSONDecodeError, AttributeError):
+            result = {"signal": "HOLD", "strength": 5, "reason": "解析失败"}
+        
+        return {
+            "status": "success",
+            "code": code,
+            **result,
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    @staticmethod
+    def _batch_items(stock_list: List[Dict]) -> List[Tuple[str, Dict]]:
+        """批量分析的输入"""
+        return [
+            (
                 stock['code'],
                 {
                     'price': stock.get('price', 0),
@@ -319,9 +453,8 @@ class GeminiAnalyzer:
                     'rsi': stock.get('rsi', 50)
                 }
             )
-            results.append(result)
-        
-        return results
+            for stock in stock_list[:20]  # 限制批量分析数量
+        ]
     
     def _format_technical_indicators(self, indicators: Dict) -> str:
         """格式化技术指标"""
@@ -375,20 +508,51 @@ class GeminiFastAnalyzer:
         if not self.analyzer.client:
             return []
         
+        movers = self._movers(stock_list)
+        signals = self.analyzer.quick_signals([(stock_list[i]['code'], stock_list[i]) for i in movers])
+        return self._alerts(stock_list, dict(zip(movers, signals)))
+    
+    async def monitor_realtime_async(self, stock_list: List[Dict]) -> List[Dict]:
+        """
+        实时监控股票（异步，异动股票的信号请求并发进行）
+        
+        参数:
+            stock_list: 实时股票数据列表
+        """
+        if not self.analyzer.client:
+            return []
+        
+        movers = self._movers(stock_list)
+        signals = await self.analyzer.quick_signals_async([(stock_list[i]['code'], stock_list[i]) for i in movers])
+        return self._alerts(stock_list, dict(zip(movers, signals)))
+    
+    @staticmethod
+    def _movers(stock_list: List[Dict]) -> List[int]:
+        """需要生成信号的异动股票（涨跌超过5%）的下标"""
+        return [i for i, stock in enumerate(stock_list) if abs(stock.get('change_pct', 0)) > 5]
+    
+    @staticmethod
+    def _alerts(stock_list: List[Dict], signals: Dict[int, Dict]) -> List[Dict]:
+        """
+        汇总警报
+        
+        参数:
+            stock_list: 实时股票数据列表
+            signals: 异动股票下标 -> 快速信号
+        """
         alerts = []
-        for stock in stock_list:
+        for i, stock in enumerate(stock_list):
             # 检查异动
-            if abs(stock.get('change_pct', 0)) > 5:  # 涨跌超过5%
-                signal = self.analyzer.quick_signal(stock['code'], stock)
-                if signal.get('status') == 'success':
-                    alerts.append({
-                        'code': stock['code'],
-                        'name': stock.get('name', ''),
-                        'alert_type': 'PRICE_CHANGE',
-                        'change_pct': stock['change_pct'],
-                        'signal': signal.get('signal'),
-                        'reason': signal.get('reason')
-                    })
+            signal = signals.get(i)
+            if signal is not None and signal.get('status') == 'success':
+                alerts.append({
+                    'code': stock['code'],
+                    'name': stock.get('name', ''),
+                    'alert_type': 'PRICE_CHANGE',
+                    'change_pct': stock['change_pct'],
+                    'signal': signal.get('signal'),
+                    'reason': signal.get('reason')
+                })
             
             # 检查成交量异常
             if stock.get('volume_ratio', 1) > 2:  # 成交量是平均的2倍以上
@@ -0,0 +1,148 @@
+"""
+机器学习特征矩阵
+
+在 [股票 × 交易日] 行情面板上一次算出所有股票的特征和标签：每只股票的有效交易日先左移压紧
+（停牌日不参与滚动窗口），多只股票作为列一起做滚动计算，不逐只股票循环。
+特征都是无量纲的比率，不同价位的股票可以放在同一个模型里训练。
+"""
+from typing import Dict, Tuple
+import numpy as np
+import logging
+
+from backend.analysis.indicator_registry import feature_registry
+from backend.analysis.market_panel import MarketPanel
+
+logger = logging.getLogger(__name__)
+
+# 特征列（顺序即特征矩阵的列顺序，模型文件中同时记录）
+FEATURE_NAMES = [
+    'ret_1', 'ret_5', 'ret_10', 'ret_20',
+    'ma5_ratio', 'ma10_ratio', 'ma20_ratio', 'ma60_ratio',
+    'volatility', 'volume_ratio', 'volume_ratio10', 'price_position', 'rsi'
+]
+
+# 计算全部特征所需的交易日数（最长的 60 日均线）
+FEATURE_WARMUP = 60
+
+
+def _compact(panel: MarketPanel) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """每只股票的有效交易日左移压紧，返回排列顺序和压紧后的各字段"""
+    return panel.compact(('high', 'low', 'close', 'volume'))
+
+
+# 直接取自特征注册表的指标列（ret_1 即 price_change）
+_REGISTRY_COLUMNS = [
+    'price_change', 'ma5_ratio', 'ma10_ratio', 'ma20_ratio', 'ma60',
+    'volatility', 'volume_ratio', 'volume_ratio10', 'rsi'
+]
+
+
+def compact_features(fields: Dict[str, np.ndarray]) -> np.ndarray:
+    """
+    在压紧后的行情上计算特征
+
+    参数:
+        fields: high/low/close/volume，形状均为 [股票 × K线]
+
+    返回:
+        [特征 × 股票 × K线] 的 float32 数组，顺序同 FEATURE_NAMES，数据不足的位置为NaN
+    """
+    indicators = feature_registry.compute_panel(fields, _REGISTRY_COLUMNS)
+    c = fields['close']
+
+    def lag_return(k):
+        shifted = np.full(c.shape, np.nan)
+        shifted[:, k:] = c[:, :-k]
+        return c / shifted - 1
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        columns = {
+            'ret_1': indicators['price_change'],
+            'ret_5': lag_return(5),
+            'ret_10': lag_return(10),
+            'ret_20': lag_return(20),
+            'ma60_ratio': c / indicators['ma60'],
+            # 一字板（最高价等于最低价）记为中间位置，不丢弃样本
+            'price_position': np.where(
+                fields['high'] > fields['low'],
+                (c - fields['low']) / (fields['high'] - fields['low']),
+                0.5
+            ),
+            **{name: indicators[name] for name in (
+                'ma5_ratio', 'ma10_ratio', 'ma20_ratio', 'volatility', 'volume_ratio', 'volume_ratio10', 'rsi'
+            )}
+        }
+
+    features = np.empty((len(FEATURE_NAMES),) + c.shape, dtype=np.float32)
+    for i, name in enumerate(FEATURE_NAMES):
+        values = columns[name]
+        features[i] = np.where(np.isfinite(values), values, np.nan)
+    return features
+
+
+def forward_return(close: np.ndarray, horizon: int) -> np.ndarray:
+    """压紧后的收盘价上，每根K线之后第 horizon 根K线的收益率"""
+    result = np.full(close.shape, np.nan)
+    if horizon < close.shape[1]:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result[:, :-horizon] = close[:, horizon:] / close[:, :-horizon] - 1
+    return result
+
+
+def build_dataset(panel: MarketPanel,
+                  horizon: int,
+                  start_date=None) -> Dict[str, np.ndarray]:
+    """
+    面板上所有 (股票, 交易日) 的带标签样本
+
+    参数:
+        panel: 行情面板（需要 high/low/close/volume）
+        horizon: 标签的持有交易日数，标签为之后 horizon 个交易日收盘价是否上涨
+        start_date: 只保留该日期及之后的样本（之前的数据只用于预热）
+
+    返回:
+        X 特征矩阵 [样本 × 特征]（float32）、y 标签（0/1）、returns 未来收益率、
+        dates 样本日期、codes 股票代码；特征不全或还没有未来数据的样本不包含在内
+    """
+    order, fields = _compact(panel)
+    features = compact_features(fields)
+    returns = forward_return(fields['close'], horizon)
+
+    usable = np.isfinite(returns) & np.isfinite(features).all(axis=0)
+    rows, positions = np.nonzero(usable)
+    dates = panel.dates[order[rows, positions]]
+    if start_date is not None:
+        keep = dates >= np.datetime64(start_date)
+        rows, positions, dates = rows[keep], positions[keep], dates[keep]
+
+    sample_returns = returns[rows, positions]
+    return {
+        'X': features[:, rows, positions].T,
+        'y': (sample_returns > 0).astype(np.int8),
+        'returns': sample_returns,
+        'dates': dates,
+        'codes': np.asarray(panel.codes, dtype=object)[rows]
+    }
+
+
+def latest_features(panel: MarketPanel) -> Dict[str, np.ndarray]:
+    """
+    每只股票最后一个交易日的特征（批量推理的输入）
+
+    返回:
+        X 特征矩阵 [股票 × 特征]、dates 各股票最后交易日、codes 股票代码；特征不全的股票不包含在内
+    """
+    order, fields = _compact(panel)
+    features = compact_features(fields)
+    counts = (~np.isnan(panel['close'])).sum(axis=1)
+    rows = np.flatnonzero(counts > 0)
+    positions = counts[rows] - 1
+
+    X = features[:, rows, positions].T
+    complete = np.isfinite(X).all(axis=1)
+    rows, positions = rows[complete], positions[complete]
+    return {
+        'X': X[complete],
+        'dates': panel.dates[order[rows, positions]],
+        'codes': np.asarray(panel.codes, dtype=object)[rows]
+    }
@@ -0,0 +1,261 @@
+"""
+机器学习涨跌预测
+
+用全市场特征矩阵训练 CPU 模型（默认 scikit-learn 的 HistGradientBoosting，安装了 xgboost 时也可以用 XGBoost），
+按交易日做时间序列交叉验证（训练集总在验证集之前，中间隔开标签的持有期，避免标签重叠造成的泄漏），
+训练好的模型按版本保存在模型仓库中。
+
+推理时模型只加载一次并常驻内存（仓库切换到新版本时自动重新加载），
+全市场所有股票的最新特征拼成一个矩阵，一次 predict_proba 调用完成打分。
+
+需要安装 ml 依赖: pip install -e ".[ml]"
+"""
+import threading
+import time
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+import pandas as pd
+import numpy as np
+import logging
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from backend.database.models import StockDaily
+from backend.analysis.market_panel import MarketPanel, load_market_panel
+from .ml_features import FEATURE_NAMES, latest_features
+from .model_registry import ModelRegistry, model_registry
+
+logger = logging.getLogger(__name__)
+
+# 支持的模型类型
+MODEL_TYPES = ('hgb', 'logistic', 'xgboost')
+
+# 推理时每只股票加载的交易日数（60日均线之外再留出 RSI 平滑的预热）
+INFERENCE_BARS = 120
+
+
+def make_model(model_type: str, random_state: int = 0):
+    """
+    创建未训练的分类模型
+
+    参数:
+        model_type: hgb（HistGradientBoosting）、logistic（标准化 + 逻辑回归）或 xgboost
+    """
+    if model_type == 'hgb':
+        from sklearn.ensemble import HistGradientBoostingClassifier
+        return HistGradientBoostingClassifier(
+            max_iter=200, learning_rate=0.05, max_leaf_nodes=31,
+            l2_regularization=1.0, early_stopping=False, random_state=random_state
+        )
+    if model_type == 'logistic':
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.pipeline import make_pipeline
+        from sklearn.preprocessing import StandardScaler
+        return make_pipeline(StandardScaler(), LogisticRegression(max_iter=1000))
+    if model_type == 'xgboost':
+        try:
+            from xgboost import XGBClassifier
+        except ImportError:
+            raise ValueError("模型类型 xgboost 需要安装 xgboost")
+        return XGBClassifier(
+            n_estimators=200, learning_rate=0.05, max_depth=6, subsample=0.8,
+            tree_method='hist', random_state=random_state
+        )
+    raise ValueError(f"不支持的模型类型: {model_type}，可选: {', '.join(MODEL_TYPES)}")
+
+
+def time_series_splits(dates: np.ndarray, n_splits: int, gap: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    按交易日划分的时间序列交叉验证
+
+    同一交易日的样本总在同一折中；验证集之前的 gap 个交易日不进入训练集（标签持有期）。
+
+    参数:
+        dates: 每个样本的日期
+        n_splits: 折数
+        gap: 训练集和验证集之间隔开的交易日数
+
+    返回:
+        [(训练样本下标, 验证样本下标)]
+    """
+    from sklearn.model_selection import TimeSeriesSplit
+
+    unique_dates, day = np.unique(dates, return_inverse=True)
+    if len(unique_dates) <= n_splits + gap:
+        raise ValueError(f"样本只有 {len(unique_dates)} 个交易日，不足以做 {n_splits} 折交叉验证")
+    splits = []
+    for train_days, test_days in TimeSeriesSplit(n_splits=n_splits, gap=gap).split(unique_dates):
+        splits.append((
+            np.flatnonzero(day <= train_days[-1]),
+            np.flatnonzero((day >= test_days[0]) & (day <= test_days[-1]))
+        ))
+    return splits
+
+
+def evaluate(y: np.ndarray, probability: np.ndarray) -> Dict:
+    """分类指标：准确率、AUC、对数损失和样本中上涨的比例"""
+    from sklearn.metrics import log_loss, roc_auc_score
+
+    y = np.asarray(y)
+    return {
+        'samples': int(len(y)),
+        'accuracy': float(np.mean((probability > 0.5) == (y == 1))),
+        'auc': float(roc_auc_score(y, probability)) if len(np.unique(y)) > 1 else None,
+        'log_loss': float(log_loss(y, np.clip(probability, 1e-6, 1 - 1e-6), labels=[0, 1])),
+        'base_rate': float(np.mean(y))
+    }
+
+
+class MLPricePredictor:
+    """机器学习涨跌预测器（模型常驻内存）"""
+
+    # 模型仓库中的名称
+    MODEL_NAME = 'ml_predictor'
+
+    def __init__(self, registry: Optional[ModelRegistry] = None, name: str = MODEL_NAME):
+        """
+        参数:
+            registry: 模型仓库
+            name: 模型名称
+        """
+        self.registry = registry or model_registry
+        self.name = name
+        self.model = None
+        self.meta: Dict = {}
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.RLock()
+
+    def train(self,
+              dataset: Dict[str, np.ndarray],
+              model_type: str = 'hgb',
+              n_splits: int = 5,
+              horizon: int = 5,
+              params: Optional[Dict] = None) -> Dict:
+        """
+        时间序列交叉验证后用全部样本训练，保存为新版本并设为当前使用的模型
+
+        参数:
+            dataset: build_dataset 返回的样本（可以是多批拼接的结果）
+            model_type: 模型类型
+            n_splits: 交叉验证折数
+            horizon: 标签的持有交易日数（同时作为交叉验证的间隔）
+            params: 额外记录到元数据中的训练参数
+
+        返回:
+            元数据（含版本号和各折指标）
+        """
+        X, y, dates = dataset['X'], dataset['y'], dataset['dates']
+        if len(y) == 0:
+            raise ValueError("没有可用于训练的样本")
+        started = time.time()
+
+        folds = []
+        for train_index, test_index in time_series_splits(dates, n_splits, horizon):
+            model = make_model(model_type)
+            model.fit(X[train_index], y[train_index])
+            probability = model.predict_proba(X[test_index])[:, 1]
+            folds.append({
+                'train_end': str(dates[train_index].max()),
+                'test_start': str(dates[test_index].min()),
+                'test_end': str(dates[test_index].max()),
+                **evaluate(y[test_index], probability)
+            })
+
+        model = make_model(model_type)
+        model.fit(X, y)
+
+        meta = {
+            'model_type': model_type,
+            'features': FEATURE_NAMES,
+            'horizon': horizon,
+            'samples': int(len(y)),
+            'start_date': str(dates.min()),
+            'end_date': str(dates.max()),
+            'cv': {
+                'folds': folds,
+                'accuracy': float(np.mean([f['accuracy'] for f in folds])),
+                'auc': float(np.mean([f['auc'] for f in folds if f['auc'] is not None]))
+                if any(f['auc'] is not None for f in folds) else None
+            },
+            'params': params or {},
+            'train_seconds': round(time.time() - started, 2)
+        }
+        version = self.registry.save(self.name, model, meta)
+        with self._lock:
+            self.model, self.meta = model, {**meta, 'name': self.name, 'version': version}
+        return self.meta
+
+    def load(self, version: Optional[str] = None) -> Dict:
+        """从模型仓库加载模型（None表示当前版本），返回元数据"""
+        model, meta = self.registry.load(self.name, version)
+        if meta.get('features') != FEATURE_NAMES:
+            raise ValueError(f"模型 {self.name} 版本 {meta.get('version')} 的特征列与当前代码不一致，需要重新训练")
+        with self._lock:
+            self.model, self.meta = model, meta
+        self.logger.info(f"已加载模型 {self.name} 版本 {meta.get('version')}")
+        return meta
+
+    def _warm_model(self) -> Any:
+        """常驻内存的模型；仓库中的当前版本变化时（如另一个进程完成了训练）重新加载"""
+        latest = self.registry.latest_version(self.name)
+        with self._lock:
+            if self.model is None or (latest is not None and latest != self.meta.get('version')):
+                self.load(latest)
+            return self.model
+
+    def predict_matrix(self, X: np.ndarray) -> np.ndarray:
+        """对特征矩阵 [样本 × 特征] 一次打分，返回上涨概率"""
+        model = self._warm_model()
+        if len(X) == 0:
+            return np.empty(0)
+        return model.predict_proba(X)[:, 1]
+
+    def predict_panel(self, panel: MarketPanel) -> pd.DataFrame:
+        """
+        面板上每只股票最新交易日的上涨概率
+
+        参数:
+            panel: 行情面板（需要 high/low/close/volume，每只股票至少 FEATURE_WARMUP 个交易日）
+
+        返回:
+            DataFrame: code、date、probability（之后 horizon 个交易日上涨的概率），按概率降序
+        """
+        latest = latest_features(panel)
+        probability = self.predict_matrix(latest['X'])
+        return pd.DataFrame({
+            'code': latest['codes'],
+            'date': latest['dates'].astype(object),
+            'probability': probability
+        }).sort_values('probability', ascending=False, ignore_index=True)
+
+    def predict_market(self,
+                       db: Session,
+                       codes: Optional[List[str]] = None,
+                       as_of: Optional[date] = None) -> pd.DataFrame:
+        """
+        全市场（或指定股票）截至 as_of 的上涨概率，所有股票一次打分
+
+        参数:
+            db: 数据库会话
+            codes: 股票代码列表，None表示全部
+            as_of: 截止日期（含），None表示最新交易日
+        """
+        query = db.query(func.max(StockDaily.date))
+        if as_of is not None:
+            query = query.filter(StockDaily.date <= as_of)
+        latest = query.scalar()
+        if latest is None:
+            return pd.DataFrame(columns=['code', 'date', 'probability'])
+        panel = load_market_panel(db, codes, start_date=latest, end_date=latest,
+                                  fields=['high', 'low', 'close', 'volume'], warmup=INFERENCE_BARS)
+        return self.predict_panel(panel)
+
+    def info(self) -> Dict:
+        """当前加载的模型信息（未加载时为空）"""
+        with self._lock:
+            return dict(self.meta)
+
+
+# 全局预测器（模型在第一次推理时加载）
+ml_predictor = MLPricePredictor()
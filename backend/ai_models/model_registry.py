@@ -0,0 +1,115 @@
+"""
+模型仓库
+
+训练好的模型按 名称/版本 保存在 data/models 下，每个版本一个目录：
+model.joblib 为模型对象，meta.json 为特征列、训练参数和交叉验证指标。
+LATEST 文件记录每个模型当前使用的版本，新版本训练完成后才切换，推理不会读到写了一半的模型。
+"""
+import json
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+_MODEL_FILE = 'model.joblib'
+_META_FILE = 'meta.json'
+_LATEST_FILE = 'LATEST'
+
+
+class ModelRegistry:
+    """按版本保存的模型仓库"""
+
+    def __init__(self, root: Optional[Path] = None):
+        """
+        参数:
+            root: 仓库目录，默认为 data/models
+        """
+        self.root = Path(root) if root is not None else settings.data_dir / 'models'
+        self.logger = logging.getLogger(__name__)
+
+    def save(self, name: str, model: Any, meta: Dict) -> str:
+        """
+        保存新版本并设为当前版本
+
+        参数:
+            name: 模型名称
+            model: 可被 joblib 序列化的模型对象
+            meta: 元数据（特征列、训练参数、评估指标等）
+
+        返回:
+            版本号（训练完成时间 YYYYMMDDHHMMSS）
+        """
+        import joblib
+
+        version = datetime.now().strftime('%Y%m%d%H%M%S')
+        directory = self.root / name / version
+        directory.mkdir(parents=True, exist_ok=True)
+        joblib.dump(model, directory / _MODEL_FILE)
+        meta = {**meta, 'name': name, 'version': version}
+        (directory / _META_FILE).write_text(json.dumps(meta, ensure_ascii=False, indent=2, default=str),
+                                            encoding='utf-8')
+        # 先写临时文件再替换，其他进程读取当前版本时不会读到空的或写了一半的内容
+        latest = self.root / name / _LATEST_FILE
+        tmp = latest.with_suffix('.tmp')
+        tmp.write_text(version, encoding='utf-8')
+        tmp.replace(latest)
+        self.logger.info(f"模型 {name} 版本 {version} 已保存到 {directory}")
+        return version
+
+    def latest_version(self, name: str) -> Optional[str]:
+        """当前使用的版本，没有训练过时返回None"""
+        path = self.root / name / _LATEST_FILE
+        return path.read_text(encoding='utf-8').strip() if path.exists() else None
+
+    def load(self, name: str, version: Optional[str] = None) -> Tuple[Any, Dict]:
+        """
+        加载模型
+
+        参数:
+            name: 模型名称
+            version: 版本号，None表示当前版本
+
+        返回:
+            (模型对象, 元数据)
+        """
+        import joblib
+
+        version = version or self.latest_version(name)
+        if version is None:
+            raise ValueError(f"模型 {name} 还没有训练过的版本")
+        directory = self.root / name / version
+        if not directory.exists():
+            raise ValueError(f"模型 {name} 不存在版本 {version}")
+        meta = json.loads((directory / _META_FILE).read_text(encoding='utf-8'))
+        return joblib.load(directory / _MODEL_FILE), meta
+
+    def versions(self, name: str) -> List[Dict]:
+        """列出模型的所有版本（新版本在前）及其元数据"""
+        directory = self.root / name
+        if not directory.exists():
+            return []
+        latest = self.latest_version(name)
+        result = []
+        for path in sorted((p for p in directory.iterdir() if (p / _META_FILE).exists()), reverse=True):
+            meta = json.loads((path / _META_FILE).read_text(encoding='utf-8'))
+            result.append({**meta, 'latest': path.name == latest})
+        return result
+
+    def prune(self, name: str, keep: int) -> int:
+        """只保留最近 keep 个版本（当前版本总是保留），返回删除的版本数"""
+        latest = self.latest_version(name)
+        removed = 0
+        for meta in self.versions(name)[keep:]:
+            if meta['version'] != latest:
+                shutil.rmtree(self.root / name / meta['version'], ignore_errors=True)
+                removed += 1
+        return removed
+
+
+# 全局模型仓库
+model_registry = ModelRegistry()
@@ -10,38 +10,34 @@ import logging
 import json
 import os
 
+from backend.analysis.indicator_registry import feature_registry
+
 logger = logging.getLogger(__name__)
 
 class SimplePricePredictor:
     """简单价格预测器 - 基于移动平均和趋势分析"""
     
+    # 写入 prediction_results 表时的模型名称
+    MODEL_NAME = 'simple_predictor'
+    
+    # 使用的特征列（由特征注册表计算）
+    FEATURES = [
+        'price_change', 'ma5', 'ma10', 'ma20', 'ma5_ratio', 'ma10_ratio', 'ma20_ratio',
+        'volatility', 'volume_ma10', 'volume_ratio10', 'price_position'
+    ]
+    
+    # predict_next_day 只用到最近20个收盘价（5/20日趋势和5/10/20日均线）
+    TREND_WINDOW = 20
+    # predict_trend 需要的最少K线数
+    TREND_MIN_BARS = 30
+    
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.model_params = {}
     
     def prepare_features(self, df: pd.DataFrame) -> pd.DataFrame:
-        """准备特征数据"""
-        df = df.copy()
-        
-        # 计算价格变化率
-        df['price_change'] = df['close'].pct_change()
-        
-        # 计算移动平均
-        for period in [5, 10, 20]:
-            df[f'ma{period}'] = df['close'].rolling(window=period).mean()
-            df[f'ma{period}_ratio'] = df['close'] / df[f'ma{period}']
-        
-        # 计算波动率
-        df['volatility'] = df['price_change'].rolling(window=20).std()
-        
-        # 成交量特征
-        df['volume_ma'] = df['volume'].rolling(window=10).mean()
-        df['volume_ratio'] = df['volume'] / df['volume_ma']
-        
-        # 价格位置（相对于最高最低价）
-        df['price_position'] = (df['close'] - df['low']) / (df['high'] - df['low'])
-        
-        return df
+        """准备特征数据（df 中已有的指标列，如特征库或 calculate_all_indicators 算出的均线，直接复用）"""
+        return feature_registry.compute(df.copy(), self.FEATURES, reuse=True)
     
     def predict_next_day(self, df: pd.DataFrame) -> Dict:
         """预测下一个交易日的价格"""
@@ -75,7 +71,7 @@ class SimplePricePredictor:
             ma_score += 0.4
         
         # 4. 成交量信号
-        volume_signal = 1 if latest['volume_ratio'] > 1.2 else 0
+        volume_signal = 1 if latest['volume_ratio10'] > 1.2 else 0
         
         # 综合预测
         trend_score = short_trend * 0.5 + mid_trend * 0.3 + ma_score * 0.2
@@ -113,37 +109,128 @@ class SimplePricePredictor:
             'reasons': reasons
         }
     
-    def predict_trend(self, df: pd.DataFrame, days: int = 5) -> Dict:
-        """预测未来几天的趋势"""
-        df_features = self.prepare_features(df)
-        
-        if len(df_features) < 30:
-            return {
-                'trend': 'unknown',
-                'confidence': 0,
-                'predictions': []
-            }
-        
-        predictions = []
-        current_df = df_features.copy()
-        
-        for i in range(days):
-            pred = self.predict_next_day(current_df)
-            if pred['prediction']:
-                predictions.append({
-                    'day': i + 1,
-                    'price': pred['prediction'],
-                    'change': pred['predicted_change']
-                })
+    def predict_history_arrays(self, closes: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        一次计算每根K线上 predict_next_day 的预测值
+        
+        每个位置只用到当根及之前的收盘价（均线为向后看的滚动均值），没有未来数据。
+        多只股票作为列一起做滚动计算，结果与逐日截取数据调用 predict_next_day 相同。
+        
+        参数:
+            closes: [股票 × K线] 收盘价（一维数组视为一只股票），每行是该股票连续的K线，
+                    末尾可以用NaN补齐长度
+        
+        返回:
+            prediction 预测价格、predicted_change 预测涨跌幅、confidence 置信度，形状同 closes；
+            前19根K线数据不足，为NaN
+        """
+        closes = np.atleast_2d(np.asarray(closes, dtype=float))
+        frame = pd.DataFrame(closes.T)
+        close = frame.to_numpy()
+        n = close.shape[0]
+        
+        def lag(k):
+            shifted = np.full(close.shape, np.nan)
+            shifted[k:] = close[:n - k]
+            return shifted
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            short_trend = (close - lag(4)) / lag(4)
+            mid_trend = (close - lag(19)) / lag(19)
+            ma_score = np.zeros(close.shape)
+            for period, weight in ((5, 0.3), (10, 0.3), (20, 0.4)):
+                ratio = close / frame.rolling(window=period).mean().to_numpy()
+                ma_score = ma_score + np.where(ratio > 1, weight, 0)
+            trend_score = short_trend * 0.5 + mid_trend * 0.3 + ma_score * 0.2
+            predicted_change = trend_score * 0.02
+            prediction = close * (1 + predicted_change)
+            confidence = np.minimum(np.abs(trend_score) * 100, 80)
+        
+        enough = (np.arange(n) >= self.TREND_WINDOW - 1)[:, None]
+        return {
+            'prediction': np.where(enough, prediction, np.nan).T,
+            'predicted_change': np.where(enough, predicted_change, np.nan).T,
+            'confidence': np.where(enough, confidence, np.nan).T
+        }
+    
+    def predict_history(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        对历史上每个交易日做一次下一交易日价格预测（回测预测准确率用）
+        
+        返回:
+            DataFrame，列为 date、close、prediction、predicted_change、confidence、
+            actual（下一交易日的实际收盘价，最后一天为NaN）；不含数据不足的前19个交易日
+        """
+        closes = df['close'].to_numpy(dtype=float)
+        result = self.predict_history_arrays(closes)
+        history = pd.DataFrame({
+            'date': df['date'].to_numpy() if 'date' in df.columns else df.index.to_numpy(),
+            'close': closes,
+            'prediction': result['prediction'][0],
+            'predicted_change': result['predicted_change'][0],
+            'confidence': result['confidence'][0],
+            'actual': np.append(closes[1:], np.nan)
+        })
+        return history.iloc[self.TREND_WINDOW - 1:].reset_index(drop=True)
+    
+    def forecast_closes(self, closes: np.ndarray, days: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        多日递推预测：每一步按 predict_next_day 的规则预测下一日收盘价，再把预测值作为最新收盘价继续预测
+        
+        递推只需要最近20个收盘价，每一步在预先分配的缓冲区上取窗口，不重新计算整张特征表，
+        多只股票按行同时递推。
+        
+        参数:
+            closes: [股票 × 20] 每只股票最近20个收盘价（一维数组视为一只股票）
+            days: 预测天数
+        
+        返回:
+            (预测价格, 预测涨跌幅)，形状均为 [股票 × days]；预测价格为0或无法计算（窗口内有缺失值）后
+            不再继续递推，之后的位置为NaN
+        """
+        closes = np.atleast_2d(np.asarray(closes, dtype=float))
+        window = self.TREND_WINDOW
+        if closes.shape[1] < window:
+            raise ValueError(f"多日预测至少需要{window}个收盘价")
+        stocks = closes.shape[0]
+        buffer = np.empty((stocks, window + days))
+        buffer[:, :window] = closes[:, -window:]
+        prices = np.full((stocks, days), np.nan)
+        changes = np.full((stocks, days), np.nan)
+        active = np.ones(stocks, dtype=bool)
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for i in range(days):
+                recent = buffer[:, i:i + window]
+                latest = recent[:, -1]
+                short_trend = (latest - recent[:, -5]) / recent[:, -5]
+                mid_trend = (latest - recent[:, -20]) / recent[:, -20]
+                ma_score = np.zeros(stocks)
+                ma_score = ma_score + np.where(latest / recent[:, -5:].mean(axis=1) > 1, 0.3, 0)
+                ma_score = ma_score + np.where(latest / recent[:, -10:].mean(axis=1) > 1, 0.3, 0)
+                ma_score = ma_score + np.where(latest / recent.mean(axis=1) > 1, 0.4, 0)
+                trend_score = short_trend * 0.5 + mid_trend * 0.3 + ma_score * 0.2
+                predicted_change = trend_score * 0.02
+                predicted_price = latest * (1 + predicted_change)
                 
-                # 添加预测值作为新的一行（简化处理）
-                new_row = current_df.iloc[-1].copy()
-                new_row['close'] = pred['prediction']
-                current_df = pd.concat([current_df, new_row.to_frame().T], ignore_index=True)
+                # 预测价格为0时 predict_trend 不追加该日，之后每一步的输入都不再变化
+                active &= (predicted_price != 0) & ~np.isnan(predicted_price)
+                prices[active, i] = predicted_price[active]
+                changes[active, i] = predicted_change[active]
+                buffer[:, i + window] = predicted_price
+        return prices, changes
+    
+    @staticmethod
+    def _trend_summary(current_price: float, prices: np.ndarray, changes: np.ndarray, days: int) -> Dict:
+        """由一只股票的递推结果生成 predict_trend 的返回值"""
+        predictions = [
+            {'day': i + 1, 'price': float(prices[i]), 'change': float(changes[i])}
+            for i in range(days) if not np.isnan(changes[i])
+        ]
         
         # 判断总体趋势
         if predictions:
-            total_change = (predictions[-1]['price'] - df_features.iloc[-1]['close']) / df_features.iloc[-1]['close']
+            total_change = (predictions[-1]['price'] - current_price) / current_price
             if total_change > 0.02:
                 trend = 'bullish'
             elif total_change < -0.02:
@@ -159,9 +246,83 @@ class SimplePricePredictor:
             'predictions': predictions,
             'confidence': 60  # 简单模型，置信度设为60%
         }
+    
+    def predict_trend(self, df: pd.DataFrame, days: int = 5) -> Dict:
+        """预测未来几天的趋势"""
+        if len(df) < self.TREND_MIN_BARS:
+            return {
+                'trend': 'unknown',
+                'confidence': 0,
+                'predictions': []
+            }
+        
+        closes = df['close'].to_numpy(dtype=float)
+        prices, changes = self.forecast_closes(closes[-self.TREND_WINDOW:], days)
+        return self._trend_summary(closes[-1], prices[0], changes[0], days)
+    
+    def predict_trend_batch(self, closes: np.ndarray, days: int = 5) -> List[Dict]:
+        """
+        批量预测多只股票未来几天的趋势
+        
+        参数:
+            closes: [股票 × 交易日] 收盘价矩阵（如行情面板的 close），缺失为NaN，
+                    每只股票只使用自己有数据的交易日
+            days: 预测天数
+        
+        返回:
+            与行对应的 predict_trend 结果列表
+        """
+        closes = np.atleast_2d(np.asarray(closes, dtype=float))
+        valid = ~np.isnan(closes)
+        # 有效收盘价右移压紧，每行最后20列即该股票最近20个收盘价
+        order = np.argsort(valid, axis=1, kind='stable')
+        compact = np.take_along_axis(closes, order, axis=1)
+        counts = valid.sum(axis=1)
+        
+        results = [{'trend': 'unknown', 'confidence': 0, 'predictions': []} for _ in range(len(closes))]
+        ready = np.flatnonzero(counts >= self.TREND_MIN_BARS)
+        if len(ready) == 0:
+            return results
+        prices, changes = self.forecast_closes(compact[ready, -self.TREND_WINDOW:], days)
+        for k, row in enumerate(ready):
+            results[row] = self._trend_summary(compact[row, -1], prices[k], changes[k], days)
+        return results
+
+# 各形态的信号方向和说明
+PATTERN_INFO = {
+    'hammer': ('bullish', '锤子线，可能见底信号'),
+    'doji': ('neutral', '十字星，趋势可能反转'),
+    'bullish_engulfing': ('bullish', '看涨吞没，强烈买入信号'),
+    'bearish_engulfing': ('bearish', '看跌吞没，强烈卖出信号'),
+    'morning_star': ('bullish', '早晨之星，底部反转信号'),
+    'evening_star': ('bearish', '黄昏之星，顶部反转信号'),
+}
+
+
+def _py_min(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """逐元素的 Python min(a, b)（含NaN时的结果与内置 min 相同）"""
+    return np.where(b < a, b, a)
+
+
+def _py_max(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """逐元素的 Python max(a, b)（含NaN时的结果与内置 max 相同）"""
+    return np.where(b > a, b, a)
+
+
+def _shift(values: np.ndarray, k: int) -> np.ndarray:
+    """沿最后一维向后平移 k 根K线（前 k 个位置为NaN）"""
+    n = values.shape[-1]
+    pad = np.full(values.shape[:-1] + (min(k, n),), np.nan)
+    return np.concatenate([pad, values[..., :max(n - k, 0)]], axis=-1)
+
 
 class PatternRecognizer:
-    """K线形态识别器"""
+    """
+    K线形态识别器
+    
+    每种形态是 OHLC 数组上的布尔掩码，多根K线的形态用平移后的数组比较，
+    一次计算所有形态后按位置输出，不逐行访问 DataFrame。
+    """
     
     def __init__(self):
         self.patterns = {
@@ -172,138 +333,163 @@ class PatternRecognizer:
             'evening_star': self.detect_evening_star
         }
     
-    def detect_patterns(self, df: pd.DataFrame) -> List[Dict]:
-        """检测所有K线形态"""
-        patterns_found = []
-        
-        for pattern_name, detect_func in self.patterns.items():
-            result = detect_func(df)
-            if result:
-                patterns_found.extend(result)
+    def masks(self, df: pd.DataFrame, names: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+        """
+        计算形态掩码
+        
+        参数:
+            df: 包含 open、high、low、close 的DataFrame
+            names: 形态组（见 self.patterns，engulfing 包含看涨和看跌两种），默认全部
+        
+        返回:
+            形态名到布尔数组的映射，按形态组的顺序排列
+        """
+        return self.mask_arrays(
+            df['open'].to_numpy(dtype=float), df['high'].to_numpy(dtype=float),
+            df['low'].to_numpy(dtype=float), df['close'].to_numpy(dtype=float), names
+        )
+    
+    def panel_masks(self, panel, names: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+        """
+        在全市场行情面板上计算形态掩码
+        
+        每只股票的有效交易日（收盘价非NaN）先左移压紧，使"前一根K线"是该股票上一个交易日
+        而不是面板上的前一列，结果与逐只股票调用 masks 完全一致。
+        
+        参数:
+            panel: MarketPanel（需要 open、high、low、close 字段）
+            names: 形态组，默认全部
+        
+        返回:
+            形态名到布尔矩阵的映射，形状同面板
+        """
+        close = panel['close']
+        valid = ~np.isnan(close)
+        order = np.argsort(~valid, axis=1, kind='stable')
+        compact = [np.take_along_axis(np.asarray(panel[f], dtype=float), order, axis=1)
+                   for f in ('open', 'high', 'low', 'close')]
+        compact_valid = np.take_along_axis(valid, order, axis=1)
+        
+        masks = {}
+        for name, mask in self.mask_arrays(*compact, names).items():
+            full = np.zeros(close.shape, dtype=bool)
+            np.put_along_axis(full, order, mask & compact_valid, axis=1)
+            masks[name] = full
+        return masks
+    
+    def mask_arrays(self,
+                    open_: np.ndarray,
+                    high: np.ndarray,
+                    low: np.ndarray,
+                    close: np.ndarray,
+                    names: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+        """
+        由 OHLC 数组计算形态掩码（数组可以是一维序列，或最后一维为时间的二维矩阵）
+        
+        参数:
+            names: 形态组，默认全部
+        """
+        names = list(self.patterns) if names is None else names
+        n = close.shape[-1]
+        
+        body = np.abs(close - open_)
+        bullish = close > open_
+        bearish = close < open_
+        first_bar = np.arange(n) < 1
+        masks = {}
+        
+        if 'hammer' in names:
+            # 锤子线条件：下影线是实体的2倍以上，上影线很小
+            lower_shadow = _py_min(open_, close) - low
+            upper_shadow = high - _py_max(open_, close)
+            masks['hammer'] = (lower_shadow > body * 2) & (upper_shadow < body * 0.5) & ~first_bar
         
-        return patterns_found
+        if 'doji' in names:
+            # 十字星条件：实体很小
+            total_range = high - low
+            with np.errstate(invalid='ignore', divide='ignore'):
+                masks['doji'] = (total_range > 0) & (body / total_range < 0.1)
+        
+        if 'engulfing' in names:
+            prev_open, prev_close = _shift(open_, 1), _shift(close, 1)
+            # 看涨吞没：前阴后阳，开盘低于前收、收盘高于前开
+            masks['bullish_engulfing'] = (prev_close < prev_open) & bullish & \
+                (open_ < prev_close) & (close > prev_open)
+            # 看跌吞没：前阳后阴，开盘高于前收、收盘低于前开
+            masks['bearish_engulfing'] = (prev_close > prev_open) & bearish & \
+                (open_ > prev_close) & (close < prev_open)
+        
+        if 'morning_star' in names or 'evening_star' in names:
+            first_open, first_close = _shift(open_, 2), _shift(close, 2)
+            first_body = np.abs(first_close - first_open)
+            # 第二天是小实体
+            small_second = _shift(body, 1) < first_body * 0.3
+            midpoint = (first_open + first_close) / 2
+            if 'morning_star' in names:
+                # 长阴线 + 小实体 + 收盘高于第一天中点的阳线
+                masks['morning_star'] = (first_close < first_open) & small_second & bullish & (close > midpoint)
+            if 'evening_star' in names:
+                # 长阳线 + 小实体 + 收盘低于第一天中点的阴线
+                masks['evening_star'] = (first_close > first_open) & small_second & bearish & (close < midpoint)
+        
+        return masks
     
-    def detect_hammer(self, df: pd.DataFrame) -> List[Dict]:
-        """检测锤子线"""
+    def _emit(self, df: pd.DataFrame, masks: Dict[str, np.ndarray], groups: List[List[str]]) -> List[Dict]:
+        """
+        按形态组输出形态列表（组内按时间顺序）
+        
+        参数:
+            masks: masks 的返回值
+            groups: 形态组，每组为一个或多个形态名
+        """
+        dates = df['date'] if 'date' in df.columns else None
         patterns = []
-        
-        for i in range(1, len(df)):
-            row = df.iloc[i]
-            body = abs(row['close'] - row['open'])
-            lower_shadow = min(row['open'], row['close']) - row['low']
-            upper_shadow = row['high'] - max(row['open'], row['close'])
-            
-            # 锤子线条件：下影线是实体的2倍以上，上影线很小
-            if lower_shadow > body * 2 and upper_shadow < body * 0.5:
+        for group in groups:
+            stacked = np.vstack([masks[name] for name in group])
+            index = np.flatnonzero(stacked.any(axis=0))
+            if len(index) == 0:
+                continue
+            kinds = stacked[:, index].argmax(axis=0)
+            labels = dates.take(index).tolist() if dates is not None else index.tolist()
+            for label, kind in zip(labels, kinds.tolist()):
+                name = group[kind]
+                signal, description = PATTERN_INFO[name]
                 patterns.append({
-                    'date': row.get('date', i),
-                    'pattern': 'hammer',
-                    'signal': 'bullish',
-                    'description': '锤子线，可能见底信号'
+                    'date': label,
+                    'pattern': name,
+                    'signal': signal,
+                    'description': description
                 })
-        
         return patterns
     
+    @staticmethod
+    def _group(name: str) -> List[str]:
+        return ['bullish_engulfing', 'bearish_engulfing'] if name == 'engulfing' else [name]
+    
+    def detect_patterns(self, df: pd.DataFrame) -> List[Dict]:
+        """检测所有K线形态（一次计算全部掩码）"""
+        names = list(self.patterns)
+        return self._emit(df, self.masks(df, names), [self._group(name) for name in names])
+    
+    def _detect(self, df: pd.DataFrame, name: str) -> List[Dict]:
+        return self._emit(df, self.masks(df, [name]), [self._group(name)])
+    
+    def detect_hammer(self, df: pd.DataFrame) -> List[Dict]:
+        """检测锤子线"""
+        return self._detect(df, 'hammer')
+    
     def detect_doji(self, df: pd.DataFrame) -> List[Dict]:
         """检测十字星"""
-        patterns = []
-        
-        for i in range(len(df)):
-            row = df.iloc[i]
-            body = abs(row['close'] - row['open'])
-            total_range = row['high'] - row['low']
-            
-            # 十字星条件：实体很小
-            if total_range > 0 and body / total_range < 0.1:
-                patterns.append({
-                    'date': row.get('date', i),
-                    'pattern': 'doji',
-                    'signal': 'neutral',
-                    'description': '十字星，趋势可能反转'
-                })
-        
-        return patterns
+        return self._detect(df, 'doji')
     
     def detect_engulfing(self, df: pd.DataFrame) -> List[Dict]:
         """检测吞没形态"""
-        patterns = []
-        
-        for i in range(1, len(df)):
-            curr = df.iloc[i]
-            prev = df.iloc[i-1]
-            
-            # 看涨吞没
-            if (prev['close'] < prev['open'] and  # 前一天是阴线
-                curr['close'] > curr['open'] and  # 当天是阳线
-                curr['open'] < prev['close'] and  # 开盘价低于前一天收盘
-                curr['close'] > prev['open']):    # 收盘价高于前一天开盘
-                
-                patterns.append({
-                    'date': curr.get('date', i),
-                    'pattern': 'bullish_engulfing',
-                    'signal': 'bullish',
-                    'description': '看涨吞没，强烈买入信号'
-                })
-            
-            # 看跌吞没
-            elif (prev['close'] > prev['open'] and  # 前一天是阳线
-                  curr['close'] < curr['open'] and  # 当天是阴线
-                  curr['open'] > prev['close'] and  # 开盘价高于前一天收盘
-                  curr['close'] < prev['open']):    # 收盘价低于前一天开盘
-                
-                patterns.append({
-                    'date': curr.get('date', i),
-                    'pattern': 'bearish_engulfing',
-                    'signal': 'bearish',
-                    'description': '看跌吞没，强烈卖出信号'
-                })
-        
-        return patterns
+        return self._detect(df, 'engulfing')
     
     def detect_morning_star(self, df: pd.DataFrame) -> List[Dict]:
         """检测早晨之星"""
-        patterns = []
-        
-        for i in range(2, len(df)):
-            first = df.iloc[i-2]
-            second = df.iloc[i-1]
-            third = df.iloc[i]
-            
-            # 早晨之星条件
-            if (first['close'] < first['open'] and  # 第一天是长阴线
-                abs(second['close'] - second['open']) < abs(first['close'] - first['open']) * 0.3 and  # 第二天是小实体
-                third['close'] > third['open'] and  # 第三天是阳线
-                third['close'] > (first['open'] + first['close']) / 2):  # 第三天收盘高于第一天中点
-                
-                patterns.append({
-                    'date': third.get('date', i),
-                    'pattern': 'morning_star',
-                    'signal': 'bullish',
-                    'description': '早晨之星，底部反转信号'
-                })
-        
-        return patterns
+        return self._detect(df, 'morning_star')
     
     def detect_evening_star(self, df: pd.DataFrame) -> List[Dict]:
         """检测黄昏之星"""
-        patterns = []
-        
-        for i in range(2, len(df)):
-            first = df.iloc[i-2]
-            second = df.iloc[i-1]
-            third = df.iloc[i]
-            
-            # 黄昏之星条件
-            if (first['close'] > first['open'] and  # 第一天是长阳线
-                abs(second['close'] - second['open']) < abs(first['close'] - first['open']) * 0.3 and  # 第二天是小实体
-                third['close'] < third['open'] and  # 第三天是阴线
-                third['close'] < (first['open'] + first['close']) / 2):  # 第三天收盘低于第一天中点
-                
-                patterns.append({
-                    'date': third.get('date', i),
-                    'pattern': 'evening_star',
-                    'signal': 'bearish',
-                    'description': '黄昏之星，顶部反转信号'
-                })
-        
-        return patterns
\ No newline at end of file
+        return self._detect(df, 'evening_star')
\ No newline at end of file
@@ -2,10 +2,48 @@
 """
 分析模块
 """
-from .technical_analysis import TechnicalAnalyzer
+from .technical_analysis import TechnicalAnalyzer, SIGNAL_COLUMNS
+from .indicator_registry import IndicatorRegistry, IndicatorSpec, default_registry
+from .signal_rules import SignalRule, SignalStrategy, DEFAULT_STRATEGY
+from .resample import ResampledBarStore, resample_bars, bar_store
 from .backtest import BacktestEngine
+from . import performance
+from .optimizer import StrategyOptimizer
+from .walk_forward import WalkForwardAnalyzer
+from .monte_carlo import MonteCarloSimulator
+from .benchmark import IndexStore, index_store
+from .market_panel import MarketPanel, load_market_panel
+from .portfolio import PortfolioBacktester
+from .event_study import EventStudy
+from .feature_store import FeatureStore, feature_store
+from .similarity import SimilarityIndex, SimilaritySearch, similarity_search
 
 __all__ = [
     'TechnicalAnalyzer',
-    'BacktestEngine'
+    'SIGNAL_COLUMNS',
+    'IndicatorRegistry',
+    'IndicatorSpec',
+    'default_registry',
+    'SignalRule',
+    'SignalStrategy',
+    'DEFAULT_STRATEGY',
+    'ResampledBarStore',
+    'resample_bars',
+    'bar_store',
+    'BacktestEngine',
+    'performance',
+    'StrategyOptimizer',
+    'WalkForwardAnalyzer',
+    'MonteCarloSimulator',
+    'IndexStore',
+    'index_store',
+    'MarketPanel',
+    'load_market_panel',
+    'PortfolioBacktester',
+    'EventStudy',
+    'FeatureStore',
+    'feature_store',
+    'SimilarityIndex',
+    'SimilaritySearch',
+    'similarity_search'
 ]
\ No newline at end of file
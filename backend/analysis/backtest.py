@@ -3,10 +3,13 @@
 """
 import pandas as pd
 import numpy as np
+import math
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 import logging
 
+from . import performance
+
 logger = logging.getLogger(__name__)
 
 class BacktestEngine:
@@ -25,19 +28,351 @@ class BacktestEngine:
     def run_backtest(self, 
                     df: pd.DataFrame, 
                     signal_column: str = 'signal_final',
-                    price_column: str = 'close') -> Dict:
+                    price_column: str = 'close',
+                    periods_per_year: float = 252,
+                    record_history: bool = True,
+                    stop_loss: Optional[float] = None,
+                    take_profit: Optional[float] = None,
+                    trailing_stop: Optional[float] = None) -> Dict:
+        """
+        运行回测（向量化实现）
+        
+        持仓状态由信号序列前向填充得到，资金曲线、回撤和交易列表都用数组计算，
+        只有逐笔交易的仓位计算需要循环。结果与逐日循环的 run_backtest_loop 完全一致。
+        
+        设置止损/止盈/移动止损后，持仓期间用每根K线的最高价和最低价判断是否触发，
+        触发当根K线按触发价（跳空时按开盘价）卖出，之后等待下一个买入信号。
+        
+        参数:
+            df: 包含价格和信号的DataFrame
+            signal_column: 信号列名
+            price_column: 价格列名
+            periods_per_year: 每年K线数量（日线252，周线52，月线12），用于年化夏普比率
+            record_history: 是否生成 trades 和 capital_history 明细（参数扫描时可关闭）
+            stop_loss: 止损比例，如0.05表示跌破买入价5%卖出
+            take_profit: 止盈比例，如0.2表示涨过买入价20%卖出
+            trailing_stop: 移动止损比例，如0.1表示从买入后最高价回落10%卖出
+        
+        返回:
+            回测结果字典
+        """
+        try:
+            stops = self.stop_rules(stop_loss, take_profit, trailing_stop)
+            prices = df[price_column].to_numpy()
+            if signal_column in df.columns:
+                signal = df[signal_column].to_numpy()
+            else:
+                signal = np.zeros(len(df))
+            
+            sim = None
+            if len(df) > 0 and prices.dtype.kind in 'if':
+                bars = self._bar_range(df, prices) if stops else None
+                sim = self.simulate(prices, signal, periods_per_year, stops=stops, bars=bars)
+            if sim is None:
+                return self.run_backtest_loop(df, signal_column, price_column, periods_per_year,
+                                              stop_loss, take_profit, trailing_stop)
+            
+            results = sim['metrics']
+            if record_history:
+                events = sim['events']
+                dates = df['date'].tolist() if 'date' in df.columns else list(range(len(df)))
+                results['trades'] = [
+                    {
+                        'date': dates[i],
+                        'type': 'buy' if sim['is_buy'][k] else 'sell',
+                        'price': sim['trade_prices'][k],
+                        'shares': int(sim['trade_shares'][k]),
+                        'capital': sim['cash_after'][k]
+                    }
+                    for k, i in enumerate(events)
+                ]
+                if stops:
+                    for trade, reason in zip(results['trades'], sim['reasons']):
+                        trade['reason'] = reason
+                results['capital_history'] = [
+                    {'date': d, 'capital': c, 'position_value': p, 'total_value': v}
+                    for d, c, p, v in zip(dates, sim['cash'].tolist(),
+                                          sim['position_value'].tolist(), sim['total_value'].tolist())
+                ]
+                self._attach_rolling(results, periods_per_year)
+            
+            self.logger.info(f"回测完成，总收益率: {results['total_return']:.2%}")
+            return results
+            
+        except Exception as e:
+            self.logger.error(f"回测失败: {e}")
+            raise
+    
+    def simulate(self,
+                 prices: np.ndarray,
+                 signal: np.ndarray,
+                 periods_per_year: float = 252,
+                 detailed: bool = True,
+                 stops: Optional[Dict[str, float]] = None,
+                 bars: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None) -> Optional[Dict]:
+        """
+        向量化模拟交易
+        
+        参数:
+            prices: 成交价格序列
+            signal: 信号序列（1买入，-1卖出）
+            periods_per_year: 每年K线数量
+            detailed: 是否计算完整的绩效和交易统计（参数扫描只需要核心指标时可关闭）
+            stops: stop_rules 返回的止损/止盈/移动止损设置
+            bars: 设置 stops 时需要的 (开盘价, 最高价, 最低价) 序列
+        
+        返回:
+            metrics（回测指标）及成交、资金曲线数组；需要回退到逐日循环时返回None
+        """
+        n = len(prices)
+        
+        if stops:
+            events, is_buy, fills, reasons = self._stop_events(prices, signal, stops, *bars)
+        else:
+            # 前向填充最近一次买卖信号得到持仓状态（1持仓，-1空仓），状态切换处即为成交
+            state = np.where(signal == 1, 1, np.where(signal == -1, -1, 0))
+            last = np.maximum.accumulate(np.where(state != 0, np.arange(n), -1))
+            state = np.where(last >= 0, state[np.maximum(last, 0)], -1)
+            prev_state = np.r_[-1, state[:-1]]
+            events = np.flatnonzero(state != prev_state)
+            is_buy = state[events] == 1
+            fills = prices[events]
+            reasons = None
+        
+        # 逐笔计算仓位和现金（运算顺序与逐日循环一致）
+        capital = self.initial_capital
+        position = 0
+        cash_after = np.empty(len(events))
+        shares_after = np.zeros(len(events), dtype=np.int64)
+        trade_shares = np.empty(len(events), dtype=np.int64)
+        # 用Python标量循环（与numpy float64运算结果相同，但更快）
+        for k, (price, buy) in enumerate(zip(fills.tolist(), is_buy.tolist())):
+            if buy:
+                if not math.isfinite(price):
+                    return None
+                shares = int(capital * 0.95 / price)  # 使用95%资金买入
+                if shares <= 0:
+                    # 资金不足以买入时后续状态不再由信号唯一决定
+                    return None
+                position = shares
+                capital -= shares * price
+                trade_shares[k] = shares
+            else:
+                capital += position * price
+                trade_shares[k] = position
+                position = 0
+            cash_after[k] = capital
+            shares_after[k] = position
+        
+        # 每日资产：取当日及之前最近一次成交后的现金和持仓
+        idx = np.searchsorted(events, np.arange(n), side='right')
+        cash = np.r_[self.initial_capital, cash_after][idx]
+        position_value = np.r_[0, shares_after][idx] * prices
+        total_value = cash + position_value
+        
+        final_value = capital + position * prices[-1]
+        
+        metrics = self._summarize(
+            trade_prices=fills,
+            is_buy=is_buy,
+            trade_shares=trade_shares,
+            trade_index=events,
+            values=total_value,
+            position_value=position_value,
+            initial_capital=self.initial_capital,
+            final_value=final_value,
+            periods_per_year=periods_per_year,
+            detailed=detailed
+        )
+        return {
+            'metrics': metrics,
+            'events': events,
+            'is_buy': is_buy,
+            'trade_prices': fills,
+            'reasons': reasons,
+            'trade_shares': trade_shares,
+            'cash_after': cash_after,
+            'cash': cash,
+            'position_value': position_value,
+            'total_value': total_value
+        }
+    
+    @staticmethod
+    def stop_rules(stop_loss: Optional[float] = None,
+                   take_profit: Optional[float] = None,
+                   trailing_stop: Optional[float] = None) -> Optional[Dict[str, float]]:
+        """
+        校验止损/止盈/移动止损比例
+        
+        返回:
+            已设置的规则字典，均未设置时返回None
+        """
+        rules = {}
+        for name, label, value, bounded in (('stop_loss', '止损', stop_loss, True),
+                                            ('take_profit', '止盈', take_profit, False),
+                                            ('trailing_stop', '移动止损', trailing_stop, True)):
+            if value is None:
+                continue
+            if not value > 0 or (bounded and value >= 1):
+                raise ValueError(f"{label}比例必须在 (0, 1) 之间" if bounded else f"{label}比例必须为正数")
+            rules[name] = float(value)
+        return rules or None
+    
+    @staticmethod
+    def _bar_range(df: pd.DataFrame, prices: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """取开盘价、最高价、最低价序列，缺少最高/最低价时用成交价代替，缺少开盘价时不考虑跳空"""
+        prices = prices.astype(float)
+        open_ = df['open'].to_numpy(dtype=float) if 'open' in df.columns else np.full(len(df), np.nan)
+        high = df['high'].to_numpy(dtype=float) if 'high' in df.columns else prices
+        low = df['low'].to_numpy(dtype=float) if 'low' in df.columns else prices
+        return open_, high, low
+    
+    @staticmethod
+    def _stop_exit(open_: float,
+                   high: float,
+                   low: float,
+                   stop: Optional[float],
+                   trail: Optional[float],
+                   target: Optional[float]) -> Optional[Tuple[float, str]]:
+        """
+        判断一根K线是否触发止损/止盈
+        
+        开盘跳空越过止损或止盈价时按开盘价成交；盘中同时触及止损和止盈时无法判断先后，
+        保守地按止损处理。
+        
+        参数:
+            stop: 固定止损价
+            trail: 移动止损价
+            target: 止盈价
+        
+        返回:
+            (成交价, 原因)，未触发时返回None
         """
-        运行回测
+        levels = [level for level in (stop, trail) if level is not None]
+        level = max(levels) if levels else None
+        if level is not None:
+            reason = 'trailing_stop' if trail is not None and (stop is None or trail > stop) else 'stop_loss'
+            if open_ <= level:
+                return open_, reason
+        if target is not None and open_ >= target:
+            return open_, 'take_profit'
+        if level is not None and low <= level:
+            return level, reason
+        if target is not None and high >= target:
+            return target, 'take_profit'
+        return None
+    
+    def _stop_events(self,
+                     prices: np.ndarray,
+                     signal: np.ndarray,
+                     stops: Dict[str, float],
+                     open_: np.ndarray,
+                     high: np.ndarray,
+                     low: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[str]]:
+        """
+        带止损/止盈的成交序列
+        
+        逐笔交易而非逐根K线循环：每笔买入后在到下一个卖出信号为止的区间内，
+        用累计最高价扫描得到移动止损线，一次数组比较找出第一根触发的K线；
+        止损离场后从该K线起寻找下一个买入信号。
+        
+        返回:
+            成交位置、是否买入、成交价、成交原因
+        """
+        n = len(prices)
+        stop_loss = stops.get('stop_loss')
+        take_profit = stops.get('take_profit')
+        trailing_stop = stops.get('trailing_stop')
+        
+        # 每根K线之后的第一个卖出信号、当根及之后的第一个买入信号
+        positions = np.arange(n)
+        is_sell = signal == -1
+        next_sell = np.minimum.accumulate(np.where(is_sell, positions, n)[::-1])[::-1]
+        next_sell = np.r_[next_sell[1:], n].tolist()
+        next_buy = np.minimum.accumulate(np.where(signal == 1, positions, n)[::-1])[::-1].tolist() + [n]
+        # 开盘跳空也算触发，先合并开盘价
+        low_reach = np.fmin(low, open_)
+        high_reach = np.fmax(high, open_)
+        
+        events, is_buy, fills, reasons = [], [], [], []
+        i = next_buy[0]
+        while i < n:
+            entry = float(prices[i])
+            events.append(i)
+            is_buy.append(True)
+            fills.append(entry)
+            reasons.append('signal')
+            
+            sell = next_sell[i]
+            end = min(sell, n - 1)
+            stop = entry * (1 - stop_loss) if stop_loss else None
+            target = entry * (1 + take_profit) if take_profit else None
+            trail = None
+            if trailing_stop:
+                # 截至前一根K线的最高价（含买入价）
+                trail = high[i:end].copy()
+                if len(trail):
+                    trail[0] = entry
+                np.fmax.accumulate(trail, out=trail)
+                trail *= 1 - trailing_stop
+            level = trail if stop is None else (stop if trail is None else np.maximum(trail, stop))
+            
+            hit = None
+            if level is not None:
+                hit = low_reach[i + 1:end + 1] <= level
+            if target is not None:
+                reach = high_reach[i + 1:end + 1] >= target
+                hit = reach if hit is None else hit | reach
+            h = int(hit.argmax()) if len(hit) else 0
+            
+            if len(hit) and hit[h]:
+                t = i + 1 + h
+                price, reason = self._stop_exit(open_[t], high[t], low[t], stop,
+                                                None if trail is None else trail[h], target)
+                events.append(t)
+                is_buy.append(False)
+                fills.append(float(price))
+                reasons.append(reason)
+                # 止损当根K线收盘的买入信号仍然有效
+                i = next_buy[t]
+            elif sell < n:
+                events.append(sell)
+                is_buy.append(False)
+                fills.append(float(prices[sell]))
+                reasons.append('signal')
+                i = next_buy[sell + 1]
+            else:
+                break
+        
+        return (np.array(events, dtype=np.int64), np.array(is_buy, dtype=bool),
+                np.array(fills, dtype=float), reasons)
+    
+    def run_backtest_loop(self, 
+                         df: pd.DataFrame, 
+                         signal_column: str = 'signal_final',
+                         price_column: str = 'close',
+                         periods_per_year: float = 252,
+                         stop_loss: Optional[float] = None,
+                         take_profit: Optional[float] = None,
+                         trailing_stop: Optional[float] = None) -> Dict:
+        """
+        运行回测（逐日循环的参考实现）
         
         参数:
             df: 包含价格和信号的DataFrame
             signal_column: 信号列名
             price_column: 价格列名
+            periods_per_year: 每年K线数量（日线252，周线52，月线12），用于年化夏普比率
+            stop_loss: 止损比例
+            take_profit: 止盈比例
+            trailing_stop: 移动止损比例
         
         返回:
             回测结果字典
         """
         try:
+            stops = self.stop_rules(stop_loss, take_profit, trailing_stop)
+            
             # 复制数据避免修改原始数据
             data = df.copy()
             
@@ -46,6 +381,7 @@ class BacktestEngine:
             position = 0
             trades = []
             capital_history = []
+            entry_price = peak = 0.0
             
             # 遍历每一天
             for i in range(len(data)):
@@ -54,12 +390,36 @@ class BacktestEngine:
                 price = row[price_column]
                 date = row.get('date', i)
                 
+                # 盘中止损/止盈（买入当根K线不检查）
+                if stops and position > 0:
+                    high = row.get('high', price)
+                    exit_ = self._stop_exit(
+                        row.get('open', np.nan), high, row.get('low', price),
+                        entry_price * (1 - stops['stop_loss']) if 'stop_loss' in stops else None,
+                        peak * (1 - stops['trailing_stop']) if 'trailing_stop' in stops else None,
+                        entry_price * (1 + stops['take_profit']) if 'take_profit' in stops else None
+                    )
+                    if exit_ is not None:
+                        capital += position * exit_[0]
+                        trades.append({
+                            'date': date,
+                            'type': 'sell',
+                            'price': exit_[0],
+                            'shares': position,
+                            'capital': capital,
+                            'reason': exit_[1]
+                        })
+                        position = 0
+                    elif high > peak:
+                        peak = high
+                
                 # 买入信号
                 if signal == 1 and position == 0:
                     shares = int(capital * 0.95 / price)  # 使用95%资金买入
                     if shares > 0:
                         position = shares
                         capital -= shares * price
+                        entry_price = peak = price
                         trades.append({
                             'date': date,
                             'type': 'buy',
@@ -89,6 +449,10 @@ class BacktestEngine:
                     'total_value': total_value
                 })
             
+            if stops:
+                for trade in trades:
+                    trade.setdefault('reason', 'signal')
+            
             # 计算最终收益
             final_value = capital + position * data.iloc[-1][price_column]
             
@@ -97,11 +461,13 @@ class BacktestEngine:
                 trades=trades,
                 capital_history=capital_history,
                 initial_capital=self.initial_capital,
-                final_value=final_value
+                final_value=final_value,
+                periods_per_year=periods_per_year
             )
             
             results['trades'] = trades
             results['capital_history'] = capital_history
+            self._attach_rolling(results, periods_per_year)
             
             self.logger.info(f"回测完成，总收益率: {results['total_return']:.2%}")
             return results
@@ -110,48 +476,87 @@ class BacktestEngine:
             self.logger.error(f"回测失败: {e}")
             raise
     
+    @staticmethod
+    def _attach_rolling(results: Dict, periods_per_year: float):
+        """在 capital_history 的每条记录中加入回撤和滚动指标"""
+        history = results['capital_history']
+        window = performance.rolling_window(periods_per_year)
+        rolling = performance.rolling_metrics(
+            np.array([h['total_value'] for h in history], dtype=float), periods_per_year, window
+        )
+        for record, values in zip(history, performance.rolling_records(rolling)):
+            record.update(values)
+        results['rolling_window'] = window
+    
     def calculate_metrics(self, 
                          trades: List[Dict],
                          capital_history: List[Dict],
                          initial_capital: float,
-                         final_value: float) -> Dict:
+                         final_value: float,
+                         periods_per_year: float = 252) -> Dict:
         """
         计算回测指标
         """
+        positions = {h['date']: i for i, h in reversed(list(enumerate(capital_history)))}
+        return self._summarize(
+            trade_prices=np.array([t['price'] for t in trades], dtype=float),
+            is_buy=np.array([t['type'] == 'buy' for t in trades], dtype=bool),
+            trade_shares=np.array([t['shares'] for t in trades], dtype=float),
+            trade_index=np.array([positions.get(t['date'], 0) for t in trades], dtype=np.int64),
+            values=np.array([h['total_value'] for h in capital_history], dtype=float),
+            position_value=np.array([h['position_value'] for h in capital_history], dtype=float),
+            initial_capital=initial_capital,
+            final_value=final_value,
+            periods_per_year=periods_per_year
+        )
+    
+    def _summarize(self,
+                   trade_prices: np.ndarray,
+                   is_buy: np.ndarray,
+                   trade_shares: np.ndarray,
+                   trade_index: np.ndarray,
+                   values: np.ndarray,
+                   position_value: np.ndarray,
+                   initial_capital: float,
+                   final_value: float,
+                   periods_per_year: float = 252,
+                   detailed: bool = True) -> Dict:
+        """
+        由逐笔成交和每日资产序列计算回测指标（见 performance 模块）
+        
+        参数:
+            trade_prices: 按时间顺序的成交价
+            is_buy: 每笔成交是否为买入
+            trade_shares: 每笔成交的股数
+            trade_index: 每笔成交所在的K线位置
+            values: 每日总资产
+            position_value: 每日持仓市值
+            detailed: 是否计算核心指标以外的风险收益和交易统计
+        """
         metrics = {}
         
         # 总收益率
         metrics['total_return'] = (final_value - initial_capital) / initial_capital
         
         # 交易次数
-        metrics['total_trades'] = len(trades)
-        metrics['buy_trades'] = len([t for t in trades if t['type'] == 'buy'])
-        metrics['sell_trades'] = len([t for t in trades if t['type'] == 'sell'])
-        
-        # 计算胜率
-        if metrics['sell_trades'] > 0:
-            wins = 0
-            for i in range(0, len(trades)-1, 2):
-                if i+1 < len(trades):
-                    buy_price = trades[i]['price']
-                    sell_price = trades[i+1]['price']
-                    if sell_price > buy_price:
-                        wins += 1
-            metrics['win_rate'] = wins / metrics['sell_trades'] if metrics['sell_trades'] > 0 else 0
-        else:
-            metrics['win_rate'] = 0
+        buy_count = int(is_buy.sum())
+        metrics['total_trades'] = len(trade_prices)
+        metrics['buy_trades'] = buy_count
+        metrics['sell_trades'] = len(trade_prices) - buy_count
         
-        # 计算最大回撤
-        if capital_history:
-            values = [h['total_value'] for h in capital_history]
-            metrics['max_drawdown'] = self.calculate_max_drawdown(values)
-            
-            # 计算夏普比率
-            returns = pd.Series(values).pct_change().dropna()
-            if len(returns) > 0:
-                metrics['sharpe_ratio'] = self.calculate_sharpe_ratio(returns)
-            else:
-                metrics['sharpe_ratio'] = 0
+        # 胜率：每笔卖出与之前的买入配对，未平仓的买入不计入
+        trips = performance.round_trips(trade_prices, is_buy, trade_shares, trade_index)
+        metrics['win_rate'] = int(np.count_nonzero(trips['exit'] > trips['entry'])) / len(trips['exit']) \
+            if len(trips['exit']) else 0
+        
+        # 最大回撤和夏普比率
+        returns = performance.simple_returns(values)
+        drawdown = performance.drawdown_stats(values)
+        if len(values):
+            metrics['max_drawdown'] = drawdown['max_drawdown']
+            metrics['sharpe_ratio'] = performance.sharpe_ratio(
+                returns, periods_per_year=periods_per_year
+            ) if len(returns) > 0 else 0
         else:
             metrics['max_drawdown'] = 0
             metrics['sharpe_ratio'] = 0
@@ -160,90 +565,62 @@ class BacktestEngine:
         metrics['final_value'] = final_value
         metrics['initial_capital'] = initial_capital
         
+        if not detailed:
+            return metrics
+        
+        # 其余风险收益和交易统计
+        stats = performance.trade_stats(trips)
+        metrics['annual_return'] = performance.annual_return(values, periods_per_year, initial_capital)
+        metrics['sortino_ratio'] = performance.sortino_ratio(returns, periods_per_year=periods_per_year)
+        metrics['calmar_ratio'] = (
+            metrics['annual_return'] / metrics['max_drawdown'] if metrics['max_drawdown'] > 0 else 0
+        )
+        metrics['max_drawdown_duration'] = drawdown['max_duration']
+        metrics.update(performance.exposure(position_value, values))
+        metrics['turnover'] = performance.turnover(trade_prices * trade_shares, values, periods_per_year)
+        for key in ('profit_factor', 'avg_win', 'avg_loss', 'expectancy', 'avg_trade_return',
+                    'best_trade', 'worst_trade', 'avg_holding_bars', 'open_trades'):
+            metrics[key] = stats[key]
+        
         return metrics
     
     def calculate_max_drawdown(self, values: List[float]) -> float:
         """
         计算最大回撤
         """
-        if not values:
-            return 0
-        
-        peak = values[0]
-        max_dd = 0
-        
-        for value in values:
-            if value > peak:
-                peak = value
-            dd = (peak - value) / peak
-            if dd > max_dd:
-                max_dd = dd
-        
-        return max_dd
+        return performance.max_drawdown(values)
     
-    def calculate_sharpe_ratio(self, returns: pd.Series, risk_free_rate: float = 0.03) -> float:
+    def calculate_sharpe_ratio(self, returns: pd.Series, risk_free_rate: float = 0.03,
+                               periods_per_year: float = 252) -> float:
         """
         计算夏普比率
         """
         if len(returns) == 0:
             return 0
-        
-        # 年化收益率
-        annual_return = returns.mean() * 252
-        
-        # 年化波动率
-        annual_vol = returns.std() * np.sqrt(252)
-        
-        if annual_vol == 0:
-            return 0
-        
-        # 夏普比率
-        sharpe = (annual_return - risk_free_rate) / annual_vol
-        
-        return sharpe
+        returns = np.asarray(returns, dtype=float)
+        return performance.sharpe_ratio(returns[~np.isnan(returns)], risk_free_rate, periods_per_year)
     
     def analyze_trades(self, trades: List[Dict]) -> Dict:
         """
-        分析交易详情
+        分析交易详情（每笔卖出与之前最近的买入配对，盈亏按每股价差计算）
         """
         if not trades:
             return {}
         
+        prices = np.array([t['price'] for t in trades], dtype=float)
+        is_buy = np.array([t['type'] == 'buy' for t in trades], dtype=bool)
+        trips = performance.round_trips(prices, is_buy)
+        profit = trips['pnl']
+        
         analysis = {
             'total_trades': len(trades),
-            'buy_count': 0,
-            'sell_count': 0,
-            'avg_buy_price': 0,
-            'avg_sell_price': 0,
-            'total_profit': 0,
-            'profit_trades': 0,
-            'loss_trades': 0
+            'buy_count': int(is_buy.sum()),
+            'sell_count': int((~is_buy).sum()),
+            'avg_buy_price': prices[is_buy].mean() if is_buy.any() else 0,
+            'avg_sell_price': prices[~is_buy].mean() if (~is_buy).any() else 0,
+            'total_profit': profit.sum() if len(profit) else 0,
+            'profit_trades': int((profit > 0).sum()),
+            'loss_trades': int((profit <= 0).sum())
         }
-        
-        buy_prices = []
-        sell_prices = []
-        
-        for trade in trades:
-            if trade['type'] == 'buy':
-                analysis['buy_count'] += 1
-                buy_prices.append(trade['price'])
-            else:
-                analysis['sell_count'] += 1
-                sell_prices.append(trade['price'])
-        
-        if buy_prices:
-            analysis['avg_buy_price'] = np.mean(buy_prices)
-        
-        if sell_prices:
-            analysis['avg_sell_price'] = np.mean(sell_prices)
-        
-        # 计算每对买卖的收益
-        for i in range(min(len(buy_prices), len(sell_prices))):
-            profit = sell_prices[i] - buy_prices[i]
-            analysis['total_profit'] += profit
-            if profit > 0:
-                analysis['profit_trades'] += 1
-            else:
-                analysis['loss_trades'] += 1
-        
-        return analysis
\ No newline at end of file
+        analysis.update(performance.trade_stats(trips))
+        return analysis
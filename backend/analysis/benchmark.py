@@ -0,0 +1,248 @@
+"""
+基准指数对比
+
+指数日线保存在本地 index_daily 表中，由 sync 增量拉取（每日定时任务或数据接口触发）；
+回测时只读本地数据，每个指数的收盘价序列缓存在内存中，对比基准不产生网络请求。
+基准序列按回测的交易日对齐：取每个交易日当天或之前最近一个指数收盘价，
+超出本地指数数据范围的交易日不参与计算。
+"""
+import re
+import threading
+from datetime import date, timedelta
+from typing import Dict, Optional, Sequence, Tuple
+import pandas as pd
+import numpy as np
+import logging
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from backend.database.models import IndexDaily
+from backend.database.bulk import upsert_index_daily
+from . import performance
+
+logger = logging.getLogger(__name__)
+
+# 常用指数的中文名称
+INDEX_ALIASES = {
+    '上证指数': 'sh000001',
+    '上证50': 'sh000016',
+    '沪深300': 'sh000300',
+    '中证500': 'sh000905',
+    '中证1000': 'sh000852',
+    '深证成指': 'sz399001',
+    '创业板指': 'sz399006',
+}
+
+# 没有本地数据时从这一天（上交所开业）开始拉取
+HISTORY_START = date(1990, 12, 19)
+
+
+def normalize_index_code(code: str) -> str:
+    """
+    规范化指数代码为 sh000300 形式
+
+    支持中文名称（沪深300）、Tushare格式（000300.SH）、带前缀（SH000300）和纯数字代码
+    （399开头为深市指数，其余为沪市指数）
+    """
+    code = (code or '').strip()
+    if code in INDEX_ALIASES:
+        return INDEX_ALIASES[code]
+    lowered = code.lower()
+    match = re.fullmatch(r'(\d{6})\.(sh|sz)', lowered)
+    if match:
+        return match.group(2) + match.group(1)
+    if re.fullmatch(r'(sh|sz)\d{6}', lowered):
+        return lowered
+    if re.fullmatch(r'\d{6}', lowered):
+        return ('sz' if lowered.startswith('399') else 'sh') + lowered
+    raise ValueError(f"无法识别的指数代码: {code}，可用名称 {', '.join(INDEX_ALIASES)}")
+
+
+class IndexStore:
+    """指数收盘价的本地缓存"""
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self._series: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._lock = threading.RLock()
+
+    def series(self, db: Session, code: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        指数的全部本地收盘价
+
+        返回:
+            (交易日 datetime64[D] 数组, 收盘价数组)，没有本地数据时为空数组
+        """
+        code = normalize_index_code(code)
+        with self._lock:
+            cached = self._series.get(code)
+        if cached is not None:
+            return cached
+
+        rows = db.query(IndexDaily.date, IndexDaily.close).filter(
+            IndexDaily.code == code
+        ).order_by(IndexDaily.date).all()
+        dates = np.array([r[0] for r in rows], dtype='datetime64[D]')
+        closes = np.array([r[1] for r in rows], dtype=float)
+        valid = ~np.isnan(closes)
+        cached = (dates[valid], closes[valid])
+        if len(cached[0]):
+            # 没有数据时不缓存，同步后即可读到
+            with self._lock:
+                self._series[code] = cached
+        return cached
+
+    def invalidate(self, code: Optional[str] = None):
+        """清除内存缓存（code 为空时清除全部）"""
+        with self._lock:
+            if code is None:
+                self._series.clear()
+            else:
+                self._series.pop(normalize_index_code(code), None)
+
+    def sync(self, db: Session, code: str, collector=None, end_date: Optional[date] = None) -> int:
+        """
+        从数据源增量拉取指数日线并写入本地
+
+        参数:
+            db: 数据库会话（本方法负责提交）
+            code: 指数代码
+            collector: 数据采集器，默认 AkShareCollector
+            end_date: 拉取截止日期，默认今天
+
+        返回:
+            写入的行数
+        """
+        code = normalize_index_code(code)
+        last = db.query(func.max(IndexDaily.date)).filter(IndexDaily.code == code).scalar()
+        start = last + timedelta(days=1) if last else HISTORY_START
+        end = end_date or date.today()
+        if start > end:
+            return 0
+
+        if collector is None:
+            from backend.data_collector import AkShareCollector
+            collector = AkShareCollector()
+        df = collector.get_index_daily(code, start.strftime("%Y%m%d"), end.strftime("%Y%m%d"))
+        df = self._standardize(df)
+        if df.empty:
+            return 0
+
+        rows = upsert_index_daily(db, code, df)
+        db.commit()
+        self.invalidate(code)
+        self.logger.info(f"指数{code}同步 {rows} 条日线（{df['date'].min()} ~ {df['date'].max()}）")
+        return rows
+
+    @staticmethod
+    def _standardize(df: pd.DataFrame) -> pd.DataFrame:
+        """统一 AkShare/Tushare 返回的列名和日期格式"""
+        if df is None or df.empty:
+            return pd.DataFrame(columns=['date', 'open', 'high', 'low', 'close', 'volume'])
+        df = df.rename(columns={'trade_date': 'date', 'vol': 'volume'})
+        df = df.assign(date=pd.to_datetime(df['date'].astype(str)).dt.date)
+        for column in ('open', 'high', 'low', 'close', 'volume'):
+            if column not in df.columns:
+                df[column] = np.nan
+        return df.sort_values('date').drop_duplicates('date', keep='last')
+
+    def align(self, db: Session, code: str, dates: Sequence) -> np.ndarray:
+        """
+        按回测的交易日对齐指数收盘价（前向填充，超出本地数据范围的日期为NaN）
+
+        参数:
+            dates: 回测的交易日序列
+        """
+        index_dates, closes = self.series(db, code)
+        dates = np.asarray(list(dates), dtype='datetime64[D]')
+        if len(index_dates) == 0:
+            return np.full(len(dates), np.nan)
+        pos = np.searchsorted(index_dates, dates, side='right') - 1
+        aligned = closes[np.maximum(pos, 0)]
+        return np.where((pos >= 0) & (dates <= index_dates[-1]), aligned, np.nan)
+
+    def compare(self,
+                db: Session,
+                code: str,
+                dates: Sequence,
+                equity: np.ndarray,
+                periods_per_year: float = 252) -> Dict:
+        """
+        策略资金曲线相对基准指数的表现
+
+        参数:
+            db: 数据库会话
+            code: 指数代码或名称
+            dates: 资金曲线对应的交易日
+            equity: 每期总资产
+            periods_per_year: 每年K线数量
+
+        返回:
+            index 指数代码，metrics（alpha、beta、信息比率、跟踪误差等及基准收益率），
+            curve 与资金曲线等长的 DataFrame（date、benchmark_value 按初始资产缩放的基准净值、
+            excess_return 相对基准的累计超额收益）
+        """
+        code = normalize_index_code(code)
+        equity = np.asarray(equity, dtype=float)
+        bench = self.align(db, code, dates)
+        covered = np.flatnonzero(~np.isnan(bench))
+        if len(covered) == 0:
+            raise ValueError(f"指数{code}在回测区间内没有本地数据，请先同步指数日线")
+
+        # 以第一个有基准数据的交易日为共同起点
+        base = covered[0]
+        benchmark_value = equity[base] * bench / bench[base]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            strategy_returns = equity[1:] / equity[:-1] - 1
+            bench_returns = bench[1:] / bench[:-1] - 1
+            excess_curve = (equity / equity[base]) / (bench / bench[base]) - 1
+        excess_curve[:base] = np.nan
+
+        last = covered[-1]
+        metrics = performance.relative_metrics(strategy_returns, bench_returns, periods_per_year)
+        metrics.update({
+            'benchmark_return': float(bench[last] / bench[base] - 1),
+            'benchmark_annual_return': performance.annual_return(bench[base:last + 1], periods_per_year),
+            'strategy_return': float(equity[last] / equity[base] - 1),
+            'aligned_bars': int(len(covered)),
+        })
+        return {
+            'index': code,
+            'metrics': metrics,
+            'curve': pd.DataFrame({
+                'date': list(dates),
+                'benchmark_value': benchmark_value,
+                'excess_return': excess_curve
+            })
+        }
+
+
+# 全局实例
+index_store = IndexStore()
+
+
+def sync_indices(codes: Optional[Sequence[str]] = None) -> Dict[str, int]:
+    """
+    同步指数日线（每日定时任务）
+
+    参数:
+        codes: 指数代码列表，默认为配置中的 BENCHMARK_INDICES
+    """
+    from backend.config import settings
+    from backend.database import SessionLocal
+
+    if codes is None:
+        codes = [c for c in settings.benchmark_indices.split(',') if c.strip()]
+    db = SessionLocal()
+    try:
+        synced = {}
+        for code in codes:
+            try:
+                synced[normalize_index_code(code)] = index_store.sync(db, code)
+            except Exception as e:
+                db.rollback()
+                logger.error(f"同步指数{code}失败: {e}")
+        return synced
+    finally:
+        db.close()
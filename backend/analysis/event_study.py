@@ -0,0 +1,282 @@
+"""
+事件研究
+
+统计K线形态、交易信号等事件出现后的远期收益：事件当天收盘买入，持有 N 个交易日
+（按该股票自身有数据的交易日计，停牌日不计）后的收益率。
+远期收益先在 [股票 × 交易日] 行情面板上整体算好，再用 (行, 列) 花式索引一次取出全市场所有事件的收益，
+不逐个事件循环。同时按交易日统计全市场平均远期收益，用来计算事件相对市场的超额收益。
+
+面板可以按股票分批加入（add），最后统一汇总（results），全市场数据不需要一次装入内存。
+"""
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+import numpy as np
+import logging
+
+from sqlalchemy.orm import Session
+
+from backend.database.models import EventStat
+from .market_panel import MarketPanel
+from .portfolio import compute_panel_signals
+from .signal_rules import SignalStrategy, DEFAULT_STRATEGY
+from .technical_analysis import TechnicalAnalyzer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HORIZONS = (1, 5, 10, 20)
+
+# 收益分布报告的分位数
+QUANTILES = (0.05, 0.25, 0.75, 0.95)
+
+# 样本数低于该值的统计不作为置信度使用
+MIN_EVENTS = 30
+
+# 事件: 名称 -> (信号方向 bullish/bearish/neutral, [股票 × 交易日] 布尔掩码)
+Events = Mapping[str, Tuple[str, np.ndarray]]
+
+
+def forward_returns(close: np.ndarray, horizons: Sequence[int]) -> np.ndarray:
+    """
+    每个交易日收盘买入、持有 horizon 个交易日后的收益率
+
+    参数:
+        close: [股票 × 交易日] 收盘价面板（缺失为NaN）
+        horizons: 持有交易日数列表
+
+    返回:
+        形状为 (len(horizons),) + close.shape 的数组，没有数据或之后不足 horizon 个交易日的位置为NaN
+    """
+    close = np.asarray(close, dtype=float)
+    # 每只股票的有效交易日左移紧凑排列，停牌日不占位置
+    order = np.argsort(np.isnan(close), axis=-1, kind='stable')
+    compact = np.take_along_axis(close, order, axis=-1)
+    n = close.shape[-1]
+
+    result = np.full((len(horizons),) + close.shape, np.nan)
+    ahead = np.empty(close.shape)
+    for i, horizon in enumerate(horizons):
+        ahead.fill(np.nan)
+        if horizon < n:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                ahead[..., :n - horizon] = compact[..., horizon:] / compact[..., :n - horizon] - 1
+        np.put_along_axis(result[i], order, ahead, axis=-1)
+    return result
+
+
+def summarize(returns: np.ndarray, excess: np.ndarray, signal: str = 'neutral') -> Dict:
+    """
+    一组事件在某个持有期上的收益分布
+
+    参数:
+        returns: 各事件的远期收益率
+        excess: 各事件相对全市场平均的超额收益率
+        signal: 事件的信号方向，看跌事件以下跌为命中，其余以上涨为命中
+
+    返回:
+        count 样本数、hit_rate 命中率、mean/median/std 收益率、分位数、mean_excess 平均超额收益、
+        t_stat 平均收益的t统计量
+    """
+    valid = np.isfinite(returns)
+    values = returns[valid]
+    count = len(values)
+    if count == 0:
+        return {'count': 0}
+
+    hits = values < 0 if signal == 'bearish' else values > 0
+    std = float(values.std(ddof=1)) if count > 1 else 0.0
+    mean = float(values.mean())
+    excess = excess[valid]
+    excess = excess[np.isfinite(excess)]
+    stats = {
+        'count': int(count),
+        'hit_rate': float(hits.mean()),
+        'mean_return': mean,
+        'median_return': float(np.median(values)),
+        'std_return': std,
+        'mean_excess': float(excess.mean()) if len(excess) else None,
+        't_stat': float(mean / std * np.sqrt(count)) if std > 0 else None,
+    }
+    for q, value in zip(QUANTILES, np.quantile(values, QUANTILES)):
+        stats[f'p{int(round(q * 100)):02d}'] = float(value)
+    return stats
+
+
+def pattern_events(panel: MarketPanel, recognizer=None, names: Optional[Sequence[str]] = None) -> Dict:
+    """
+    K线形态事件
+
+    参数:
+        panel: 行情面板（需要 open、high、low、close）
+        recognizer: 形态识别器
+        names: 形态名称，默认全部
+    """
+    from backend.ai_models import PatternRecognizer
+    from backend.ai_models.simple_predictor import PATTERN_INFO
+
+    recognizer = recognizer or PatternRecognizer()
+    masks = recognizer.panel_masks(panel, names)
+    return {name: (PATTERN_INFO[name][0], mask) for name, mask in masks.items()}
+
+
+def _onset(active: np.ndarray) -> np.ndarray:
+    """条件开始成立的那一天（前一交易日不成立）"""
+    previous = np.zeros_like(active)
+    previous[..., 1:] = active[..., :-1]
+    return active & ~previous
+
+
+def signal_events(panel: MarketPanel,
+                  analyzer: Optional[TechnicalAnalyzer] = None,
+                  strategy: Optional[SignalStrategy] = None) -> Dict:
+    """
+    交易信号事件：综合信号 signal_buy/signal_sell，以及每条规则的 <规则名>_buy/<规则名>_sell
+    （如 ma_signal_buy 为MA金叉）
+
+    状态型规则（如 rsi < 30）连续多天成立时只在开始成立的那天记为一次事件，避免样本重叠。
+    """
+    panels = compute_panel_signals(panel, analyzer, strategy or DEFAULT_STRATEGY, rules=True)
+    sources = dict(panels['rules'])
+    sources['signal'] = panels['signal']
+    events = {}
+    for name, values in sources.items():
+        with np.errstate(invalid='ignore'):
+            events[f'{name}_buy'] = ('bullish', _onset(values > 0))
+            events[f'{name}_sell'] = ('bearish', _onset(values < 0))
+    return events
+
+
+class EventStudy:
+    """事件研究引擎"""
+
+    def __init__(self, horizons: Sequence[int] = DEFAULT_HORIZONS):
+        """
+        参数:
+            horizons: 持有交易日数列表
+        """
+        horizons = sorted({int(h) for h in horizons})
+        if not horizons or horizons[0] <= 0:
+            raise ValueError("持有期必须为正整数")
+        self.horizons = tuple(horizons)
+        self.logger = logging.getLogger(__name__)
+        self.reset()
+
+    def reset(self):
+        """清空已加入的面板"""
+        self._signals: Dict[str, str] = {}
+        self._events: Dict[str, List[Tuple[np.ndarray, np.ndarray]]] = {}
+        self._market: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+
+    def add(self, panel: MarketPanel, events: Events) -> int:
+        """
+        加入一个行情面板及其上的事件
+
+        参数:
+            panel: 行情面板（需要 close）
+            events: 事件名称 -> (信号方向, 布尔掩码)
+
+        返回:
+            加入的事件数
+        """
+        returns = forward_returns(panel['close'], self.horizons)
+        valid = np.isfinite(returns)
+        self._market.append((
+            panel.dates,
+            np.where(valid, returns, 0).sum(axis=1),
+            valid.sum(axis=1)
+        ))
+
+        added = 0
+        for name, (signal, mask) in events.items():
+            self._signals[name] = signal
+            rows, cols = np.nonzero(mask)
+            if len(rows) == 0:
+                continue
+            self._events.setdefault(name, []).append((panel.dates[cols], returns[:, rows, cols].T))
+            added += len(rows)
+        return added
+
+    def market_returns(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        各交易日全市场等权平均远期收益率
+
+        返回:
+            (交易日数组, 形状为 (len(horizons), 交易日数) 的平均收益率)
+        """
+        if not self._market:
+            return np.array([], dtype='datetime64[D]'), np.empty((len(self.horizons), 0))
+        dates = np.unique(np.concatenate([d for d, _, _ in self._market]))
+        sums = np.zeros((len(self.horizons), len(dates)))
+        counts = np.zeros((len(self.horizons), len(dates)))
+        for chunk_dates, chunk_sums, chunk_counts in self._market:
+            cols = np.searchsorted(dates, chunk_dates)
+            sums[:, cols] += chunk_sums
+            counts[:, cols] += chunk_counts
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return dates, sums / counts
+
+    def results(self) -> Dict[str, Dict]:
+        """
+        汇总所有已加入的事件
+
+        返回:
+            事件名称 -> {signal, count, start_date, end_date, horizons: {持有期: 收益分布}}
+        """
+        market_dates, market = self.market_returns()
+        results = {}
+        for name, signal in self._signals.items():
+            parts = self._events.get(name)
+            if not parts:
+                results[name] = {'signal': signal, 'count': 0, 'start_date': None, 'end_date': None,
+                                 'horizons': {h: {'count': 0} for h in self.horizons}}
+                continue
+            dates = np.concatenate([d for d, _ in parts])
+            returns = np.concatenate([r for _, r in parts])
+            excess = returns - market[:, np.searchsorted(market_dates, dates)].T
+            results[name] = {
+                'signal': signal,
+                'count': int(len(dates)),
+                'start_date': dates.min().astype(object),
+                'end_date': dates.max().astype(object),
+                'horizons': {
+                    h: summarize(returns[:, i], excess[:, i], signal)
+                    for i, h in enumerate(self.horizons)
+                }
+            }
+        return results
+
+    def run(self, panel: MarketPanel, events: Events) -> Dict[str, Dict]:
+        """在单个行情面板上做事件研究"""
+        self.reset()
+        self.add(panel, events)
+        return self.results()
+
+
+def load_event_stats(db: Session, events: Sequence[str], horizon: int) -> Dict[str, Dict]:
+    """
+    读取事件研究任务保存的统计结果
+
+    参数:
+        db: 数据库会话
+        events: 事件名称列表
+        horizon: 持有交易日数
+
+    返回:
+        事件名称 -> 统计结果，样本数不足 MIN_EVENTS 的事件不返回
+    """
+    if not events:
+        return {}
+    rows = db.query(EventStat).filter(
+        EventStat.event.in_(list(events)),
+        EventStat.horizon == horizon,
+        EventStat.count >= MIN_EVENTS
+    ).all()
+    return {
+        r.event: {
+            'horizon': r.horizon,
+            'count': r.count,
+            'hit_rate': r.hit_rate,
+            'mean_return': r.mean_return,
+            'median_return': r.median_return,
+            'mean_excess': r.mean_excess,
+        }
+        for r in rows
+    }
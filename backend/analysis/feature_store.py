@@ -0,0 +1,203 @@
+"""
+特征库
+
+技术指标和模型特征按 (code, 起始日期, as-of 日期) 计算一次后缓存在内存中（可选持久化为 Parquet 文件），
+各调用方（关注股票分析、价格预测、Gemini 分析）按需取列子集，不再各自重复做滚动窗口计算。
+同一窗口上后来请求的新列只计算缺少的部分，已算好的列和中间结果直接复用。
+
+technical_indicators 表中的指标列（收盘后预计算任务写入，有完整的预热历史）直接读取预计算结果；
+预计算还没有覆盖到最新交易日时，才在加载的日线上现算。
+"""
+import shutil
+import threading
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+import pandas as pd
+import logging
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from backend.config import settings
+from backend.database.bulk import INDICATOR_COLUMNS
+from backend.database.queries import load_daily_bars, load_technical_indicators, OHLCV_COLUMNS
+from .indicator_cache import IndicatorCache
+from .indicator_registry import IndicatorRegistry, feature_registry
+
+logger = logging.getLogger(__name__)
+
+# 默认每只股票加载的交易日数
+FEATURE_BARS = 60
+
+
+class FeatureStore:
+    """特征库（内存LRU + 可选 Parquet 持久化）"""
+
+    def __init__(self,
+                 registry: Optional[IndicatorRegistry] = None,
+                 max_bytes: int = 64 * 1024 * 1024,
+                 persist_dir: Optional[Path] = None):
+        """
+        参数:
+            registry: 特征注册表，默认为 feature_registry（默认指标 + 模型特征）
+            max_bytes: 内存缓存上限（字节）
+            persist_dir: Parquet 持久化目录，None表示只缓存在内存中
+        """
+        self.registry = registry or feature_registry
+        self.persist_dir = Path(persist_dir) if persist_dir is not None else None
+        self.logger = logging.getLogger(__name__)
+        self._cache = IndicatorCache(max_bytes=max_bytes)
+        self._lock = threading.RLock()
+        self._watched = set()
+
+    def features(self,
+                 db: Session,
+                 code: str,
+                 columns: Iterable[str],
+                 bars: int = FEATURE_BARS,
+                 as_of: Optional[date] = None) -> pd.DataFrame:
+        """
+        读取单只股票截至 as_of 的最近 bars 根日线及所需特征
+
+        参数:
+            db: 数据库会话
+            code: 股票代码
+            columns: 需要的特征列
+            bars: 加载的交易日数（指标的预热也在这个窗口内完成）
+            as_of: 截止日期（含），None表示最新
+
+        返回:
+            包含 date、OHLCV 和所需特征列的DataFrame（按日期升序，可以修改），没有数据时为空
+        """
+        columns = list(dict.fromkeys(columns))
+        daily = load_daily_bars(db, code, end_date=as_of, limit=bars)
+        precomputed = None
+        if not daily.empty and any(c in INDICATOR_COLUMNS for c in columns):
+            rows = load_technical_indicators(db, code, daily['date'].iloc[0], daily['date'].iloc[-1],
+                                             INDICATOR_COLUMNS)
+            # 预计算结果覆盖了这段日线的每个交易日时才使用
+            if len(rows) == len(daily) and (rows['date'].to_numpy() == daily['date'].to_numpy()).all():
+                precomputed = rows
+        return self.compute(code, daily, columns, precomputed)
+
+    def compute(self,
+                code: str,
+                bars: pd.DataFrame,
+                columns: Iterable[str],
+                precomputed: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """
+        在给定的日线上取特征（已有日线时直接调用，不再查询数据库）
+
+        参数:
+            code: 股票代码
+            bars: 按日期升序的日线（包含 date 和 OHLCV 列）
+            columns: 需要的特征列
+            precomputed: 与 bars 逐行对齐的预计算指标（INDICATOR_COLUMNS），这些列不再现算
+        """
+        columns = list(dict.fromkeys(columns))
+        if bars.empty:
+            return bars.reindex(columns=list(bars.columns) + columns)
+
+        source = 'bars' if precomputed is None else 'precomputed'
+        key = (code, bars['date'].iloc[0], bars['date'].iloc[-1], len(bars), source)
+        with self._lock:
+            frame = self._cache.get(key)
+            if frame is None:
+                frame = self._load(key)
+            if frame is None:
+                frame = bars[OHLCV_COLUMNS].reset_index(drop=True)
+                if precomputed is not None:
+                    frame = frame.assign(**{c: precomputed[c].to_numpy() for c in INDICATOR_COLUMNS})
+
+            missing = [c for c in columns if c not in frame.columns]
+            if missing:
+                frame = self.registry.compute(frame.copy(), missing, reuse=True)
+                self._save(key, frame)
+            self._cache.put(key, frame)
+
+        return frame[OHLCV_COLUMNS + [c for c in columns if c not in OHLCV_COLUMNS]].copy()
+
+    def latest(self, db: Session, code: str, columns: Iterable[str],
+               bars: int = FEATURE_BARS) -> Optional[pd.Series]:
+        """最新交易日的特征，没有数据时返回None"""
+        frame = self.features(db, code, columns, bars)
+        return frame.iloc[-1] if not frame.empty else None
+
+    def invalidate(self, code: Optional[str] = None):
+        """
+        丢弃缓存的特征（包括持久化的文件）
+
+        参数:
+            code: 股票代码，None表示全部
+        """
+        with self._lock:
+            self._cache.invalidate(code)
+            if self.persist_dir is None:
+                return
+            target = self.persist_dir if code is None else self.persist_dir / code
+            shutil.rmtree(target, ignore_errors=True)
+
+    def watch(self, model):
+        """
+        监听ORM模型的写入，自动丢弃对应股票的特征
+
+        注意: 绕过ORM的批量写入不会触发事件，需要手动调用 invalidate
+        """
+        if model in self._watched:
+            return
+
+        def _on_write(mapper, connection, target):
+            self.invalidate(target.code)
+
+        for name in ('after_insert', 'after_update', 'after_delete'):
+            event.listen(model, name, _on_write)
+        self._watched.add(model)
+
+    def stats(self) -> Dict:
+        """缓存统计信息"""
+        return {**self._cache.stats(), 'persist_dir': str(self.persist_dir) if self.persist_dir else None}
+
+    def _path(self, key) -> Path:
+        code, start, end, count, source = key
+        return self.persist_dir / code / f'{start:%Y%m%d}_{end:%Y%m%d}_{count}_{source}.parquet'
+
+    def _load(self, key) -> Optional[pd.DataFrame]:
+        if self.persist_dir is None:
+            return None
+        path = self._path(key)
+        if not path.exists():
+            return None
+        try:
+            frame = pd.read_parquet(path)
+            frame['date'] = frame['date'].dt.date
+            return frame
+        except Exception as e:
+            self.logger.warning(f"读取特征文件失败 {path}: {e}")
+            return None
+
+    def _save(self, key, frame: pd.DataFrame):
+        """持久化特征，同一股票更早 as-of 日期的文件一并删除"""
+        if self.persist_dir is None:
+            return
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            frame.assign(date=pd.to_datetime(frame['date'])).to_parquet(path, index=False)
+        except ImportError as e:
+            self.logger.warning(f"未安装 Parquet 引擎（pyarrow），特征只缓存在内存中: {e}")
+            self.persist_dir = None
+            return
+        except Exception as e:
+            self.logger.warning(f"保存特征文件失败 {path}: {e}")
+            return
+        for stale in path.parent.glob('*.parquet'):
+            if stale.name.split('_')[1] < path.name.split('_')[1]:
+                stale.unlink(missing_ok=True)
+
+
+# 全局特征库
+feature_store = FeatureStore(
+    max_bytes=settings.feature_cache_mb * 1024 * 1024,
+    persist_dir=settings.processed_data_dir / 'features' if settings.feature_store_persist else None
+)
@@ -0,0 +1,147 @@
+"""
+技术指标结果缓存
+
+按 (code, start, end, last_bar_date, 指标参数) 缓存计算结果，
+超过内存上限时按LRU淘汰；写入新的日线数据时自动失效对应股票的缓存。
+"""
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Set, Tuple
+import pandas as pd
+import logging
+
+from sqlalchemy import event
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _sizeof(value: Any) -> int:
+    """估算缓存值占用的内存（字节）"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_sizeof(k) + _sizeof(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(_sizeof(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class IndicatorCache:
+    """技术指标结果缓存（内存上限 + LRU淘汰）"""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        """
+        参数:
+            max_bytes: 缓存占用内存上限（字节）
+        """
+        self.max_bytes = max_bytes
+        self.logger = logging.getLogger(__name__)
+        self._entries: "OrderedDict[Tuple, Tuple[Any, int]]" = OrderedDict()
+        self._keys_by_code: Dict[str, Set[Tuple]] = {}
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.RLock()
+        self._watched = set()
+
+    @staticmethod
+    def make_key(code: str, start: Any, end: Any, last_bar_date: Any,
+                 params: Hashable) -> Tuple:
+        """生成缓存键"""
+        return (code, start, end, last_bar_date, params)
+
+    def get(self, key: Tuple) -> Optional[Any]:
+        """读取缓存，命中时移到最近使用的位置（返回值只读，不要修改）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[0]
+
+    def put(self, key: Tuple, value: Any, nbytes: Optional[int] = None):
+        """写入缓存，超过内存上限时淘汰最久未使用的条目"""
+        nbytes = _sizeof(value) if nbytes is None else nbytes
+        if nbytes > self.max_bytes:
+            self.logger.debug(f"缓存值过大({nbytes}字节)，跳过缓存")
+            return
+
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, nbytes)
+            self._keys_by_code.setdefault(key[0], set()).add(key)
+            self._size += nbytes
+
+            while self._size > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def invalidate(self, code: Optional[str] = None):
+        """
+        使缓存失效
+
+        参数:
+            code: 股票代码，None表示清空全部缓存
+        """
+        with self._lock:
+            if code is None:
+                self._entries.clear()
+                self._keys_by_code.clear()
+                self._size = 0
+                return
+            for key in list(self._keys_by_code.get(code, ())):
+                self._remove(key)
+
+    def watch(self, model):
+        """
+        监听ORM模型的写入，自动失效对应股票的缓存
+
+        参数:
+            model: 带有 code 字段的ORM模型（如 StockDaily）
+
+        注意: 绕过ORM的批量写入不会触发事件，需要手动调用 invalidate
+        """
+        if model in self._watched:
+            return
+
+        def _on_write(mapper, connection, target):
+            self.invalidate(target.code)
+
+        for name in ('after_insert', 'after_update', 'after_delete'):
+            event.listen(model, name, _on_write)
+        self._watched.add(model)
+
+    def stats(self) -> Dict:
+        """缓存统计信息"""
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'size_bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / total if total else 0
+            }
+
+    def _remove(self, key: Tuple):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._size -= entry[1]
+        keys = self._keys_by_code.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_code[key[0]]
+
+
+# 全局指标缓存
+indicator_cache = IndicatorCache(max_bytes=settings.indicator_cache_mb * 1024 * 1024)
@@ -0,0 +1,512 @@
+"""
+技术指标注册表
+
+每个指标声明自己的输入列、参数、预热长度和依赖项，
+调用方只需给出需要的输出列，注册表会生成最小计算计划，
+共享的中间结果（如MACD使用的EMA）只计算一次。
+
+计算函数只使用 pandas 的逐列运算，输入既可以是单只股票的 Series，
+也可以是 [K线 × 股票] 的 DataFrame（见 compute_panel），多只股票一次算完。
+"""
+import math
+import pandas as pd
+import numpy as np
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 原始行情列，不需要计算
+BASE_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+
+class IndicatorSpec:
+    """单个指标的声明"""
+
+    def __init__(self,
+                 name: str,
+                 outputs: Tuple[str, ...],
+                 func: Callable[..., Dict[str, pd.Series]],
+                 inputs: Tuple[str, ...] = ('close',),
+                 params: Optional[Dict] = None,
+                 warmup: int = 0,
+                 depends: Tuple[str, ...] = (),
+                 internal: bool = False):
+        """
+        参数:
+            name: 指标名称（注册表内唯一）
+            outputs: 输出列名
+            func: 计算函数，签名为 func(data, **params)，data为已有列的字典，返回 {列名: Series}
+                （面板计算时 data 中的值为 [K线 × 股票] 的 DataFrame）
+            inputs: 需要的原始行情列
+            params: 计算参数
+            warmup: 在依赖项之上额外需要的预热K线数
+            depends: 依赖的其他指标名称
+            internal: 是否为中间结果（默认不输出）
+        """
+        self.name = name
+        self.outputs = tuple(outputs)
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.params = dict(params or {})
+        self.warmup = warmup
+        self.depends = tuple(depends)
+        self.internal = internal
+
+    def compute(self, data: Dict[str, pd.Series]) -> Dict[str, pd.Series]:
+        """执行计算"""
+        return self.func(data, **self.params)
+
+    def __repr__(self):
+        return f"IndicatorSpec({self.name!r}, outputs={self.outputs}, params={self.params})"
+
+
+def _ewm_warmup(alpha: float) -> int:
+    """EWM类指标的预热长度：初始值权重衰减到5%以下所需的K线数"""
+    return int(math.ceil(math.log(0.05) / math.log(1 - alpha)))
+
+
+def _suffix(values: Iterable, defaults: Iterable) -> str:
+    """非默认参数时生成列名后缀"""
+    values = tuple(values)
+    if values == tuple(defaults):
+        return ''
+    return '_' + '_'.join(str(v) for v in values)
+
+
+# ---------------------------------------------------------------------------
+# 计算函数
+# ---------------------------------------------------------------------------
+
+def _rolling_mean(data, source, period, output):
+    return {output: data[source].rolling(window=period).mean()}
+
+
+def _ema(data, source, span, output):
+    # 与 ta 库保持一致：min_periods=span, adjust=False
+    return {output: data[source].ewm(span=span, min_periods=span, adjust=False).mean()}
+
+
+def _rsi(data, period, output):
+    # 与 ta 库的 RSIIndicator 相同的 Wilder 平滑（下跌均值为0时记为100）
+    diff = data['close'].diff()
+    up = diff.where(diff > 0, 0.0)
+    down = -diff.where(diff < 0, 0.0)
+    ema_up = up.ewm(alpha=1 / period, min_periods=period, adjust=False).mean()
+    ema_down = down.ewm(alpha=1 / period, min_periods=period, adjust=False).mean()
+    rsi = 100 - 100 / (1 + ema_up / ema_down)
+    return {output: rsi.where(ema_down != 0, 100.0)}
+
+
+def _macd(data, fast, slow, signal, sources, outputs):
+    macd = data[sources[0]] - data[sources[1]]
+    macd_signal = macd.ewm(span=signal, min_periods=signal, adjust=False).mean()
+    return {
+        outputs[0]: macd,
+        outputs[1]: macd_signal,
+        outputs[2]: macd - macd_signal,
+    }
+
+
+def _bollinger(data, period, std_dev, middle, outputs):
+    close = data['close']
+    mavg = data[middle]
+    mstd = close.rolling(period, min_periods=period).std(ddof=0)
+    hband = mavg + std_dev * mstd
+    lband = mavg - std_dev * mstd
+    return {
+        outputs[0]: hband,
+        outputs[1]: mavg,
+        outputs[2]: lband,
+        outputs[3]: ((hband - lband) / mavg) * 100,
+        outputs[4]: (close - lband) / (hband - lband).where(hband != lband, np.nan),
+    }
+
+
+def _kdj(data, n, m1, m2, outputs):
+    low_n = data['low'].rolling(window=n, min_periods=1).min()
+    high_n = data['high'].rolling(window=n, min_periods=1).max()
+    rsv = (data['close'] - low_n) / (high_n - low_n) * 100
+    k = rsv.ewm(com=m1 - 1, adjust=False).mean()
+    d = k.ewm(com=m2 - 1, adjust=False).mean()
+    return {outputs[0]: k, outputs[1]: d, outputs[2]: 3 * k - 2 * d}
+
+
+def _ratio(data, numerator, denominator, output):
+    return {output: data[numerator] / data[denominator]}
+
+
+def _pct_change(data, source, output):
+    return {output: data[source].pct_change()}
+
+
+def _rolling_std(data, source, period, output):
+    return {output: data[source].rolling(window=period).std()}
+
+
+def _price_position(data, output):
+    return {output: (data['close'] - data['low']) / (data['high'] - data['low'])}
+
+
+def _obv(data, output):
+    # 与 ta 库的 OnBalanceVolumeIndicator 相同：收盘价低于前一日时成交量记为负，再累加
+    close, volume = data['close'], data['volume']
+    return {output: volume.where(~(close < close.shift(1)), -volume).cumsum()}
+
+
+# ---------------------------------------------------------------------------
+# 指标工厂（支持非默认参数的变体）
+# ---------------------------------------------------------------------------
+
+def moving_average(period: int, source: str = 'close') -> IndicatorSpec:
+    """简单移动平均"""
+    prefix = 'ma' if source == 'close' else f'{source}_ma'
+    output = f'{prefix}{period}'
+    return IndicatorSpec(
+        name=output,
+        outputs=(output,),
+        func=_rolling_mean,
+        inputs=(source,),
+        params={'source': source, 'period': period, 'output': output},
+        warmup=period - 1
+    )
+
+
+def ema(span: int, source: str = 'close') -> IndicatorSpec:
+    """指数移动平均（中间结果）"""
+    output = f'ema{span}' if source == 'close' else f'{source}_ema{span}'
+    return IndicatorSpec(
+        name=output,
+        outputs=(output,),
+        func=_ema,
+        inputs=(source,),
+        params={'source': source, 'span': span, 'output': output},
+        warmup=_ewm_warmup(2 / (span + 1)),
+        internal=True
+    )
+
+
+def rsi(period: int = 14) -> IndicatorSpec:
+    """RSI相对强弱指标"""
+    output = 'rsi' if period == 14 else f'rsi{period}'
+    return IndicatorSpec(
+        name=output,
+        outputs=(output,),
+        func=_rsi,
+        params={'period': period, 'output': output},
+        warmup=_ewm_warmup(1 / period)
+    )
+
+
+def macd(fast: int = 12, slow: int = 26, signal: int = 9) -> IndicatorSpec:
+    """MACD指标，依赖快慢两条EMA"""
+    suffix = _suffix((fast, slow, signal), (12, 26, 9))
+    outputs = (f'macd{suffix}', f'macd_signal{suffix}', f'macd_hist{suffix}')
+    fast_ema, slow_ema = f'ema{fast}', f'ema{slow}'
+    return IndicatorSpec(
+        name=outputs[0],
+        outputs=outputs,
+        func=_macd,
+        params={'fast': fast, 'slow': slow, 'signal': signal,
+                'sources': (fast_ema, slow_ema), 'outputs': outputs},
+        warmup=_ewm_warmup(2 / (signal + 1)),
+        depends=(fast_ema, slow_ema)
+    )
+
+
+def bollinger(period: int = 20, std_dev: float = 2) -> IndicatorSpec:
+    """布林带，中轨复用同周期均线"""
+    suffix = _suffix((period, std_dev), (20, 2))
+    outputs = tuple(f'bb_{part}{suffix}' for part in ('upper', 'middle', 'lower', 'width', 'percent'))
+    middle = f'ma{period}'
+    return IndicatorSpec(
+        name=f'bb{suffix}',
+        outputs=outputs,
+        func=_bollinger,
+        params={'period': period, 'std_dev': std_dev, 'middle': middle, 'outputs': outputs},
+        warmup=0,
+        depends=(middle,)
+    )
+
+
+def kdj(n: int = 9, m1: int = 3, m2: int = 3) -> IndicatorSpec:
+    """KDJ随机指标"""
+    suffix = _suffix((n, m1, m2), (9, 3, 3))
+    outputs = (f'kdj_k{suffix}', f'kdj_d{suffix}', f'kdj_j{suffix}')
+    return IndicatorSpec(
+        name=f'kdj{suffix}',
+        outputs=outputs,
+        func=_kdj,
+        inputs=('high', 'low', 'close'),
+        params={'n': n, 'm1': m1, 'm2': m2, 'outputs': outputs},
+        warmup=n - 1 + _ewm_warmup(1 / m1) + _ewm_warmup(1 / m2)
+    )
+
+
+def volume_ratio(period: int = 5) -> IndicatorSpec:
+    """成交量比率（当日成交量 / N日均量）"""
+    output = 'volume_ratio' if period == 5 else f'volume_ratio{period}'
+    average = f'volume_ma{period}'
+    return IndicatorSpec(
+        name=output,
+        outputs=(output,),
+        func=_ratio,
+        inputs=('volume',),
+        params={'numerator': 'volume', 'denominator': average, 'output': output},
+        depends=(average,)
+    )
+
+
+def price_change() -> IndicatorSpec:
+    """收盘价日变化率"""
+    return IndicatorSpec(
+        name='price_change',
+        outputs=('price_change',),
+        func=_pct_change,
+        params={'source': 'close', 'output': 'price_change'},
+        warmup=1
+    )
+
+
+def ma_ratio(period: int) -> IndicatorSpec:
+    """收盘价 / N日均线"""
+    output = f'ma{period}_ratio'
+    average = f'ma{period}'
+    return IndicatorSpec(
+        name=output,
+        outputs=(output,),
+        func=_ratio,
+        params={'numerator': 'close', 'denominator': average, 'output': output},
+        depends=(average,)
+    )
+
+
+def volatility(period: int = 20) -> IndicatorSpec:
+    """N日收盘价变化率的标准差"""
+    output = 'volatility' if period == 20 else f'volatility{period}'
+    return IndicatorSpec(
+        name=output,
+        outputs=(output,),
+        func=_rolling_std,
+        params={'source': 'price_change', 'period': period, 'output': output},
+        warmup=period - 1,
+        depends=('price_change',)
+    )
+
+
+def price_position() -> IndicatorSpec:
+    """收盘价在当日最高最低价之间的位置"""
+    return IndicatorSpec(
+        name='price_position',
+        outputs=('price_position',),
+        func=_price_position,
+        inputs=('high', 'low', 'close'),
+        params={'output': 'price_position'}
+    )
+
+
+def obv() -> IndicatorSpec:
+    """能量潮指标"""
+    return IndicatorSpec(
+        name='obv',
+        outputs=('obv',),
+        func=_obv,
+        inputs=('close', 'volume'),
+        params={'output': 'obv'}
+    )
+
+
+class IndicatorRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self._specs: Dict[str, IndicatorSpec] = {}
+        self._producers: Dict[str, str] = {}
+
+    def register(self, spec: IndicatorSpec) -> IndicatorSpec:
+        """注册指标，同名指标直接返回已注册的实例"""
+        if spec.name in self._specs:
+            return self._specs[spec.name]
+        for output in spec.outputs:
+            if output in self._producers:
+                raise ValueError(f"输出列 {output} 已由指标 {self._producers[output]} 提供")
+        self._specs[spec.name] = spec
+        for output in spec.outputs:
+            self._producers[output] = spec.name
+        return spec
+
+    def get(self, name: str) -> IndicatorSpec:
+        """按名称获取指标"""
+        if name not in self._specs:
+            raise KeyError(f"未注册的指标: {name}")
+        return self._specs[name]
+
+    def spec_for(self, column: str) -> IndicatorSpec:
+        """获取产出某列的指标"""
+        if column not in self._producers:
+            raise KeyError(f"没有指标提供列: {column}")
+        return self._specs[self._producers[column]]
+
+    def columns(self, include_internal: bool = False) -> List[str]:
+        """按注册顺序列出所有输出列"""
+        return [
+            output
+            for spec in self._specs.values()
+            if include_internal or not spec.internal
+            for output in spec.outputs
+        ]
+
+    def plan(self, columns: Iterable[str], available: Iterable[str] = ()) -> List[IndicatorSpec]:
+        """
+        生成最小计算计划
+
+        参数:
+            columns: 需要的输出列
+            available: 已经算好的列，输出列都在其中的指标（连同只被它依赖的指标）不进入计划
+
+        返回按依赖拓扑排序的指标列表，每个指标只出现一次
+        """
+        available = set(available)
+        ordered: List[IndicatorSpec] = []
+        visited = set()
+        visiting = set()
+
+        def visit(name: str):
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"指标依赖存在循环: {name}")
+            spec = self.get(name)
+            if available.issuperset(spec.outputs):
+                visited.add(name)
+                return
+            visiting.add(name)
+            for dep in spec.depends:
+                visit(dep)
+            visiting.discard(name)
+            visited.add(name)
+            ordered.append(spec)
+
+        for column in columns:
+            if column in BASE_COLUMNS:
+                continue
+            visit(self.spec_for(column).name)
+        return ordered
+
+    def fingerprint(self, columns: Iterable[str]) -> Tuple:
+        """指标列及其计算参数的可哈希标识，用作缓存键"""
+        columns = tuple(columns)
+        return columns + tuple(
+            (spec.name, tuple(sorted((k, repr(v)) for k, v in spec.params.items())))
+            for spec in self.plan(columns)
+        )
+
+    def warmup(self, columns: Iterable[str]) -> int:
+        """计算指定列所需的预热K线数（沿依赖链累加）"""
+        memo: Dict[str, int] = {}
+
+        def total(name: str) -> int:
+            if name not in memo:
+                spec = self.get(name)
+                memo[name] = spec.warmup + max((total(dep) for dep in spec.depends), default=0)
+            return memo[name]
+
+        return max(
+            (total(self.spec_for(c).name) for c in columns if c not in BASE_COLUMNS),
+            default=0
+        )
+
+    def compute(self,
+                df: pd.DataFrame,
+                columns: Optional[Iterable[str]] = None,
+                reuse: bool = False) -> pd.DataFrame:
+        """
+        按需计算指标并写入DataFrame
+
+        参数:
+            df: 包含OHLCV数据的DataFrame
+            columns: 需要的输出列，None表示所有非中间指标
+            reuse: 是否复用df中已有的指标列（输出列都已存在的指标不再计算）
+
+        返回:
+            写入了所需列的DataFrame（中间结果不会写入）
+        """
+        columns = list(self.columns() if columns is None else columns)
+        data: Dict[str, pd.Series] = {c: df[c] for c in BASE_COLUMNS if c in df.columns}
+        if reuse:
+            data.update({c: df[c] for c in df.columns if c in self._producers})
+
+        self._run(self.plan(columns, available=data if reuse else ()), data)
+
+        for column in columns:
+            if column not in BASE_COLUMNS:
+                df[column] = data[column]
+        return df
+
+    def compute_panel(self,
+                      fields: Dict[str, np.ndarray],
+                      columns: Iterable[str]) -> Dict[str, np.ndarray]:
+        """
+        在 [股票 × K线] 的行情面板上一次算出所有股票的指标
+
+        参数:
+            fields: 行情字段，形状均为 [股票 × K线]；每只股票的有效K线需要先左移压紧
+                （见 MarketPanel.compact），否则停牌日会进入滚动窗口
+            columns: 需要的输出列
+
+        返回:
+            {列名: [股票 × K线] 数组}，与逐只股票调用 compute 的结果相同
+        """
+        columns = list(columns)
+        data: Dict[str, pd.DataFrame] = {
+            c: pd.DataFrame(np.asarray(fields[c], dtype=float).T) for c in BASE_COLUMNS if c in fields
+        }
+        self._run(self.plan(columns), data)
+        return {c: data[c].to_numpy().T for c in columns if c not in BASE_COLUMNS}
+
+    @staticmethod
+    def _run(plan: List[IndicatorSpec], data: Dict) -> None:
+        """按计划依次计算，结果写入 data"""
+        for spec in plan:
+            missing = [c for c in spec.inputs if c not in data]
+            if missing:
+                raise KeyError(f"指标 {spec.name} 缺少输入列: {missing}")
+            data.update(spec.compute(data))
+
+
+def _build_default_registry() -> IndicatorRegistry:
+    """注册系统默认使用的指标（顺序即 calculate_all_indicators 的输出顺序）"""
+    registry = IndicatorRegistry()
+    for period in (5, 10, 20, 60):
+        registry.register(moving_average(period))
+    registry.register(rsi(14))
+    registry.register(ema(12))
+    registry.register(ema(26))
+    registry.register(macd(12, 26, 9))
+    registry.register(bollinger(20, 2))
+    registry.register(kdj(9, 3, 3))
+    registry.register(moving_average(5, source='volume'))
+    registry.register(moving_average(10, source='volume'))
+    registry.register(volume_ratio(5))
+    registry.register(obv())
+    return registry
+
+
+def _build_feature_registry() -> IndicatorRegistry:
+    """默认指标之外再注册价格预测等模型使用的特征"""
+    registry = _build_default_registry()
+    registry.register(price_change())
+    for period in (5, 10, 20):
+        registry.register(ma_ratio(period))
+    registry.register(volatility(20))
+    registry.register(volume_ratio(10))
+    registry.register(price_position())
+    return registry
+
+
+# 全局默认注册表
+default_registry = _build_default_registry()
+
+# 特征注册表（默认指标 + 模型特征），供特征库使用
+feature_registry = _build_feature_registry()
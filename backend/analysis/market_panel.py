@@ -0,0 +1,205 @@
+"""
+全市场行情面板
+
+把多只股票的日线整理为 [股票 × 交易日] 的稠密矩阵（缺失为NaN），
+可以保存为 .npy 文件并以内存映射方式打开，供多个进程共享读取而不复制数据。
+"""
+import json
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+import pandas as pd
+import numpy as np
+import logging
+
+from sqlalchemy.orm import Session
+
+from backend.database.models import StockDaily
+
+logger = logging.getLogger(__name__)
+
+PANEL_FIELDS = ['open', 'high', 'low', 'close', 'volume']
+
+_META_FILE = 'meta.json'
+
+
+class MarketPanel:
+    """
+    全市场行情面板
+
+    属性:
+        codes: 股票代码列表（行）
+        dates: 交易日数组，datetime64[D]（列）
+        fields: 字段名到二维数组的映射，形状为 (len(codes), len(dates))
+    """
+
+    def __init__(self, codes: Sequence[str], dates: np.ndarray, fields: Dict[str, np.ndarray]):
+        self.codes = list(codes)
+        self.dates = np.asarray(dates, dtype='datetime64[D]')
+        self.fields = fields
+        self._rows = {code: i for i, code in enumerate(self.codes)}
+
+    @property
+    def shape(self):
+        return len(self.codes), len(self.dates)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in self.fields.values())
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        return self.fields[field]
+
+    def row(self, code: str) -> int:
+        """股票所在的行号"""
+        return self._rows[code]
+
+    def compact(self, fields: Optional[Sequence[str]] = None) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """
+        每只股票的有效交易日（有收盘价）左移压紧，停牌日不参与滚动窗口
+
+        参数:
+            fields: 需要的字段，默认全部
+
+        返回:
+            (order, 压紧后的字段)：order[i, j] 为第 i 只股票压紧后第 j 根K线在面板中的列号
+        """
+        valid = ~np.isnan(self.fields['close'])
+        order = np.argsort(~valid, axis=1, kind='stable')
+        compacted = {
+            name: np.take_along_axis(np.asarray(self.fields[name], dtype=float), order, axis=1)
+            for name in (fields or self.fields)
+        }
+        return order, compacted
+
+    def expand(self, order: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """把压紧后的数组放回面板中的位置（compact 的逆操作），没有数据的交易日为NaN"""
+        result = np.empty(self.shape)
+        np.put_along_axis(result, order, np.asarray(values, dtype=float), axis=1)
+        result[np.isnan(self.fields['close'])] = np.nan
+        return result
+
+    def frame(self, row: int, fields: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """
+        取出单只股票的日线DataFrame（只保留有数据的交易日）
+
+        参数:
+            row: 行号
+            fields: 需要的字段，默认全部
+        """
+        fields = list(fields or self.fields)
+        mask = ~np.isnan(self.fields['close'][row])
+        data = {'date': self.dates[mask].astype(object)}
+        for field in fields:
+            data[field] = np.asarray(self.fields[field][row][mask], dtype=float)
+        return pd.DataFrame(data)
+
+    def save(self, directory: Path) -> Path:
+        """保存为 .npy 文件和元数据，便于其他进程以内存映射方式打开"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for field, values in self.fields.items():
+            np.save(directory / f'{field}.npy', np.ascontiguousarray(values))
+        _write_meta(directory, self.codes, self.dates, list(self.fields))
+        logger.info(f"行情面板已保存到 {directory}，{self.shape[0]} 只股票 × {self.shape[1]} 个交易日")
+        return directory
+
+    @classmethod
+    def create(cls,
+               directory: Path,
+               codes: Sequence[str],
+               dates: np.ndarray,
+               fields: Sequence[str]) -> 'MarketPanel':
+        """
+        直接在磁盘上创建全为NaN的面板并以可写内存映射打开（不在内存中分配整个面板）
+
+        参数:
+            directory: 保存目录
+            codes: 股票代码
+            dates: 交易日
+            fields: 字段名
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        shape = (len(codes), len(dates))
+        for field in fields:
+            values = np.lib.format.open_memmap(directory / f'{field}.npy', mode='w+', dtype=float, shape=shape)
+            values.fill(np.nan)
+            values.flush()
+        _write_meta(directory, list(codes), dates, list(fields))
+        return cls.open(directory, mmap_mode='r+')
+
+    @classmethod
+    def open(cls, directory: Path, mmap_mode: Optional[str] = 'r') -> 'MarketPanel':
+        """打开保存的面板，默认只读内存映射"""
+        directory = Path(directory)
+        meta = json.loads((directory / _META_FILE).read_text(encoding='utf-8'))
+        fields = {
+            field: np.load(directory / f'{field}.npy', mmap_mode=mmap_mode)
+            for field in meta['fields']
+        }
+        return cls(meta['codes'], np.array(meta['dates'], dtype='datetime64[D]'), fields)
+
+
+def _write_meta(directory: Path, codes: List[str], dates: np.ndarray, fields: List[str]):
+    meta = {
+        'codes': codes,
+        'dates': [str(d) for d in dates],
+        'fields': fields
+    }
+    (directory / _META_FILE).write_text(json.dumps(meta), encoding='utf-8')
+
+
+def load_market_panel(db: Session,
+                      codes: Optional[List[str]] = None,
+                      start_date: Optional[date] = None,
+                      end_date: Optional[date] = None,
+                      fields: Optional[List[str]] = None,
+                      warmup: int = 0) -> MarketPanel:
+    """
+    从数据库一次性读取多只股票的日线并组装为面板
+
+    参数:
+        db: 数据库会话
+        codes: 股票代码列表，None表示全部
+        start_date: 开始日期（含）
+        end_date: 结束日期（含）
+        fields: 需要的字段，默认为 PANEL_FIELDS
+        warmup: 在开始日期之前多取的交易日数（用于指标预热）
+    """
+    fields = fields or PANEL_FIELDS
+    if start_date is not None and warmup > 0:
+        start_date = db.query(StockDaily.date).filter(
+            StockDaily.date < start_date
+        ).distinct().order_by(StockDaily.date.desc()).offset(warmup - 1).limit(1).scalar() or start_date
+    query = db.query(StockDaily.code, StockDaily.date, *(getattr(StockDaily, f) for f in fields))
+    if codes is not None:
+        query = query.filter(StockDaily.code.in_(codes))
+    if start_date is not None:
+        query = query.filter(StockDaily.date >= start_date)
+    if end_date is not None:
+        query = query.filter(StockDaily.date <= end_date)
+
+    df = pd.DataFrame(query.all(), columns=['code', 'date'] + fields)
+    if df.empty:
+        empty = {f: np.empty((0, 0)) for f in fields}
+        return MarketPanel([], np.array([], dtype='datetime64[D]'), empty)
+
+    # 先对代码和日期编码，只转换去重后的值（逐行转换日期对象很慢）
+    rows, panel_codes = pd.factorize(df['code'], sort=True)
+    cols, dates = pd.factorize(df['date'], sort=True)
+    panel_codes = np.asarray(panel_codes, dtype=str)
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    if codes is not None:
+        # 保留调用方给定的股票顺序，没有数据的股票整行为NaN
+        order = {code: i for i, code in enumerate(codes)}
+        rows = np.array([order[c] for c in panel_codes])[rows]
+        panel_codes = list(codes)
+
+    shape = (len(panel_codes), len(dates))
+    values = {}
+    for field in fields:
+        matrix = np.full(shape, np.nan)
+        matrix[rows, cols] = df[field].to_numpy(dtype=float)
+        values[field] = matrix
+    return MarketPanel(list(panel_codes), dates, values)
@@ -0,0 +1,230 @@
+"""
+蒙特卡洛稳健性检验
+
+对回测结果重抽样，判断收益是否只是运气：
+- trades: 对逐笔交易收益有放回地重抽样，重新排列交易顺序
+- blocks: 对每日收益分块重抽样（移动块自助法），保留短期自相关
+
+每个可能的块（起点 × 长度）预先汇总为收益和、平方和、对数收益和、块内最大回撤及
+最高/最低累计收益，模拟时每一步为所有路径同时抽取一个块并合并汇总量，
+不需要展开 [路径数 × K线数] 的矩阵，一万次重抽样只需按块数做少量数组运算。
+"""
+import time
+from typing import Dict, List, Optional
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+import logging
+
+from . import performance
+
+logger = logging.getLogger(__name__)
+
+METHODS = ('trades', 'blocks')
+
+# 重抽样次数上限（每次模拟按路径数分配若干 float64 数组）
+MAX_SIMULATIONS = 100000
+
+
+def trade_returns(trades: List[Dict]) -> np.ndarray:
+    """
+    由回测成交记录计算每个买卖回合的资产收益率（卖出后总资产 / 买入前总资产 - 1）
+
+    参数:
+        trades: run_backtest 返回的 trades
+    """
+    if not trades:
+        return np.empty(0)
+    is_buy = np.array([t['type'] == 'buy' for t in trades], dtype=bool)
+    capital = np.array([t['capital'] for t in trades], dtype=float)
+    value = np.array([t['shares'] * t['price'] for t in trades], dtype=float)
+    # 买入后的现金加上持仓市值即买入前的总资产，卖出后的现金即总资产
+    equity = np.where(is_buy, capital + value, capital)
+    return performance.round_trips(equity, is_buy)['returns']
+
+
+class MonteCarloSimulator:
+    """蒙特卡洛重抽样检验"""
+
+    def __init__(self,
+                 n_simulations: int = 10000,
+                 confidence: float = 0.95,
+                 seed: Optional[int] = None):
+        """
+        参数:
+            n_simulations: 重抽样次数
+            confidence: 置信区间水平
+            seed: 随机种子
+        """
+        if not 1 <= n_simulations <= MAX_SIMULATIONS:
+            raise ValueError(f"重抽样次数必须在 1 到 {MAX_SIMULATIONS} 之间")
+        if not 0 < confidence < 1:
+            raise ValueError("置信水平必须在 (0, 1) 之间")
+        self.n_simulations = n_simulations
+        self.confidence = confidence
+        self.seed = seed
+        self.logger = logging.getLogger(__name__)
+
+    def run(self,
+            results: Dict,
+            method: str = 'blocks',
+            block_size: Optional[int] = None,
+            periods_per_year: float = 252) -> Dict:
+        """
+        对 run_backtest 的结果做蒙特卡洛检验
+
+        参数:
+            results: run_backtest 的返回值（需要 trades 和 capital_history）
+            method: trades 逐笔收益重抽样，blocks 每日收益分块重抽样
+            block_size: 分块长度，默认为样本长度的立方根
+            periods_per_year: 每年K线数量
+
+        返回:
+            各指标的置信区间、实际值在模拟分布中的分位和亏损概率
+        """
+        if method == 'trades':
+            history = results.get('capital_history') or []
+            years = len(history) / periods_per_year if history else 0
+            returns = trade_returns(results.get('trades') or [])
+            returns = returns[~np.isnan(returns)]
+            trades_per_year = len(returns) / years if years > 0 else len(returns)
+            return self.bootstrap_trades(returns, trades_per_year)
+        if method == 'blocks':
+            values = np.array([h['total_value'] for h in results.get('capital_history') or []], dtype=float)
+            return self.block_bootstrap(performance.simple_returns(values), block_size, periods_per_year)
+        raise ValueError(f"不支持的蒙特卡洛方法: {method}，可选 {', '.join(METHODS)}")
+
+    def bootstrap_trades(self, returns: np.ndarray, trades_per_year: float) -> Dict:
+        """
+        逐笔收益重抽样：每条路径有放回地抽取与实际相同数量的交易
+
+        参数:
+            returns: 每笔交易的资产收益率
+            trades_per_year: 每年交易笔数，用于年化夏普比率
+        """
+        returns = np.asarray(returns, dtype=float)
+        return self._simulate(returns, 1, 'trades', max(trades_per_year, 1))
+
+    def block_bootstrap(self,
+                        returns: np.ndarray,
+                        block_size: Optional[int] = None,
+                        periods_per_year: float = 252) -> Dict:
+        """
+        每日收益分块重抽样：随机抽取连续的收益块首尾拼接为与原序列等长的路径
+
+        参数:
+            returns: 每日收益率
+            block_size: 分块长度，默认为样本长度的立方根
+            periods_per_year: 每年K线数量
+        """
+        returns = np.asarray(returns, dtype=float)
+        n = len(returns)
+        if block_size is None:
+            block_size = max(1, int(round(n ** (1 / 3))))
+        if block_size < 1:
+            raise ValueError("分块长度必须为正数")
+        return self._simulate(returns, min(block_size, max(n, 1)), 'blocks', periods_per_year)
+
+    def _simulate(self, returns: np.ndarray, block: int, method: str, periods_per_year: float) -> Dict:
+        started = time.time()
+        n = len(returns)
+        if n < 2:
+            raise ValueError("样本太少，无法做蒙特卡洛检验")
+
+        logs = np.log1p(np.maximum(returns, -1 + 1e-12))
+        k = -(-n // block)              # 每条路径的块数
+        tail = n - (k - 1) * block      # 最后一块的长度
+        starts = n - block + 1          # 可选的块起点数
+        tables = {length: self._block_table(returns, logs, length, starts) for length in {block, tail}}
+
+        rng = np.random.default_rng(self.seed)
+        size = self.n_simulations
+        level = np.zeros(size)          # 当前累计对数收益
+        peak = np.zeros(size)           # 历史最高累计对数收益
+        drawdown = np.zeros(size)       # 最大回撤（对数）
+        s1 = np.zeros(size)
+        s2 = np.zeros(size)
+        for j in range(k):
+            table = tables[tail if j == k - 1 else block]
+            pick = rng.integers(0, starts, size=size)
+            # 块内某点的回撤 = max(之前的峰值, 块内之前的峰值) - 该点，取块内最大
+            np.maximum(drawdown, np.maximum(table['drawdown'][pick], peak - level - table['low'][pick]),
+                       out=drawdown)
+            np.maximum(peak, level + table['high'][pick], out=peak)
+            level += table['log'][pick]
+            s1 += table['sum'][pick]
+            s2 += table['sum2'][pick]
+
+        total = np.expm1(level)
+        drawdown = -np.expm1(-drawdown)
+        sharpe = self._sharpe(s1, s2, n, periods_per_year)
+
+        # 原始序列按相同口径计算的实际值
+        path = np.cumsum(logs)
+        observed = {
+            'total_return': float(np.expm1(path[-1])),
+            'max_drawdown': float(-np.expm1(-(np.maximum(np.maximum.accumulate(path), 0) - path).max())),
+            'sharpe_ratio': float(self._sharpe(returns.sum(), (returns ** 2).sum(), n, periods_per_year)),
+        }
+        simulated = {'total_return': total, 'max_drawdown': drawdown, 'sharpe_ratio': sharpe}
+
+        elapsed = time.time() - started
+        self.logger.info(f"蒙特卡洛检验完成：{method}，{self.n_simulations} 次重抽样，耗时 {elapsed:.3f} 秒")
+        return {
+            'method': method,
+            'simulations': self.n_simulations,
+            'samples': n,
+            'block_size': block if method == 'blocks' else None,
+            'confidence': self.confidence,
+            'metrics': {
+                name: self._summary(values, observed[name]) for name, values in simulated.items()
+            },
+            'probability_of_loss': float(np.mean(total < 0)),
+            'elapsed': round(elapsed, 3)
+        }
+
+    @staticmethod
+    def _block_table(returns: np.ndarray, logs: np.ndarray, length: int, starts: int) -> Dict[str, np.ndarray]:
+        """
+        每个起点上长度为 length 的块的汇总量
+
+        返回:
+            sum/sum2 收益和与平方和，log 对数收益和，high/low 块内最高/最低累计对数收益，
+            drawdown 块内最大回撤（对数，以块起点为初始峰值）
+        """
+        windows = sliding_window_view(logs, length)[:starts]
+        path = np.cumsum(windows, axis=1)
+        peak = np.maximum(np.maximum.accumulate(path, axis=1), 0)
+        cs1 = np.r_[0.0, np.cumsum(returns)]
+        cs2 = np.r_[0.0, np.cumsum(returns ** 2)]
+        index = np.arange(starts)
+        return {
+            'sum': cs1[index + length] - cs1[index],
+            'sum2': cs2[index + length] - cs2[index],
+            'log': path[:, -1],
+            'high': path.max(axis=1),
+            'low': path.min(axis=1),
+            'drawdown': (peak - path).max(axis=1)
+        }
+
+    @staticmethod
+    def _sharpe(s1: np.ndarray, s2: np.ndarray, n: int, periods_per_year: float) -> np.ndarray:
+        """由收益和与平方和计算夏普比率（口径同 performance.sharpe_ratio）"""
+        mean = s1 / n
+        var = np.maximum(s2 - s1 * mean, 0) / (n - 1)
+        vol = np.sqrt(var) * np.sqrt(periods_per_year)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(vol > 0, (mean * periods_per_year - performance.RISK_FREE_RATE) / vol, 0.0)
+
+    def _summary(self, values: np.ndarray, observed: float) -> Dict[str, float]:
+        alpha = (1 - self.confidence) / 2
+        lower, median, upper = np.quantile(values, [alpha, 0.5, 1 - alpha])
+        return {
+            'observed': observed,
+            'mean': float(values.mean()),
+            'median': float(median),
+            'lower': float(lower),
+            'upper': float(upper),
+            'std': float(values.std()),
+            # 实际值在模拟分布中的分位（越接近0.5越说明结果可由随机重排解释）
+            'percentile': float(np.mean(values <= observed))
+        }
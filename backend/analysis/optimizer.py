@@ -0,0 +1,475 @@
+"""
+策略参数优化
+
+对默认信号策略（MA/RSI/MACD/布林带/KDJ）的参数做网格、随机或逐步细化搜索。
+所有参数组合需要的指标列先一次性算好（同周期均线、MACD共用的EMA等只算一次），
+每个组合只需按参数挑选列、编译信号规则并做向量化回测；组合较多时分发到进程池并行计算。
+"""
+import itertools
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import pandas as pd
+import numpy as np
+import logging
+
+from backend.config import settings
+from .indicator_registry import (
+    IndicatorRegistry, IndicatorSpec, moving_average, ema, rsi, macd, bollinger, kdj
+)
+from .signal_rules import SignalRule, SignalStrategy
+from .backtest import BacktestEngine
+
+logger = logging.getLogger(__name__)
+
+# 可优化的参数及默认值（与 generate_signals 的默认规则一致）
+DEFAULT_PARAMS = {
+    'ma_fast': 5, 'ma_slow': 20,
+    'rsi_period': 14, 'rsi_low': 30, 'rsi_high': 70,
+    'macd_fast': 12, 'macd_slow': 26, 'macd_signal_period': 9,
+    'bb_period': 20, 'bb_std': 2,
+    'kdj_n': 9, 'kdj_low': 20, 'kdj_high': 80,
+}
+
+# 作为规则阈值的参数，其余参数决定使用哪一列指标
+THRESHOLD_PARAMS = ('rsi_low', 'rsi_high', 'kdj_low', 'kdj_high')
+
+# 指标周期参数，只能取整数
+PERIOD_PARAMS = ('ma_fast', 'ma_slow', 'rsi_period', 'macd_fast', 'macd_slow', 'macd_signal_period',
+                 'bb_period', 'kdj_n')
+
+# 参数化的默认策略：规则中的列名为别名，由参数决定对应的实际指标列
+SWEEP_STRATEGY = SignalStrategy([
+    SignalRule('ma_signal', buy='cross_up(ma_fast, ma_slow)', sell='cross_down(ma_fast, ma_slow)'),
+    SignalRule('rsi_signal', buy='rsi < rsi_low', sell='rsi > rsi_high'),
+    SignalRule('macd_cross_signal',
+               buy='cross_up(macd, macd_signal)', sell='cross_down(macd, macd_signal)'),
+    SignalRule('bb_signal', buy='close < bb_lower', sell='close > bb_upper'),
+    SignalRule('kdj_signal',
+               buy='cross_up(kdj_k, kdj_d) and kdj_k < kdj_low',
+               sell='cross_down(kdj_k, kdj_d) and kdj_k > kdj_high'),
+], name='sweep')
+
+METRICS = ['sharpe_ratio', 'total_return', 'max_drawdown', 'win_rate', 'total_trades', 'final_value']
+
+# 回撤越小越好，其余指标越大越好
+ASCENDING_METRICS = ('max_drawdown',)
+
+# 组合数少于该值时不启动进程池
+PARALLEL_THRESHOLD = 500
+
+
+def resolve_parameters(params: Dict[str, Any]) -> Tuple[Dict[str, str], List[IndicatorSpec]]:
+    """
+    把参数解析为规则别名到指标列的映射
+
+    返回:
+        (别名 -> 指标列, 需要的指标声明)
+    """
+    p = {**DEFAULT_PARAMS, **params}
+    fractional = [name for name in PERIOD_PARAMS if p[name] != int(p[name])]
+    if fractional:
+        raise ValueError(f"周期参数必须为整数: {', '.join(f'{n}={p[n]}' for n in fractional)}")
+    fast = moving_average(int(p['ma_fast']))
+    slow = moving_average(int(p['ma_slow']))
+    rsi_spec = rsi(int(p['rsi_period']))
+    macd_spec = macd(int(p['macd_fast']), int(p['macd_slow']), int(p['macd_signal_period']))
+    bb_middle = moving_average(int(p['bb_period']))
+    bb_spec = bollinger(int(p['bb_period']), float(p['bb_std']))
+    kdj_spec = kdj(int(p['kdj_n']))
+
+    aliases = {
+        'close': 'close',
+        'ma_fast': fast.outputs[0],
+        'ma_slow': slow.outputs[0],
+        'rsi': rsi_spec.outputs[0],
+        'macd': macd_spec.outputs[0],
+        'macd_signal': macd_spec.outputs[1],
+        'bb_upper': bb_spec.outputs[0],
+        'bb_lower': bb_spec.outputs[2],
+        'kdj_k': kdj_spec.outputs[0],
+        'kdj_d': kdj_spec.outputs[1],
+    }
+    specs = [
+        fast, slow, rsi_spec,
+        ema(int(p['macd_fast'])), ema(int(p['macd_slow'])), macd_spec,
+        bb_middle, bb_spec, kdj_spec
+    ]
+    return aliases, specs
+
+
+def is_valid(params: Dict[str, Any]) -> bool:
+    """参数组合是否有意义（快线短于慢线、低阈值小于高阈值等）"""
+    p = {**DEFAULT_PARAMS, **params}
+    return (
+        1 <= p['ma_fast'] < p['ma_slow']
+        and 1 <= p['macd_fast'] < p['macd_slow']
+        and p['macd_signal_period'] >= 1
+        and p['rsi_period'] >= 2 and p['rsi_low'] < p['rsi_high']
+        and p['bb_period'] >= 2 and p['bb_std'] > 0
+        and p['kdj_n'] >= 1 and p['kdj_low'] < p['kdj_high']
+    )
+
+
+def _is_number(value: Any) -> bool:
+    """是否为有限的数值（不含布尔值）"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def expand_values(spec: Any, limit: Optional[int] = None, integer: bool = False) -> List:
+    """
+    把参数取值声明展开为有序的候选值列表
+
+    支持单个数值、列表（如 [5, 10, 20]）或区间字典（如 {"min": 5, "max": 30, "step": 5}）
+
+    参数:
+        spec: 取值声明
+        limit: 区间展开后候选值个数的上限，超过时抛出 ValueError
+        integer: 是否只允许整数取值（指标周期参数）
+    """
+    if isinstance(spec, dict):
+        missing = [key for key in ('min', 'max') if key not in spec]
+        if missing:
+            raise ValueError(f"取值区间缺少 {', '.join(missing)}: {spec}")
+        low, high, step = spec['min'], spec['max'], spec.get('step')
+        if not all(_is_number(v) for v in (low, high, 1 if step is None else step)):
+            raise ValueError(f"取值区间的 min、max、step 必须为数值: {spec}")
+        if integer and not all(float(v).is_integer() for v in (low, high, 1 if step is None else step)):
+            raise ValueError(f"周期参数的 min、max、step 必须为整数: {spec}")
+        if integer:
+            low, high, step = int(low), int(high), None if step is None else int(step)
+        if low > high:
+            raise ValueError(f"取值区间的 min 不能大于 max: {spec}")
+        is_int = all(isinstance(v, int) for v in (low, high, 1 if step is None else step))
+        if step is None:
+            step = 1 if is_int else (high - low) / 10 or 1
+        if step <= 0:
+            raise ValueError(f"步长必须为正数: {spec}")
+        if limit is not None and (high - low) / step + 1 > limit:
+            raise ValueError(f"取值区间 {spec} 的候选值超过 {limit} 个，请增大步长")
+        values = np.arange(low, high + step / 2, step)
+        return [int(v) for v in values] if is_int else [round(float(v), 10) for v in values]
+    values = list(spec) if isinstance(spec, (list, tuple)) else [spec]
+    if not values:
+        raise ValueError("候选值列表不能为空")
+    invalid = [v for v in values if not _is_number(v)]
+    if invalid:
+        raise ValueError(f"候选值必须为数值: {invalid}")
+    if integer:
+        fractional = [v for v in values if not float(v).is_integer()]
+        if fractional:
+            raise ValueError(f"周期参数的候选值必须为整数: {fractional}")
+        values = [int(v) for v in values]
+    return sorted(set(values))
+
+
+class _SweepContext:
+    """参数扫描共享的数据：预先算好的指标列和价格"""
+
+    def __init__(self,
+                 columns: Dict[str, np.ndarray],
+                 initial_capital: float,
+                 periods_per_year: float,
+                 cache_signals: bool = False):
+        """
+        参数:
+            cache_signals: 是否缓存各参数组合的信号（同一组合要在多个区间回测时使用）
+        """
+        self.columns = columns
+        self.initial_capital = initial_capital
+        self.periods_per_year = periods_per_year
+        self._signals: Optional[Dict[Tuple, np.ndarray]] = {} if cache_signals else None
+
+    def signals(self, params: Dict[str, Any]) -> np.ndarray:
+        """参数组合在整段行情上的信号（指标只依赖历史数据，可直接按区间截取）"""
+        key = tuple(sorted(params.items()))
+        if self._signals is not None and key in self._signals:
+            return self._signals[key]
+
+        aliases, _ = resolve_parameters(params)
+        thresholds = {k: v for k, v in {**DEFAULT_PARAMS, **params}.items() if k in THRESHOLD_PARAMS}
+        compiled = SWEEP_STRATEGY.compile(thresholds)
+        signal = compiled.evaluate(
+            {alias: self.columns[c] for alias, c in aliases.items()}
+        )['signal_final'].astype(np.int8)
+        if self._signals is not None:
+            self._signals[key] = signal
+        return signal
+
+    def backtest(self, params: Dict[str, Any], window: slice = slice(None)) -> Tuple[Dict, np.ndarray]:
+        """
+        在指定区间回测参数组合
+
+        返回:
+            (回测指标, 每日总资产)
+        """
+        signal = self.signals(params)[window]
+        prices = self.columns['close'][window]
+        engine = BacktestEngine(self.initial_capital)
+        sim = engine.simulate(prices, signal, self.periods_per_year, detailed=False)
+        if sim is not None:
+            return sim['metrics'], sim['total_value']
+        frame = pd.DataFrame({'close': prices, 'signal_final': signal})
+        results = engine.run_backtest_loop(frame, periods_per_year=self.periods_per_year)
+        return results, np.array([h['total_value'] for h in results['capital_history']])
+
+    def evaluate(self, params: Dict[str, Any], window: slice = slice(None)) -> Dict:
+        metrics, _ = self.backtest(params, window)
+        return {m: int(metrics[m]) if m == 'total_trades' else float(metrics[m]) for m in METRICS}
+
+
+_worker_context: Optional[_SweepContext] = None
+
+
+def _init_worker(context: _SweepContext):
+    global _worker_context
+    _worker_context = context
+
+
+def _evaluate_chunk(combos: List[Dict[str, Any]], context: Optional[_SweepContext] = None) -> List[Dict]:
+    context = context or _worker_context
+    return [context.evaluate(params) for params in combos]
+
+
+class StrategyOptimizer:
+    """默认信号策略的参数优化器"""
+
+    def __init__(self,
+                 initial_capital: float = 100000,
+                 workers: Optional[int] = None,
+                 max_combinations: Optional[int] = None):
+        """
+        参数:
+            initial_capital: 初始资金
+            workers: 并行进程数，默认为CPU核数
+            max_combinations: 一次评估的参数组合数上限，默认为配置中的 OPTIMIZE_MAX_COMBINATIONS
+        """
+        self.initial_capital = initial_capital
+        self.workers = workers or os.cpu_count() or 1
+        self.max_combinations = max_combinations or settings.optimize_max_combinations
+        self.logger = logging.getLogger(__name__)
+
+    def sample(self,
+               space: Dict[str, Any],
+               method: str = 'grid',
+               n_samples: int = 200,
+               seed: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        生成参数组合（grid 网格 / random 随机），无效组合会被过滤
+
+        参数:
+            space: 参数名到候选值的映射，见 expand_values
+            method: 采样方式
+            n_samples: 随机采样的组合数
+            seed: 随机种子
+        """
+        unknown = set(space) - set(DEFAULT_PARAMS)
+        if unknown:
+            raise ValueError(f"不支持的参数: {sorted(unknown)}")
+        names = sorted(space)
+        values = [expand_values(space[name], self.max_combinations, name in PERIOD_PARAMS) for name in names]
+
+        if method == 'grid':
+            total = math.prod(len(v) for v in values)
+            if total > self.max_combinations:
+                raise ValueError(
+                    f"网格共 {total} 个参数组合，超过上限 {self.max_combinations}，"
+                    f"请缩小取值范围，或使用 random / refine 并指定 n_samples"
+                )
+            combos = (dict(zip(names, combo)) for combo in itertools.product(*values))
+            return [c for c in combos if is_valid(c)]
+
+        if method == 'random':
+            if n_samples > self.max_combinations:
+                raise ValueError(f"采样组合数 {n_samples} 超过上限 {self.max_combinations}")
+            # 候选空间较小时直接退化为网格
+            if math.prod(len(v) for v in values) <= n_samples:
+                return self.sample(space, 'grid')
+            rng = np.random.default_rng(seed)
+            seen = set()
+            combos = []
+            attempts = 0
+            while len(combos) < n_samples and attempts < n_samples * 20:
+                attempts += 1
+                combo = tuple(v[rng.integers(len(v))] for v in values)
+                if combo in seen:
+                    continue
+                seen.add(combo)
+                params = dict(zip(names, combo))
+                if is_valid(params):
+                    combos.append(params)
+            return combos
+
+        raise ValueError(f"不支持的采样方式: {method}")
+
+    def prepare(self,
+                df: pd.DataFrame,
+                combos: Sequence[Dict[str, Any]],
+                periods_per_year: float = 252,
+                context: Optional[_SweepContext] = None,
+                cache_signals: bool = False) -> _SweepContext:
+        """
+        一次性计算所有组合需要的指标列
+
+        参数:
+            context: 已有的扫描数据，传入时只补算其中缺少的列
+            cache_signals: 新建的扫描数据是否缓存各组合的信号
+        """
+        registry = IndicatorRegistry()
+        needed = set()
+        for params in combos or [{}]:
+            aliases, specs = resolve_parameters(params)
+            for spec in specs:
+                registry.register(spec)
+            needed.update(aliases.values())
+
+        if context is None:
+            context = _SweepContext({}, self.initial_capital, periods_per_year, cache_signals)
+        missing = sorted(c for c in needed if c not in context.columns)
+        if missing:
+            frame = registry.compute(df.reset_index(drop=True).copy(), missing)
+            context.columns.update({c: frame[c].to_numpy(dtype=float) for c in missing})
+        return context
+
+    def evaluate(self,
+                 context: _SweepContext,
+                 combos: List[Dict[str, Any]],
+                 progress: Optional[Callable[[float], None]] = None) -> List[Dict]:
+        """
+        评估参数组合，组合较多时使用进程池
+
+        参数:
+            progress: 进度回调，参数为已完成的比例（0~1）
+        """
+        parallel = len(combos) >= PARALLEL_THRESHOLD and self.workers > 1
+        if not parallel and progress is None:
+            return _evaluate_chunk(combos, context)
+
+        size = max(1, -(-len(combos) // (self.workers * 4 if parallel else 20)))
+        chunks = [combos[i:i + size] for i in range(0, len(combos), size)]
+        rows = []
+        if not parallel:
+            for chunk in chunks:
+                rows.extend(_evaluate_chunk(chunk, context))
+                progress(len(rows) / len(combos))
+            return rows
+
+        with ProcessPoolExecutor(max_workers=self.workers,
+                                 mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker,
+                                 initargs=(context,)) as pool:
+            for chunk_rows in pool.map(_evaluate_chunk, chunks):
+                rows.extend(chunk_rows)
+                if progress is not None:
+                    progress(len(rows) / len(combos))
+        return rows
+
+    def optimize(self,
+                 df: pd.DataFrame,
+                 space: Dict[str, Any],
+                 method: str = 'grid',
+                 n_samples: int = 200,
+                 metric: str = 'sharpe_ratio',
+                 top: Optional[int] = 20,
+                 periods_per_year: float = 252,
+                 seed: Optional[int] = None,
+                 progress: Optional[Callable[[float], None]] = None) -> Dict:
+        """
+        参数优化
+
+        参数:
+            df: 包含OHLCV数据的DataFrame（按日期升序）
+            space: 参数搜索空间，如 {"ma_fast": [5, 10], "ma_slow": {"min": 20, "max": 60, "step": 10}}
+            method: grid 网格、random 随机、refine 先随机采样再围绕最优组合逐步细化
+            n_samples: random/refine 评估的组合数上限
+            metric: 排序指标（sharpe_ratio、total_return、max_drawdown、win_rate 等）
+            top: 返回前N个组合，None表示全部
+            periods_per_year: 每年K线数量
+            seed: 随机种子
+            progress: 进度回调，参数为已完成的比例（0~1）
+
+        返回:
+            按指标排序的结果表和运行统计
+        """
+        if metric not in METRICS:
+            raise ValueError(f"不支持的排序指标: {metric}")
+        started = time.time()
+
+        if method == 'refine':
+            combos, rows = self._refine(df, space, n_samples, metric, periods_per_year, seed, progress)
+        else:
+            combos = self.sample(space, method, n_samples, seed)
+            if not combos:
+                raise ValueError("没有有效的参数组合")
+            context = self.prepare(df, combos, periods_per_year)
+            rows = self.evaluate(context, combos, progress)
+
+        table = [{**params, **row} for params, row in zip(combos, rows)]
+        table = self.rank(table, metric)
+        elapsed = time.time() - started
+        self.logger.info(f"参数优化完成：{len(table)} 个组合，耗时 {elapsed:.2f} 秒")
+        return {
+            'method': method,
+            'metric': metric,
+            'combinations': len(table),
+            'elapsed': round(elapsed, 3),
+            'best': table[0] if table else None,
+            'results': table[:top] if top else table
+        }
+
+    @staticmethod
+    def rank(table: List[Dict], metric: str) -> List[Dict]:
+        """按指标排序，NaN排在最后"""
+        sign = 1 if metric in ASCENDING_METRICS else -1
+
+        def key(row):
+            value = row[metric]
+            return (math.isnan(value), sign * value if not math.isnan(value) else 0)
+
+        return sorted(table, key=key)
+
+    def _refine(self, df, space, n_samples, metric, periods_per_year, seed, progress=None):
+        """先用一半预算随机采样，再逐轮在排名前10%组合的相邻取值中搜索"""
+        rng = np.random.default_rng(seed)
+        names = sorted(space)
+        values = {name: expand_values(space[name], self.max_combinations, name in PERIOD_PARAMS)
+                  for name in names}
+
+        combos = self.sample(space, 'random', max(1, n_samples // 2), seed)
+        if not combos:
+            raise ValueError("没有有效的参数组合")
+        seen = {tuple(c[n] for n in names) for c in combos}
+        context = self.prepare(df, combos, periods_per_year)
+        rows = self.evaluate(context, combos)
+        if progress is not None:
+            progress(len(combos) / n_samples)
+
+        while len(combos) < n_samples:
+            table = self.rank([{**c, **r} for c, r in zip(combos, rows)], metric)
+            candidates = []
+            for leader in table[:max(1, len(table) // 10)]:
+                for name in names:
+                    index = values[name].index(leader[name])
+                    for step in (-1, 1):
+                        if not 0 <= index + step < len(values[name]):
+                            continue
+                        params = {n: leader[n] for n in names}
+                        params[name] = values[name][index + step]
+                        key = tuple(params[n] for n in names)
+                        if key not in seen and is_valid(params):
+                            seen.add(key)
+                            candidates.append(params)
+            if not candidates:
+                break
+            rng.shuffle(candidates)
+            candidates = candidates[:n_samples - len(combos)]
+            # 指标列缓存在各轮之间共享，只补算新出现的列
+            self.prepare(df, candidates, periods_per_year, context)
+            combos.extend(candidates)
+            rows.extend(self.evaluate(context, candidates))
+            if progress is not None:
+                progress(len(combos) / n_samples)
+        return combos, rows
@@ -0,0 +1,433 @@
+"""
+绩效分析
+
+基于 NumPy 数组的资金曲线和逐笔成交计算绩效指标：收益率、回撤及持续时间、
+夏普/索提诺/卡玛比率（含滚动窗口版本）、持仓暴露、换手率、逐笔交易统计和相对基准的指标。
+所有函数都是向量化实现，单只股票回测、参数扫描、滚动前推和组合回测共用同一套定义，
+各模式的资金曲线明细中都带有逐期的回撤和滚动夏普/索提诺/卡玛比率（见 rolling_metrics）。
+"""
+from typing import Dict, List, Optional
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 默认无风险利率（年化）
+RISK_FREE_RATE = 0.03
+
+# 随资金曲线逐期返回的回撤和滚动指标
+ROLLING_COLUMNS = ('drawdown', 'rolling_sharpe', 'rolling_sortino', 'rolling_calmar')
+
+
+def simple_returns(equity: np.ndarray) -> np.ndarray:
+    """逐期收益率，相邻两期任一为NaN的收益率被丢弃（与 pandas pct_change().dropna() 一致）"""
+    equity = np.asarray(equity, dtype=float)
+    if len(equity) < 2:
+        return np.empty(0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        returns = equity[1:] / equity[:-1] - 1
+    return returns[~np.isnan(returns)]
+
+
+def drawdown_series(equity: np.ndarray) -> np.ndarray:
+    """每期相对历史峰值的回撤（0~1，忽略NaN）"""
+    equity = np.asarray(equity, dtype=float)
+    peak = np.fmax.accumulate(equity)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (peak - equity) / peak
+
+
+def drawdown_stats(equity: np.ndarray) -> Dict[str, float]:
+    """
+    回撤统计（共用一次峰值计算）
+
+    返回:
+        max_drawdown 最大回撤；max_duration 最长的水下时间（K线数，从峰值到重新创新高，
+        或到序列结束）；current_duration 当前距离最近一次创新高的K线数
+    """
+    equity = np.asarray(equity, dtype=float)
+    n = len(equity)
+    if n == 0:
+        return {'max_drawdown': 0, 'max_duration': 0, 'current_duration': 0}
+    peak = np.fmax.accumulate(equity)
+    index = np.arange(n)
+    last_peak = np.maximum.accumulate(np.where(equity < peak, 0, index))
+    duration = index - last_peak
+
+    max_dd = 0
+    if not np.isnan(equity[0]):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            drawdown = (peak - equity) / peak
+        max_dd = np.fmax.reduce(drawdown)
+        if not max_dd > 0:
+            max_dd = 0
+    return {'max_drawdown': max_dd, 'max_duration': int(duration.max()), 'current_duration': int(duration[-1])}
+
+
+def max_drawdown(equity: np.ndarray) -> float:
+    """最大回撤"""
+    return drawdown_stats(equity)['max_drawdown']
+
+
+def annual_return(equity: np.ndarray, periods_per_year: float = 252,
+                  initial_capital: Optional[float] = None) -> float:
+    """
+    年化收益率（复利）
+
+    参数:
+        initial_capital: 初始资金，默认取资金曲线的第一个值
+    """
+    equity = np.asarray(equity, dtype=float)
+    if len(equity) == 0:
+        return 0
+    start = equity[0] if initial_capital is None else initial_capital
+    years = len(equity) / periods_per_year
+    if years <= 0 or not start > 0 or not equity[-1] > 0:
+        return 0
+    return float((equity[-1] / start) ** (1 / years) - 1)
+
+
+def sharpe_ratio(returns: np.ndarray, risk_free_rate: float = RISK_FREE_RATE,
+                 periods_per_year: float = 252) -> float:
+    """夏普比率：(年化收益率 - 无风险利率) / 年化波动率，收益率和波动率按算术方式年化"""
+    returns = np.asarray(returns, dtype=float)
+    if len(returns) == 0:
+        return 0
+    annual_vol = returns.std(ddof=1) * np.sqrt(periods_per_year) if len(returns) > 1 else np.nan
+    if annual_vol == 0:
+        return 0
+    return (returns.mean() * periods_per_year - risk_free_rate) / annual_vol
+
+
+def sortino_ratio(returns: np.ndarray, risk_free_rate: float = RISK_FREE_RATE,
+                  periods_per_year: float = 252) -> float:
+    """索提诺比率：只把下行波动（负收益的均方根）作为风险"""
+    returns = np.asarray(returns, dtype=float)
+    if len(returns) == 0:
+        return 0
+    downside = np.sqrt(np.mean(np.minimum(returns, 0) ** 2)) * np.sqrt(periods_per_year)
+    if downside == 0:
+        return 0
+    return float((returns.mean() * periods_per_year - risk_free_rate) / downside)
+
+
+def _rolling_sums(values: np.ndarray, window: int) -> np.ndarray:
+    cumsum = np.r_[0.0, np.cumsum(values)]
+    return cumsum[window:] - cumsum[:-window]
+
+
+def _pad(values: np.ndarray, n: int) -> np.ndarray:
+    """在前面补NaN，使滚动结果与输入对齐（第 i 个值对应以 i 结尾的窗口）"""
+    return np.r_[np.full(n - len(values), np.nan), values]
+
+
+def rolling_sharpe(returns: np.ndarray, window: int, risk_free_rate: float = RISK_FREE_RATE,
+                   periods_per_year: float = 252) -> np.ndarray:
+    """滚动夏普比率，窗口不足的位置为NaN"""
+    returns = np.asarray(returns, dtype=float)
+    n = len(returns)
+    if window < 2 or n < window:
+        return np.full(n, np.nan)
+    mean = _rolling_sums(returns, window) / window
+    # 标准差直接按窗口计算：累计平方和相减会留下舍入误差，空仓（收益全为0）的窗口会得到极小的正波动率
+    vol = sliding_window_view(returns, window).std(axis=1, ddof=1) * np.sqrt(periods_per_year)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sharpe = np.where(vol > 0, (mean * periods_per_year - risk_free_rate) / vol, 0.0)
+    return _pad(sharpe, n)
+
+
+def rolling_sortino(returns: np.ndarray, window: int, risk_free_rate: float = RISK_FREE_RATE,
+                    periods_per_year: float = 252) -> np.ndarray:
+    """滚动索提诺比率，窗口不足的位置为NaN"""
+    returns = np.asarray(returns, dtype=float)
+    n = len(returns)
+    if window < 1 or n < window:
+        return np.full(n, np.nan)
+    mean = _rolling_sums(returns, window) / window
+    downside = np.sqrt(_rolling_sums(np.minimum(returns, 0) ** 2, window) / window) * np.sqrt(periods_per_year)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sortino = np.where(downside > 0, (mean * periods_per_year - risk_free_rate) / downside, 0.0)
+    return _pad(sortino, n)
+
+
+def rolling_max_drawdown(equity: np.ndarray, window: int) -> np.ndarray:
+    """滚动最大回撤（每个窗口内部的峰谷回撤），窗口不足的位置为NaN"""
+    equity = np.asarray(equity, dtype=float)
+    n = len(equity)
+    if window < 1 or n < window:
+        return np.full(n, np.nan)
+    windows = sliding_window_view(equity, window)
+    peak = np.fmax.accumulate(windows, axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        drawdown = np.fmax.reduce((peak - windows) / peak, axis=1)
+    return _pad(np.maximum(drawdown, 0), n)
+
+
+def rolling_calmar(equity: np.ndarray, window: int, periods_per_year: float = 252) -> np.ndarray:
+    """滚动卡玛比率：窗口内的年化收益率 / 窗口内的最大回撤"""
+    equity = np.asarray(equity, dtype=float)
+    n = len(equity)
+    if window < 2 or n < window:
+        return np.full(n, np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        growth = equity[window - 1:] / equity[:n - window + 1]
+        annual = np.where(growth > 0, growth ** (periods_per_year / window) - 1, -1.0)
+        dd = rolling_max_drawdown(equity, window)[window - 1:]
+        calmar = np.where(dd > 0, annual / dd, 0.0)
+    return _pad(calmar, n)
+
+
+def rolling_window(periods_per_year: float = 252) -> int:
+    """滚动指标的默认窗口：约一个季度的K线数"""
+    return max(2, int(round(periods_per_year / 4)))
+
+
+def rolling_metrics(equity: np.ndarray,
+                    periods_per_year: float = 252,
+                    window: Optional[int] = None,
+                    risk_free_rate: float = RISK_FREE_RATE) -> Dict[str, np.ndarray]:
+    """
+    与资金曲线逐期对齐的回撤和滚动风险收益指标
+
+    参数:
+        equity: 每期总资产
+        periods_per_year: 每年K线数量
+        window: 滚动窗口（K线数），默认见 rolling_window
+
+    返回:
+        ROLLING_COLUMNS 各列的数组，长度与 equity 相同，窗口不足的位置为NaN：
+        drawdown 相对历史峰值的回撤；rolling_sharpe、rolling_sortino 以该期结尾的 window 期收益率计算；
+        rolling_calmar 以该期结尾的 window 根K线的资金曲线计算
+    """
+    equity = np.asarray(equity, dtype=float)
+    window = window or rolling_window(periods_per_year)
+    n = len(equity)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        returns = equity[1:] / equity[:-1] - 1 if n > 1 else np.empty(0)
+    return {
+        'drawdown': drawdown_series(equity),
+        # 第 i 期的收益率以第 i 根K线结束，补上第一根K线使之与资金曲线对齐
+        'rolling_sharpe': _pad(rolling_sharpe(returns, window, risk_free_rate, periods_per_year), n),
+        'rolling_sortino': _pad(rolling_sortino(returns, window, risk_free_rate, periods_per_year), n),
+        'rolling_calmar': rolling_calmar(equity, window + 1, periods_per_year),
+    }
+
+
+def rolling_records(metrics: Dict[str, np.ndarray]) -> List[Dict[str, Optional[float]]]:
+    """把 rolling_metrics 的结果转换为逐期的记录（NaN为None），便于并入资金曲线明细"""
+    columns = [np.asarray(metrics[c], dtype=float).tolist() for c in ROLLING_COLUMNS]
+    return [
+        {c: (v if v == v else None) for c, v in zip(ROLLING_COLUMNS, values)}
+        for values in zip(*columns)
+    ]
+
+
+def exposure(position_value: np.ndarray, total_value: np.ndarray) -> Dict[str, float]:
+    """
+    持仓暴露
+
+    返回:
+        time_in_market 有持仓的K线占比，avg_exposure 平均仓位（持仓市值 / 总资产）
+    """
+    position_value = np.asarray(position_value, dtype=float)
+    total_value = np.asarray(total_value, dtype=float)
+    n = len(total_value)
+    if n == 0:
+        return {'time_in_market': 0.0, 'avg_exposure': 0.0}
+    ratio = np.zeros(n)
+    np.divide(position_value, total_value, out=ratio, where=total_value > 0)
+    avg = ratio.mean()
+    if np.isnan(avg):
+        avg = np.nanmean(ratio) if not np.isnan(ratio).all() else 0.0
+    return {
+        'time_in_market': np.count_nonzero(position_value > 0) / n,
+        'avg_exposure': float(avg)
+    }
+
+
+def turnover(traded_value: np.ndarray, total_value: np.ndarray, periods_per_year: float = 252) -> float:
+    """年化换手率：累计成交金额 / 平均总资产，按回测长度折算为每年"""
+    traded_value = np.asarray(traded_value, dtype=float)
+    total_value = np.asarray(total_value, dtype=float)
+    if len(total_value) == 0 or len(traded_value) == 0:
+        return 0.0
+    traded = traded_value.sum()
+    mean_value = total_value.mean()
+    if np.isnan(traded):
+        traded = np.nansum(traded_value)
+    if np.isnan(mean_value):
+        mean_value = np.nanmean(total_value) if not np.isnan(total_value).all() else 0.0
+    if traded == 0 or not mean_value > 0:
+        return 0.0
+    return float(traded / mean_value * periods_per_year / len(total_value))
+
+
+def round_trips(prices: np.ndarray, is_buy: np.ndarray, shares: Optional[np.ndarray] = None,
+                index: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """
+    把成交序列配对为完整的买卖回合：每笔卖出与它之前最近的一笔买入配对，
+    末尾尚未卖出的买入视为未平仓，不计入回合
+
+    参数:
+        prices: 按时间顺序的成交价
+        is_buy: 是否为买入
+        shares: 成交股数（卖出股数即该回合的持仓股数），默认为1
+        index: 成交所在的K线位置，用于计算持仓时间
+
+    返回:
+        entry/exit（开平仓价）、shares、pnl（盈亏金额）、returns（收益率）、
+        bars（持仓K线数，未提供 index 时为空）和 open_trades（未平仓数）
+    """
+    prices = np.asarray(prices, dtype=float)
+    is_buy = np.asarray(is_buy, dtype=bool)
+    buys = np.flatnonzero(is_buy)
+    sells = np.flatnonzero(~is_buy)
+    entry = np.searchsorted(buys, sells) - 1
+    closed = entry >= 0
+    entries, exits = buys[entry[closed]], sells[closed]
+
+    qty = np.ones(len(exits)) if shares is None else np.asarray(shares, dtype=float)[exits]
+    entry_price, exit_price = prices[entries], prices[exits]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        returns = exit_price / entry_price - 1
+    bars = np.empty(0, dtype=np.int64)
+    if index is not None:
+        index = np.asarray(index)
+        bars = index[exits] - index[entries]
+    last_sell = sells[-1] if len(sells) else -1
+    return {
+        'entry': entry_price,
+        'exit': exit_price,
+        'shares': qty,
+        'pnl': (exit_price - entry_price) * qty,
+        'returns': returns,
+        'bars': bars,
+        'open_trades': int(np.count_nonzero(buys > last_sell))
+    }
+
+
+def trade_stats(trips: Dict[str, np.ndarray]) -> Dict[str, float]:
+    """
+    逐笔交易统计
+
+    参数:
+        trips: round_trips 的返回值
+
+    返回:
+        回合数、胜率、盈亏比（总盈利 / 总亏损）、平均盈利/亏损、期望收益、最好/最差一笔、平均持仓时间
+    """
+    pnl = trips['pnl']
+    count = len(pnl)
+    if count == 0:
+        return {
+            'round_trips': 0, 'open_trades': trips['open_trades'], 'win_rate': 0, 'profit_factor': 0,
+            'avg_win': 0, 'avg_loss': 0, 'expectancy': 0, 'avg_trade_return': 0,
+            'best_trade': 0, 'worst_trade': 0, 'avg_holding_bars': 0
+        }
+    wins = trips['exit'] > trips['entry']
+    win_count = int(np.count_nonzero(wins))
+    gross_profit = pnl[pnl > 0].sum()
+    gross_loss = -pnl[pnl < 0].sum()
+    if gross_loss > 0:
+        profit_factor = float(gross_profit / gross_loss)
+    else:
+        profit_factor = float('inf') if gross_profit > 0 else 0
+    returns = trips['returns']
+    returns = returns[~np.isnan(returns)]
+    bars = trips['bars']
+    return {
+        'round_trips': count,
+        'open_trades': trips['open_trades'],
+        'win_rate': win_count / count,
+        'profit_factor': profit_factor,
+        'avg_win': float(pnl[wins].mean()) if win_count else 0,
+        'avg_loss': float(pnl[~wins].mean()) if win_count < count else 0,
+        'expectancy': float(pnl.mean()),
+        'avg_trade_return': float(returns.mean()) if len(returns) else 0,
+        'best_trade': float(returns.max()) if len(returns) else 0,
+        'worst_trade': float(returns.min()) if len(returns) else 0,
+        'avg_holding_bars': float(bars.mean()) if len(bars) else 0
+    }
+
+
+def equity_metrics(equity: np.ndarray,
+                   periods_per_year: float = 252,
+                   initial_capital: Optional[float] = None,
+                   risk_free_rate: float = RISK_FREE_RATE) -> Dict[str, float]:
+    """
+    资金曲线的汇总指标
+
+    参数:
+        equity: 每期总资产
+        periods_per_year: 每年K线数量
+        initial_capital: 初始资金，默认取资金曲线的第一个值
+
+    返回:
+        total_return、annual_return、annual_volatility、max_drawdown、max_drawdown_duration、
+        sharpe_ratio、sortino_ratio、calmar_ratio
+    """
+    equity = np.asarray(equity, dtype=float)
+    if len(equity) == 0:
+        return {
+            'total_return': 0, 'annual_return': 0, 'annual_volatility': 0, 'max_drawdown': 0,
+            'max_drawdown_duration': 0, 'sharpe_ratio': 0, 'sortino_ratio': 0, 'calmar_ratio': 0
+        }
+    start = equity[0] if initial_capital is None else initial_capital
+    returns = simple_returns(equity)
+    drawdown = drawdown_stats(equity)
+    dd = drawdown['max_drawdown']
+    annual = annual_return(equity, periods_per_year, start)
+    return {
+        'total_return': float((equity[-1] - start) / start),
+        'annual_return': annual,
+        'annual_volatility': float(returns.std(ddof=1) * np.sqrt(periods_per_year)) if len(returns) > 1 else 0,
+        'max_drawdown': float(dd),
+        'max_drawdown_duration': drawdown['max_duration'],
+        'sharpe_ratio': float(sharpe_ratio(returns, risk_free_rate, periods_per_year)),
+        'sortino_ratio': sortino_ratio(returns, risk_free_rate, periods_per_year),
+        'calmar_ratio': float(annual / dd) if dd > 0 else 0
+    }
+
+
+def relative_metrics(returns: np.ndarray,
+                     benchmark_returns: np.ndarray,
+                     periods_per_year: float = 252,
+                     risk_free_rate: float = RISK_FREE_RATE) -> Dict[str, float]:
+    """
+    相对基准的指标（两组收益率逐期对齐，任一为NaN的期被丢弃）
+
+    返回:
+        alpha 年化詹森阿尔法、beta、correlation 相关系数、excess_return 年化超额收益（算术）、
+        tracking_error 年化跟踪误差、information_ratio 信息比率
+    """
+    returns = np.asarray(returns, dtype=float)
+    benchmark_returns = np.asarray(benchmark_returns, dtype=float)
+    valid = ~(np.isnan(returns) | np.isnan(benchmark_returns))
+    returns = returns[valid]
+    benchmark_returns = benchmark_returns[valid]
+    n = len(returns)
+    if n < 2:
+        return {
+            'alpha': 0, 'beta': 0, 'correlation': 0, 'excess_return': 0,
+            'tracking_error': 0, 'information_ratio': 0
+        }
+
+    mean, bench_mean = returns.mean(), benchmark_returns.mean()
+    var = returns.var(ddof=1)
+    bench_var = benchmark_returns.var(ddof=1)
+    cov = float(np.dot(returns - mean, benchmark_returns - bench_mean) / (n - 1))
+    beta = cov / bench_var if bench_var > 0 else 0
+    rf = risk_free_rate / periods_per_year
+
+    active = returns - benchmark_returns
+    excess = float(active.mean() * periods_per_year)
+    tracking = float(active.std(ddof=1) * np.sqrt(periods_per_year))
+    return {
+        'alpha': float(((mean - rf) - beta * (bench_mean - rf)) * periods_per_year),
+        'beta': float(beta),
+        'correlation': float(cov / np.sqrt(var * bench_var)) if var > 0 and bench_var > 0 else 0,
+        'excess_return': excess,
+        'tracking_error': tracking,
+        'information_ratio': excess / tracking if tracking > 0 else 0
+    }
@@ -0,0 +1,244 @@
+"""
+多股票组合回测
+
+在 [股票 × 交易日] 的行情面板上同时运行信号：按调仓频率把资金等权分配给处于持仓状态的股票，
+单只股票权重不超过上限、持仓数量不超过上限。调仓之间持股数不变，资金曲线用矩阵运算得到，
+只有调仓日需要循环。
+"""
+from typing import Callable, Dict, Optional
+import pandas as pd
+import numpy as np
+import logging
+
+from .market_panel import MarketPanel
+from .technical_analysis import TechnicalAnalyzer, SIGNAL_COLUMNS
+from .signal_rules import SignalStrategy, DEFAULT_STRATEGY
+from . import performance
+from .resample import bucket_ids
+
+logger = logging.getLogger(__name__)
+
+
+def hold_state(signal: np.ndarray) -> np.ndarray:
+    """
+    由信号面板得到持仓状态：最近一次信号为买入(1)则持有，卖出(-1)或尚无信号则空仓
+
+    参数:
+        signal: [股票 × 日期] 的信号数组
+    """
+    n = signal.shape[-1]
+    state = np.where(signal == 1, 1, np.where(signal == -1, -1, 0))
+    last = np.maximum.accumulate(np.where(state != 0, np.arange(n), -1), axis=-1)
+    filled = np.take_along_axis(state, np.maximum(last, 0), axis=-1)
+    return (last >= 0) & (filled == 1)
+
+
+def compute_panel_signals(panel: MarketPanel,
+                          analyzer: Optional[TechnicalAnalyzer] = None,
+                          strategy: Optional[SignalStrategy] = None,
+                          progress: Optional[Callable[[float], None]] = None,
+                          rules: bool = False) -> Dict[str, np.ndarray]:
+    """
+    在整个面板上计算信号：所有股票的指标一次算出（股票作为列一起做滚动计算），
+    再把编译后的规则作用在 [股票 × K线] 的二维数组上，结果与逐只股票计算相同
+
+    参数:
+        progress: 进度回调，参数为已完成的比例（0~1）
+        rules: 是否同时返回每条规则的信号面板
+
+    返回:
+        {'signal': 信号面板, 'strength': 信号强度面板}，没有数据的位置为NaN；
+        rules 为 True 时另有 'rules': {规则名: 规则信号面板}
+    """
+    analyzer = analyzer or TechnicalAnalyzer()
+    compiled = (strategy or DEFAULT_STRATEGY).compile()
+    columns = SIGNAL_COLUMNS
+    if strategy is not None:
+        columns = sorted(compiled.required_columns() & set(analyzer.registry.columns()))
+
+    # 停牌日左移压紧后计算，滚动窗口只包含有数据的交易日
+    order, fields = panel.compact()
+    values = {**fields, **analyzer.registry.compute_panel(fields, columns)}
+    if progress is not None:
+        progress(0.8)
+
+    inputs = {c: values[c] for c in compiled.required_columns() if c in values}
+    result = compiled.evaluate(inputs or {'__shape__': np.zeros(panel.shape)})
+    signal = panel.expand(order, result.get('signal_final', np.zeros(panel.shape)))
+    strength = panel.expand(order, result['signal_strength'])
+    if progress is not None:
+        progress(1.0)
+    if rules:
+        rule_signals = {
+            name: panel.expand(order, result[name]) if name in result else np.full(panel.shape, np.nan)
+            for name in compiled.rule_names
+        }
+        return {'signal': signal, 'strength': strength, 'rules': rule_signals}
+    return {'signal': signal, 'strength': strength}
+
+
+class PortfolioBacktester:
+    """组合回测引擎"""
+
+    def __init__(self,
+                 initial_capital: float = 1000000,
+                 max_weight: float = 0.1,
+                 max_positions: Optional[int] = None,
+                 rebalance: str = 'W',
+                 commission: float = 0.0):
+        """
+        参数:
+            initial_capital: 初始资金
+            max_weight: 单只股票占组合净值的权重上限
+            max_positions: 最多同时持有的股票数（按信号强度优先），None表示不限
+            rebalance: 调仓频率，D每日、W每周、M每月、ND每N个交易日
+            commission: 单边手续费率
+        """
+        if not 0 < max_weight <= 1:
+            raise ValueError("单只股票权重上限必须在 (0, 1] 之间")
+        if max_positions is not None and max_positions < 1:
+            raise ValueError("最多持有股票数必须为正整数")
+        self.initial_capital = initial_capital
+        self.max_weight = max_weight
+        self.max_positions = max_positions
+        self.rebalance = rebalance
+        self.commission = commission
+        self.logger = logging.getLogger(__name__)
+
+    def rebalance_days(self, dates: np.ndarray) -> np.ndarray:
+        """调仓日在日期数组中的位置（每个周期的第一个交易日）"""
+        ids = bucket_ids(pd.Series(dates), self.rebalance)
+        return np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+
+    def run(self,
+            panel: MarketPanel,
+            signal: np.ndarray,
+            strength: Optional[np.ndarray] = None,
+            start: int = 0) -> Dict:
+        """
+        运行组合回测
+
+        参数:
+            panel: 行情面板（使用收盘价成交）
+            signal: [股票 × 日期] 的信号面板
+            strength: 信号强度面板，持仓数超过上限时优先持有强度高的股票
+            start: 从第几个交易日开始回测（之前的数据只用于指标预热）
+
+        返回:
+            组合指标、资金曲线（含回撤和滚动指标）和调仓统计
+        """
+        close = np.asarray(panel['close'], dtype=float)[:, start:]
+        dates = panel.dates[start:]
+        hold = hold_state(np.asarray(signal)[:, start:])
+        n_codes, n_days = close.shape
+        if n_days == 0:
+            raise ValueError("回测区间内没有交易日")
+
+        # 停牌或未上市时不能交易，估值沿用最近的收盘价
+        tradable = ~np.isnan(close)
+        last = np.maximum.accumulate(np.where(tradable, np.arange(n_days), 0), axis=1)
+        valuation = np.nan_to_num(np.take_along_axis(close, last, axis=1))
+        rank = None
+        if strength is not None:
+            rank = np.nan_to_num(np.asarray(strength, dtype=float)[:, start:], nan=-np.inf)
+
+        days = self.rebalance_days(dates)
+        bounds = np.r_[days, n_days]
+        equity = np.empty(n_days)
+        cash_curve = np.empty(n_days)
+        positions = np.zeros(n_days, dtype=np.int64)
+        shares = np.zeros(n_codes)
+        cash = float(self.initial_capital)
+        turnover = 0.0
+        trade_count = 0
+        fees = 0.0
+
+        for k, t in enumerate(days):
+            prices = valuation[:, t]
+            value = cash + shares @ prices
+
+            # 目标持仓：处于持仓状态且当日可交易
+            targets = hold[:, t] & tradable[:, t]
+            target_count = int(targets.sum())
+            if self.max_positions is not None and target_count > self.max_positions:
+                # 优先保留已持有的股票，其余名额按信号强度分配
+                strength_t = rank[:, t] if rank is not None else np.zeros(n_codes)
+                order = np.lexsort((-strength_t, shares <= 0))
+                keep = order[targets[order]][:self.max_positions]
+                targets = np.zeros(n_codes, dtype=bool)
+                targets[keep] = True
+                target_count = self.max_positions
+
+            # 停牌股票的市值不能动用，其余资金按权重上限等权分配
+            frozen = ~tradable[:, t]
+            available = value - shares[frozen] @ prices[frozen]
+            target_shares = np.zeros(n_codes)
+            if target_count:
+                budget = min(value * self.max_weight, available / target_count) / (1 + self.commission)
+                target_shares[targets] = np.floor(budget / prices[targets])
+            # 停牌股票维持原有持仓
+            target_shares[frozen] = shares[frozen]
+
+            # 先卖后买，现金不足时按比例缩减买入
+            delta = target_shares - shares
+            sells = np.minimum(delta, 0)
+            buys = np.maximum(delta, 0)
+            sold = -sells @ prices
+            cash += sold * (1 - self.commission)
+            cost = buys @ prices * (1 + self.commission)
+            if cost > cash:
+                buys = np.floor(buys * (cash / cost))
+            bought = buys @ prices
+            cash -= bought * (1 + self.commission)
+            shares = shares + sells + buys
+
+            turnover += sold + bought
+            fees += (sold + bought) * self.commission
+            trade_count += int(np.count_nonzero(sells) + np.count_nonzero(buys))
+
+            # 调仓之间持股数不变，净值 = 现金 + 持股市值
+            segment = slice(bounds[k], bounds[k + 1])
+            equity[segment] = cash + shares @ valuation[:, segment]
+            cash_curve[segment] = cash
+            positions[segment] = np.count_nonzero(shares)
+
+        metrics = self.metrics(equity)
+        metrics.update(performance.exposure(equity - cash_curve, equity))
+        metrics.update({
+            'trade_count': trade_count,
+            'rebalances': len(days),
+            'turnover': performance.turnover(np.array([turnover]), equity),
+            'fees': float(fees),
+            'avg_positions': float(positions.mean()),
+            'max_positions_held': int(positions.max()),
+        })
+
+        self.logger.info(
+            f"组合回测完成：{n_codes} 只股票，{n_days} 个交易日，总收益率 {metrics['total_return']:.2%}"
+        )
+        return {
+            'metrics': metrics,
+            'equity_curve': pd.DataFrame({
+                'date': dates.astype(object),
+                'total_value': equity,
+                'cash': cash_curve,
+                'positions': positions,
+                **performance.rolling_metrics(equity)
+            }),
+            'holdings': {
+                panel.codes[i]: int(shares[i]) for i in np.flatnonzero(shares)
+            }
+        }
+
+    def metrics(self, equity: np.ndarray, periods: float = 252) -> Dict:
+        """
+        组合层面的指标，与单只股票回测使用相同的定义（见 performance 模块）
+
+        参数:
+            equity: 每日组合净值
+            periods: 每年K线数量
+        """
+        metrics = performance.equity_metrics(equity, periods, self.initial_capital)
+        metrics['final_value'] = float(equity[-1])
+        metrics['initial_capital'] = self.initial_capital
+        return metrics
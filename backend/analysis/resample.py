@@ -0,0 +1,246 @@
+"""
+多周期K线重采样
+
+从日线数据派生周线、月线和N日线。按交易日历分桶（周线按ISO周、月线按自然月、
+N日线按交易日序号），用 numpy reduceat 一次性聚合；缓存的重采样序列在有新日线时
+只重算最后一个桶及之后的数据。
+"""
+import re
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Optional, Tuple
+import pandas as pd
+import numpy as np
+import logging
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from backend.database.models import StockDaily
+from backend.database.queries import load_daily_bars
+
+logger = logging.getLogger(__name__)
+
+DAILY = 'D'
+
+_TIMEFRAME_PATTERN = re.compile(r'^(\d*)([DWM])$')
+
+
+def parse_timeframe(timeframe: str) -> Tuple[str, int]:
+    """
+    解析K线周期
+
+    支持 D（日线）、W（周线）、M（月线）、ND（每N个交易日，如 5D）
+
+    返回:
+        (周期类型, N)
+    """
+    match = _TIMEFRAME_PATTERN.match((timeframe or DAILY).upper())
+    if not match:
+        raise ValueError(f"不支持的K线周期: {timeframe}")
+    n = int(match.group(1) or 1)
+    kind = match.group(2)
+    if n < 1 or (kind != 'D' and n != 1):
+        raise ValueError(f"不支持的K线周期: {timeframe}")
+    return kind, n
+
+
+def normalize_timeframe(timeframe: str) -> str:
+    """规范化K线周期写法（如 1D -> D, w -> W）"""
+    kind, n = parse_timeframe(timeframe)
+    return f'{n}D' if kind == 'D' and n > 1 else kind
+
+
+def is_daily(timeframe: str) -> bool:
+    """是否为日线"""
+    return parse_timeframe(timeframe) == ('D', 1)
+
+
+def periods_per_year(timeframe: str) -> float:
+    """每年的K线数量，用于年化指标"""
+    kind, n = parse_timeframe(timeframe)
+    if kind == 'W':
+        return 52
+    if kind == 'M':
+        return 12
+    return 252 / n
+
+
+def bucket_ids(dates: pd.Series, timeframe: str, start_position: int = 0) -> np.ndarray:
+    """
+    计算每根日线所属的桶编号
+
+    参数:
+        dates: 按升序排列的交易日期
+        timeframe: K线周期
+        start_position: 第一根日线在完整序列中的序号（N日线增量更新时使用）
+    """
+    kind, n = parse_timeframe(timeframe)
+    if kind == 'D':
+        return (start_position + np.arange(len(dates))) // n
+
+    dt = pd.to_datetime(pd.Series(dates).reset_index(drop=True))
+    if kind == 'W':
+        iso = dt.dt.isocalendar()
+        return (iso['year'].astype(np.int64) * 100 + iso['week'].astype(np.int64)).to_numpy()
+    return (dt.dt.year * 100 + dt.dt.month).to_numpy(dtype=np.int64)
+
+
+def resample_bars(df: pd.DataFrame, timeframe: str, start_position: int = 0) -> pd.DataFrame:
+    """
+    把日线聚合为指定周期的K线
+
+    参数:
+        df: 按日期升序排列的日线数据（date, open, high, low, close, volume，可选 amount）
+        timeframe: K线周期
+        start_position: 第一根日线在完整序列中的序号
+
+    返回:
+        重采样后的K线，date 为桶内最后一个交易日，bar_start 为桶内第一个交易日，
+        bars 为桶内的日线数量
+    """
+    if df.empty:
+        return df.assign(bar_start=pd.Series(dtype=object), bars=pd.Series(dtype=np.int64))
+
+    ids = bucket_ids(df['date'], timeframe, start_position)
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    ends = np.r_[starts[1:], len(ids)] - 1
+
+    result = {
+        'date': df['date'].to_numpy()[ends],
+        'bar_start': df['date'].to_numpy()[starts],
+        'open': df['open'].to_numpy(dtype=float)[starts],
+        'high': np.maximum.reduceat(df['high'].to_numpy(dtype=float), starts),
+        'low': np.minimum.reduceat(df['low'].to_numpy(dtype=float), starts),
+        'close': df['close'].to_numpy(dtype=float)[ends],
+        'volume': np.add.reduceat(df['volume'].to_numpy(dtype=float), starts),
+    }
+    if 'amount' in df.columns:
+        result['amount'] = np.add.reduceat(df['amount'].to_numpy(dtype=float), starts)
+    result['bars'] = ends - starts + 1
+    return pd.DataFrame(result)
+
+
+class _Entry:
+    """缓存的重采样序列"""
+
+    def __init__(self, bars: pd.DataFrame, last_date: date, count: int):
+        self.bars = bars
+        self.last_date = last_date
+        self.count = count
+
+
+class ResampledBarStore:
+    """
+    多周期K线缓存
+
+    每个 (code, timeframe) 缓存完整的重采样序列；有新日线追加时只重算最后一个桶，
+    历史日线被修改或删除时整体重建。
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self.logger = logging.getLogger(__name__)
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._watched = False
+
+    def watch(self):
+        """监听日线写入：修改了已缓存区间内的数据时丢弃对应缓存，追加新日线则留待增量更新"""
+        if self._watched:
+            return
+
+        def _on_write(mapper, connection, target):
+            with self._lock:
+                for key in [k for k in self._entries if k[0] == target.code]:
+                    entry = self._entries[key]
+                    if entry.last_date is None or target.date is None or target.date <= entry.last_date:
+                        del self._entries[key]
+
+        for name in ('after_insert', 'after_update', 'after_delete'):
+            event.listen(StockDaily, name, _on_write)
+        self._watched = True
+
+    def invalidate(self, code: Optional[str] = None):
+        """丢弃缓存，code为None时清空全部"""
+        with self._lock:
+            if code is None:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries if k[0] == code]:
+                del self._entries[key]
+
+    def get_bars(self,
+                 db: Session,
+                 code: str,
+                 timeframe: str = DAILY,
+                 start_date: Optional[date] = None,
+                 end_date: Optional[date] = None) -> pd.DataFrame:
+        """
+        获取指定周期的K线
+
+        日线直接查询数据库；其他周期从缓存的重采样序列中截取（按桶的最后交易日过滤）
+        """
+        if is_daily(timeframe):
+            return load_daily_bars(db, code, start_date, end_date)
+
+        bars = self._series(db, code, normalize_timeframe(timeframe))
+        mask = np.ones(len(bars), dtype=bool)
+        if start_date is not None:
+            mask &= (bars['date'] >= start_date).to_numpy()
+        if end_date is not None:
+            mask &= (bars['date'] <= end_date).to_numpy()
+        return bars[mask].reset_index(drop=True)
+
+    def _series(self, db: Session, code: str, timeframe: str) -> pd.DataFrame:
+        last_date, count = db.query(
+            func.max(StockDaily.date), func.count(StockDaily.id)
+        ).filter(StockDaily.code == code).one()
+
+        key = (code, timeframe)
+        with self._lock:
+            entry = self._entries.get(key)
+
+        if entry is not None and entry.last_date == last_date and entry.count == count:
+            with self._lock:
+                self._entries.move_to_end(key)
+            return entry.bars
+
+        if entry is not None and entry.last_date is not None \
+                and last_date is not None and last_date > entry.last_date:
+            entry = self._extend(db, code, timeframe, entry, last_date, count)
+        else:
+            entry = self._rebuild(db, code, timeframe)
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry.bars
+
+    def _rebuild(self, db: Session, code: str, timeframe: str) -> _Entry:
+        daily = load_daily_bars(db, code, columns=['date', 'open', 'high', 'low', 'close', 'volume', 'amount'])
+        bars = resample_bars(daily, timeframe)
+        last_date = daily['date'].iloc[-1] if not daily.empty else None
+        return _Entry(bars, last_date, len(daily))
+
+    def _extend(self, db: Session, code: str, timeframe: str, entry: _Entry,
+                last_date: date, count: int) -> _Entry:
+        """增量更新：只重算最后一个桶（可能不完整）及之后的日线"""
+        tail_start = entry.bars['bar_start'].iloc[-1]
+        tail_position = entry.count - int(entry.bars['bars'].iloc[-1])
+        daily = load_daily_bars(db, code, start_date=tail_start,
+                                columns=['date', 'open', 'high', 'low', 'close', 'volume', 'amount'])
+        if tail_position + len(daily) != count:
+            # 中间有缺口（如绕过ORM写入的数据），整体重建
+            return self._rebuild(db, code, timeframe)
+
+        tail = resample_bars(daily, timeframe, start_position=tail_position)
+        bars = pd.concat([entry.bars.iloc[:-1], tail], ignore_index=True)
+        return _Entry(bars, last_date, count)
+
+
+# 全局多周期K线缓存
+bar_store = ResampledBarStore()
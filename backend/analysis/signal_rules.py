@@ -0,0 +1,361 @@
+"""
+信号规则语言
+
+用简单的表达式声明交易信号规则，例如:
+
+    SignalRule('ma_signal', buy='cross_up(ma5, ma20)', sell='cross_down(ma5, ma20)')
+    SignalRule('rsi_signal', buy='rsi < {rsi_low}', sell='rsi > {rsi_high}', weight=2)
+
+支持列名、数字、比较运算、and/or/not、四则运算，以及函数
+cross_up(a, b)、cross_down(a, b)、prev(x, n)、abs(x)。
+
+策略编译后是一串去重后的向量化指令，相同的子表达式（如 prev(ma5)）只计算一次；
+输入既可以是单只股票的一维数组，也可以是 [股票 × 日期] 的二维面板。
+"""
+import ast
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple
+import pandas as pd
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 每个策略缓存的编译结果组数（不同参数各一组）
+MAX_COMPILED = 256
+
+_COMPARE_OPS = {
+    ast.Lt: 'lt', ast.LtE: 'le', ast.Gt: 'gt', ast.GtE: 'ge', ast.Eq: 'eq', ast.NotEq: 'ne'
+}
+_BINARY_OPS = {
+    ast.Add: 'add', ast.Sub: 'sub', ast.Mult: 'mul', ast.Div: 'div',
+    ast.BitAnd: 'and', ast.BitOr: 'or'
+}
+_NUMPY_OPS = {
+    'lt': np.less, 'le': np.less_equal, 'gt': np.greater, 'ge': np.greater_equal,
+    'eq': np.equal, 'ne': np.not_equal,
+    'add': np.add, 'sub': np.subtract, 'mul': np.multiply, 'div': np.divide,
+}
+
+
+def _parse(expr: str, params: Mapping) -> Tuple:
+    """把表达式解析为嵌套元组形式的语法树"""
+    try:
+        tree = ast.parse(expr.strip(), mode='eval').body
+    except SyntaxError as e:
+        raise ValueError(f"规则表达式语法错误: {expr}") from e
+    return _convert(tree, params, expr)
+
+
+def _convert(node, params: Mapping, expr: str) -> Tuple:
+    if isinstance(node, ast.Name):
+        if node.id in params:
+            return ('const', float(params[node.id]))
+        return ('col', node.id)
+
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+        return ('const', float(node.value))
+
+    if isinstance(node, ast.Compare):
+        parts = []
+        left = _convert(node.left, params, expr)
+        for op, comparator in zip(node.ops, node.comparators):
+            if type(op) not in _COMPARE_OPS:
+                raise ValueError(f"不支持的比较运算: {expr}")
+            right = _convert(comparator, params, expr)
+            parts.append((_COMPARE_OPS[type(op)], left, right))
+            left = right
+        return parts[0] if len(parts) == 1 else ('and',) + tuple(parts)
+
+    if isinstance(node, ast.BoolOp):
+        name = 'and' if isinstance(node.op, ast.And) else 'or'
+        return (name,) + tuple(_convert(v, params, expr) for v in node.values)
+
+    if isinstance(node, ast.UnaryOp):
+        operand = _convert(node.operand, params, expr)
+        if isinstance(node.op, (ast.Not, ast.Invert)):
+            return ('not', operand)
+        if isinstance(node.op, ast.USub):
+            return ('neg', operand)
+        if isinstance(node.op, ast.UAdd):
+            return operand
+
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+        return (_BINARY_OPS[type(node.op)],
+                _convert(node.left, params, expr),
+                _convert(node.right, params, expr))
+
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+        name = node.func.id
+        args = [_convert(a, params, expr) for a in node.args]
+        if name in ('cross_up', 'cross_down') and len(args) == 2:
+            a, b = args
+            if name == 'cross_up':
+                return ('and', ('gt', a, b), ('le', ('prev', a, 1), ('prev', b, 1)))
+            return ('and', ('lt', a, b), ('ge', ('prev', a, 1), ('prev', b, 1)))
+        if name == 'prev' and len(args) in (1, 2):
+            periods = 1
+            if len(args) == 2:
+                if args[1][0] != 'const' or args[1][1] < 1 or args[1][1] != int(args[1][1]):
+                    raise ValueError(f"prev 的周期必须是正整数: {expr}")
+                periods = int(args[1][1])
+            return ('prev', args[0], periods)
+        if name == 'abs' and len(args) == 1:
+            return ('abs', args[0])
+
+    raise ValueError(f"不支持的规则表达式: {expr}")
+
+
+def _columns(node: Tuple) -> Set[str]:
+    """表达式引用的列"""
+    if node[0] == 'col':
+        return {node[1]}
+    if node[0] == 'const':
+        return set()
+    return set().union(*(_columns(a) for a in node[1:] if isinstance(a, tuple)))
+
+
+def _shift(values: np.ndarray, periods: int) -> np.ndarray:
+    """沿最后一维向后平移（等价于 pandas 的 shift），空出的位置为NaN"""
+    values = values.astype(float, copy=False)
+    result = np.full(values.shape, np.nan)
+    if periods < values.shape[-1]:
+        result[..., periods:] = values[..., :-periods]
+    return result
+
+
+class SignalRule:
+    """单条信号规则：满足 buy 条件记 +weight，满足 sell 条件记 -weight（买入优先）"""
+
+    def __init__(self, name: str, buy: str, sell: str, weight: float = 1):
+        if (not isinstance(weight, (int, float)) or isinstance(weight, bool)
+                or not np.isfinite(weight) or weight <= 0):
+            raise ValueError(f"规则 {name} 的权重必须为正数: {weight!r}")
+        self.name = name
+        self.buy = buy
+        self.sell = sell
+        self.weight = weight
+
+    def to_dict(self) -> Dict:
+        return {'name': self.name, 'buy': self.buy, 'sell': self.sell, 'weight': self.weight}
+
+    def __repr__(self):
+        return f"SignalRule({self.name!r}, buy={self.buy!r}, sell={self.sell!r}, weight={self.weight})"
+
+
+class CompiledStrategy:
+    """编译后的策略：去重的向量化指令序列"""
+
+    def __init__(self, rules: List[Tuple[SignalRule, Tuple, Tuple]]):
+        self._instructions: List[Tuple] = []
+        self._index: Dict[Tuple, int] = {}
+        self._rules = []
+        for rule, buy, sell in rules:
+            self._rules.append((
+                rule.name,
+                rule.weight,
+                self._emit(buy),
+                self._emit(sell),
+                _columns(buy) | _columns(sell)
+            ))
+
+    @property
+    def rule_names(self) -> List[str]:
+        return [name for name, *_ in self._rules]
+
+    @property
+    def instruction_count(self) -> int:
+        """去重后的指令数量"""
+        return len(self._instructions)
+
+    def required_columns(self) -> Set[str]:
+        """所有规则引用的列"""
+        return set().union(*(cols for *_, cols in self._rules)) if self._rules else set()
+
+    def _emit(self, node: Tuple) -> int:
+        """把语法树展开为指令，相同的子表达式只生成一次"""
+        if node in self._index:
+            return self._index[node]
+        op = node[0]
+        if op in ('col', 'const'):
+            instruction = node
+        elif op == 'prev':
+            instruction = ('prev', self._emit(node[1]), node[2])
+        else:
+            instruction = (op,) + tuple(self._emit(a) for a in node[1:])
+        self._instructions.append(instruction)
+        self._index[node] = len(self._instructions) - 1
+        return self._index[node]
+
+    def evaluate(self, columns: Mapping[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """
+        计算信号
+
+        参数:
+            columns: 列名到数组的映射（一维或 [股票 × 日期] 二维，缺失的列对应的规则会被跳过）
+
+        返回:
+            各规则的信号列，以及 signal、signal_strength、signal_final（没有可用规则时只有前两项）
+        """
+        active = [r for r in self._rules if r[4] <= set(columns)]
+        needed = self._needed([r[2] for r in active] + [r[3] for r in active])
+        shape = np.shape(next(iter(columns.values()))) if columns else ()
+
+        values: Dict[int, np.ndarray] = {}
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for i in sorted(needed):
+                instruction = self._instructions[i]
+                op = instruction[0]
+                if op == 'col':
+                    values[i] = np.asarray(columns[instruction[1]], dtype=float)
+                elif op == 'const':
+                    values[i] = instruction[1]
+                elif op == 'prev':
+                    values[i] = _shift(np.asarray(values[instruction[1]]), instruction[2])
+                elif op == 'and':
+                    values[i] = np.logical_and.reduce([values[a] for a in instruction[1:]])
+                elif op == 'or':
+                    values[i] = np.logical_or.reduce([values[a] for a in instruction[1:]])
+                elif op == 'not':
+                    values[i] = np.logical_not(values[instruction[1]])
+                elif op == 'neg':
+                    values[i] = np.negative(values[instruction[1]])
+                elif op == 'abs':
+                    values[i] = np.abs(values[instruction[1]])
+                else:
+                    values[i] = _NUMPY_OPS[op](values[instruction[1]], values[instruction[2]])
+
+        result: Dict[str, np.ndarray] = {}
+        for name, weight, buy, sell, _ in active:
+            result[name] = np.where(
+                np.broadcast_to(values[buy], shape), weight,
+                np.where(np.broadcast_to(values[sell], shape), -weight, 0)
+            )
+
+        if not active:
+            result['signal'] = np.zeros(shape, dtype=np.int64)
+            result['signal_strength'] = np.zeros(shape, dtype=np.int64)
+            return result
+
+        signal = result[active[0][0]]
+        for name, *_ in active[1:]:
+            signal = signal + result[name]
+        result['signal'] = signal
+        result['signal_strength'] = np.abs(signal) / sum(r[1] for r in active)
+        result['signal_final'] = np.where(signal > 0, 1, np.where(signal < 0, -1, 0))
+        return result
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        """在DataFrame上计算信号并写入对应的列"""
+        columns = {c: df[c].to_numpy(dtype=float) for c in self.required_columns() if c in df.columns}
+        if not columns:
+            columns = {'__shape__': np.zeros(len(df))}
+        # 综合信号列放在各规则信号列之前
+        df['signal'] = 0
+        df['signal_strength'] = 0
+        for name, values in self.evaluate(columns).items():
+            df[name] = values
+        return df
+
+    def _needed(self, roots: Iterable[int]) -> Set[int]:
+        needed: Set[int] = set()
+        stack = list(roots)
+        while stack:
+            i = stack.pop()
+            if i in needed:
+                continue
+            needed.add(i)
+            instruction = self._instructions[i]
+            if instruction[0] == 'prev':
+                stack.append(instruction[1])
+            elif instruction[0] not in ('col', 'const'):
+                stack.extend(instruction[1:])
+        return needed
+
+
+class SignalStrategy:
+    """由多条规则组成的信号策略"""
+
+    def __init__(self, rules: List[SignalRule], name: str = 'custom'):
+        if not rules:
+            raise ValueError("策略至少需要一条规则")
+        names = [r.name for r in rules]
+        if len(set(names)) != len(names):
+            raise ValueError("规则名称不能重复")
+        self.name = name
+        self.rules = rules
+        # 按参数缓存编译结果（最近使用的 MAX_COMPILED 组，优化器逐组参数调用时不会无限增长）
+        self._compiled: "OrderedDict[Tuple, CompiledStrategy]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_dict(cls, spec: Dict) -> 'SignalStrategy':
+        """
+        从字典创建策略
+
+        格式: {"name": "...", "rules": [{"name": "...", "buy": "...", "sell": "...", "weight": 1}]}
+        """
+        try:
+            rules = [SignalRule(r['name'], r['buy'], r['sell'], r.get('weight', 1))
+                     for r in spec['rules']]
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"策略格式错误: {e}") from e
+        return cls(rules, name=spec.get('name', 'custom'))
+
+    def to_dict(self) -> Dict:
+        return {'name': self.name, 'rules': [r.to_dict() for r in self.rules]}
+
+    def compile(self, params: Optional[Mapping] = None) -> CompiledStrategy:
+        """
+        编译策略
+
+        参数:
+            params: 规则参数，用于替换表达式中的 {name} 占位符和同名标识符
+        """
+        params = dict(params or {})
+        key = tuple(sorted(params.items()))
+        with self._lock:
+            compiled = self._compiled.get(key)
+            if compiled is not None:
+                self._compiled.move_to_end(key)
+                return compiled
+
+        parsed = []
+        for rule in self.rules:
+            try:
+                buy = rule.buy.format(**params)
+                sell = rule.sell.format(**params)
+            except KeyError as e:
+                raise ValueError(f"规则 {rule.name} 缺少参数: {e}") from e
+            except (IndexError, ValueError, AttributeError, TypeError) as e:
+                raise ValueError(f"规则 {rule.name} 的占位符格式错误: {e}") from e
+            parsed.append((rule, _parse(buy, params), _parse(sell, params)))
+        compiled = CompiledStrategy(parsed)
+
+        with self._lock:
+            self._compiled[key] = compiled
+            while len(self._compiled) > MAX_COMPILED:
+                self._compiled.popitem(last=False)
+        return compiled
+
+    def required_columns(self, params: Optional[Mapping] = None) -> Set[str]:
+        """策略引用的所有列"""
+        return self.compile(params).required_columns()
+
+    def apply(self, df: pd.DataFrame, params: Optional[Mapping] = None) -> pd.DataFrame:
+        """在DataFrame上计算信号"""
+        return self.compile(params).apply(df)
+
+
+# 默认策略：MA金叉死叉、RSI超买超卖、MACD金叉死叉、布林带、KDJ
+DEFAULT_STRATEGY = SignalStrategy([
+    SignalRule('ma_signal', buy='cross_up(ma5, ma20)', sell='cross_down(ma5, ma20)'),
+    SignalRule('rsi_signal', buy='rsi < 30', sell='rsi > 70'),
+    SignalRule('macd_cross_signal',
+               buy='cross_up(macd, macd_signal)', sell='cross_down(macd, macd_signal)'),
+    SignalRule('bb_signal', buy='close < bb_lower', sell='close > bb_upper'),
+    SignalRule('kdj_signal',
+               buy='cross_up(kdj_k, kdj_d) and kdj_k < 20',
+               sell='cross_down(kdj_k, kdj_d) and kdj_k > 80'),
+], name='default')
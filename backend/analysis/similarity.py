@@ -0,0 +1,510 @@
+"""
+相似K线走势搜索
+
+把所有股票历史上的每个 N 日窗口（按步长滑动）表示为一个形状向量：窗口内对数收盘价和对数成交量
+各自 z 标准化后拼接（成交量乘以权重），与价格水平、成交量大小无关，只反映走势形状。
+两个形状向量的点积除以向量长度的平方就是价格、成交量序列相关系数的加权平均。
+
+形状向量以 float16 紧凑矩阵保存（窗口之后的收益率为 float32），近似最近邻检索用随机超平面 LSH（SimHash）：
+每张哈希表用 K 个随机超平面把向量编码为 K 位整数，按编码排序后用二分查找取出同一个桶的候选，
+再翻转离超平面最近的几位做多探针查询，最后在候选集上精确计算相似度排序。
+千万级窗口的查询只需要访问几千个候选，耗时在毫秒级。
+
+索引保存为 .npy 文件，可以内存映射方式打开。每次重建写入新的版本目录，
+建完后再切换 CURRENT 文件中记录的当前版本，查询方始终能读到一个完整的索引。
+"""
+import json
+import shutil
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+import pandas as pd
+import numpy as np
+import logging
+
+from backend.config import settings
+from .market_panel import MarketPanel
+
+logger = logging.getLogger(__name__)
+
+# 默认窗口长度（交易日）
+DEFAULT_WINDOW = 20
+
+# 结果中给出的窗口之后的收益率（交易日）
+FORWARD_HORIZONS = (5, 20)
+
+# 成交量形状相对于价格形状的权重
+VOLUME_WEIGHT = 0.5
+
+_META_FILE = 'meta.json'
+_CURRENT_FILE = 'CURRENT'
+_PARTS_DIR = 'parts'
+
+# 切换版本后保留的旧索引个数（正在使用旧版本的查询不受影响）
+KEEP_BUILDS = 1
+
+# 索引中逐窗口保存的数组（形状矩阵、元数据和各哈希表排序后的编码）
+_WINDOW_ARRAYS = ('vectors', 'rows', 'end_positions', 'start_days', 'end_days', 'forward_returns')
+_ARRAYS = _WINDOW_ARRAYS + ('hash_codes', 'hash_order')
+
+
+def shape_vectors(close: np.ndarray, volume: np.ndarray, window: int,
+                  volume_weight: float = VOLUME_WEIGHT) -> np.ndarray:
+    """
+    滑动窗口的形状向量
+
+    参数:
+        close: [股票 × K线] 收盘价（每行是连续的有效K线，末尾可以是NaN）
+        volume: 成交量，形状同 close
+        window: 窗口长度
+
+    返回:
+        [股票 × 窗口结束位置 × 2*window] 的 float32 数组，第 j 个窗口以第 j+window-1 根K线结束；
+        价格或成交量在窗口内不变、或窗口内有缺失数据时为NaN
+    """
+    close = np.atleast_2d(np.asarray(close, dtype=float))
+    volume = np.atleast_2d(np.asarray(volume, dtype=float))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        parts = []
+        for values, weight in ((np.log(close), 1.0), (np.log1p(volume), volume_weight)):
+            windows = np.lib.stride_tricks.sliding_window_view(values, window, axis=1)
+            mean = windows.mean(axis=2, keepdims=True)
+            std = windows.std(axis=2, keepdims=True)
+            parts.append(((windows - mean) / np.where(std > 1e-12, std, np.nan) * weight).astype(np.float32))
+    return np.concatenate(parts, axis=2)
+
+
+class SimilarityIndex:
+    """相似走势索引（float16 形状矩阵 + 随机超平面 LSH）"""
+
+    def __init__(self,
+                 window: int = DEFAULT_WINDOW,
+                 stride: int = 1,
+                 tables: int = 12,
+                 bits: int = 18,
+                 volume_weight: float = VOLUME_WEIGHT,
+                 seed: int = 0,
+                 directory: Optional[Path] = None):
+        """
+        参数:
+            window: 窗口长度（交易日）
+            stride: 窗口滑动的步长（交易日），越大索引越小
+            tables: 哈希表个数（越多召回率越高，索引和查询也越慢）
+            bits: 每张哈希表的编码位数（越多桶越小，候选越少）
+            volume_weight: 成交量形状的权重，0表示只比较价格
+            seed: 随机超平面的种子
+            directory: 建索引的输出目录，每批窗口直接写入磁盘，合并时也写入内存映射文件，
+                内存占用与窗口总数无关；None 表示在内存中建索引（适合小规模索引）
+        """
+        if bits > 32:
+            raise ValueError("每张哈希表最多32位")
+        self.window = window
+        self.stride = stride
+        self.tables = tables
+        self.bits = bits
+        self.volume_weight = volume_weight
+        self.seed = seed
+        self.dim = 2 * window
+        self.planes = np.random.default_rng(seed).standard_normal((tables, self.dim, bits)).astype(np.float32)
+        self.codes: List[str] = []
+        self.meta: Dict = {}
+        self.arrays: Dict[str, np.ndarray] = {}
+        self.directory = Path(directory) if directory is not None else None
+        self._parts: List[Dict[str, Union[np.ndarray, Path]]] = []
+        self.logger = logging.getLogger(__name__)
+
+    def __len__(self) -> int:
+        return len(self.arrays['rows']) if self.arrays else 0
+
+    @property
+    def norm(self) -> float:
+        """形状向量长度的平方（点积除以它即为相似度）"""
+        return self.window * (1 + self.volume_weight ** 2)
+
+    def hash(self, vectors: np.ndarray) -> np.ndarray:
+        """[向量 × 维度] -> [哈希表 × 向量] 的 LSH 编码"""
+        weights = (np.uint32(1) << np.arange(self.bits, dtype=np.uint32))
+        codes = np.empty((self.tables, len(vectors)), dtype=np.uint32)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        for t in range(self.tables):
+            codes[t] = ((vectors @ self.planes[t]) > 0) @ weights
+        return codes
+
+    def add(self, panel: MarketPanel) -> int:
+        """
+        加入一批股票的全部窗口（建索引时按批调用，最后调用 finalize）
+
+        返回:
+            加入的窗口数
+        """
+        close = panel['close']
+        valid = ~np.isnan(close)
+        order = np.argsort(~valid, axis=1, kind='stable')
+        compact_close = np.take_along_axis(close, order, axis=1)
+        compact_volume = np.take_along_axis(np.asarray(panel['volume'], dtype=float), order, axis=1)
+        if compact_close.shape[1] < self.window:
+            return 0
+
+        vectors = shape_vectors(compact_close, compact_volume, self.window, self.volume_weight)
+        ends = np.arange(self.window - 1, compact_close.shape[1])
+        keep = np.isfinite(vectors).all(axis=2) & ((ends - self.window + 1) % self.stride == 0)
+        rows, starts = np.nonzero(keep)
+        end_positions = starts + self.window - 1
+        if len(rows) == 0:
+            return 0
+
+        forward = np.full((len(rows), len(FORWARD_HORIZONS)), np.nan, dtype=np.float32)
+        for i, horizon in enumerate(FORWARD_HORIZONS):
+            later = end_positions + horizon
+            available = later < compact_close.shape[1]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                forward[available, i] = (
+                    compact_close[rows[available], later[available]]
+                    / compact_close[rows[available], end_positions[available]] - 1
+                )
+
+        days = panel.dates.astype('datetime64[D]').astype(np.int32)
+        selected = vectors[rows, starts].astype(np.float16)
+        part = {
+            'vectors': selected,
+            'rows': (rows + len(self.codes)).astype(np.int32),
+            'end_positions': end_positions.astype(np.int32),
+            'start_days': days[order[rows, starts]],
+            'end_days': days[order[rows, end_positions]],
+            'forward_returns': forward,
+            'hash_codes': self.hash(selected)
+        }
+        if self.directory is not None:
+            # 每批写成单独的文件，合并时再按需读取，不在内存中累积
+            parts = self.directory / _PARTS_DIR
+            parts.mkdir(parents=True, exist_ok=True)
+            number = len(self._parts)
+            for key, values in part.items():
+                np.save(parts / f'{number}_{key}.npy', values)
+            part = {key: parts / f'{number}_{key}.npy' for key in part}
+        self._parts.append(part)
+        self.codes.extend(panel.codes)
+        return len(rows)
+
+    @staticmethod
+    def _part(part: Dict, key: str) -> np.ndarray:
+        values = part[key]
+        return np.load(values, mmap_mode='r') if isinstance(values, Path) else values
+
+    def _allocate(self, name: str, shape, dtype) -> np.ndarray:
+        if self.directory is None:
+            return np.empty(shape, dtype=dtype)
+        return np.lib.format.open_memmap(self.directory / f'{name}.npy', mode='w+', dtype=dtype, shape=shape)
+
+    def finalize(self) -> 'SimilarityIndex':
+        """
+        合并各批窗口并为每张哈希表按编码排序
+
+        指定了 directory 时结果直接写入该目录（连同元数据），完成后即是一个可以打开的完整索引，
+        合并过程中同时驻留内存的只有一张哈希表的编码（每个窗口8字节）。
+        """
+        if not self._parts:
+            raise ValueError("索引中没有窗口")
+        sizes = [len(self._part(part, 'rows')) for part in self._parts]
+        offsets = np.r_[0, np.cumsum(sizes)]
+        total = int(offsets[-1])
+
+        arrays = {}
+        for key in _WINDOW_ARRAYS:
+            first = self._part(self._parts[0], key)
+            arrays[key] = self._allocate(key, (total,) + first.shape[1:], first.dtype)
+            for part, start, end in zip(self._parts, offsets[:-1], offsets[1:]):
+                arrays[key][start:end] = self._part(part, key)
+
+        # 编码放在高32位、窗口下标放在低32位一起排序，等价于按编码稳定排序且不需要额外的下标数组
+        arrays['hash_codes'] = self._allocate('hash_codes', (self.tables, total), np.uint32)
+        arrays['hash_order'] = self._allocate('hash_order', (self.tables, total), np.int32)
+        for t in range(self.tables):
+            packed = np.empty(total, dtype=np.uint64)
+            for part, start, end in zip(self._parts, offsets[:-1], offsets[1:]):
+                codes = self._part(part, 'hash_codes')[t].astype(np.uint64)
+                packed[start:end] = (codes << np.uint64(32)) | np.arange(start, end, dtype=np.uint64)
+            packed.sort()
+            arrays['hash_codes'][t] = packed >> np.uint64(32)
+            arrays['hash_order'][t] = packed & np.uint64(0xFFFFFFFF)
+            del packed
+
+        self._parts = []
+        days = arrays['end_days']
+        self.meta = {
+            'window': self.window,
+            'stride': self.stride,
+            'tables': self.tables,
+            'bits': self.bits,
+            'volume_weight': self.volume_weight,
+            'seed': self.seed,
+            'windows': int(len(days)),
+            'start_date': str(np.datetime64(int(days.min()), 'D')),
+            'end_date': str(np.datetime64(int(days.max()), 'D')),
+            'built_at': datetime.now().isoformat()
+        }
+        if self.directory is not None:
+            for values in arrays.values():
+                values.flush()
+            shutil.rmtree(self.directory / _PARTS_DIR, ignore_errors=True)
+            self._write_meta(self.directory)
+            arrays = {name: np.load(self.directory / f'{name}.npy', mmap_mode='r') for name in _ARRAYS}
+        self.arrays = arrays
+        return self
+
+    def candidates(self, vector: np.ndarray, probes: int = 4, max_bucket: int = 1000) -> np.ndarray:
+        """
+        LSH 候选窗口
+
+        参数:
+            vector: 查询的形状向量
+            probes: 每张哈希表额外探测的桶数（依次翻转离超平面最近的位）
+            max_bucket: 每个桶最多取出的候选数（超大的桶均匀抽样）
+        """
+        vector = np.asarray(vector, dtype=np.float32)
+        found = []
+        for t in range(self.tables):
+            projection = vector @ self.planes[t]
+            code = int(((projection > 0) * (1 << np.arange(self.bits))).sum())
+            flips = np.argsort(np.abs(projection))[:probes]
+            sorted_codes = self.arrays['hash_codes'][t]
+            for probe in [code] + [code ^ (1 << int(bit)) for bit in flips]:
+                # 编码与数组同为 uint32，二分查找时不需要转换整个数组的类型
+                probe = np.uint32(probe)
+                lo = np.searchsorted(sorted_codes, probe, side='left')
+                hi = np.searchsorted(sorted_codes, probe, side='right')
+                if hi - lo > max_bucket:
+                    positions = np.linspace(lo, hi - 1, max_bucket).astype(np.int64)
+                else:
+                    positions = np.arange(lo, hi)
+                found.append(self.arrays['hash_order'][t][positions])
+        return np.unique(np.concatenate(found)) if found else np.empty(0, dtype=np.int32)
+
+    def search(self,
+               vector: np.ndarray,
+               k: int = 10,
+               exclude_row: Optional[int] = None,
+               exclude_after_day: Optional[int] = None,
+               exact: bool = False,
+               probes: int = 4,
+               max_bucket: int = 1000) -> List[int]:
+        """
+        最相似的 k 个窗口（同一只股票的结果互不重叠）
+
+        参数:
+            vector: 查询的形状向量
+            k: 返回的窗口数
+            exclude_row: 排除这只股票中 exclude_after_day 之后结束的窗口（避免匹配到查询窗口自身）
+            exclude_after_day: 见 exclude_row（距1970-01-01的天数）
+            exact: 是否扫描全部窗口（用于评估近似检索的召回率）
+            probes: 多探针查询每张表额外探测的桶数
+            max_bucket: 每个桶最多取出的候选数
+
+        返回:
+            按相似度降序的窗口下标
+        """
+        if exact:
+            ids = np.arange(len(self))
+        else:
+            ids = self.candidates(vector, probes, max_bucket)
+        rows = self.arrays['rows'][ids]
+        if exclude_row is not None:
+            keep = rows != exclude_row
+            if exclude_after_day is not None:
+                keep |= self.arrays['end_days'][ids] < exclude_after_day
+            ids, rows = ids[keep], rows[keep]
+        if len(ids) == 0:
+            return []
+
+        scores = self.similarity(ids, vector)
+        order = np.argsort(-scores, kind='stable')
+        positions = self.arrays['end_positions'][ids]
+        picked: List[int] = []
+        taken: Dict[int, List[int]] = {}
+        for i in order:
+            row = int(rows[i])
+            if any(abs(int(positions[i]) - p) < self.window for p in taken.get(row, ())):
+                continue
+            picked.append(int(ids[i]))
+            taken.setdefault(row, []).append(int(positions[i]))
+            if len(picked) >= k:
+                break
+        return picked
+
+    def similarity(self, ids: np.ndarray, vector: np.ndarray) -> np.ndarray:
+        """指定窗口与查询向量的相似度（价格、成交量相关系数的加权平均，-1 到 1）"""
+        matrix = self.arrays['vectors'][ids]
+        return matrix.astype(np.float32) @ np.asarray(vector, dtype=np.float32) / self.norm
+
+    def describe(self, ids: Sequence[int], vector: np.ndarray) -> pd.DataFrame:
+        """窗口的股票、起止日期、相似度和之后的收益率"""
+        ids = np.asarray(ids, dtype=np.int64)
+        frame = pd.DataFrame({
+            'code': np.asarray(self.codes, dtype=object)[self.arrays['rows'][ids]],
+            'start_date': self.arrays['start_days'][ids].astype('datetime64[D]').astype(object),
+            'end_date': self.arrays['end_days'][ids].astype('datetime64[D]').astype(object),
+            'similarity': self.similarity(ids, vector) if len(ids) else np.empty(0)
+        })
+        # 收益率以 float32 保存（约7位有效数字），输出时去掉转换为双精度后多出的尾数
+        forward = np.round(self.arrays['forward_returns'][ids].astype(float), 6)
+        for i, horizon in enumerate(FORWARD_HORIZONS):
+            frame[f'return_{horizon}d'] = forward[:, i]
+        return frame
+
+    def save(self, directory: Path) -> Path:
+        """保存为 .npy 文件和元数据（写入新目录，由 SimilaritySearch.publish 切换为当前版本）"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in _ARRAYS:
+            np.save(directory / f'{name}.npy', np.ascontiguousarray(self.arrays[name]))
+        self._write_meta(directory)
+        self.logger.info(f"相似走势索引已保存到 {directory}，共 {self.meta['windows']} 个窗口")
+        return directory
+
+    def _write_meta(self, directory: Path):
+        (directory / _META_FILE).write_text(
+            json.dumps({**self.meta, 'codes': self.codes}, ensure_ascii=False), encoding='utf-8'
+        )
+
+    @classmethod
+    def open(cls, directory: Path, mmap_mode: Optional[str] = 'r') -> 'SimilarityIndex':
+        """打开保存的索引，默认只读内存映射"""
+        directory = Path(directory)
+        meta = json.loads((directory / _META_FILE).read_text(encoding='utf-8'))
+        index = cls(window=meta['window'], stride=meta['stride'], tables=meta['tables'], bits=meta['bits'],
+                    volume_weight=meta['volume_weight'], seed=meta['seed'])
+        index.codes = meta.pop('codes')
+        index.meta = meta
+        index.arrays = {name: np.load(directory / f'{name}.npy', mmap_mode=mmap_mode) for name in _ARRAYS}
+        return index
+
+
+class SimilaritySearch:
+    """常驻内存的相似走势索引（索引重建后自动重新打开）"""
+
+    def __init__(self, directory: Path):
+        """
+        参数:
+            directory: 索引根目录，每次重建为其中的一个版本目录，CURRENT 文件记录当前版本
+        """
+        self.directory = Path(directory)
+        self._index: Optional[SimilarityIndex] = None
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def current_version(self) -> Optional[str]:
+        """当前使用的索引版本，还没有建立时返回None"""
+        try:
+            version = (self.directory / _CURRENT_FILE).read_text(encoding='utf-8').strip()
+        except FileNotFoundError:
+            return None
+        return version or None
+
+    def new_version(self) -> Path:
+        """为一次重建分配新的版本目录（目录名即版本号，按时间递增）"""
+        version = datetime.now().strftime('%Y%m%d%H%M%S%f')
+        return self.directory / version
+
+    def publish(self, directory: Path, keep: int = KEEP_BUILDS) -> str:
+        """
+        把建好的版本目录切换为当前索引，并清理更早的版本
+
+        参数:
+            directory: new_version 分配、已写完整的索引目录
+            keep: 保留的旧版本个数
+
+        返回:
+            版本号
+        """
+        version = Path(directory).name
+        # 先写临时文件再替换，查询方读到的要么是旧版本要么是新版本
+        pointer = self.directory / _CURRENT_FILE
+        tmp = pointer.with_suffix('.tmp')
+        tmp.write_text(version, encoding='utf-8')
+        tmp.replace(pointer)
+        self.prune(keep)
+        self.logger.info(f"相似走势索引已切换到版本 {version}")
+        return version
+
+    def prune(self, keep: int = KEEP_BUILDS) -> int:
+        """删除当前版本之前、超出 keep 个的旧版本（之后的版本可能正在构建，不删除），返回删除的个数"""
+        current = self.current_version()
+        if current is None:
+            return 0
+        older = sorted((p for p in self.directory.iterdir() if p.is_dir() and p.name < current), reverse=True)
+        for path in older[keep:]:
+            shutil.rmtree(path, ignore_errors=True)
+        return max(len(older) - keep, 0)
+
+    def index(self) -> SimilarityIndex:
+        """当前索引，还没有建立时抛出 ValueError"""
+        # 读到版本号之后该版本可能刚好被清理，此时重新读取当前版本
+        for _ in range(3):
+            version = self.current_version()
+            if version is None:
+                break
+            with self._lock:
+                if self._index is not None and version == self._version:
+                    return self._index
+                try:
+                    self._index = SimilarityIndex.open(self.directory / version)
+                except FileNotFoundError:
+                    continue
+                self._version = version
+                return self._index
+        raise ValueError("相似走势索引尚未建立")
+
+    def query(self,
+              code: str,
+              bars: pd.DataFrame,
+              k: int = 10,
+              probes: int = 4) -> Dict:
+        """
+        查找与一段K线走势最相似的历史窗口
+
+        参数:
+            code: 查询的股票（该股票自己与查询窗口重叠的历史窗口不参与匹配）
+            bars: 包含 date、close、volume 的日线，取最后 window 根
+            k: 返回的窗口数
+            probes: 多探针查询每张表额外探测的桶数
+
+        返回:
+            查询窗口、相似窗口列表及其之后收益率的统计
+        """
+        index = self.index()
+        if len(bars) < index.window:
+            raise ValueError(f"至少需要 {index.window} 个交易日的数据")
+        bars = bars.iloc[-index.window:]
+        vector = shape_vectors(bars['close'].to_numpy()[None, :], bars['volume'].to_numpy()[None, :],
+                               index.window, index.volume_weight)[0, 0]
+        if not np.isfinite(vector).all():
+            raise ValueError("查询窗口内价格或成交量没有变化，无法比较走势")
+
+        start_day = int(np.datetime64(pd.Timestamp(bars['date'].iloc[0]).date(), 'D').astype(np.int32))
+        row = index.codes.index(code) if code in index.codes else None
+        ids = index.search(vector, k, exclude_row=row, exclude_after_day=start_day, probes=probes)
+        matches = index.describe(ids, vector)
+
+        outcomes = {}
+        for horizon in FORWARD_HORIZONS:
+            returns = matches[f'return_{horizon}d'].dropna()
+            outcomes[f'{horizon}d'] = {
+                'count': int(len(returns)),
+                'mean_return': float(returns.mean()) if len(returns) else None,
+                'up_ratio': float((returns > 0).mean()) if len(returns) else None
+            }
+        return {
+            'code': code,
+            'window': index.window,
+            'start_date': bars['date'].iloc[0],
+            'end_date': bars['date'].iloc[-1],
+            'index': {key: index.meta[key] for key in ('windows', 'stride', 'start_date', 'end_date', 'built_at')},
+            'matches': matches.replace({np.nan: None}).to_dict(orient='records'),
+            'outcomes': outcomes
+        }
+
+
+# 全局相似走势索引
+similarity_search = SimilaritySearch(settings.processed_data_dir / 'similarity')
@@ -2,18 +2,30 @@
 技术指标计算模块
 """
 import pandas as pd
-import numpy as np
 import ta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterable
 import logging
 
+from .indicator_registry import IndicatorRegistry, default_registry
+from .signal_rules import SignalStrategy, DEFAULT_STRATEGY
+
 logger = logging.getLogger(__name__)
 
+# generate_signals 依赖的指标列
+SIGNAL_COLUMNS = [
+    'ma5', 'ma20', 'rsi', 'macd', 'macd_signal',
+    'bb_upper', 'bb_lower', 'kdj_k', 'kdj_d'
+]
+
+# 信号规则可以直接引用的行情列
+PRICE_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
 class TechnicalAnalyzer:
     """技术指标分析器"""
     
-    def __init__(self):
+    def __init__(self, registry: Optional[IndicatorRegistry] = None):
         self.logger = logging.getLogger(__name__)
+        self.registry = registry or default_registry
     
     def calculate_all_indicators(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -30,30 +42,59 @@ class TechnicalAnalyzer:
             if 'date' in df.columns:
                 df = df.sort_values('date')
             
-            # 计算移动平均线
-            df = self.calculate_ma(df)
-            
-            # 计算RSI
-            df = self.calculate_rsi(df)
-            
-            # 计算MACD
-            df = self.calculate_macd(df)
-            
-            # 计算布林带
-            df = self.calculate_bollinger_bands(df)
+            # 均线、RSI、MACD、布林带、KDJ、成交量指标
+            df = self.registry.compute(df)
             
-            # 计算KDJ
-            df = self.calculate_kdj(df)
+            self.logger.info(f"计算技术指标完成，共{len(df)}条数据")
+            return df
+        except Exception as e:
+            self.logger.error(f"计算技术指标失败: {e}")
+            raise
+    
+    def calculate_indicators(self, df: pd.DataFrame, columns: Iterable[str]) -> pd.DataFrame:
+        """
+        只计算指定的指标列
+        
+        参数:
+            df: 包含OHLCV数据的DataFrame
+            columns: 需要的指标列，如 ['rsi', 'macd', 'ma5']
+        
+        返回:
+            包含所需指标的DataFrame，共享的中间结果只计算一次
+        """
+        try:
+            if 'date' in df.columns:
+                df = df.sort_values('date')
             
-            # 计算成交量指标
-            df = self.calculate_volume_indicators(df)
+            df = self.registry.compute(df, columns)
             
-            self.logger.info(f"计算技术指标完成，共{len(df)}条数据")
+            self.logger.info(f"计算技术指标完成，共{len(df)}条数据，指标: {list(columns)}")
             return df
         except Exception as e:
             self.logger.error(f"计算技术指标失败: {e}")
             raise
     
+    def warmup_period(self, columns: Optional[Iterable[str]] = None) -> int:
+        """
+        计算指标所需的预热K线数
+        
+        参数:
+            columns: 指标列，None表示所有指标
+        """
+        if columns is None:
+            columns = self.registry.columns()
+        return self.registry.warmup(columns)
+    
+    def check_strategy(self, strategy: SignalStrategy) -> None:
+        """
+        检查自定义策略只引用已注册的指标列和行情列
+        
+        规则引用的列缺失时会被跳过，拼写错误的列名会让策略静默地不产生信号，因此请求中的策略需要先检查。
+        """
+        unknown = sorted(strategy.required_columns() - set(self.registry.columns()) - set(PRICE_COLUMNS))
+        if unknown:
+            raise ValueError(f"策略引用了未知的列: {', '.join(unknown)}")
+    
     def calculate_ma(self, df: pd.DataFrame, periods: list = [5, 10, 20, 60]) -> pd.DataFrame:
         """
         计算移动平均线
@@ -198,71 +239,17 @@ class TechnicalAnalyzer:
         
         return df
     
-    def generate_signals(self, df: pd.DataFrame) -> pd.DataFrame:
+    def generate_signals(self,
+                         df: pd.DataFrame,
+                         strategy: Optional[SignalStrategy] = None,
+                         params: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
         """
         根据技术指标生成交易信号
-        """
-        # 初始化信号列
-        df['signal'] = 0
-        df['signal_strength'] = 0
         
-        signals = []
-        
-        # MA金叉死叉信号
-        if 'ma5' in df.columns and 'ma20' in df.columns:
-            df['ma_signal'] = np.where(
-                (df['ma5'] > df['ma20']) & (df['ma5'].shift(1) <= df['ma20'].shift(1)), 1,
-                np.where(
-                    (df['ma5'] < df['ma20']) & (df['ma5'].shift(1) >= df['ma20'].shift(1)), -1, 0
-                )
-            )
-            signals.append('ma_signal')
-        
-        # RSI超买超卖信号
-        if 'rsi' in df.columns:
-            df['rsi_signal'] = np.where(
-                df['rsi'] < 30, 1,  # 超卖，买入信号
-                np.where(df['rsi'] > 70, -1, 0)  # 超买，卖出信号
-            )
-            signals.append('rsi_signal')
-        
-        # MACD金叉死叉信号
-        if 'macd' in df.columns and 'macd_signal' in df.columns:
-            df['macd_cross_signal'] = np.where(
-                (df['macd'] > df['macd_signal']) & (df['macd'].shift(1) <= df['macd_signal'].shift(1)), 1,
-                np.where(
-                    (df['macd'] < df['macd_signal']) & (df['macd'].shift(1) >= df['macd_signal'].shift(1)), -1, 0
-                )
-            )
-            signals.append('macd_cross_signal')
-        
-        # 布林带信号
-        if 'bb_upper' in df.columns and 'bb_lower' in df.columns:
-            df['bb_signal'] = np.where(
-                df['close'] < df['bb_lower'], 1,  # 触及下轨，买入信号
-                np.where(df['close'] > df['bb_upper'], -1, 0)  # 触及上轨，卖出信号
-            )
-            signals.append('bb_signal')
-        
-        # KDJ信号
-        if 'kdj_k' in df.columns and 'kdj_d' in df.columns:
-            df['kdj_signal'] = np.where(
-                (df['kdj_k'] > df['kdj_d']) & (df['kdj_k'].shift(1) <= df['kdj_d'].shift(1)) & (df['kdj_k'] < 20), 1,
-                np.where(
-                    (df['kdj_k'] < df['kdj_d']) & (df['kdj_k'].shift(1) >= df['kdj_d'].shift(1)) & (df['kdj_k'] > 80), -1, 0
-                )
-            )
-            signals.append('kdj_signal')
-        
-        # 综合信号
-        if signals:
-            df['signal'] = df[signals].sum(axis=1)
-            df['signal_strength'] = abs(df['signal']) / len(signals)
-            
-            # 将信号标准化为-1, 0, 1
-            df['signal_final'] = np.where(
-                df['signal'] > 0, 1,
-                np.where(df['signal'] < 0, -1, 0)
-            )
-        
-        return df
\ No newline at end of file
+        参数:
+            df: 包含技术指标的DataFrame
+            strategy: 信号策略，默认为 MA/RSI/MACD/布林带/KDJ 五条规则
+            params: 策略参数
+        """
+        strategy = strategy or DEFAULT_STRATEGY
+        return strategy.apply(df, params)
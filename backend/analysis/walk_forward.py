@@ -0,0 +1,220 @@
+"""
+滚动前推（walk-forward）分析
+
+把历史切分为连续的训练/测试窗口：在训练窗口上优化参数，在紧随其后的测试窗口上
+用最优参数做样本外回测，最后把各测试窗口的资金曲线首尾相接。
+
+指标和各参数组合的信号在整段历史上只计算一次（都只依赖历史数据），
+各窗口直接截取，重叠的窗口不重复计算；窗口较多时分发到进程池并行。
+"""
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+import pandas as pd
+import numpy as np
+import logging
+
+from .optimizer import StrategyOptimizer, _SweepContext, METRICS, PARALLEL_THRESHOLD
+from . import performance
+
+logger = logging.getLogger(__name__)
+
+
+def make_windows(n: int, train_bars: int, test_bars: int,
+                 step: Optional[int] = None, anchored: bool = False) -> List[Dict[str, int]]:
+    """
+    生成训练/测试窗口
+
+    参数:
+        n: K线总数
+        train_bars: 训练窗口长度
+        test_bars: 测试窗口长度
+        step: 窗口前推步长，默认等于测试窗口长度（测试窗口首尾相接）
+        anchored: 是否锚定起点（训练窗口始终从第一根K线开始并逐步扩大）
+
+    返回:
+        [{'train_start', 'train_end', 'test_start', 'test_end'}]，区间左闭右开
+    """
+    if train_bars < 2 or test_bars < 1:
+        raise ValueError("训练窗口至少2根K线，测试窗口至少1根K线")
+    step = step or test_bars
+    windows = []
+    start = 0
+    while start + train_bars < n:
+        test_start = start + train_bars
+        windows.append({
+            'train_start': 0 if anchored else start,
+            'train_end': test_start,
+            'test_start': test_start,
+            'test_end': min(test_start + test_bars, n),
+        })
+        start += step
+    return windows
+
+
+_worker_state: Dict[str, Any] = {}
+
+
+def _init_worker(context: _SweepContext, combos: List[Dict], metric: str):
+    _worker_state.update(context=context, combos=combos, metric=metric)
+
+
+def _run_window(window: Dict[str, int],
+                context: Optional[_SweepContext] = None,
+                combos: Optional[List[Dict]] = None,
+                metric: Optional[str] = None) -> Dict:
+    """在训练窗口上选出最优参数，并在测试窗口上回测"""
+    context = context or _worker_state['context']
+    combos = combos or _worker_state['combos']
+    metric = metric or _worker_state['metric']
+
+    train = slice(window['train_start'], window['train_end'])
+    table = [{**params, **context.evaluate(params, train)} for params in combos]
+    best = StrategyOptimizer.rank(table, metric)[0]
+    params = {k: best[k] for k in combos[0]}
+
+    metrics, equity = context.backtest(params, slice(window['test_start'], window['test_end']))
+    return {
+        **window,
+        'params': params,
+        'train_metrics': {m: best[m] for m in METRICS},
+        'test_metrics': {m: int(metrics[m]) if m == 'total_trades' else float(metrics[m]) for m in METRICS},
+        'test_equity': equity
+    }
+
+
+class WalkForwardAnalyzer:
+    """滚动前推分析"""
+
+    def __init__(self, initial_capital: float = 100000, workers: Optional[int] = None):
+        self.initial_capital = initial_capital
+        self.optimizer = StrategyOptimizer(initial_capital, workers)
+        self.logger = logging.getLogger(__name__)
+
+    def run(self,
+            df: pd.DataFrame,
+            space: Dict[str, Any],
+            train_bars: int = 504,
+            test_bars: int = 126,
+            step: Optional[int] = None,
+            anchored: bool = False,
+            method: str = 'grid',
+            n_samples: int = 200,
+            metric: str = 'sharpe_ratio',
+            periods_per_year: float = 252,
+            seed: Optional[int] = None,
+            progress: Optional[Callable[[float], None]] = None) -> Dict:
+        """
+        运行滚动前推分析
+
+        参数:
+            df: 包含OHLCV数据的DataFrame（按日期升序）
+            space: 参数搜索空间，格式同 StrategyOptimizer.optimize
+            train_bars: 训练窗口K线数
+            test_bars: 测试窗口K线数
+            step: 窗口前推步长，默认等于 test_bars
+            anchored: 是否锚定起点
+            method: 参数采样方式（grid / random）
+            n_samples: 随机采样的组合数
+            metric: 选择最优参数的指标
+            periods_per_year: 每年K线数量
+            seed: 随机种子
+            progress: 进度回调，参数为已完成窗口的比例（0~1）
+
+        返回:
+            各窗口的最优参数和样本内外指标、拼接后的样本外资金曲线（含回撤和滚动指标）及其指标
+        """
+        if metric not in METRICS:
+            raise ValueError(f"不支持的排序指标: {metric}")
+        started = time.time()
+        df = df.reset_index(drop=True)
+        windows = make_windows(len(df), train_bars, test_bars, step, anchored)
+        if not windows:
+            raise ValueError(f"数据不足：共 {len(df)} 根K线，训练窗口需要 {train_bars} 根以上")
+
+        combos = self.optimizer.sample(space, method, n_samples, seed)
+        if not combos:
+            raise ValueError("没有有效的参数组合")
+
+        # 指标和信号在整段历史上各算一次，所有窗口共享
+        context = self.optimizer.prepare(df, combos, periods_per_year, cache_signals=True)
+        for params in combos:
+            context.signals(params)
+
+        workers = self.optimizer.workers
+        if workers > 1 and len(windows) > 1 and len(windows) * len(combos) >= PARALLEL_THRESHOLD:
+            with ProcessPoolExecutor(max_workers=min(workers, len(windows)),
+                                     mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=_init_worker,
+                                     initargs=(context, combos, metric)) as pool:
+                results = []
+                for result in pool.map(_run_window, windows):
+                    results.append(result)
+                    if progress is not None:
+                        progress(len(results) / len(windows))
+        else:
+            results = []
+            for window in windows:
+                results.append(_run_window(window, context, combos, metric))
+                if progress is not None:
+                    progress(len(results) / len(windows))
+
+        dates = df['date'].tolist() if 'date' in df.columns else list(range(len(df)))
+        curve = self._stitch(results, dates, step or test_bars, test_bars)
+        curve = curve.assign(**performance.rolling_metrics(curve['total_value'].to_numpy(), periods_per_year))
+        oos = self._oos_metrics(curve['total_value'].to_numpy(), periods_per_year)
+
+        train_scores = [r['train_metrics'][metric] for r in results]
+        test_scores = [r['test_metrics'][metric] for r in results]
+        elapsed = time.time() - started
+        self.logger.info(f"滚动前推分析完成：{len(windows)} 个窗口，{len(combos)} 个参数组合，耗时 {elapsed:.2f} 秒")
+
+        return {
+            'windows': [
+                {
+                    'train': [dates[r['train_start']], dates[r['train_end'] - 1]],
+                    'test': [dates[r['test_start']], dates[r['test_end'] - 1]],
+                    'params': r['params'],
+                    'train_metrics': r['train_metrics'],
+                    'test_metrics': r['test_metrics'],
+                }
+                for r in results
+            ],
+            'combinations': len(combos),
+            'anchored': anchored,
+            'metric': metric,
+            'in_sample_mean': float(np.nanmean(train_scores)),
+            'out_of_sample_mean': float(np.nanmean(test_scores)),
+            'oos_metrics': oos,
+            'equity_curve': curve,
+            'elapsed': round(elapsed, 3)
+        }
+
+    def _stitch(self, results: List[Dict], dates: List, step: int, test_bars: int) -> pd.DataFrame:
+        """
+        拼接样本外资金曲线：每个测试窗口的收益率接在上一个窗口的期末净值上
+
+        步长小于测试窗口时窗口会重叠，只取每个窗口前 step 根K线
+        """
+        values = []
+        index = []
+        capital = self.initial_capital
+        for r in results:
+            equity = r['test_equity'][:min(step, test_bars)]
+            if len(equity) == 0:
+                continue
+            scaled = capital * equity / self.initial_capital
+            values.append(scaled)
+            index.extend(dates[r['test_start']:r['test_start'] + len(equity)])
+            capital = scaled[-1]
+        return pd.DataFrame({
+            'date': index,
+            'total_value': np.concatenate(values) if values else np.array([])
+        })
+
+    def _oos_metrics(self, equity: np.ndarray, periods_per_year: float) -> Dict:
+        """样本外资金曲线的风险收益指标"""
+        metrics = performance.equity_metrics(equity, periods_per_year, self.initial_capital)
+        metrics['final_value'] = float(equity[-1]) if len(equity) else self.initial_capital
+        return metrics
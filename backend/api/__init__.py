@@ -7,11 +7,13 @@ from .analysis import router as analysis_router
 from .data import router as data_router
 from .watchlist import router as watchlist_router
 from .gemini import router as gemini_router
+from .patterns import router as patterns_router
 
 __all__ = [
     'stock_router',
     'analysis_router',
     'data_router',
     'watchlist_router',
-    'gemini_router'
+    'gemini_router',
+    'patterns_router'
 ]
\ No newline at end of file
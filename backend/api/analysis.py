@@ -1,35 +1,102 @@
 """
 分析相关API路由
 """
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Body, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import Optional
+from sqlalchemy import func
+from typing import Any, Dict, List, Optional
 import pandas as pd
+import numpy as np
 from datetime import datetime
 import logging
 
-from backend.database import get_db, StockDaily, TechnicalIndicator
-from backend.analysis import TechnicalAnalyzer, BacktestEngine
-from backend.schemas import TechnicalIndicatorResponse, BacktestResult
+from backend.database import get_db, StockDaily, WatchList
+from backend.analysis import TechnicalAnalyzer, BacktestEngine, SignalStrategy, StrategyOptimizer, WalkForwardAnalyzer, SIGNAL_COLUMNS, performance
+from backend.analysis.indicator_cache import indicator_cache
+from backend.analysis.resample import bar_store, is_daily, normalize_timeframe, periods_per_year
+from backend.analysis.market_panel import load_market_panel
+from backend.analysis.portfolio import PortfolioBacktester, compute_panel_signals
+from backend.analysis.monte_carlo import MonteCarloSimulator, MAX_SIMULATIONS
+from backend.analysis.benchmark import index_store, normalize_index_code
+from backend.jobs.backtest_queue import backtest_queue
+from backend.schemas import TechnicalIndicatorResponse, BacktestResult, OptimizeRequest, WalkForwardRequest, PortfolioBacktestRequest, BacktestJobRequest
 
 router = APIRouter()
 
 # 初始化分析器
 technical_analyzer = TechnicalAnalyzer()
-backtest_engine = BacktestEngine()
+
+# 写入新的日线数据时自动失效指标缓存和多周期K线缓存
+indicator_cache.watch(StockDaily)
+bar_store.watch()
+
+TIMEFRAME_DESCRIPTION = "K线周期：D日线、W周线、M月线、ND每N个交易日（如5D）"
+
+def _parse_timeframe(timeframe: str) -> str:
+    """校验并规范化K线周期"""
+    try:
+        return normalize_timeframe(timeframe)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 # 配置logger
 logger = logging.getLogger(__name__)
 
+def _benchmark_index(benchmark: Optional[str]) -> Optional[str]:
+    """校验并规范化基准指数代码"""
+    if not benchmark:
+        return None
+    try:
+        return normalize_index_code(benchmark)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _compare_benchmark(db: Session, index: str, dates, equity, timeframe: str) -> Dict[str, Any]:
+    """资金曲线相对基准指数的指标和超额收益曲线（NaN转为None）"""
+    try:
+        comparison = index_store.compare(db, index, dates, equity, periods_per_year(timeframe))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    curve = comparison['curve']
+    comparison['curve'] = [
+        {
+            "date": d.isoformat() if hasattr(d, 'isoformat') else str(d),
+            "benchmark_value": None if np.isnan(b) else float(b),
+            "excess_return": None if np.isnan(x) else float(x)
+        }
+        for d, b, x in zip(curve['date'], curve['benchmark_value'], curve['excess_return'])
+    ]
+    return comparison
+
+def _rolling_records(curve: pd.DataFrame) -> List[Dict[str, Optional[float]]]:
+    """资金曲线中逐期的回撤和滚动指标（NaN转为None）"""
+    return performance.rolling_records({c: curve[c].to_numpy() for c in performance.ROLLING_COLUMNS})
+
+def _watchlist_stops(db: Session, code: str, user_id: str) -> Dict[str, Optional[float]]:
+    """由关注列表中的止损价、目标价相对添加时价格的比例得到止损/止盈比例"""
+    item = db.query(WatchList).filter(
+        WatchList.user_id == user_id,
+        WatchList.code == code,
+        WatchList.is_active == True
+    ).order_by(WatchList.created_at.desc()).first()
+    if item is None or not item.add_price:
+        raise HTTPException(status_code=404, detail="关注列表中没有该股票或缺少添加时价格")
+    return {
+        'stop_loss': 1 - item.stop_loss_price / item.add_price if item.stop_loss_price else None,
+        'take_profit': item.target_price / item.add_price - 1 if item.target_price else None,
+    }
+
 @router.get("/{code}/technical")
 async def analyze_technical(
     code: str,
     start_date: str = Query(..., description="开始日期，格式：20210101"),
     end_date: str = Query(..., description="结束日期，格式：20211231"),
+    timeframe: str = Query("D", description=TIMEFRAME_DESCRIPTION),
     db: Session = Depends(get_db)
 ):
     """计算技术指标"""
     try:
+        timeframe = _parse_timeframe(timeframe)
         logger.info(f"开始分析股票 {code}，日期范围：{start_date} 到 {end_date}")
         
         # 解析日期
@@ -47,30 +114,41 @@ async def analyze_technical(
         
         logger.info(f"日期解析成功：{start_dt} 到 {end_dt}")
         
-        # 获取股票数据
-        daily_data = db.query(StockDaily).filter(
-            StockDaily.code == code,
-            StockDaily.date >= start_dt,
-            StockDaily.date <= end_dt
-        ).order_by(StockDaily.date).all()
-        
-        logger.info(f"查询到 {len(daily_data)} 条数据")
+        # 区间内最后一根K线的日期，作为缓存键的一部分
+        df = None
+        if is_daily(timeframe):
+            last_bar_date = db.query(func.max(StockDaily.date)).filter(
+                StockDaily.code == code,
+                StockDaily.date >= start_dt,
+                StockDaily.date <= end_dt
+            ).scalar()
+        else:
+            # 非日线从缓存的重采样序列中截取
+            df = bar_store.get_bars(db, code, timeframe, start_dt, end_dt)
+            last_bar_date = df['date'].iloc[-1] if not df.empty else None
         
-        if not daily_data:
+        if last_bar_date is None:
             logger.warning(f"没有找到股票 {code} 的数据")
             raise HTTPException(status_code=404, detail="没有找到股票数据")
         
-        # 转换为DataFrame
-        df = pd.DataFrame([{
-            'date': d.date,
-            'open': float(d.open) if d.open else 0,
-            'high': float(d.high) if d.high else 0,
-            'low': float(d.low) if d.low else 0,
-            'close': float(d.close) if d.close else 0,
-            'volume': float(d.volume) if d.volume else 0
-        } for d in daily_data])
+        cache_key = indicator_cache.make_key(
+            code, start_dt, end_dt, last_bar_date,
+            ('technical', timeframe, technical_analyzer.registry.fingerprint(technical_analyzer.registry.columns()))
+        )
+        cached = indicator_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"命中指标缓存：{code} {start_dt} 到 {end_dt}")
+            return {
+                "code": code,
+                "period": f"{start_date} - {end_date}",
+                **cached
+            }
+        
+        # 获取股票数据
+        if df is None:
+            df = bar_store.get_bars(db, code, timeframe, start_dt, end_dt)
         
-        logger.info(f"DataFrame创建成功，shape: {df.shape}")
+        logger.info(f"查询到 {len(df)} 条{timeframe}数据")
         
         # 计算技术指标
         df_with_indicators = technical_analyzer.calculate_all_indicators(df)
@@ -80,29 +158,6 @@ async def analyze_technical(
         df_with_signals = technical_analyzer.generate_signals(df_with_indicators)
         logger.info("交易信号生成成功")
         
-        # 存储技术指标到数据库
-        for _, row in df_with_indicators.iterrows():
-            indicator = TechnicalIndicator(
-                code=code,
-                date=row['date'],
-                ma5=row.get('ma5'),
-                ma10=row.get('ma10'),
-                ma20=row.get('ma20'),
-                ma60=row.get('ma60'),
-                rsi=row.get('rsi'),
-                macd=row.get('macd'),
-                macd_signal=row.get('macd_signal'),
-                macd_hist=row.get('macd_hist'),
-                bb_upper=row.get('bb_upper'),
-                bb_middle=row.get('bb_middle'),
-                bb_lower=row.get('bb_lower'),
-                kdj_k=row.get('kdj_k'),
-                kdj_d=row.get('kdj_d'),
-                kdj_j=row.get('kdj_j')
-            )
-            db.merge(indicator)  # 使用merge避免重复
-        db.commit()
-        
         # 转换numpy类型为Python原生类型
         indicators_list = []
         for record in df_with_indicators.to_dict('records'):
@@ -124,13 +179,18 @@ async def analyze_technical(
             latest_signal = int(last_row.get('signal_final', 0)) if not pd.isna(last_row.get('signal_final', 0)) else 0
             signal_strength = float(last_row.get('signal_strength', 0)) if not pd.isna(last_row.get('signal_strength', 0)) else 0
         
+        result = {
+            "indicators": indicators_list,
+            "latest_signal": latest_signal,
+            "signal_strength": signal_strength
+        }
+        indicator_cache.put(cache_key, result)
+        
         # 返回结果
         return {
             "code": code,
             "period": f"{start_date} - {end_date}",
-            "indicators": indicators_list,
-            "latest_signal": latest_signal,
-            "signal_strength": signal_strength
+            **result
         }
     except HTTPException:
         raise
@@ -138,89 +198,425 @@ async def analyze_technical(
         logger.error(f"分析股票 {code} 失败: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/jobs")
+def submit_backtest_job(request: BacktestJobRequest):
+    """
+    提交回测任务，立即返回任务ID，在后台执行
+    
+    kind 可选 backtest（单股回测）、optimize（参数优化）、walk_forward（滚动前推）、portfolio（组合回测）；
+    params 分别同对应接口的请求体，backtest 可传 {"strategy": {...}}。
+    参数相同且行情数据未更新时返回已有任务，不重复计算
+    """
+    try:
+        return backtest_queue.submit(
+            request.kind,
+            code=request.code,
+            start_date=request.start_date,
+            end_date=request.end_date,
+            timeframe=request.timeframe,
+            initial_capital=request.initial_capital,
+            params=request.params
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"提交回测任务失败: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/jobs")
+def list_backtest_jobs(
+    status: Optional[str] = Query(None, description="按状态过滤：pending、running、completed、failed"),
+    code: Optional[str] = Query(None, description="按股票代码过滤"),
+    limit: int = Query(50, description="返回数量")
+):
+    """最近提交的回测任务"""
+    return {"jobs": backtest_queue.list_jobs(status, code, limit)}
+
+@router.get("/jobs/{job_id}")
+def get_backtest_job(job_id: str, include_result: bool = Query(True, description="是否返回回测结果")):
+    """查询回测任务的状态、进度和结果"""
+    job = backtest_queue.get(job_id, include_result)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job
+
+@router.get("/jobs/{job_id}/equity")
+def get_backtest_job_equity(job_id: str):
+    """回测任务的资金曲线"""
+    curve = backtest_queue.equity_curve(job_id)
+    if curve is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return {"job_id": job_id, "equity_curve": curve}
+
+@router.post("/portfolio/backtest")
+def run_portfolio_backtest(
+    request: PortfolioBacktestRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    组合回测：在多只股票上同时运行信号，按调仓频率等权分配资金
+    
+    codes 为空时使用所有有日线数据的股票
+    """
+    try:
+        try:
+            start_dt = datetime.strptime(request.start_date, "%Y%m%d").date()
+            end_dt = datetime.strptime(request.end_date, "%Y%m%d").date()
+            strategy = SignalStrategy.from_dict(request.strategy) if request.strategy else None
+            if strategy is not None:
+                technical_analyzer.check_strategy(strategy)
+            backtester = PortfolioBacktester(
+                initial_capital=request.initial_capital,
+                max_weight=request.max_weight,
+                max_positions=request.max_positions,
+                rebalance=_parse_timeframe(request.rebalance),
+                commission=request.commission
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        benchmark = _benchmark_index(request.benchmark)
+        
+        # 在开始日期之前多取指标预热需要的交易日
+        warmup = technical_analyzer.warmup_period(
+            SIGNAL_COLUMNS if strategy is None else
+            strategy.required_columns() & set(technical_analyzer.registry.columns())
+        )
+        panel = load_market_panel(db, request.codes, start_date=start_dt, end_date=end_dt, warmup=warmup)
+        start = int(np.searchsorted(panel.dates, np.datetime64(start_dt)))
+        if not panel.codes or start >= len(panel.dates):
+            raise HTTPException(status_code=404, detail="没有找到股票数据")
+        
+        signals = compute_panel_signals(panel, technical_analyzer, strategy)
+        results = backtester.run(panel, signals['signal'], signals['strength'], start=start)
+        
+        equity = results['equity_curve']
+        curve = [
+            {"date": d.isoformat(), "total_value": float(v), "positions": int(n), **rolling}
+            for d, v, n, rolling in zip(equity['date'], equity['total_value'], equity['positions'],
+                                        _rolling_records(equity))
+        ]
+        comparison = None
+        if benchmark:
+            comparison = _compare_benchmark(db, benchmark, equity['date'], equity['total_value'], "D")
+            for point, relative in zip(curve, comparison.pop('curve')):
+                point.update(benchmark_value=relative['benchmark_value'], excess_return=relative['excess_return'])
+        return {
+            "codes": len(panel.codes),
+            "period": f"{request.start_date} - {request.end_date}",
+            "rebalance": backtester.rebalance,
+            "metrics": results['metrics'],
+            "benchmark": comparison,
+            "holdings": results['holdings'],
+            "equity_curve": curve,
+            "summary": f"总收益率: {results['metrics']['total_return']:.2%}, 最大回撤: {results['metrics']['max_drawdown']:.2%}, 夏普比率: {results['metrics']['sharpe_ratio']:.2f}"
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"组合回测失败: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/{code}/backtest")
-async def run_backtest(
+def run_backtest(
     code: str,
     start_date: str = Query(..., description="开始日期，格式：20210101"),
     end_date: str = Query(..., description="结束日期，格式：20211231"),
     initial_capital: float = Query(100000, description="初始资金"),
+    timeframe: str = Query("D", description=TIMEFRAME_DESCRIPTION),
+    strategy: Optional[Dict[str, Any]] = Body(
+        None,
+        description='自定义信号策略，如 {"rules": [{"name": "rsi", "buy": "rsi < 30", "sell": "rsi > 70"}]}'
+    ),
+    monte_carlo: Optional[str] = Query(None, description="蒙特卡洛检验：trades 逐笔收益重抽样，blocks 日收益分块重抽样"),
+    simulations: int = Query(10000, ge=1, le=MAX_SIMULATIONS, description="蒙特卡洛重抽样次数"),
+    block_size: Optional[int] = Query(None, description="分块重抽样的块长度，默认为样本长度的立方根"),
+    stop_loss: Optional[float] = Query(None, description="止损比例，如0.05表示最低价跌破买入价5%时卖出"),
+    take_profit: Optional[float] = Query(None, description="止盈比例，如0.2表示最高价涨过买入价20%时卖出"),
+    trailing_stop: Optional[float] = Query(None, description="移动止损比例，如0.1表示从买入后最高价回落10%时卖出"),
+    watchlist_user: Optional[str] = Query(None, description="未指定止损/止盈比例时，使用该用户关注列表中的止损价和目标价"),
+    benchmark: Optional[str] = Query(None, description="基准指数（本地已同步），如 沪深300、sh000300、000300.SH"),
+    background: bool = Query(False, description="提交到后台回测任务队列，立即返回任务ID，结果通过 /jobs/{job_id} 查询"),
     db: Session = Depends(get_db)
 ):
     """运行回测"""
     try:
+        timeframe = _parse_timeframe(timeframe)
+        benchmark = _benchmark_index(benchmark)
+        
+        # 止损/止盈规则
+        if watchlist_user:
+            watched = _watchlist_stops(db, code, watchlist_user)
+            stop_loss = watched['stop_loss'] if stop_loss is None else stop_loss
+            take_profit = watched['take_profit'] if take_profit is None else take_profit
+        
+        if background:
+            try:
+                return backtest_queue.submit(
+                    'backtest',
+                    code=code,
+                    start_date=start_date,
+                    end_date=end_date,
+                    timeframe=timeframe,
+                    initial_capital=initial_capital,
+                    params={
+                        'strategy': strategy,
+                        'stop_loss': stop_loss,
+                        'take_profit': take_profit,
+                        'trailing_stop': trailing_stop,
+                        'monte_carlo': monte_carlo,
+                        'simulations': simulations,
+                        'block_size': block_size,
+                        'benchmark': benchmark,
+                    }
+                )
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        
+        try:
+            stops = BacktestEngine.stop_rules(stop_loss, take_profit, trailing_stop) or {}
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        # 解析自定义策略，默认使用内置的五条规则
+        signal_columns = SIGNAL_COLUMNS
+        signal_strategy = None
+        if strategy:
+            try:
+                signal_strategy = SignalStrategy.from_dict(strategy)
+                technical_analyzer.check_strategy(signal_strategy)
+                available = set(technical_analyzer.registry.columns())
+                signal_columns = sorted(signal_strategy.required_columns() & available)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        
         # 获取股票数据
-        daily_data = db.query(StockDaily).filter(
-            StockDaily.code == code,
-            StockDaily.date >= datetime.strptime(start_date, "%Y%m%d").date(),
-            StockDaily.date <= datetime.strptime(end_date, "%Y%m%d").date()
-        ).order_by(StockDaily.date).all()
+        df = bar_store.get_bars(
+            db, code, timeframe,
+            datetime.strptime(start_date, "%Y%m%d").date(),
+            datetime.strptime(end_date, "%Y%m%d").date()
+        )
         
-        if not daily_data:
+        if df.empty:
             raise HTTPException(status_code=404, detail="没有找到股票数据")
         
-        # 转换为DataFrame
-        df = pd.DataFrame([{
-            'date': d.date,
-            'open': d.open,
-            'high': d.high,
-            'low': d.low,
-            'close': d.close,
-            'volume': d.volume
-        } for d in daily_data])
-        
-        # 计算技术指标和信号
-        df_with_indicators = technical_analyzer.calculate_all_indicators(df)
-        df_with_signals = technical_analyzer.generate_signals(df_with_indicators)
+        # 只计算信号需要的技术指标
+        df_with_indicators = technical_analyzer.calculate_indicators(df, signal_columns)
+        df_with_signals = technical_analyzer.generate_signals(df_with_indicators, signal_strategy)
         
         # 运行回测
-        backtest_engine.initial_capital = initial_capital
-        results = backtest_engine.run_backtest(df_with_signals)
+        results = BacktestEngine(initial_capital).run_backtest(
+            df_with_signals,
+            periods_per_year=periods_per_year(timeframe),
+            **stops
+        )
+        
+        robustness = None
+        if monte_carlo:
+            try:
+                robustness = MonteCarloSimulator(simulations).run(
+                    results, monte_carlo, block_size, periods_per_year(timeframe)
+                )
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        
+        comparison = None
+        if benchmark:
+            history = results['capital_history']
+            comparison = _compare_benchmark(
+                db, benchmark, [h['date'] for h in history], [h['total_value'] for h in history], timeframe
+            )
         
         return {
             "code": code,
             "period": f"{start_date} - {end_date}",
+            "timeframe": timeframe,
             "metrics": {
                 "total_return": results['total_return'],
                 "win_rate": results['win_rate'],
                 "max_drawdown": results['max_drawdown'],
                 "sharpe_ratio": results['sharpe_ratio'],
                 "total_trades": results['total_trades'],
-                "final_value": results['final_value']
+                "final_value": results['final_value'],
+                "annual_return": results.get('annual_return', 0),
+                "sortino_ratio": results.get('sortino_ratio', 0),
+                "calmar_ratio": results.get('calmar_ratio', 0),
+                "max_drawdown_duration": results.get('max_drawdown_duration', 0),
+                "time_in_market": results.get('time_in_market', 0)
             },
             "trades": results.get('trades', [])[:20],  # 返回最近20笔交易
+            "rolling_window": results.get('rolling_window'),
+            "equity_curve": [
+                {"date": h['date'], "total_value": h['total_value'],
+                 **{c: h.get(c) for c in performance.ROLLING_COLUMNS}}
+                for h in results.get('capital_history', [])
+            ],
+            "stops": stops or None,
+            "benchmark": comparison,
+            "monte_carlo": robustness,
             "summary": f"总收益率: {results['total_return']:.2%}, 胜率: {results['win_rate']:.2%}, 最大回撤: {results['max_drawdown']:.2%}"
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/{code}/optimize")
+def optimize_strategy(
+    code: str,
+    request: OptimizeRequest,
+    start_date: str = Query(..., description="开始日期，格式：20210101"),
+    end_date: str = Query(..., description="结束日期，格式：20211231"),
+    initial_capital: float = Query(100000, description="初始资金"),
+    timeframe: str = Query("D", description=TIMEFRAME_DESCRIPTION),
+    db: Session = Depends(get_db)
+):
+    """
+    优化默认信号策略的参数
+    
+    params 为参数搜索空间，如 {"ma_fast": [5, 10], "ma_slow": {"min": 20, "max": 60, "step": 10}}，
+    method 可选 grid（网格）、random（随机）、refine（随机后逐步细化）
+    """
+    try:
+        timeframe = _parse_timeframe(timeframe)
+        
+        df = bar_store.get_bars(
+            db, code, timeframe,
+            datetime.strptime(start_date, "%Y%m%d").date(),
+            datetime.strptime(end_date, "%Y%m%d").date()
+        )
+        if df.empty:
+            raise HTTPException(status_code=404, detail="没有找到股票数据")
+        
+        optimizer = StrategyOptimizer(initial_capital=initial_capital)
+        try:
+            result = optimizer.optimize(
+                df,
+                request.params,
+                method=request.method,
+                n_samples=request.n_samples,
+                metric=request.metric,
+                top=request.top,
+                periods_per_year=periods_per_year(timeframe),
+                seed=request.seed
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        return {
+            "code": code,
+            "period": f"{start_date} - {end_date}",
+            "timeframe": timeframe,
+            **result
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"优化股票 {code} 策略参数失败: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/{code}/walk-forward")
+def walk_forward_analysis(
+    code: str,
+    request: WalkForwardRequest,
+    start_date: str = Query(..., description="开始日期，格式：20210101"),
+    end_date: str = Query(..., description="结束日期，格式：20211231"),
+    initial_capital: float = Query(100000, description="初始资金"),
+    timeframe: str = Query("D", description=TIMEFRAME_DESCRIPTION),
+    db: Session = Depends(get_db)
+):
+    """
+    滚动前推分析：在每个训练窗口上优化参数，在随后的测试窗口上做样本外回测
+    
+    params 格式同参数优化接口，train_bars / test_bars 为训练、测试窗口的K线数，
+    anchored 为 true 时训练窗口固定从区间起点开始
+    """
+    try:
+        timeframe = _parse_timeframe(timeframe)
+        
+        df = bar_store.get_bars(
+            db, code, timeframe,
+            datetime.strptime(start_date, "%Y%m%d").date(),
+            datetime.strptime(end_date, "%Y%m%d").date()
+        )
+        if df.empty:
+            raise HTTPException(status_code=404, detail="没有找到股票数据")
+        
+        analyzer = WalkForwardAnalyzer(initial_capital=initial_capital)
+        try:
+            result = analyzer.run(
+                df,
+                request.params,
+                train_bars=request.train_bars,
+                test_bars=request.test_bars,
+                step=request.step,
+                anchored=request.anchored,
+                method=request.method,
+                n_samples=request.n_samples,
+                metric=request.metric,
+                periods_per_year=periods_per_year(timeframe),
+                seed=request.seed
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        curve = result.pop('equity_curve')
+        return {
+            "code": code,
+            "period": f"{start_date} - {end_date}",
+            "timeframe": timeframe,
+            **result,
+            "equity_curve": [
+                {"date": d.isoformat(), "total_value": float(v), **rolling}
+                for d, v, rolling in zip(curve['date'], curve['total_value'], _rolling_records(curve))
+            ]
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"股票 {code} 滚动前推分析失败: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/{code}/signals")
 async def get_trade_signals(
     code: str,
-    days: int = Query(30, description="最近天数"),
+    days: int = Query(30, description="最近K线数"),
+    timeframe: str = Query("D", description=TIMEFRAME_DESCRIPTION),
     db: Session = Depends(get_db)
 ):
     """获取交易信号"""
     try:
-        # 获取最近的股票数据
-        daily_data = db.query(StockDaily).filter(
-            StockDaily.code == code
-        ).order_by(StockDaily.date.desc()).limit(days + 60).all()  # 多获取一些数据用于计算指标
+        timeframe = _parse_timeframe(timeframe)
+        
+        # 获取最近的股票数据，按指标预热长度多取一些用于计算指标
+        warmup = technical_analyzer.warmup_period(SIGNAL_COLUMNS)
+        
+        df = None
+        if is_daily(timeframe):
+            # 先只查询日期，命中缓存时不需要加载行情数据
+            bar_dates = [d for (d,) in db.query(StockDaily.date).filter(
+                StockDaily.code == code
+            ).order_by(StockDaily.date.desc()).limit(days + warmup).all()]
+            window = (bar_dates[-1], bar_dates[0]) if bar_dates else None
+        else:
+            df = bar_store.get_bars(db, code, timeframe).tail(days + warmup).reset_index(drop=True)
+            window = (df['date'].iloc[0], df['date'].iloc[-1]) if not df.empty else None
         
-        if not daily_data:
+        if window is None:
             raise HTTPException(status_code=404, detail="没有找到股票数据")
         
-        # 转换为DataFrame并反转（因为是倒序查询的）
-        df = pd.DataFrame([{
-            'date': d.date,
-            'open': d.open,
-            'high': d.high,
-            'low': d.low,
-            'close': d.close,
-            'volume': d.volume
-        } for d in reversed(daily_data)])
-        
-        # 计算技术指标和信号
-        df_with_indicators = technical_analyzer.calculate_all_indicators(df)
+        cache_key = indicator_cache.make_key(
+            code, window[0], window[1], window[1],
+            ('signals', timeframe, days, technical_analyzer.registry.fingerprint(SIGNAL_COLUMNS))
+        )
+        cached = indicator_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        if df is None:
+            df = bar_store.get_bars(db, code, timeframe, start_date=window[0])
+        
+        # 只计算信号需要的技术指标
+        df_with_indicators = technical_analyzer.calculate_indicators(df, SIGNAL_COLUMNS)
         df_with_signals = technical_analyzer.generate_signals(df_with_indicators)
         
         # 只返回最近的信号
@@ -243,11 +639,16 @@ async def get_trade_signals(
                     }
                 })
         
-        return {
+        result = {
             "code": code,
             "total_signals": len(signals),
             "signals": signals,
             "latest_signal": signals[-1] if signals else None
         }
+        indicator_cache.put(cache_key, result)
+        
+        return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
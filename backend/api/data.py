@@ -3,12 +3,20 @@
 """
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from datetime import datetime
+import json
 import logging
 
-from backend.database import get_db, Stock, StockDaily
+from backend.database import get_db, Stock, StockDaily, PredictionAccuracy
 from backend.data_collector import AkShareCollector, TushareCollector
 from backend.config import settings
+from backend.jobs import (
+    precompute_indicators, run_batch_analysis, BatchRunner, backfill_predictions, track_predictions, train_model
+)
+from backend.ai_models import ml_predictor
+from backend.ai_models.ml_predictor import MODEL_TYPES
+from backend.analysis.benchmark import index_store, normalize_index_code
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -105,6 +113,156 @@ async def update_stock_daily(
         logger.error(f"更新股票{code}日线数据失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/update/index/{index_code}")
+async def update_index_daily(
+    index_code: str,
+    db: Session = Depends(get_db)
+):
+    """增量同步指数日线到本地（回测基准只读本地数据）"""
+    try:
+        try:
+            code = normalize_index_code(index_code)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        added = index_store.sync(db, code)
+        dates, _ = index_store.series(db, code)
+        return {
+            "message": f"指数{code}日线数据同步成功",
+            "added": added,
+            "total": len(dates),
+            "latest_date": str(dates[-1]) if len(dates) else None
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"同步指数{index_code}日线数据失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/precompute/indicators")
+async def trigger_precompute_indicators(
+    background_tasks: BackgroundTasks,
+    full: bool = False
+):
+    """在后台预计算全市场技术指标"""
+    background_tasks.add_task(precompute_indicators, None, full)
+    return {"message": "技术指标预计算任务已提交", "full": full}
+
+@router.post("/batch/run")
+async def trigger_batch_analysis(
+    background_tasks: BackgroundTasks,
+    full: bool = False,
+    workers: Optional[int] = None
+):
+    """在后台用多进程批量分析全市场（指标、信号、形态）"""
+    background_tasks.add_task(run_batch_analysis, None, full, workers)
+    return {"message": "全市场批量分析任务已提交", "full": full, "workers": workers}
+
+@router.post("/predictions/backfill")
+async def trigger_prediction_backfill(
+    background_tasks: BackgroundTasks,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None
+):
+    """在后台回填全市场历史价格预测（连同实际收盘价写入 prediction_results）"""
+    try:
+        start = datetime.strptime(start_date, "%Y%m%d").date() if start_date else None
+        end = datetime.strptime(end_date, "%Y%m%d").date() if end_date else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="日期格式错误，应为 YYYYMMDD")
+    background_tasks.add_task(backfill_predictions, None, start, end)
+    return {"message": "历史预测回填任务已提交", "start_date": start_date, "end_date": end_date}
+
+@router.post("/predictions/track")
+async def trigger_prediction_tracking(background_tasks: BackgroundTasks):
+    """在后台回填预测实际值、记录当天预测并更新准确率统计"""
+    background_tasks.add_task(track_predictions)
+    return {"message": "预测跟踪任务已提交"}
+
+@router.get("/predictions/accuracy")
+async def get_prediction_accuracy(
+    model_name: Optional[str] = None,
+    window_days: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """各模型的滚动准确率和置信度校准（预测跟踪任务预先汇总的结果）"""
+    query = db.query(PredictionAccuracy)
+    if model_name is not None:
+        query = query.filter(PredictionAccuracy.model_name == model_name)
+    if window_days is not None:
+        query = query.filter(PredictionAccuracy.window_days == window_days)
+    rows = query.order_by(
+        PredictionAccuracy.model_name, PredictionAccuracy.prediction_type, PredictionAccuracy.window_days
+    ).all()
+    return {
+        "count": len(rows),
+        "accuracy": [
+            {
+                "model_name": r.model_name,
+                "prediction_type": r.prediction_type,
+                "window_days": r.window_days,
+                "as_of": r.as_of,
+                "count": r.count,
+                "direction_accuracy": r.direction_accuracy,
+                "mean_confidence": r.mean_confidence,
+                "mean_abs_pct_error": r.mean_abs_pct_error,
+                "calibration": json.loads(r.calibration) if r.calibration else []
+            }
+            for r in rows
+        ]
+    }
+
+@router.post("/models/train")
+async def trigger_model_training(
+    background_tasks: BackgroundTasks,
+    model_type: Optional[str] = None
+):
+    """在后台用全市场数据训练涨跌预测模型（时间序列交叉验证，新版本保存到模型仓库）"""
+    if model_type is not None and model_type not in MODEL_TYPES:
+        raise HTTPException(status_code=400, detail=f"不支持的模型类型: {model_type}，可选: {', '.join(MODEL_TYPES)}")
+    background_tasks.add_task(train_model, None, model_type)
+    return {"message": "模型训练任务已提交", "model_type": model_type or settings.ml_model_type}
+
+@router.get("/models")
+async def list_model_versions():
+    """模型仓库中涨跌预测模型的各个版本及交叉验证指标"""
+    return {
+        "name": ml_predictor.name,
+        "loaded": ml_predictor.info().get('version'),
+        "versions": ml_predictor.registry.versions(ml_predictor.name)
+    }
+
+@router.get("/models/scores")
+def get_model_scores(
+    limit: int = 50,
+    db: Session = Depends(get_db)
+):
+    """用当前模型对全市场最新交易日一次打分，返回上涨概率最高的股票"""
+    try:
+        scores = ml_predictor.predict_market(db)
+        return {
+            "version": ml_predictor.info().get('version'),
+            "horizon": ml_predictor.info().get('horizon'),
+            "scored": len(scores),
+            "scores": scores.head(limit).to_dict(orient='records')
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"模型打分失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/batch/results")
+async def get_batch_results(signal_only: bool = True):
+    """获取最近一次批量分析的最新信号和形态"""
+    results = BatchRunner().results()
+    latest = results['latest']
+    if signal_only:
+        latest = {code: s for code, s in latest.items() if s['signal'] != 0}
+    return {
+        "signals": latest,
+        "patterns": results['patterns']
+    }
+
 @router.get("/status")
 async def get_data_status(db: Session = Depends(get_db)):
     """获取数据状态"""
@@ -10,8 +10,10 @@ from datetime import datetime, timedelta
 from PIL import Image
 import io
 
-from backend.database import get_db, StockDaily, TechnicalIndicator, Stock
+from backend.database import get_db, StockDaily, Stock
 from backend.ai_models import GeminiAnalyzer, GeminiFastAnalyzer
+from backend.ai_models.gemini_analyzer import SIGNAL_FEATURES, quick_signal_inputs
+from backend.analysis.feature_store import feature_store, FEATURE_BARS
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -20,6 +22,9 @@ logger = logging.getLogger(__name__)
 gemini_analyzer = GeminiAnalyzer()
 gemini_fast = GeminiFastAnalyzer()
 
+# 综合分析提供给 Gemini 的技术指标
+TECHNICAL_FEATURES = ['rsi', 'macd', 'ma5', 'ma20', 'kdj_k']
+
 
 @router.post("/{code}/comprehensive")
 async def gemini_comprehensive_analysis(
@@ -36,44 +41,21 @@ async def gemini_comprehensive_analysis(
         if not stock:
             raise HTTPException(status_code=404, detail=f"股票 {code} 不存在")
         
-        # 获取历史数据
+        # 获取历史数据及技术指标（特征库中与关注股票分析共用同一份计算结果）
         end_date = datetime.now().date()
         start_date = end_date - timedelta(days=days)
         
-        daily_data = db.query(StockDaily).filter(
-            StockDaily.code == code,
-            StockDaily.date >= start_date,
-            StockDaily.date <= end_date
-        ).order_by(StockDaily.date).all()
+        features = feature_store.features(db, code, TECHNICAL_FEATURES, bars=max(FEATURE_BARS, days))
+        df = features[features['date'] >= start_date].reset_index(drop=True)
         
-        if not daily_data:
+        if df.empty:
             raise HTTPException(status_code=404, detail=f"股票 {code} 没有历史数据")
         
-        # 转换为 DataFrame
-        df = pd.DataFrame([{
-            'date': d.date,
-            'open': float(d.open) if d.open else 0,
-            'high': float(d.high) if d.high else 0,
-            'low': float(d.low) if d.low else 0,
-            'close': float(d.close) if d.close else 0,
-            'volume': float(d.volume) if d.volume else 0,
-            'change_pct': float(d.change_pct) if d.change_pct else 0
-        } for d in daily_data])
-        
-        # 获取最新技术指标
-        latest_indicator = db.query(TechnicalIndicator).filter(
-            TechnicalIndicator.code == code
-        ).order_by(TechnicalIndicator.date.desc()).first()
-        
-        technical_data = None
-        if latest_indicator:
-            technical_data = {
-                'rsi': float(latest_indicator.rsi) if latest_indicator.rsi else None,
-                'macd': float(latest_indicator.macd) if latest_indicator.macd else None,
-                'ma5': float(latest_indicator.ma5) if latest_indicator.ma5 else None,
-                'ma20': float(latest_indicator.ma20) if latest_indicator.ma20 else None,
-                'kdj_k': float(latest_indicator.kdj_k) if latest_indicator.kdj_k else None
-            }
+        latest = df.iloc[-1]
+        technical_data = {
+            column: float(latest[column]) if pd.notna(latest[column]) else None
+            for column in TECHNICAL_FEATURES
+        }
         
         # 调用 Gemini 分析
         result = gemini_analyzer.analyze_stock_comprehensive(
@@ -90,7 +72,7 @@ async def gemini_comprehensive_analysis(
                 "name": stock.name
             },
             "gemini_analysis": result,
-            "data_points": len(daily_data),
+            "data_points": len(df),
             "period": f"{start_date} 至 {end_date}"
         }
         
@@ -136,30 +118,16 @@ async def get_quick_signal(
     获取快速交易信号
     """
     try:
-        # 获取最新数据
-        latest = db.query(StockDaily).filter(
-            StockDaily.code == code
-        ).order_by(StockDaily.date.desc()).first()
+        # 获取最新数据及技术指标
+        latest = feature_store.latest(db, code, SIGNAL_FEATURES)
         
-        if not latest:
+        if latest is None:
             raise HTTPException(status_code=404, detail=f"股票 {code} 没有数据")
         
-        # 获取最新技术指标
-        indicator = db.query(TechnicalIndicator).filter(
-            TechnicalIndicator.code == code,
-            TechnicalIndicator.date == latest.date
-        ).first()
-        
-        latest_data = {
-            'price': float(latest.close) if latest.close else 0,
-            'change_pct': float(latest.change_pct) if latest.change_pct else 0,
-            'volume_ratio': 1.0,  # 需要计算
-            'rsi': float(indicator.rsi) if indicator and indicator.rsi else 50,
-            'macd': float(indicator.macd) if indicator and indicator.macd else 0
-        }
+        latest_data = quick_signal_inputs(latest)
         
         # 获取快速信号
-        signal = gemini_analyzer.quick_signal(code, latest_data)
+        signal = await gemini_analyzer.quick_signal_async(code, latest_data)
         
         return signal
         
@@ -194,8 +162,8 @@ async def batch_analyze_stocks(
                     'volume': float(latest.volume) if latest.volume else 0
                 })
         
-        # 批量分析
-        results = gemini_analyzer.batch_analyze(stock_list)
+        # 批量分析（各股票的请求并发进行）
+        results = await gemini_analyzer.batch_analyze_async(stock_list)
         
         return {
             "status": "success",
@@ -240,8 +208,8 @@ async def get_monitoring_alerts(
                 'volume_ratio': 1.0  # 需要计算
             })
         
-        # 监控异动
-        alerts = gemini_fast.monitor_realtime(stock_list)
+        # 监控异动（异动股票的信号请求并发进行）
+        alerts = await gemini_fast.monitor_realtime_async(stock_list)
         
         return {
             "status": "success",
@@ -0,0 +1,209 @@
+"""
+K线形态查询API路由
+
+查询全市场形态扫描（pattern_occurrences 表）的结果，不重新识别形态；
+以及事件研究（event_stats 表）统计的形态、信号出现后的远期收益分布；
+相似走势搜索在全市场历史窗口的索引中查找与某只股票最近走势相似的K线段
+"""
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from typing import Optional
+from datetime import datetime
+import logging
+
+from backend.database import get_db, Stock, PatternOccurrence, EventStat
+from backend.database.queries import load_daily_bars
+from backend.analysis.similarity import similarity_search
+from backend.ai_models.simple_predictor import PATTERN_INFO
+from backend.jobs.pattern_scanner import scan_patterns
+from backend.jobs.event_stats import refresh_event_stats
+from backend.jobs.similarity_index import build_similarity_index
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+def _check_pattern(pattern: Optional[str]):
+    """校验形态名称"""
+    if pattern is not None and pattern not in PATTERN_INFO:
+        raise HTTPException(status_code=400, detail=f"不支持的形态: {pattern}，可选 {', '.join(PATTERN_INFO)}")
+
+def _parse_date(value: Optional[str]):
+    if value is None:
+        return None
+    try:
+        return datetime.strptime(value, "%Y%m%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"日期格式错误: {value}，应为 YYYYMMDD")
+
+def _latest_date(db: Session):
+    """最近一次扫描到的最新交易日"""
+    latest = db.query(func.max(PatternOccurrence.date)).scalar()
+    if latest is None:
+        raise HTTPException(status_code=404, detail="还没有形态扫描结果，请先运行形态扫描")
+    return latest
+
+@router.get("/occurrences")
+def find_pattern_stocks(
+    pattern: str = Query(..., description="形态名称，如 morning_star、hammer、bullish_engulfing"),
+    date: Optional[str] = Query(None, description="日期，格式：20240105，默认为最新交易日"),
+    limit: int = Query(500, description="返回数量"),
+    db: Session = Depends(get_db)
+):
+    """某个交易日出现指定形态的股票"""
+    _check_pattern(pattern)
+    day = _parse_date(date) or _latest_date(db)
+    rows = db.query(PatternOccurrence.code, Stock.name).outerjoin(
+        Stock, Stock.code == PatternOccurrence.code
+    ).filter(
+        PatternOccurrence.pattern == pattern,
+        PatternOccurrence.date == day
+    ).order_by(PatternOccurrence.code).limit(limit).all()
+    signal, description = PATTERN_INFO[pattern]
+    return {
+        "pattern": pattern,
+        "signal": signal,
+        "description": description,
+        "date": day.isoformat(),
+        "count": len(rows),
+        "stocks": [{"code": code, "name": name} for code, name in rows]
+    }
+
+@router.get("/summary")
+def pattern_summary(
+    date: Optional[str] = Query(None, description="日期，格式：20240105，默认为最新交易日"),
+    db: Session = Depends(get_db)
+):
+    """某个交易日各形态出现的股票数"""
+    day = _parse_date(date) or _latest_date(db)
+    counts = dict(db.query(PatternOccurrence.pattern, func.count(PatternOccurrence.id)).filter(
+        PatternOccurrence.date == day
+    ).group_by(PatternOccurrence.pattern).all())
+    return {
+        "date": day.isoformat(),
+        "patterns": {name: counts.get(name, 0) for name in PATTERN_INFO}
+    }
+
+@router.post("/scan")
+async def trigger_pattern_scan(
+    background_tasks: BackgroundTasks,
+    full: bool = False
+):
+    """在后台扫描全市场K线形态（默认增量）"""
+    background_tasks.add_task(scan_patterns, None, full)
+    return {"message": "形态扫描任务已提交", "full": full}
+
+@router.get("/stats")
+def event_stats(
+    event: Optional[str] = Query(None, description="事件名称，如 bullish_engulfing、ma_signal_buy，默认全部"),
+    horizon: Optional[int] = Query(None, description="持有交易日数，默认全部"),
+    source: Optional[str] = Query(None, description="事件来源：pattern 或 signal"),
+    db: Session = Depends(get_db)
+):
+    """事件出现后的远期收益统计（命中率、收益分布）"""
+    query = db.query(EventStat)
+    if event is not None:
+        query = query.filter(EventStat.event == event)
+    if horizon is not None:
+        query = query.filter(EventStat.horizon == horizon)
+    if source is not None:
+        query = query.filter(EventStat.source == source)
+    rows = query.order_by(EventStat.source, EventStat.event, EventStat.horizon).all()
+    if not rows and event is None and horizon is None and source is None:
+        raise HTTPException(status_code=404, detail="还没有事件研究结果，请先运行事件研究")
+
+    events = {}
+    for r in rows:
+        item = events.setdefault(r.event, {
+            "event": r.event,
+            "source": r.source,
+            "signal": r.signal,
+            "description": PATTERN_INFO.get(r.event, (None, None))[1],
+            "start_date": r.start_date.isoformat() if r.start_date else None,
+            "end_date": r.end_date.isoformat() if r.end_date else None,
+            "horizons": []
+        })
+        item["horizons"].append({
+            "horizon": r.horizon,
+            "count": r.count,
+            "hit_rate": r.hit_rate,
+            "mean_return": r.mean_return,
+            "median_return": r.median_return,
+            "std_return": r.std_return,
+            "quantiles": {"p05": r.p05, "p25": r.p25, "p75": r.p75, "p95": r.p95},
+            "mean_excess": r.mean_excess,
+            "t_stat": r.t_stat
+        })
+    return {"count": len(events), "events": list(events.values())}
+
+@router.post("/stats/refresh")
+async def trigger_event_stats(
+    background_tasks: BackgroundTasks,
+    signals: bool = Query(True, description="是否统计交易信号事件（耗时较长）")
+):
+    """在后台重新统计全市场事件研究结果"""
+    background_tasks.add_task(refresh_event_stats, None, signals)
+    return {"message": "事件研究任务已提交", "signals": signals}
+
+@router.post("/similar/refresh")
+async def trigger_similarity_index(background_tasks: BackgroundTasks):
+    """在后台重建全市场相似走势索引"""
+    background_tasks.add_task(build_similarity_index)
+    return {"message": "相似走势索引任务已提交"}
+
+@router.get("/{code}/similar")
+def similar_windows(
+    code: str,
+    end_date: Optional[str] = Query(None, description="查询窗口的结束日期，格式：20240105，默认为最新交易日"),
+    k: int = Query(10, ge=1, le=100, description="返回的相似窗口数"),
+    probes: int = Query(4, ge=0, le=16, description="多探针查询每张哈希表额外探测的桶数，越多越准越慢"),
+    db: Session = Depends(get_db)
+):
+    """全市场历史上与这只股票最近 N 日价格、成交量走势最相似的K线段，以及这些K线段之后的涨跌"""
+    try:
+        index = similarity_search.index()
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=f"{e}，请先重建相似走势索引")
+    bars = load_daily_bars(db, code, end_date=_parse_date(end_date),
+                           columns=['date', 'close', 'volume'], limit=index.window)
+    if bars.empty:
+        raise HTTPException(status_code=404, detail=f"股票 {code} 没有日线数据")
+    try:
+        return similarity_search.query(code, bars, k=k, probes=probes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/{code}/history")
+def pattern_history(
+    code: str,
+    pattern: Optional[str] = Query(None, description="形态名称，默认全部形态"),
+    start_date: Optional[str] = Query(None, description="开始日期，格式：20210101"),
+    end_date: Optional[str] = Query(None, description="结束日期，格式：20211231"),
+    limit: int = Query(200, description="返回数量"),
+    db: Session = Depends(get_db)
+):
+    """某只股票的形态历史（按日期倒序）"""
+    _check_pattern(pattern)
+    query = db.query(PatternOccurrence).filter(PatternOccurrence.code == code)
+    if pattern is not None:
+        query = query.filter(PatternOccurrence.pattern == pattern)
+    start, end = _parse_date(start_date), _parse_date(end_date)
+    if start is not None:
+        query = query.filter(PatternOccurrence.date >= start)
+    if end is not None:
+        query = query.filter(PatternOccurrence.date <= end)
+    rows = query.order_by(PatternOccurrence.date.desc()).limit(limit).all()
+    return {
+        "code": code,
+        "pattern": pattern,
+        "count": len(rows),
+        "occurrences": [
+            {
+                "date": r.date.isoformat(),
+                "pattern": r.pattern,
+                "signal": r.signal,
+                "description": PATTERN_INFO.get(r.pattern, (None, None))[1]
+            }
+            for r in rows
+        ]
+    }
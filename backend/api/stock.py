@@ -9,6 +9,7 @@ import pandas as pd
 
 from backend.database import get_db, Stock, StockDaily, StockRealtime
 from backend.data_collector import AkShareCollector
+from backend.analysis.resample import bar_store
 from backend.schemas import StockInfo, StockDaily as StockDailySchema, StockRealtime as StockRealtimeSchema
 
 router = APIRouter()
@@ -92,6 +93,34 @@ async def get_stock_daily(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/{code}/bars")
+async def get_stock_bars(
+    code: str,
+    timeframe: str = Query("W", description="K线周期：D日线、W周线、M月线、ND每N个交易日（如5D）"),
+    start_date: Optional[str] = Query(None, description="开始日期，格式：20210101"),
+    end_date: Optional[str] = Query(None, description="结束日期，格式：20211231"),
+    db: Session = Depends(get_db)
+):
+    """获取多周期K线（由日线重采样，结果缓存并增量更新）"""
+    try:
+        df = bar_store.get_bars(
+            db, code, timeframe,
+            datetime.strptime(start_date, "%Y%m%d").date() if start_date else None,
+            datetime.strptime(end_date, "%Y%m%d").date() if end_date else None
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if df.empty:
+        raise HTTPException(status_code=404, detail="没有找到股票数据")
+    
+    df = df.astype(object).where(df.notna(), None)
+    return {
+        "code": code,
+        "timeframe": timeframe,
+        "bars": df.to_dict('records')
+    }
+
 @router.get("/{code}/realtime", response_model=StockRealtimeSchema)
 async def get_stock_realtime(
     code: str,
@@ -3,6 +3,7 @@
 """
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
+from sqlalchemy import func
 from typing import List, Optional
 from datetime import datetime
 import logging
@@ -10,8 +11,10 @@ import logging
 from backend.database import get_db, WatchList, Stock, StockDaily, StockRealtime
 from backend.schemas import WatchListItem, WatchListCreate, WatchListUpdate
 from backend.ai_models import SimplePricePredictor, PatternRecognizer
-from backend.analysis import TechnicalAnalyzer
-import pandas as pd
+from backend.analysis import TechnicalAnalyzer, DEFAULT_STRATEGY, load_market_panel
+from backend.analysis.event_study import load_event_stats
+from backend.analysis.feature_store import feature_store, FEATURE_BARS
+import numpy as np
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -20,6 +23,16 @@ logger = logging.getLogger(__name__)
 predictor = SimplePricePredictor()
 pattern_recognizer = PatternRecognizer()
 technical_analyzer = TechnicalAnalyzer()
+feature_store.watch(StockDaily)
+
+# 形态、信号历史表现所用的持有交易日数
+EVENT_HORIZON = 5
+
+# 批量趋势预测时每只股票加载的交易日数
+FORECAST_BARS = 60
+
+# 详细分析使用的特征：全部技术指标 + 价格预测特征
+ANALYSIS_FEATURES = technical_analyzer.registry.columns() + SimplePricePredictor.FEATURES
 
 @router.get("/list", response_model=List[WatchListItem])
 async def get_watch_list(
@@ -63,6 +76,40 @@ async def get_watch_list(
     
     return result
 
+@router.get("/forecast")
+async def forecast_watch_list(
+    user_id: str = Query("default", description="用户ID"),
+    days: int = Query(5, ge=1, le=60, description="预测天数"),
+    db: Session = Depends(get_db)
+):
+    """关注列表中所有股票的多日趋势预测（一次批量递推）"""
+    watch_list = db.query(WatchList).filter(
+        WatchList.user_id == user_id,
+        WatchList.is_active == True
+    ).order_by(WatchList.created_at.desc()).all()
+    codes = list(dict.fromkeys(item.code for item in watch_list))
+    if not codes:
+        return {"days": days, "count": 0, "forecasts": []}
+    
+    latest = db.query(func.max(StockDaily.date)).filter(StockDaily.code.in_(codes)).scalar()
+    if latest is None:
+        raise HTTPException(status_code=404, detail="关注的股票没有历史数据")
+    panel = load_market_panel(db, codes, start_date=latest, fields=['close'], warmup=FORECAST_BARS)
+    results = predictor.predict_trend_batch(panel['close'], days)
+    
+    names = {item.code: item.name for item in watch_list}
+    forecasts = []
+    for code, result in zip(panel.codes, results):
+        closes = panel['close'][panel.row(code)]
+        closes = closes[~np.isnan(closes)]
+        forecasts.append({
+            "code": code,
+            "name": names.get(code),
+            "current_price": float(closes[-1]) if len(closes) else None,
+            **result
+        })
+    return {"days": days, "count": len(forecasts), "forecasts": forecasts}
+
 @router.post("/add")
 async def add_to_watch_list(
     watch_item: WatchListCreate,
@@ -159,35 +206,36 @@ async def get_watch_stock_analysis(
     if not stock:
         raise HTTPException(status_code=404, detail="股票不存在")
     
-    # 获取最近60天的K线数据
-    daily_data = db.query(StockDaily).filter(
-        StockDaily.code == code
-    ).order_by(StockDaily.date.desc()).limit(60).all()
+    # 最近60天的K线数据及技术指标、预测特征（特征库中每个交易日只计算一次）
+    df = feature_store.features(db, code, ANALYSIS_FEATURES, bars=FEATURE_BARS)
     
-    if not daily_data:
+    if df.empty:
         raise HTTPException(status_code=404, detail="没有历史数据")
     
-    # 转换为DataFrame
-    df = pd.DataFrame([{
-        'date': d.date,
-        'open': d.open,
-        'high': d.high,
-        'low': d.low,
-        'close': d.close,
-        'volume': d.volume
-    } for d in reversed(daily_data)])
-    
     # 技术分析
-    df_with_indicators = technical_analyzer.calculate_all_indicators(df)
+    df_with_indicators = df
     df_with_signals = technical_analyzer.generate_signals(df_with_indicators)
     
-    # AI预测
+    # AI预测（直接使用特征库中的均线、成交量特征）
     prediction = predictor.predict_next_day(df)
     trend_prediction = predictor.predict_trend(df, days=5)
     
     # K线形态识别
     patterns = pattern_recognizer.detect_patterns(df)
     
+    # 全市场历史上同类形态、信号出现后的表现（事件研究任务的统计结果）
+    latest_signals = df_with_signals.iloc[-1]
+    signal_events = [
+        f"{name}_{'buy' if latest_signals[name] > 0 else 'sell'}"
+        for name in ['signal'] + [r.name for r in DEFAULT_STRATEGY.rules]
+        if name in df_with_signals and latest_signals[name] != 0
+    ]
+    history = load_event_stats(
+        db, [p['pattern'] for p in patterns[-5:]] + signal_events, EVENT_HORIZON
+    )
+    for p in patterns[-5:]:
+        p['history'] = history.get(p['pattern'])
+    
     # 生成详细的分析报告
     latest = df_with_indicators.iloc[-1]
     
@@ -209,7 +257,8 @@ async def get_watch_stock_analysis(
             "signal": int(df_with_signals.iloc[-1].get('signal_final', 0)),
             "strength": float(df_with_signals.iloc[-1].get('signal_strength', 0)),
             "ma_trend": "上升" if latest.get('ma5', 0) > latest.get('ma20', 0) else "下降",
-            "volume_trend": "放量" if latest.get('volume_ratio', 1) > 1.2 else "缩量"
+            "volume_trend": "放量" if latest.get('volume_ratio', 1) > 1.2 else "缩量",
+            "history": {event: history[event] for event in signal_events if event in history}
         },
         "ai_prediction": {
             "next_day": {
@@ -300,6 +349,14 @@ def generate_detailed_analysis(stock, latest, prediction, patterns, signals_df):
             pattern_analysis += "这是看跌信号，需要注意风险。"
         else:
             pattern_analysis += "市场处于震荡整理阶段。"
+        stats = recent_pattern.get('history')
+        if stats:
+            move = "下跌" if recent_pattern['signal'] == 'bearish' else "上涨"
+            pattern_analysis += (
+                f"历史上全市场出现该形态{stats['count']}次，"
+                f"之后{stats['horizon']}个交易日{move}的比例为{stats['hit_rate']:.0%}，"
+                f"平均收益{stats['mean_return']:.2%}。"
+            )
         analysis.append({"type": "形态分析", "content": pattern_analysis})
     
     # 6. 支撑压力分析
@@ -377,10 +434,14 @@ def generate_investment_suggestion(latest, prediction, signals_df, patterns):
     else:
         score -= confidence / 5
     
-    if patterns and patterns[-1]['signal'] == 'bullish':
-        score += 10
-    elif patterns and patterns[-1]['signal'] == 'bearish':
-        score -= 10
+    if patterns:
+        direction = {'bullish': 1, 'bearish': -1}.get(patterns[-1]['signal'], 0)
+        stats = patterns[-1].get('history')
+        if stats:
+            # 按该形态在全市场的历史命中率加权，命中率不超过50%的形态不加分
+            score += direction * min(max(stats['hit_rate'] - 0.5, 0), 0.2) * 50
+        else:
+            score += direction * 10
     
     # 生成建议
     if score > 70:
@@ -17,6 +17,8 @@ class Settings(BaseSettings):
     gemini_api_key: Optional[str] = Field(None, env="GEMINI_API_KEY")
     gemini_model_main: str = Field("gemini-2.5-pro", env="GEMINI_MODEL_MAIN")
     gemini_model_fast: str = Field("gemini-2.5-flash", env="GEMINI_MODEL_FAST")
+    gemini_timeout: float = Field(30, env="GEMINI_TIMEOUT")  # 快速信号单次请求超时（秒）
+    gemini_concurrency: int = Field(20, env="GEMINI_CONCURRENCY")  # 批量分析时同时进行的请求数上限
     
     # 数据库配置
     database_url: str = Field("sqlite:///./data/stock.db", env="DATABASE_URL")
@@ -28,6 +30,48 @@ class Settings(BaseSettings):
     # 数据更新配置
     update_interval: int = Field(3600, env="UPDATE_INTERVAL")  # 秒
     
+    # 指标缓存配置
+    indicator_cache_mb: int = Field(64, env="INDICATOR_CACHE_MB")  # 内存上限（MB）
+    
+    # 特征库配置
+    feature_cache_mb: int = Field(64, env="FEATURE_CACHE_MB")  # 内存上限（MB）
+    feature_store_persist: bool = Field(False, env="FEATURE_STORE_PERSIST")  # 是否持久化为 Parquet 文件（需要 pyarrow）
+    
+    # 收盘后预计算任务配置
+    precompute_enabled: bool = Field(False, env="PRECOMPUTE_ENABLED")
+    precompute_time: str = Field("15:30", env="PRECOMPUTE_TIME")  # HH:MM
+    
+    # 全市场批量分析配置
+    batch_workers: int = Field(0, env="BATCH_WORKERS")  # 进程数，0表示CPU核数
+    
+    # 策略参数优化配置
+    optimize_max_combinations: int = Field(20000, env="OPTIMIZE_MAX_COMBINATIONS")  # 一次优化评估的参数组合数上限
+    
+    # 回测任务队列配置
+    job_workers: int = Field(2, env="JOB_WORKERS")  # 执行回测任务的线程数
+    
+    # 回测基准指数配置
+    benchmark_indices: str = Field("sh000300,sh000001,sh000905", env="BENCHMARK_INDICES")  # 每日同步的指数，逗号分隔
+    
+    # 事件研究配置
+    event_horizons: str = Field("1,5,10,20", env="EVENT_HORIZONS")  # 统计的持有交易日数，逗号分隔
+    
+    # 预测跟踪配置
+    accuracy_windows: str = Field("20,60,250", env="ACCURACY_WINDOWS")  # 滚动准确率的统计窗口（交易日），逗号分隔
+    tracking_gemini_limit: int = Field(20, env="TRACKING_GEMINI_LIMIT")  # 每日记录 Gemini 快速信号的关注股票数上限，0表示不记录
+    
+    # 机器学习模型配置
+    ml_model_type: str = Field("hgb", env="ML_MODEL_TYPE")  # hgb / logistic / xgboost
+    ml_label_horizon: int = Field(5, env="ML_LABEL_HORIZON")  # 预测之后多少个交易日的涨跌
+    ml_train_days: int = Field(500, env="ML_TRAIN_DAYS")  # 训练样本覆盖最近多少个交易日
+    ml_cv_splits: int = Field(5, env="ML_CV_SPLITS")  # 时间序列交叉验证折数
+    ml_keep_versions: int = Field(5, env="ML_KEEP_VERSIONS")  # 模型仓库中每个模型保留的版本数
+    ml_train_enabled: bool = Field(False, env="ML_TRAIN_ENABLED")  # 是否在收盘后预计算时重新训练
+    
+    # 相似走势搜索配置
+    similarity_window: int = Field(20, env="SIMILARITY_WINDOW")  # 比较走势的窗口长度（交易日）
+    similarity_stride: int = Field(1, env="SIMILARITY_STRIDE")  # 历史窗口滑动的步长（交易日），越大索引越小
+    
     # 日志配置
     log_level: str = Field("INFO", env="LOG_LEVEL")
     
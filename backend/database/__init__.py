@@ -8,9 +8,14 @@ from .models import (
     StockRealtime,
     StockFinancial,
     TechnicalIndicator,
+    IndexDaily,
     PredictionResult,
+    PredictionAccuracy,
     TradeSignal,
-    WatchList
+    PatternOccurrence,
+    EventStat,
+    WatchList,
+    BacktestJob
 )
 
 __all__ = [
@@ -23,7 +28,12 @@ __all__ = [
     'StockRealtime',
     'StockFinancial',
     'TechnicalIndicator',
+    'IndexDaily',
     'PredictionResult',
+    'PredictionAccuracy',
     'TradeSignal',
-    'WatchList'
+    'PatternOccurrence',
+    'EventStat',
+    'WatchList',
+    'BacktestJob'
 ]
\ No newline at end of file
@@ -0,0 +1,255 @@
+"""
+批量写入工具
+
+按自然键批量 upsert，替代逐行 db.merge() 的写法。
+"""
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence
+import pandas as pd
+import numpy as np
+import logging
+
+from sqlalchemy import Index, inspect, text
+from sqlalchemy.orm import Session
+
+from .models import (
+    TechnicalIndicator, IndexDaily, PatternOccurrence, EventStat, PredictionResult, PredictionAccuracy
+)
+
+logger = logging.getLogger(__name__)
+
+# 各表的自然键：(唯一索引名, 键列)
+NATURAL_KEYS = {
+    TechnicalIndicator: ('uq_indicator_code_date', ('code', 'date')),
+    IndexDaily: ('uq_index_code_date', ('code', 'date')),
+    PatternOccurrence: ('uq_pattern_date_code', ('pattern', 'date', 'code')),
+    EventStat: ('uq_event_horizon', ('event', 'horizon')),
+    PredictionResult: ('uq_prediction_key', ('code', 'model_name', 'prediction_type', 'prediction_date')),
+    PredictionAccuracy: ('uq_accuracy_model_window', ('model_name', 'prediction_type', 'window_days')),
+}
+
+# technical_indicators 表中可写入的指标列
+INDICATOR_COLUMNS = [
+    'ma5', 'ma10', 'ma20', 'ma60', 'rsi',
+    'macd', 'macd_signal', 'macd_hist',
+    'bb_upper', 'bb_middle', 'bb_lower',
+    'kdj_k', 'kdj_d', 'kdj_j'
+]
+
+_ensured = set()
+_ensure_lock = threading.Lock()
+
+
+def ensure_unique_index(bind, model) -> None:
+    """
+    确保表上存在自然键唯一索引
+
+    旧版本创建的表没有唯一约束且可能有重复行，
+    这里先按自然键去重（保留id最大的一行），再补建唯一索引。
+    """
+    name, keys = NATURAL_KEYS[model]
+    table = model.__table__
+
+    existing = {ix['name'] for ix in inspect(bind).get_indexes(table.name)}
+    if name in existing:
+        return
+
+    key_sql = ', '.join(keys)
+    result = bind.execute(text(
+        f"DELETE FROM {table.name} WHERE id NOT IN ("
+        f"SELECT id FROM (SELECT MAX(id) AS id FROM {table.name} GROUP BY {key_sql}) AS keep)"
+    ))
+    if result.rowcount:
+        logger.info(f"{table.name} 去重删除 {result.rowcount} 行")
+
+    Index(name, *(table.c[k] for k in keys), unique=True).create(bind)
+    logger.info(f"已创建唯一索引 {name} ON {table.name}({key_sql})")
+
+
+def ensure_natural_keys(engine) -> None:
+    """为所有登记了自然键的表补建唯一索引"""
+    with engine.begin() as conn:
+        for model in NATURAL_KEYS:
+            ensure_unique_index(conn, model)
+
+
+def _ensure_once(db: Session, model) -> None:
+    """每个进程只检查一次唯一索引"""
+    if model in _ensured:
+        return
+    with _ensure_lock:
+        if model in _ensured:
+            return
+        ensure_unique_index(db.connection(), model)
+        _ensured.add(model)
+
+
+def bulk_upsert(db: Session,
+                model,
+                rows: Sequence[Dict],
+                batch_size: int = 500,
+                update_columns: Optional[Iterable[str]] = None) -> int:
+    """
+    按自然键批量插入或更新
+
+    参数:
+        db: 数据库会话（调用方负责提交）
+        model: ORM模型，必须在 NATURAL_KEYS 中登记
+        rows: 行数据字典列表
+        batch_size: 每批写入的行数
+        update_columns: 冲突时更新的列，默认为除自然键外的所有列
+
+    返回:
+        写入的行数
+    """
+    if not rows:
+        return 0
+
+    _ensure_once(db, model)
+    _, keys = NATURAL_KEYS[model]
+    table = model.__table__
+    if update_columns is None:
+        update_columns = [c for c in rows[0] if c not in keys and c != 'id']
+    update_columns = list(update_columns)
+    dialect = db.get_bind().dialect.name
+
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+
+        if dialect in ('sqlite', 'postgresql'):
+            if dialect == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert
+            stmt = insert(table)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(keys),
+                set_={c: stmt.excluded[c] for c in update_columns}
+            )
+            db.execute(stmt, batch)
+        elif dialect == 'mysql':
+            from sqlalchemy.dialects.mysql import insert
+            stmt = insert(table)
+            stmt = stmt.on_duplicate_key_update(
+                {c: stmt.inserted[c] for c in update_columns}
+            )
+            db.execute(stmt, batch)
+        else:
+            # 通用实现：先删除同键的行再插入
+            for row in batch:
+                db.query(model).filter(
+                    *(getattr(model, k) == row[k] for k in keys)
+                ).delete(synchronize_session=False)
+            db.execute(table.insert(), batch)
+
+    return len(rows)
+
+
+def dataframe_to_rows(df: pd.DataFrame, columns: List[str], **constants) -> List[Dict]:
+    """把DataFrame转换为写库用的行字典，NaN/inf转为None"""
+    columns = [c for c in columns if c in df.columns]
+    frame = df[columns].replace([np.inf, -np.inf], np.nan)
+    frame = frame.astype(object).where(frame.notna(), None)
+    records = frame.to_dict('records')
+    if constants:
+        for record in records:
+            record.update(constants)
+    return records
+
+
+def upsert_technical_indicators(db: Session,
+                                code: str,
+                                df: pd.DataFrame,
+                                batch_size: int = 500) -> int:
+    """
+    批量写入技术指标，按 (code, date) upsert
+
+    参数:
+        db: 数据库会话（调用方负责提交）
+        code: 股票代码
+        df: 包含 date 和指标列的DataFrame
+        batch_size: 每批写入的行数
+    """
+    rows = dataframe_to_rows(df, ['date'] + INDICATOR_COLUMNS, code=code)
+    return bulk_upsert(db, TechnicalIndicator, rows, batch_size=batch_size)
+
+
+def upsert_index_daily(db: Session,
+                       code: str,
+                       df: pd.DataFrame,
+                       batch_size: int = 500) -> int:
+    """
+    批量写入指数日线，按 (code, date) upsert
+
+    参数:
+        db: 数据库会话（调用方负责提交）
+        code: 指数代码
+        df: 包含 date、open、high、low、close、volume 列的DataFrame
+        batch_size: 每批写入的行数
+    """
+    rows = dataframe_to_rows(df, ['date', 'open', 'high', 'low', 'close', 'volume'], code=code)
+    return bulk_upsert(db, IndexDaily, rows, batch_size=batch_size)
+
+
+def upsert_pattern_occurrences(db: Session,
+                               df: pd.DataFrame,
+                               batch_size: int = 1000) -> int:
+    """
+    批量写入形态出现记录，按 (pattern, date, code) upsert
+
+    参数:
+        db: 数据库会话（调用方负责提交）
+        df: 包含 pattern、date、code、signal 列的DataFrame
+        batch_size: 每批写入的行数
+    """
+    rows = dataframe_to_rows(df, ['pattern', 'date', 'code', 'signal'])
+    return bulk_upsert(db, PatternOccurrence, rows, batch_size=batch_size)
+
+
+def upsert_event_stats(db: Session,
+                       df: pd.DataFrame,
+                       batch_size: int = 500) -> int:
+    """
+    批量写入事件研究统计，按 (event, horizon) upsert
+
+    参数:
+        db: 数据库会话（调用方负责提交）
+        df: 每行为一个事件在一个持有期上的统计，列同 event_stats 表
+        batch_size: 每批写入的行数
+    """
+    columns = [c.name for c in EventStat.__table__.columns if c.name != 'id']
+    rows = dataframe_to_rows(df, columns)
+    return bulk_upsert(db, EventStat, rows, batch_size=batch_size)
+
+
+def upsert_prediction_results(db: Session,
+                              df: pd.DataFrame,
+                              batch_size: int = 1000) -> int:
+    """
+    批量写入预测结果，按 (code, model_name, prediction_type, prediction_date) upsert
+
+    参数:
+        db: 数据库会话（调用方负责提交）
+        df: 包含 code、model_name、prediction_date、prediction_type、prediction_value、
+            confidence、actual_value 列的DataFrame（缺少的列不写入）
+        batch_size: 每批写入的行数
+    """
+    rows = dataframe_to_rows(df, ['code', 'model_name', 'prediction_date', 'prediction_type',
+                                  'prediction_value', 'confidence', 'actual_value'])
+    return bulk_upsert(db, PredictionResult, rows, batch_size=batch_size)
+
+
+def upsert_prediction_accuracy(db: Session,
+                               df: pd.DataFrame,
+                               batch_size: int = 500) -> int:
+    """
+    批量写入预测准确率统计，按 (model_name, prediction_type, window_days) upsert
+
+    参数:
+        db: 数据库会话（调用方负责提交）
+        df: 每行为一个模型在一个统计窗口上的准确率，列同 prediction_accuracy 表
+        batch_size: 每批写入的行数
+    """
+    columns = [c.name for c in PredictionAccuracy.__table__.columns if c.name != 'id']
+    rows = dataframe_to_rows(df, columns)
+    return bulk_upsert(db, PredictionAccuracy, rows, batch_size=batch_size)
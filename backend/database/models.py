@@ -116,7 +116,25 @@ class TechnicalIndicator(Base):
     created_at = Column(DateTime, default=func.now())
     
     __table_args__ = (
-        Index('idx_indicator_code_date', 'code', 'date'),
+        Index('uq_indicator_code_date', 'code', 'date', unique=True),
+    )
+
+class IndexDaily(Base):
+    """指数日线数据表（回测基准）"""
+    __tablename__ = "index_daily"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    code = Column(String(20), comment="指数代码")  # 如 sh000300
+    date = Column(Date, comment="交易日期")
+    open = Column(Float, comment="开盘点位")
+    high = Column(Float, comment="最高点位")
+    low = Column(Float, comment="最低点位")
+    close = Column(Float, comment="收盘点位")
+    volume = Column(Float, comment="成交量")
+    created_at = Column(DateTime, default=func.now())
+    
+    __table_args__ = (
+        Index('uq_index_code_date', 'code', 'date', unique=True),
     )
 
 class PredictionResult(Base):
@@ -135,6 +153,27 @@ class PredictionResult(Base):
     
     __table_args__ = (
         Index('idx_prediction_code_date', 'code', 'prediction_date'),
+        Index('uq_prediction_key', 'code', 'model_name', 'prediction_type', 'prediction_date', unique=True),
+    )
+
+class PredictionAccuracy(Base):
+    """预测准确率统计（按模型和滚动窗口预先汇总）"""
+    __tablename__ = "prediction_accuracy"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    model_name = Column(String(50), comment="模型名称")
+    prediction_type = Column(String(20), comment="预测类型")  # price, signal
+    window_days = Column(Integer, comment="统计窗口（交易日数）")
+    as_of = Column(Date, comment="统计截止日期")
+    count = Column(Integer, comment="有方向判断且已有实际值的预测数")
+    direction_accuracy = Column(Float, comment="涨跌方向准确率")
+    mean_confidence = Column(Float, comment="平均置信度（0-100）")
+    mean_abs_pct_error = Column(Float, comment="价格预测的平均绝对百分比误差")
+    calibration = Column(Text, comment="按置信度分组的准确率（JSON）")
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        Index('uq_accuracy_model_window', 'model_name', 'prediction_type', 'window_days', unique=True),
     )
 
 class TradeSignal(Base):
@@ -154,6 +193,50 @@ class TradeSignal(Base):
         Index('idx_signal_code_date', 'code', 'signal_date'),
     )
 
+class PatternOccurrence(Base):
+    """K线形态出现记录（全市场扫描结果）"""
+    __tablename__ = "pattern_occurrences"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    pattern = Column(String(30), comment="形态名称")
+    date = Column(Date, comment="出现日期")
+    code = Column(String(10), comment="股票代码")
+    signal = Column(String(10), comment="信号方向")  # bullish, bearish, neutral
+    created_at = Column(DateTime, default=func.now())
+    
+    __table_args__ = (
+        Index('uq_pattern_date_code', 'pattern', 'date', 'code', unique=True),
+        Index('idx_pattern_code_date', 'code', 'pattern', 'date'),
+    )
+
+class EventStat(Base):
+    """事件研究统计（形态、信号出现后的远期收益分布）"""
+    __tablename__ = "event_stats"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    event = Column(String(50), comment="事件名称")
+    source = Column(String(10), comment="事件来源")  # pattern, signal
+    signal = Column(String(10), comment="信号方向")  # bullish, bearish, neutral
+    horizon = Column(Integer, comment="持有交易日数")
+    count = Column(Integer, comment="样本数")
+    hit_rate = Column(Float, comment="命中率")
+    mean_return = Column(Float, comment="平均收益率")
+    median_return = Column(Float, comment="收益率中位数")
+    std_return = Column(Float, comment="收益率标准差")
+    p05 = Column(Float, comment="5%分位收益率")
+    p25 = Column(Float, comment="25%分位收益率")
+    p75 = Column(Float, comment="75%分位收益率")
+    p95 = Column(Float, comment="95%分位收益率")
+    mean_excess = Column(Float, comment="相对全市场平均的超额收益率")
+    t_stat = Column(Float, comment="平均收益t统计量")
+    start_date = Column(Date, comment="样本开始日期")
+    end_date = Column(Date, comment="样本结束日期")
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        Index('uq_event_horizon', 'event', 'horizon', unique=True),
+    )
+
 class WatchList(Base):
     """关注列表"""
     __tablename__ = "watch_list"
@@ -172,4 +255,29 @@ class WatchList(Base):
     
     __table_args__ = (
         Index('idx_watch_user_code', 'user_id', 'code'),
+    )
+
+class BacktestJob(Base):
+    """回测任务表"""
+    __tablename__ = "backtest_jobs"
+    
+    id = Column(String(32), primary_key=True, comment="任务ID")
+    job_hash = Column(String(64), comment="参数和数据版本的哈希，用于去重")
+    kind = Column(String(20), comment="任务类型")  # backtest, optimize, walk_forward, portfolio
+    code = Column(String(10), index=True, comment="股票代码（组合回测为空）")
+    params = Column(Text, comment="任务参数（JSON）")
+    data_version = Column(String(64), comment="提交时的数据版本")
+    status = Column(String(10), default="pending", comment="状态")  # pending, running, completed, failed
+    progress = Column(Float, default=0.0, comment="进度（0~1）")
+    message = Column(String(200), comment="当前阶段说明")
+    result = Column(Text, comment="回测结果（JSON）")
+    equity_curve = Column(Text, comment="资金曲线（JSON）")
+    error = Column(Text, comment="错误信息")
+    created_at = Column(DateTime, default=func.now())
+    started_at = Column(DateTime, comment="开始时间")
+    finished_at = Column(DateTime, comment="结束时间")
+    
+    __table_args__ = (
+        Index('uq_backtest_job_hash', 'job_hash', unique=True),
+        Index('idx_backtest_job_status', 'status', 'created_at'),
     )
\ No newline at end of file
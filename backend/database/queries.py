@@ -0,0 +1,74 @@
+"""
+常用数据查询
+"""
+from datetime import date
+from typing import List, Optional
+import pandas as pd
+
+from sqlalchemy.orm import Session
+
+from .models import StockDaily, TechnicalIndicator
+
+# 行情DataFrame的标准列
+OHLCV_COLUMNS = ['date', 'open', 'high', 'low', 'close', 'volume']
+
+
+def load_daily_bars(db: Session,
+                    code: str,
+                    start_date: Optional[date] = None,
+                    end_date: Optional[date] = None,
+                    columns: Optional[List[str]] = None,
+                    limit: Optional[int] = None) -> pd.DataFrame:
+    """
+    读取单只股票的日线数据（按日期升序）
+
+    只查询需要的列，不构造ORM对象。
+
+    参数:
+        db: 数据库会话
+        code: 股票代码
+        start_date: 开始日期（含）
+        end_date: 结束日期（含）
+        columns: 需要的列，默认为 OHLCV_COLUMNS
+        limit: 只取最近的N条（区间内按日期倒数）
+    """
+    columns = columns or OHLCV_COLUMNS
+    query = db.query(*(getattr(StockDaily, c) for c in columns)).filter(StockDaily.code == code)
+    if start_date is not None:
+        query = query.filter(StockDaily.date >= start_date)
+    if end_date is not None:
+        query = query.filter(StockDaily.date <= end_date)
+
+    if limit is not None:
+        rows = query.order_by(StockDaily.date.desc()).limit(limit).all()[::-1]
+    else:
+        rows = query.order_by(StockDaily.date).all()
+    df = pd.DataFrame(rows, columns=columns)
+    numeric = [c for c in columns if c != 'date']
+    df[numeric] = df[numeric].astype(float)
+    return df
+
+
+def load_technical_indicators(db: Session,
+                              code: str,
+                              start_date: date,
+                              end_date: date,
+                              columns: List[str]) -> pd.DataFrame:
+    """
+    读取单只股票预计算的技术指标（technical_indicators 表，按日期升序）
+
+    参数:
+        db: 数据库会话
+        code: 股票代码
+        start_date: 开始日期（含）
+        end_date: 结束日期（含）
+        columns: 指标列
+    """
+    rows = db.query(TechnicalIndicator.date, *(getattr(TechnicalIndicator, c) for c in columns)).filter(
+        TechnicalIndicator.code == code,
+        TechnicalIndicator.date >= start_date,
+        TechnicalIndicator.date <= end_date
+    ).order_by(TechnicalIndicator.date).all()
+    df = pd.DataFrame(rows, columns=['date'] + columns)
+    df[columns] = df[columns].astype(float)
+    return df
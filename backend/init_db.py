@@ -7,6 +7,7 @@ sys.path.append(str(Path(__file__).parent.parent))
 
 from backend.database import Base, engine
 from backend.database.models import *
+from backend.database.bulk import ensure_natural_keys
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -17,6 +18,8 @@ def init_database():
     try:
         # 创建所有表
         Base.metadata.create_all(bind=engine)
+        # 旧数据库补建自然键唯一索引
+        ensure_natural_keys(engine)
         logger.info("数据库初始化成功")
         logger.info(f"创建的表: {', '.join(Base.metadata.tables.keys())}")
     except Exception as e:
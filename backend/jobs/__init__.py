@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+后台任务模块
+"""
+from .scheduler import DailyScheduler
+from .precompute import precompute_indicators
+from .batch_runner import BatchRunner, run_batch_analysis
+from .backtest_queue import BacktestJobQueue, backtest_queue
+from .pattern_scanner import PatternScanner, scan_patterns
+from .event_stats import EventStatsBuilder, refresh_event_stats
+from .prediction_backfill import PredictionBackfill, backfill_predictions
+from .prediction_tracker import PredictionTracker, track_predictions
+from .model_training import ModelTrainer, train_model
+from .similarity_index import SimilarityIndexBuilder, build_similarity_index
+
+__all__ = [
+    'DailyScheduler',
+    'precompute_indicators',
+    'BatchRunner',
+    'run_batch_analysis',
+    'BacktestJobQueue',
+    'backtest_queue',
+    'PatternScanner',
+    'scan_patterns',
+    'EventStatsBuilder',
+    'refresh_event_stats',
+    'PredictionBackfill',
+    'backfill_predictions',
+    'PredictionTracker',
+    'track_predictions',
+    'ModelTrainer',
+    'train_model',
+    'SimilarityIndexBuilder',
+    'build_similarity_index'
+]
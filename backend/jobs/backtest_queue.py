@@ -0,0 +1,519 @@
+"""
+回测任务队列
+
+提交回测后立即返回任务ID，由后台线程池在请求之外执行（参数扫描类任务内部仍会使用进程池）。
+任务状态、进度、结果和资金曲线保存在 backtest_jobs 表中供轮询。
+任务参数和提交时的数据版本一起计算哈希：参数相同且行情未更新时直接返回已有任务，不重复计算。
+"""
+import hashlib
+import json
+import math
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import pandas as pd
+import numpy as np
+import logging
+
+from pydantic import ValidationError
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from backend.config import settings
+from backend.database import SessionLocal, StockDaily, BacktestJob
+from backend.analysis import (
+    TechnicalAnalyzer, BacktestEngine, SignalStrategy, StrategyOptimizer, WalkForwardAnalyzer,
+    PortfolioBacktester, SIGNAL_COLUMNS, performance
+)
+from backend.analysis.market_panel import load_market_panel
+from backend.analysis.portfolio import compute_panel_signals
+from backend.analysis.monte_carlo import MonteCarloSimulator, METHODS as MONTE_CARLO_METHODS, MAX_SIMULATIONS
+from backend.analysis.benchmark import index_store, normalize_index_code
+from backend.analysis.resample import bar_store, normalize_timeframe, periods_per_year
+from backend.schemas import OptimizeRequest, WalkForwardRequest, PortfolioBacktestRequest
+
+logger = logging.getLogger(__name__)
+
+JOB_KINDS = ('backtest', 'optimize', 'walk_forward', 'portfolio')
+
+# 这些状态的任务可以被相同参数的新提交复用，失败的任务会重新执行
+REUSABLE_STATUSES = ('pending', 'running', 'completed')
+
+# 进度写库的最小间隔（秒）
+PROGRESS_INTERVAL = 0.5
+
+
+def _plain(value: Any) -> Any:
+    """转换为可JSON序列化的值（numpy标量、日期、NaN/inf -> None）"""
+    if isinstance(value, dict):
+        return {str(k): _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, (datetime, date, pd.Timestamp)):
+        return value.isoformat()
+    return value
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(_plain(value), ensure_ascii=False, sort_keys=True)
+
+
+def data_version(db, codes: Optional[List[str]] = None) -> str:
+    """行情数据版本：最新日期和记录数，任一变化都说明数据有更新"""
+    query = db.query(func.max(StockDaily.date), func.count(StockDaily.id))
+    if codes is not None:
+        query = query.filter(StockDaily.code.in_(codes))
+    last_date, count = query.one()
+    return f"{last_date}:{count}"
+
+
+def job_hash(kind: str, code: Optional[str], spec: Dict, version: str) -> str:
+    """任务去重键：任务类型、股票、规范化后的参数和数据版本的哈希"""
+    payload = _dumps({'kind': kind, 'code': code, 'spec': spec, 'version': version})
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class _Progress:
+    """任务进度上报，按时间间隔节流写库"""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self._written = 0.0
+
+    def update(self, value: float, message: Optional[str] = None):
+        now = time.monotonic()
+        if message is None and now - self._written < PROGRESS_INTERVAL:
+            return
+        self._written = now
+        values = {'progress': round(min(max(value, 0.0), 1.0), 4)}
+        if message is not None:
+            values['message'] = message
+        db = SessionLocal()
+        try:
+            db.query(BacktestJob).filter(BacktestJob.id == self.job_id).update(values)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"更新任务 {self.job_id} 进度失败: {e}")
+        finally:
+            db.close()
+
+    def stage(self, message: str, start: float, end: float) -> Callable[[float], None]:
+        """进入一个阶段，返回把阶段内进度（0~1）映射到 [start, end] 的回调"""
+        self.update(start, message)
+        return lambda fraction: self.update(start + (end - start) * fraction)
+
+
+def _load_bars(db, code: str, spec: Dict) -> pd.DataFrame:
+    df = bar_store.get_bars(
+        db, code, spec['timeframe'],
+        datetime.strptime(spec['start_date'], "%Y%m%d").date(),
+        datetime.strptime(spec['end_date'], "%Y%m%d").date()
+    )
+    if df.empty:
+        raise ValueError("没有找到股票数据")
+    return df
+
+
+def _attach_benchmark(db, index: Optional[str], results: Dict, curve: List[Dict], ppy: float) -> None:
+    """把相对基准指数的指标写入结果，并在资金曲线上附加基准净值和超额收益"""
+    if not index or not curve:
+        return
+    comparison = index_store.compare(
+        db, index, [point['date'] for point in curve], [point['total_value'] for point in curve], ppy
+    )
+    results['benchmark'] = {'index': comparison['index'], 'metrics': comparison['metrics']}
+    relative = comparison['curve']
+    for point, value, excess in zip(curve, relative['benchmark_value'].tolist(), relative['excess_return'].tolist()):
+        point['benchmark_value'] = value
+        point['excess_return'] = excess
+
+
+def _run_backtest(db, code: str, spec: Dict, progress: _Progress) -> Tuple[Dict, List[Dict]]:
+    """单只股票回测"""
+    progress.update(0.05, "加载行情")
+    df = _load_bars(db, code, spec)
+
+    analyzer = TechnicalAnalyzer()
+    strategy = spec['params'].get('strategy')
+    strategy = SignalStrategy.from_dict(strategy) if strategy else None
+    columns = SIGNAL_COLUMNS
+    if strategy is not None:
+        columns = sorted(strategy.required_columns() & set(analyzer.registry.columns()))
+
+    progress.update(0.3, "计算指标和信号")
+    df = analyzer.generate_signals(analyzer.calculate_indicators(df, columns), strategy)
+
+    progress.update(0.7, "回测")
+    params = spec['params']
+    results = BacktestEngine(spec['initial_capital']).run_backtest(
+        df, periods_per_year=periods_per_year(spec['timeframe']), **(params.get('stops') or {})
+    )
+    if params.get('monte_carlo'):
+        progress.update(0.85, "蒙特卡洛检验")
+        results['monte_carlo'] = MonteCarloSimulator(params['simulations']).run(
+            results, params['monte_carlo'], params['block_size'], periods_per_year(spec['timeframe'])
+        )
+    curve = results.pop('capital_history', [])
+    _attach_benchmark(db, params.get('benchmark'), results, curve, periods_per_year(spec['timeframe']))
+    return results, curve
+
+
+def _run_optimize(db, code: str, spec: Dict, progress: _Progress) -> Tuple[Dict, List[Dict]]:
+    """参数优化，资金曲线为最优参数组合的回测结果"""
+    progress.update(0.05, "加载行情")
+    df = _load_bars(db, code, spec)
+    params = spec['params']
+    ppy = periods_per_year(spec['timeframe'])
+
+    optimizer = StrategyOptimizer(initial_capital=spec['initial_capital'])
+    result = optimizer.optimize(
+        df,
+        params['params'],
+        method=params['method'],
+        n_samples=params['n_samples'],
+        metric=params['metric'],
+        top=params['top'],
+        periods_per_year=ppy,
+        seed=params['seed'],
+        progress=progress.stage("参数扫描", 0.1, 0.95)
+    )
+
+    curve = []
+    if result['best'] is not None:
+        best = {k: result['best'][k] for k in params['params']}
+        context = optimizer.prepare(df, [best], ppy)
+        _, equity = context.backtest(best)
+        curve = pd.DataFrame({
+            'date': df['date'], 'total_value': equity, **performance.rolling_metrics(equity, ppy)
+        }).to_dict('records')
+    return result, curve
+
+
+def _run_walk_forward(db, code: str, spec: Dict, progress: _Progress) -> Tuple[Dict, List[Dict]]:
+    """滚动前推分析，资金曲线为拼接后的样本外曲线"""
+    progress.update(0.05, "加载行情")
+    df = _load_bars(db, code, spec)
+    params = dict(spec['params'])
+    space = params.pop('params')
+
+    result = WalkForwardAnalyzer(initial_capital=spec['initial_capital']).run(
+        df,
+        space,
+        periods_per_year=periods_per_year(spec['timeframe']),
+        progress=progress.stage("滚动前推", 0.1, 0.95),
+        **params
+    )
+    curve = result.pop('equity_curve')
+    return result, curve.to_dict('records')
+
+
+def _run_portfolio(db, code: Optional[str], spec: Dict, progress: _Progress) -> Tuple[Dict, List[Dict]]:
+    """多股票组合回测"""
+    params = spec['params']
+    strategy = SignalStrategy.from_dict(params['strategy']) if params.get('strategy') else None
+    backtester = PortfolioBacktester(
+        initial_capital=params['initial_capital'],
+        max_weight=params['max_weight'],
+        max_positions=params['max_positions'],
+        rebalance=normalize_timeframe(params['rebalance']),
+        commission=params['commission']
+    )
+
+    progress.update(0.05, "加载行情面板")
+    analyzer = TechnicalAnalyzer()
+    warmup = analyzer.warmup_period(
+        SIGNAL_COLUMNS if strategy is None else
+        strategy.required_columns() & set(analyzer.registry.columns())
+    )
+    start_dt = datetime.strptime(params['start_date'], "%Y%m%d").date()
+    end_dt = datetime.strptime(params['end_date'], "%Y%m%d").date()
+    panel = load_market_panel(db, params['codes'], start_date=start_dt, end_date=end_dt, warmup=warmup)
+    start = int(np.searchsorted(panel.dates, np.datetime64(start_dt)))
+    if not panel.codes or start >= len(panel.dates):
+        raise ValueError("没有找到股票数据")
+
+    signals = compute_panel_signals(panel, analyzer, strategy, progress.stage("计算信号面板", 0.1, 0.85))
+    progress.update(0.9, "组合回测")
+    results = backtester.run(panel, signals['signal'], signals['strength'], start=start)
+    summary = {
+        'codes': len(panel.codes),
+        'rebalance': backtester.rebalance,
+        'metrics': results['metrics'],
+        'holdings': results['holdings']
+    }
+    curve = results['equity_curve'].to_dict('records')
+    _attach_benchmark(db, params.get('benchmark'), summary, curve, periods_per_year('D'))
+    return summary, curve
+
+
+_RUNNERS = {
+    'backtest': _run_backtest,
+    'optimize': _run_optimize,
+    'walk_forward': _run_walk_forward,
+    'portfolio': _run_portfolio,
+}
+
+
+class BacktestJobQueue:
+    """回测任务队列"""
+
+    def __init__(self, workers: Optional[int] = None):
+        """
+        参数:
+            workers: 执行任务的线程数，默认取配置 JOB_WORKERS
+        """
+        self.workers = max(1, workers or settings.job_workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='backtest-job')
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def submit(self,
+               kind: str,
+               code: Optional[str] = None,
+               start_date: Optional[str] = None,
+               end_date: Optional[str] = None,
+               timeframe: str = "D",
+               initial_capital: Optional[float] = None,
+               params: Optional[Dict[str, Any]] = None) -> Dict:
+        """
+        提交回测任务
+
+        参数:
+            kind: 任务类型（backtest、optimize、walk_forward、portfolio）
+            code: 股票代码（组合回测不需要）
+            start_date: 开始日期，格式：20210101
+            end_date: 结束日期，格式：20211231
+            timeframe: K线周期
+            initial_capital: 初始资金，默认沿用各类回测自己的默认值
+            params: 任务参数，optimize/walk_forward/portfolio 分别同对应接口的请求体，
+                backtest 可传 {"strategy": {...}, "stop_loss": 0.05, "take_profit": 0.2, "trailing_stop": 0.1,
+                "monte_carlo": "blocks", "simulations": 10000, "benchmark": "沪深300"}
+
+        返回:
+            任务信息；相同参数且数据未更新的任务已存在时返回该任务（deduplicated 为 True）
+        """
+        spec = self._normalize(kind, code, start_date, end_date, timeframe, initial_capital, params or {})
+
+        db = SessionLocal()
+        try:
+            codes = spec['params']['codes'] if kind == 'portfolio' else [code]
+            version = data_version(db, codes)
+            digest = job_hash(kind, code, spec, version)
+
+            with self._lock:
+                job = db.query(BacktestJob).filter(BacktestJob.job_hash == digest).first()
+                if job is not None and job.status in REUSABLE_STATUSES:
+                    return self.describe(job, deduplicated=True)
+
+                if job is None:
+                    job = BacktestJob(id=uuid.uuid4().hex, job_hash=digest, kind=kind, code=code,
+                                      params=_dumps(spec), data_version=version)
+                    db.add(job)
+                job.status = 'pending'
+                job.progress = 0.0
+                job.message = None
+                job.result = None
+                job.equity_curve = None
+                job.error = None
+                job.started_at = None
+                job.finished_at = None
+                try:
+                    db.commit()
+                except IntegrityError:
+                    # 其他进程刚提交了相同的任务
+                    db.rollback()
+                    job = db.query(BacktestJob).filter(BacktestJob.job_hash == digest).one()
+                    return self.describe(job, deduplicated=True)
+
+            self._executor.submit(self._execute, job.id)
+            self.logger.info(f"已提交回测任务 {job.id}（{kind} {code or ''}）")
+            return self.describe(job)
+        finally:
+            db.close()
+
+    def get(self, job_id: str, include_result: bool = True) -> Optional[Dict]:
+        """查询任务状态，已完成的任务附带结果"""
+        db = SessionLocal()
+        try:
+            job = db.get(BacktestJob, job_id)
+            return self.describe(job, include_result=include_result) if job else None
+        finally:
+            db.close()
+
+    def equity_curve(self, job_id: str) -> Optional[List[Dict]]:
+        """已完成任务的资金曲线，任务不存在时返回None"""
+        db = SessionLocal()
+        try:
+            job = db.get(BacktestJob, job_id)
+            if job is None:
+                return None
+            return json.loads(job.equity_curve) if job.equity_curve else []
+        finally:
+            db.close()
+
+    def list_jobs(self, status: Optional[str] = None, code: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        """最近提交的任务（不含结果）"""
+        db = SessionLocal()
+        try:
+            query = db.query(BacktestJob)
+            if status:
+                query = query.filter(BacktestJob.status == status)
+            if code:
+                query = query.filter(BacktestJob.code == code)
+            jobs = query.order_by(BacktestJob.created_at.desc()).limit(limit).all()
+            return [self.describe(job, include_result=False) for job in jobs]
+        finally:
+            db.close()
+
+    def recover(self) -> int:
+        """重新排队上次退出时未完成的任务（启动时调用）"""
+        db = SessionLocal()
+        try:
+            jobs = db.query(BacktestJob).filter(BacktestJob.status.in_(('pending', 'running'))).all()
+            for job in jobs:
+                job.status = 'pending'
+                job.progress = 0.0
+            db.commit()
+            ids = [job.id for job in jobs]
+        finally:
+            db.close()
+        for job_id in ids:
+            self._executor.submit(self._execute, job_id)
+        if ids:
+            self.logger.info(f"重新排队 {len(ids)} 个未完成的回测任务")
+        return len(ids)
+
+    def shutdown(self, wait: bool = False):
+        """停止接收新任务，未开始的任务留在表中等待下次启动时恢复"""
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    @staticmethod
+    def describe(job: BacktestJob, include_result: bool = False, deduplicated: bool = False) -> Dict:
+        """任务信息"""
+        info = {
+            'job_id': job.id,
+            'kind': job.kind,
+            'code': job.code,
+            'status': job.status,
+            'progress': job.progress,
+            'message': job.message,
+            'error': job.error,
+            'data_version': job.data_version,
+            'params': json.loads(job.params) if job.params else None,
+            'created_at': job.created_at,
+            'started_at': job.started_at,
+            'finished_at': job.finished_at,
+        }
+        if deduplicated:
+            info['deduplicated'] = True
+        if include_result and job.result:
+            info['result'] = json.loads(job.result)
+        return info
+
+    def _normalize(self, kind, code, start_date, end_date, timeframe, initial_capital, params) -> Dict:
+        """校验并规范化任务参数（补齐默认值，保证相同含义的参数得到相同的哈希）"""
+        if kind not in JOB_KINDS:
+            raise ValueError(f"不支持的任务类型: {kind}，可选 {', '.join(JOB_KINDS)}")
+        if kind != 'portfolio' and not code:
+            raise ValueError("缺少股票代码")
+        for value in (start_date, end_date):
+            if value is None:
+                raise ValueError("缺少开始或结束日期")
+            datetime.strptime(value, "%Y%m%d")
+
+        try:
+            if kind == 'backtest':
+                strategy = params.get('strategy')
+                if strategy:
+                    TechnicalAnalyzer().check_strategy(SignalStrategy.from_dict(strategy))
+                monte_carlo = params.get('monte_carlo')
+                if monte_carlo and monte_carlo not in MONTE_CARLO_METHODS:
+                    raise ValueError(f"不支持的蒙特卡洛方法: {monte_carlo}")
+                simulations = int(params.get('simulations', 10000))
+                if not 1 <= simulations <= MAX_SIMULATIONS:
+                    raise ValueError(f"重抽样次数必须在 1 到 {MAX_SIMULATIONS} 之间")
+                params = {
+                    'strategy': strategy,
+                    'stops': BacktestEngine.stop_rules(
+                        params.get('stop_loss'), params.get('take_profit'), params.get('trailing_stop')
+                    ),
+                    'monte_carlo': monte_carlo or None,
+                    'simulations': simulations,
+                    'block_size': params.get('block_size'),
+                    'benchmark': normalize_index_code(params['benchmark']) if params.get('benchmark') else None,
+                }
+            elif kind == 'optimize':
+                params = OptimizeRequest(**params).model_dump()
+            elif kind == 'walk_forward':
+                params = WalkForwardRequest(**params).model_dump()
+            else:
+                values = {**params, 'start_date': start_date, 'end_date': end_date}
+                if initial_capital is not None:
+                    values['initial_capital'] = initial_capital
+                params = PortfolioBacktestRequest(**values).model_dump()
+                normalize_timeframe(params['rebalance'])
+                if params['strategy']:
+                    TechnicalAnalyzer().check_strategy(SignalStrategy.from_dict(params['strategy']))
+                if params['codes'] is not None:
+                    params['codes'] = sorted(set(params['codes']))
+                if params['benchmark']:
+                    params['benchmark'] = normalize_index_code(params['benchmark'])
+        except ValidationError as e:
+            raise ValueError(str(e))
+
+        if kind == 'portfolio':
+            initial_capital = params['initial_capital']
+        return {
+            'start_date': start_date,
+            'end_date': end_date,
+            'timeframe': normalize_timeframe(timeframe),
+            'initial_capital': float(initial_capital if initial_capital is not None else 100000),
+            'params': params,
+        }
+
+    def _execute(self, job_id: str):
+        """执行任务（在工作线程中运行）"""
+        db = SessionLocal()
+        job = None
+        try:
+            job = db.get(BacktestJob, job_id)
+            if job is None or job.status != 'pending':
+                return
+            job.status = 'running'
+            job.started_at = datetime.now()
+            db.commit()
+
+            started = time.time()
+            result, curve = _RUNNERS[job.kind](db, job.code, json.loads(job.params), _Progress(job_id))
+
+            db.refresh(job)
+            job.result = _dumps(result)
+            job.equity_curve = _dumps(curve)
+            job.status = 'completed'
+            job.progress = 1.0
+            job.message = None
+            job.finished_at = datetime.now()
+            db.commit()
+            self.logger.info(f"回测任务 {job_id} 完成，耗时 {time.time() - started:.2f} 秒")
+        except Exception as e:
+            db.rollback()
+            self.logger.error(f"回测任务 {job_id} 失败: {e}", exc_info=True)
+            if job is not None:
+                job.status = 'failed'
+                job.error = str(e)
+                job.finished_at = datetime.now()
+                db.commit()
+        finally:
+            db.close()
+
+
+# 全局任务队列
+backtest_queue = BacktestJobQueue()
@@ -0,0 +1,329 @@
+"""
+全市场批量分析任务
+
+把全市场日线整理为内存映射的行情面板，按股票切分为若干分片交给进程池并行计算
+技术指标、交易信号和K线形态。各进程直接把指标写入共享的内存映射结果文件，
+主进程在分片完成后批量写库并记录检查点，中断后重新运行会跳过已完成的分片。
+
+用法: python -m backend.jobs.batch_runner [--full] [--workers N]
+"""
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional
+import pandas as pd
+import numpy as np
+import logging
+
+from sqlalchemy import func
+
+from backend.config import settings
+from backend.database import SessionLocal, StockDaily, TechnicalIndicator
+from backend.database.bulk import INDICATOR_COLUMNS, upsert_technical_indicators
+from backend.analysis import TechnicalAnalyzer
+from backend.analysis.market_panel import MarketPanel, load_market_panel
+from backend.ai_models import PatternRecognizer
+
+logger = logging.getLogger(__name__)
+
+# 增量计算时在已计算日期之前额外加载的交易日数，保证EMA类指标充分收敛
+HISTORY_BARS = 250
+
+# 形态识别只扫描最近的K线数
+PATTERN_BARS = 60
+
+# 信号结果面板中的字段
+SIGNAL_FIELDS = ['signal', 'signal_strength', 'signal_final']
+
+_CHECKPOINT_FILE = 'checkpoint.json'
+_RESULTS_FILE = 'results.json'
+
+
+def _process_shard(work_dir: str, shard: int, start: int, stop: int) -> Dict:
+    """
+    计算一个分片（在子进程中运行）
+
+    从内存映射的行情面板读取 [start, stop) 行，计算结果写入共享的结果面板，
+    只把形态和最新信号这类小结果返回给主进程。
+    """
+    started = time.perf_counter()
+    work_dir = Path(work_dir)
+    panel = MarketPanel.open(work_dir / 'panel')
+    indicators = MarketPanel.open(work_dir / 'indicators', mmap_mode='r+')
+    signals = MarketPanel.open(work_dir / 'signals', mmap_mode='r+')
+    analyzer = TechnicalAnalyzer()
+    recognizer = PatternRecognizer()
+
+    bars = 0
+    latest = {}
+    patterns = []
+    for row in range(start, stop):
+        mask = ~np.isnan(panel['close'][row])
+        if not mask.any():
+            continue
+        df = panel.frame(row)
+        df = analyzer.calculate_indicators(df, INDICATOR_COLUMNS)
+        df = analyzer.generate_signals(df)
+        bars += len(df)
+
+        for column in INDICATOR_COLUMNS:
+            indicators[column][row, mask] = df[column].to_numpy(dtype=float)
+        for column in SIGNAL_FIELDS:
+            signals[column][row, mask] = df[column].to_numpy(dtype=float)
+
+        code = panel.codes[row]
+        last = df.iloc[-1]
+        latest[code] = {
+            'date': last['date'].isoformat(),
+            'signal': int(last['signal_final']),
+            'strength': float(last['signal_strength']),
+            'close': float(last['close'])
+        }
+        for pattern in recognizer.detect_patterns(df.tail(PATTERN_BARS).reset_index(drop=True)):
+            patterns.append({**pattern, 'code': code, 'date': pattern['date'].isoformat()})
+
+    for result in (indicators, signals):
+        for values in result.fields.values():
+            values.flush()
+
+    return {
+        'shard': shard,
+        'start': start,
+        'stop': stop,
+        'bars': bars,
+        'pid': os.getpid(),
+        'elapsed': round(time.perf_counter() - started, 3),
+        'latest': latest,
+        'patterns': patterns
+    }
+
+
+class BatchRunner:
+    """全市场批量分析"""
+
+    def __init__(self,
+                 workers: Optional[int] = None,
+                 shard_size: Optional[int] = None,
+                 work_dir: Optional[Path] = None):
+        """
+        参数:
+            workers: 进程数，默认为 settings.batch_workers（0表示CPU核数）
+            shard_size: 每个分片的股票数，默认按进程数的4倍均分
+            work_dir: 工作目录，存放行情面板、结果面板和检查点
+        """
+        self.workers = workers or settings.batch_workers or os.cpu_count() or 1
+        self.shard_size = shard_size
+        self.work_dir = Path(work_dir or settings.processed_data_dir / 'batch')
+        self.logger = logging.getLogger(__name__)
+
+    def run(self, codes: Optional[List[str]] = None, full: bool = False) -> Dict:
+        """
+        运行全市场批量分析
+
+        参数:
+            codes: 股票代码列表，None表示所有有日线数据的股票
+            full: 是否全量重算（默认只写入上次计算之后的新K线，并从检查点续跑）
+
+        返回:
+            任务统计信息，包括每个分片的耗时
+        """
+        started = time.time()
+        db = SessionLocal()
+        try:
+            last_done = {} if full else dict(
+                db.query(TechnicalIndicator.code, func.max(TechnicalIndicator.date))
+                .group_by(TechnicalIndicator.code).all()
+            )
+            version = self._data_version(db, codes)
+
+            checkpoint = None if full else self._load_checkpoint(version, codes)
+            if checkpoint is None:
+                start_date = self._history_start(db, last_done, codes)
+                panel = load_market_panel(db, codes, start_date=start_date)
+                checkpoint = self._prepare(panel, version, codes)
+            else:
+                panel = MarketPanel.open(self.work_dir / 'panel')
+                self.logger.info(f"从检查点续跑，已完成 {len(checkpoint['done'])}/{len(checkpoint['shards'])} 个分片")
+            load_elapsed = time.time() - started
+
+            pending = [s for s in checkpoint['shards'] if str(s[0]) not in checkpoint['done']]
+            rows = 0
+            write_elapsed = 0.0
+            if pending:
+                # 调度器在线程中运行本任务，用 spawn 启动子进程避免在多线程进程中 fork
+                with ProcessPoolExecutor(max_workers=min(self.workers, len(pending)),
+                                         mp_context=multiprocessing.get_context('spawn')) as pool:
+                    futures = [
+                        pool.submit(_process_shard, str(self.work_dir), shard, start, stop)
+                        for shard, start, stop in pending
+                    ]
+                    for future in as_completed(futures):
+                        result = future.result()
+                        write_started = time.perf_counter()
+                        rows += self._write_shard(db, panel, result, last_done)
+                        write_elapsed += time.perf_counter() - write_started
+                        self._record(checkpoint, result)
+
+            results = self.results()
+            timings = [checkpoint['done'][str(s[0])] for s in checkpoint['shards']]
+            stats = {
+                'codes': len(panel.codes),
+                'dates': len(panel.dates),
+                'workers': self.workers,
+                'shards': len(checkpoint['shards']),
+                'resumed_shards': len(checkpoint['shards']) - len(pending),
+                'rows': rows,
+                'signals': sum(1 for s in results['latest'].values() if s['signal'] != 0),
+                'patterns': len(results['patterns']),
+                'load_elapsed': round(load_elapsed, 2),
+                'write_elapsed': round(write_elapsed, 2),
+                'elapsed': round(time.time() - started, 2),
+                'shard_timings': timings
+            }
+            self.logger.info(
+                f"批量分析完成: {stats['codes']} 只股票，{stats['shards']} 个分片，"
+                f"写入 {rows} 行，耗时 {stats['elapsed']} 秒"
+            )
+            return stats
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def results(self) -> Dict:
+        """最近一次运行的最新信号和形态"""
+        path = self.work_dir / _RESULTS_FILE
+        if not path.exists():
+            return {'latest': {}, 'patterns': []}
+        return json.loads(path.read_text(encoding='utf-8'))
+
+    def signal_panel(self) -> MarketPanel:
+        """最近一次运行的信号面板（内存映射）"""
+        return MarketPanel.open(self.work_dir / 'signals')
+
+    def _data_version(self, db, codes: Optional[List[str]]) -> List:
+        """行情数据版本：最新日期和行数，数据变化后检查点失效"""
+        query = db.query(func.max(StockDaily.date), func.count(StockDaily.id))
+        if codes is not None:
+            query = query.filter(StockDaily.code.in_(codes))
+        last_date, count = query.one()
+        return [last_date.isoformat() if last_date else None, count]
+
+    def _history_start(self, db, last_done: Dict, codes: Optional[List[str]]) -> Optional[date]:
+        """增量计算时需要加载的最早日期"""
+        if not last_done:
+            return None
+        targets = codes if codes is not None else list(last_done)
+        if any(code not in last_done for code in targets):
+            return None
+        earliest = min(last_done[code] for code in targets)
+        return db.query(StockDaily.date).filter(
+            StockDaily.date <= earliest
+        ).distinct().order_by(StockDaily.date.desc()).offset(HISTORY_BARS).limit(1).scalar()
+
+    def _prepare(self, panel: MarketPanel, version: List, codes: Optional[List[str]]) -> Dict:
+        """写出行情面板、预分配结果面板并创建新的检查点"""
+        if self.work_dir.exists():
+            shutil.rmtree(self.work_dir)
+        panel.save(self.work_dir / 'panel')
+
+        for name, fields in (('indicators', INDICATOR_COLUMNS), ('signals', SIGNAL_FIELDS)):
+            MarketPanel.create(self.work_dir / name, panel.codes, panel.dates, fields)
+
+        n = len(panel.codes)
+        size = self.shard_size or max(1, -(-n // (self.workers * 4)))
+        shards = [[i, start, min(start + size, n)] for i, start in enumerate(range(0, n, size))]
+        checkpoint = {
+            'version': version,
+            'codes': codes,
+            'shards': shards,
+            'done': {}
+        }
+        self._save_checkpoint(checkpoint)
+        self._write_json(_RESULTS_FILE, {'latest': {}, 'patterns': []})
+        return checkpoint
+
+    def _write_shard(self, db, panel: MarketPanel, result: Dict, last_done: Dict) -> int:
+        """把分片的指标批量写入 technical_indicators 表"""
+        indicators = MarketPanel.open(self.work_dir / 'indicators')
+        rows = 0
+        for row in range(result['start'], result['stop']):
+            code = panel.codes[row]
+            if code not in result['latest']:
+                continue
+            mask = ~np.isnan(panel['close'][row])
+            df = pd.DataFrame({'date': panel.dates[mask].astype(object)})
+            for column in INDICATOR_COLUMNS:
+                df[column] = indicators[column][row, mask]
+            done = last_done.get(code)
+            if done is not None:
+                df = df[df['date'] > done]
+            rows += upsert_technical_indicators(db, code, df)
+        db.commit()
+        return rows
+
+    def _record(self, checkpoint: Dict, result: Dict):
+        """记录分片完成并合并小结果"""
+        results = json.loads((self.work_dir / _RESULTS_FILE).read_text(encoding='utf-8'))
+        results['latest'].update(result['latest'])
+        results['patterns'].extend(result['patterns'])
+        self._write_json(_RESULTS_FILE, results)
+
+        checkpoint['done'][str(result['shard'])] = {
+            'shard': result['shard'],
+            'codes': result['stop'] - result['start'],
+            'bars': result['bars'],
+            'pid': result['pid'],
+            'elapsed': result['elapsed']
+        }
+        self._save_checkpoint(checkpoint)
+        self.logger.info(
+            f"分片 {result['shard']} 完成（{result['stop'] - result['start']} 只股票，"
+            f"{result['bars']} 根K线，进程 {result['pid']}，耗时 {result['elapsed']} 秒）"
+        )
+
+    def _load_checkpoint(self, version: List, codes: Optional[List[str]]) -> Optional[Dict]:
+        """读取可续跑的检查点，数据版本或股票范围不一致时返回None"""
+        path = self.work_dir / _CHECKPOINT_FILE
+        if not path.exists():
+            return None
+        try:
+            checkpoint = json.loads(path.read_text(encoding='utf-8'))
+        except ValueError:
+            return None
+        if checkpoint.get('version') != version or checkpoint.get('codes') != codes:
+            return None
+        return checkpoint
+
+    def _save_checkpoint(self, checkpoint: Dict):
+        self._write_json(_CHECKPOINT_FILE, checkpoint)
+
+    def _write_json(self, name: str, value: Dict):
+        # 先写临时文件再替换，避免中断时留下损坏的文件，读取方也不会读到写了一半的内容
+        path = self.work_dir / name
+        tmp = path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(value, ensure_ascii=False), encoding='utf-8')
+        tmp.replace(path)
+
+
+def run_batch_analysis(codes: Optional[List[str]] = None,
+                       full: bool = False,
+                       workers: Optional[int] = None) -> Dict:
+    """运行全市场批量分析（供调度器和API调用）"""
+    return BatchRunner(workers=workers).run(codes, full)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    workers = None
+    if '--workers' in sys.argv:
+        workers = int(sys.argv[sys.argv.index('--workers') + 1])
+    stats = run_batch_analysis(full='--full' in sys.argv, workers=workers)
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
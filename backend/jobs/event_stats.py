@@ -0,0 +1,136 @@
+"""
+全市场事件研究
+
+按批加载全市场日线面板，统计每种K线形态和交易信号（如MA金叉）出现后 N 个交易日的收益分布，
+结果整体替换 event_stats 表，供关注股票分析给出基于历史数据的置信度。
+
+用法: python -m backend.jobs.event_stats [--no-signals]
+"""
+import json
+import sys
+import time
+from typing import Dict, List, Optional, Sequence
+import pandas as pd
+import logging
+
+from backend.config import settings
+from backend.database import SessionLocal, StockDaily, EventStat
+from backend.database.bulk import upsert_event_stats
+from backend.analysis.event_study import EventStudy, pattern_events, signal_events
+from backend.analysis.market_panel import load_market_panel
+
+logger = logging.getLogger(__name__)
+
+# 每批加载到面板中的股票数
+CHUNK_CODES = 500
+
+
+def event_horizons() -> List[int]:
+    """配置中的持有期列表"""
+    return [int(h) for h in settings.event_horizons.split(',') if h.strip()]
+
+
+class EventStatsBuilder:
+    """全市场事件研究统计"""
+
+    def __init__(self,
+                 horizons: Optional[Sequence[int]] = None,
+                 chunk_size: int = CHUNK_CODES,
+                 signals: bool = True):
+        """
+        参数:
+            horizons: 持有交易日数列表，默认为配置中的 EVENT_HORIZONS
+            chunk_size: 每批加载的股票数（控制面板占用的内存）
+            signals: 是否统计交易信号事件（需要逐只股票计算指标，比形态慢得多）
+        """
+        self.study = EventStudy(horizons or event_horizons())
+        self.chunk_size = chunk_size
+        self.signals = signals
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def to_frame(results: Dict[str, Dict], sources: Dict[str, str]) -> pd.DataFrame:
+        """把 EventStudy.results() 展开为每个 (事件, 持有期) 一行"""
+        records = []
+        for event, result in results.items():
+            for horizon, stats in result['horizons'].items():
+                records.append({
+                    'event': event,
+                    'source': sources.get(event),
+                    'signal': result['signal'],
+                    'horizon': horizon,
+                    'start_date': result['start_date'],
+                    'end_date': result['end_date'],
+                    **stats
+                })
+        return pd.DataFrame(records)
+
+    def run(self, codes: Optional[List[str]] = None) -> Dict:
+        """
+        统计并整体替换 event_stats 表（不统计信号事件时只替换形态的统计）
+
+        参数:
+            codes: 股票代码列表，None表示所有有日线数据的股票
+
+        返回:
+            任务统计信息
+        """
+        started = time.time()
+        db = SessionLocal()
+        try:
+            if codes is None:
+                codes = [c for (c,) in db.query(StockDaily.code).distinct().order_by(StockDaily.code).all()]
+
+            self.study.reset()
+            sources: Dict[str, str] = {}
+            found = 0
+            for offset in range(0, len(codes), self.chunk_size):
+                chunk = codes[offset:offset + self.chunk_size]
+                panel = load_market_panel(db, chunk)
+                if not panel.codes or len(panel.dates) == 0:
+                    continue
+                events = pattern_events(panel)
+                sources.update(dict.fromkeys(events, 'pattern'))
+                if self.signals:
+                    signals = signal_events(panel)
+                    sources.update(dict.fromkeys(signals, 'signal'))
+                    events.update(signals)
+                found += self.study.add(panel, events)
+
+            frame = self.to_frame(self.study.results(), sources)
+            stale = db.query(EventStat)
+            if not self.signals:
+                # 只统计形态时保留已有的信号统计
+                stale = stale.filter(EventStat.source == 'pattern')
+            stale.delete(synchronize_session=False)
+            rows = upsert_event_stats(db, frame)
+            db.commit()
+
+            stats = {
+                'codes': len(codes),
+                'events': found,
+                'horizons': list(self.study.horizons),
+                'rows': rows,
+                'elapsed': round(time.time() - started, 2)
+            }
+            self.logger.info(
+                f"事件研究完成: {stats['codes']} 只股票，{found} 个事件，耗时 {stats['elapsed']} 秒"
+            )
+            return stats
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            self.study.reset()
+            db.close()
+
+
+def refresh_event_stats(codes: Optional[List[str]] = None, signals: bool = True) -> Dict:
+    """重新统计全市场事件研究结果（供调度器和API调用）"""
+    return EventStatsBuilder(signals=signals).run(codes)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    stats = refresh_event_stats(signals='--no-signals' not in sys.argv)
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
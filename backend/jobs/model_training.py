@@ -0,0 +1,139 @@
+"""
+机器学习模型训练
+
+按批加载全市场日线面板，向量化生成最近 ML_TRAIN_DAYS 个交易日的特征和标签，
+拼成一个特征矩阵后做时间序列交叉验证并训练，新版本保存到模型仓库（data/models）。
+训练完成后 API 进程中常驻的模型在下一次推理时自动切换到新版本。
+
+用法: python -m backend.jobs.model_training [模型类型]
+"""
+import json
+import sys
+import time
+from typing import Dict, List, Optional
+import numpy as np
+import logging
+
+from backend.config import settings
+from backend.database import SessionLocal, StockDaily
+from backend.analysis.market_panel import load_market_panel
+from backend.ai_models import MLPricePredictor, ml_predictor
+from backend.ai_models.ml_features import FEATURE_WARMUP, build_dataset
+
+logger = logging.getLogger(__name__)
+
+# 每批加载到面板中的股票数
+CHUNK_CODES = 500
+
+
+class ModelTrainer:
+    """全市场模型训练"""
+
+    def __init__(self,
+                 predictor: Optional[MLPricePredictor] = None,
+                 model_type: Optional[str] = None,
+                 horizon: Optional[int] = None,
+                 train_days: Optional[int] = None,
+                 n_splits: Optional[int] = None,
+                 chunk_size: int = CHUNK_CODES):
+        """
+        参数:
+            predictor: 预测器，默认为全局常驻的 ml_predictor
+            model_type: 模型类型，默认为配置中的 ML_MODEL_TYPE
+            horizon: 标签的持有交易日数，默认为配置中的 ML_LABEL_HORIZON
+            train_days: 训练样本覆盖的交易日数，默认为配置中的 ML_TRAIN_DAYS
+            n_splits: 交叉验证折数，默认为配置中的 ML_CV_SPLITS
+            chunk_size: 每批加载的股票数（控制面板占用的内存）
+        """
+        self.predictor = predictor or ml_predictor
+        self.model_type = model_type or settings.ml_model_type
+        self.horizon = horizon or settings.ml_label_horizon
+        self.train_days = train_days or settings.ml_train_days
+        self.n_splits = n_splits or settings.ml_cv_splits
+        self.chunk_size = chunk_size
+        self.logger = logging.getLogger(__name__)
+
+    def build(self, db, codes: List[str]) -> Dict[str, np.ndarray]:
+        """
+        生成全部股票的训练样本
+
+        返回:
+            同 build_dataset，各批结果按样本拼接
+        """
+        dates = [d for (d,) in db.query(StockDaily.date).distinct().order_by(
+            StockDaily.date.desc()
+        ).limit(self.train_days + self.horizon).all()]
+        if not dates:
+            raise ValueError("没有日线数据")
+        start_date = dates[-1]
+
+        parts = []
+        for offset in range(0, len(codes), self.chunk_size):
+            chunk = codes[offset:offset + self.chunk_size]
+            panel = load_market_panel(db, chunk, start_date=start_date,
+                                      fields=['high', 'low', 'close', 'volume'], warmup=FEATURE_WARMUP)
+            if not panel.codes or len(panel.dates) == 0:
+                continue
+            parts.append(build_dataset(panel, self.horizon, start_date))
+
+        if not parts:
+            raise ValueError("没有可用于训练的样本")
+        dataset = {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+        # 按日期排序，交叉验证按时间先后划分
+        order = np.argsort(dataset['dates'], kind='stable')
+        return {key: values[order] for key, values in dataset.items()}
+
+    def run(self, codes: Optional[List[str]] = None) -> Dict:
+        """
+        训练并保存新版本
+
+        参数:
+            codes: 股票代码列表，None表示所有有日线数据的股票
+
+        返回:
+            任务统计信息（含交叉验证指标）
+        """
+        started = time.time()
+        db = SessionLocal()
+        try:
+            if codes is None:
+                codes = [c for (c,) in db.query(StockDaily.code).distinct().order_by(StockDaily.code).all()]
+            dataset = self.build(db, codes)
+        finally:
+            db.close()
+
+        meta = self.predictor.train(
+            dataset,
+            model_type=self.model_type,
+            n_splits=self.n_splits,
+            horizon=self.horizon,
+            params={'codes': len(codes), 'train_days': self.train_days}
+        )
+        pruned = self.predictor.registry.prune(self.predictor.name, settings.ml_keep_versions)
+
+        stats = {
+            'codes': len(codes),
+            'samples': meta['samples'],
+            'model_type': self.model_type,
+            'version': meta['version'],
+            'cv_accuracy': meta['cv']['accuracy'],
+            'cv_auc': meta['cv']['auc'],
+            'pruned_versions': pruned,
+            'elapsed': round(time.time() - started, 2)
+        }
+        self.logger.info(
+            f"模型训练完成: {stats['codes']} 只股票，{stats['samples']} 个样本，版本 {stats['version']}，"
+            f"交叉验证准确率 {stats['cv_accuracy']:.4f}，耗时 {stats['elapsed']} 秒"
+        )
+        return stats
+
+
+def train_model(codes: Optional[List[str]] = None, model_type: Optional[str] = None) -> Dict:
+    """训练全市场涨跌预测模型（供调度器、API和命令行调用）"""
+    return ModelTrainer(model_type=model_type).run(codes)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    stats = train_model(model_type=sys.argv[1] if len(sys.argv) > 1 else None)
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
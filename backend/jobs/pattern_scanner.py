@@ -0,0 +1,185 @@
+"""
+全市场K线形态扫描
+
+收盘后把全市场日线组装为 [股票 × 交易日] 行情面板，一次计算所有形态的布尔掩码，
+形态出现记录按 (pattern, date, code) 写入 pattern_occurrences 表。
+增量扫描按股票分别确定起始日期：还没有形态记录的股票（新上市或新导入）全量扫描，
+上次扫描之后补录了更早历史的股票从补录的最早日期开始重扫。
+"某天哪些股票出现了早晨之星"、"某只股票的锤子线历史"这类查询直接走索引，不再重新识别。
+
+用法: python -m backend.jobs.pattern_scanner [--full]
+"""
+import json
+import sys
+import time
+from datetime import date
+from typing import Dict, List, Optional, Union
+import pandas as pd
+import numpy as np
+import logging
+
+from sqlalchemy import func
+
+from backend.database import SessionLocal, StockDaily, PatternOccurrence
+from backend.database.bulk import upsert_pattern_occurrences
+from backend.analysis.market_panel import MarketPanel, load_market_panel
+from backend.ai_models import PatternRecognizer
+from backend.ai_models.simple_predictor import PATTERN_INFO
+
+logger = logging.getLogger(__name__)
+
+# 增量扫描时在上次扫描日期之前多加载的交易日数（多根K线形态需要之前的K线）
+CONTEXT_BARS = 20
+
+# 每批加载到面板中的股票数
+CHUNK_CODES = 500
+
+OHLC_FIELDS = ['open', 'high', 'low', 'close']
+
+
+class PatternScanner:
+    """全市场K线形态扫描"""
+
+    def __init__(self, recognizer: Optional[PatternRecognizer] = None, chunk_size: int = CHUNK_CODES):
+        """
+        参数:
+            recognizer: 形态识别器
+            chunk_size: 每批加载的股票数（控制面板占用的内存）
+        """
+        self.recognizer = recognizer or PatternRecognizer()
+        self.chunk_size = chunk_size
+        self.logger = logging.getLogger(__name__)
+
+    def scan_panel(self,
+                   panel: MarketPanel,
+                   since: Union[date, np.ndarray, None] = None) -> pd.DataFrame:
+        """
+        在行情面板上识别所有形态
+
+        参数:
+            panel: 行情面板（需要 open、high、low、close）
+            since: 只返回该日期及之后的形态；也可以是与 panel.codes 对齐的 datetime64 数组，
+                每只股票分别指定（NaT 表示不限制）
+
+        返回:
+            DataFrame，列为 pattern、date、code、signal
+        """
+        masks = self.recognizer.panel_masks(panel)
+        since = np.broadcast_to(np.asarray(
+            np.datetime64('NaT') if since is None else since, dtype='datetime64[D]'
+        ), (len(panel.codes),))
+        first = np.where(np.isnat(since), 0, np.searchsorted(panel.dates, since))
+        codes = np.asarray(panel.codes, dtype=object)
+        frames = []
+        for name, mask in masks.items():
+            rows, cols = np.nonzero(mask)
+            keep = cols >= first[rows]
+            rows, cols = rows[keep], cols[keep]
+            if len(rows) == 0:
+                continue
+            frames.append(pd.DataFrame({
+                'pattern': name,
+                'date': panel.dates[cols].astype(object),
+                'code': codes[rows],
+                'signal': PATTERN_INFO[name][0]
+            }))
+        if not frames:
+            return pd.DataFrame(columns=['pattern', 'date', 'code', 'signal'])
+        return pd.concat(frames, ignore_index=True)
+
+    def scan_starts(self, db) -> Dict[str, date]:
+        """
+        增量扫描时每只股票的重扫起始日期
+
+        取上次扫描到的最新形态日期，以及上次扫描之后新写入的日线中最早的日期（补录的历史），两者较早者。
+        还没有形态记录的股票不在结果中，需要全量扫描。
+        """
+        scanned = db.query(
+            PatternOccurrence.code.label('code'),
+            func.max(PatternOccurrence.date).label('last_date'),
+            func.max(PatternOccurrence.created_at).label('scanned_at')
+        ).group_by(PatternOccurrence.code).subquery()
+        starts = {code: last for code, last, _ in db.query(scanned).all()}
+        backfilled = db.query(StockDaily.code, func.min(StockDaily.date)).join(
+            scanned, scanned.c.code == StockDaily.code
+        ).filter(StockDaily.created_at >= scanned.c.scanned_at).group_by(StockDaily.code)
+        for code, first in backfilled.all():
+            starts[code] = min(starts[code], first)
+        return starts
+
+    def run(self, codes: Optional[List[str]] = None, full: bool = False) -> Dict:
+        """
+        扫描并写入形态出现记录
+
+        参数:
+            codes: 股票代码列表，None表示所有有日线数据的股票
+            full: 是否全量重扫（默认每只股票从 scan_starts 给出的日期开始增量扫描）
+
+        返回:
+            任务统计信息
+        """
+        started = time.time()
+        db = SessionLocal()
+        try:
+            if codes is None:
+                codes = [c for (c,) in db.query(StockDaily.code).distinct().order_by(StockDaily.code).all()]
+            starts = {} if full else self.scan_starts(db)
+            # 起始日期相近的股票放在同一批，需要全量扫描的股票排在最前
+            codes = sorted(codes, key=lambda c: (c in starts, starts.get(c) or date.min, c))
+            resumed = [starts[c] for c in codes if c in starts]
+
+            found = 0
+            dates = 0
+            for offset in range(0, len(codes), self.chunk_size):
+                chunk = codes[offset:offset + self.chunk_size]
+                since = [starts.get(c) for c in chunk]
+                start = None
+                if all(since):
+                    start = db.query(StockDaily.date).filter(
+                        StockDaily.date < min(since)
+                    ).distinct().order_by(StockDaily.date.desc()).offset(CONTEXT_BARS - 1).limit(1).scalar()
+                panel = load_market_panel(db, chunk, start_date=start, fields=OHLC_FIELDS)
+                if not panel.codes or len(panel.dates) == 0:
+                    continue
+                occurrences = self.scan_panel(panel, since=np.array(
+                    [np.datetime64(s) if s else np.datetime64('NaT') for s in since], dtype='datetime64[D]'
+                ))
+                # 重扫范围内的旧记录先删除（补录历史后原先识别出的形态可能不再成立）
+                for value in set(since):
+                    group = [c for c, s in zip(chunk, since) if s == value]
+                    query = db.query(PatternOccurrence).filter(PatternOccurrence.code.in_(group))
+                    if value is not None:
+                        query = query.filter(PatternOccurrence.date >= value)
+                    query.delete(synchronize_session=False)
+                found += upsert_pattern_occurrences(db, occurrences)
+                db.commit()
+                dates = max(dates, len(panel.dates))
+
+            stats = {
+                'codes': len(codes),
+                'full_scan_codes': len(codes) - len(resumed),
+                'since': min(resumed).isoformat() if resumed else None,
+                'dates': dates,
+                'occurrences': found,
+                'elapsed': round(time.time() - started, 2)
+            }
+            self.logger.info(
+                f"形态扫描完成: {stats['codes']} 只股票，写入 {found} 条形态记录，耗时 {stats['elapsed']} 秒"
+            )
+            return stats
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+def scan_patterns(codes: Optional[List[str]] = None, full: bool = False) -> Dict:
+    """扫描全市场K线形态（供调度器和API调用）"""
+    return PatternScanner().run(codes, full)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    stats = scan_patterns(full='--full' in sys.argv)
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
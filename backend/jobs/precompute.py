@@ -0,0 +1,96 @@
+"""
+技术指标预计算任务
+
+收盘后为全市场计算技术指标并批量写入 technical_indicators 表。
+特征存储（backend.analysis.feature_store）在预计算覆盖了所需日线时直接读取这些指标列，
+quick-signal、comprehensive 等读接口因此不再现算。
+
+用法: python -m backend.jobs.precompute [--full]
+"""
+import sys
+import time
+from typing import Dict, List, Optional
+import logging
+
+from sqlalchemy import func
+
+from backend.database import SessionLocal, StockDaily, TechnicalIndicator
+from backend.database.bulk import INDICATOR_COLUMNS, upsert_technical_indicators
+from backend.database.queries import load_daily_bars
+from backend.analysis import TechnicalAnalyzer
+
+logger = logging.getLogger(__name__)
+
+# 增量计算时在已计算日期之前额外加载的K线数，保证EMA类指标充分收敛
+HISTORY_BARS = 250
+
+
+def precompute_indicators(codes: Optional[List[str]] = None, full: bool = False) -> Dict:
+    """
+    预计算技术指标
+
+    参数:
+        codes: 股票代码列表，None表示所有有日线数据的股票
+        full: 是否全量重算（默认只计算上次预计算之后的新K线）
+
+    返回:
+        任务统计信息
+    """
+    started = time.time()
+    analyzer = TechnicalAnalyzer()
+    db = SessionLocal()
+    try:
+        last_bar = dict(
+            db.query(StockDaily.code, func.max(StockDaily.date)).group_by(StockDaily.code).all()
+        )
+        last_done = {} if full else dict(
+            db.query(TechnicalIndicator.code, func.max(TechnicalIndicator.date))
+            .group_by(TechnicalIndicator.code).all()
+        )
+        if codes is None:
+            codes = sorted(last_bar)
+
+        updated = 0
+        rows = 0
+        for code in codes:
+            done = last_done.get(code)
+            if code not in last_bar or (done is not None and done >= last_bar[code]):
+                continue
+
+            start = None
+            if done is not None:
+                start = db.query(StockDaily.date).filter(
+                    StockDaily.code == code,
+                    StockDaily.date <= done
+                ).order_by(StockDaily.date.desc()).offset(HISTORY_BARS).limit(1).scalar()
+
+            df = load_daily_bars(db, code, start_date=start)
+            if df.empty:
+                continue
+
+            df = analyzer.calculate_indicators(df, INDICATOR_COLUMNS)
+            if done is not None:
+                df = df[df['date'] > done]
+
+            rows += upsert_technical_indicators(db, code, df)
+            db.commit()
+            updated += 1
+
+        stats = {
+            'codes': len(codes),
+            'updated': updated,
+            'rows': rows,
+            'elapsed': round(time.time() - started, 2)
+        }
+        logger.info(f"技术指标预计算完成: {stats}")
+        return stats
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(precompute_indicators(full='--full' in sys.argv))
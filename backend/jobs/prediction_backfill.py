@@ -0,0 +1,196 @@
+"""
+历史预测回填
+
+在全市场收盘价面板上一次算出 SimplePricePredictor 在每个历史交易日收盘后对下一交易日的预测
+（只用当天及之前的数据），连同下一交易日的实际收盘价批量写入 prediction_results 表，
+用来统计预测器多年来在全市场上的准确率。
+
+prediction_date 为做出预测所依据的最后一个交易日，prediction_value 为对下一交易日收盘价的预测，
+actual_value 为该股票下一个交易日的实际收盘价（还没有下一交易日数据时为空）。
+
+用法: python -m backend.jobs.prediction_backfill [开始日期YYYYMMDD] [结束日期YYYYMMDD]
+"""
+import json
+import sys
+import time
+from datetime import date, datetime
+from typing import Dict, List, Optional
+import pandas as pd
+import numpy as np
+import logging
+
+from backend.database import SessionLocal, StockDaily
+from backend.database.bulk import upsert_prediction_results
+from backend.analysis.market_panel import MarketPanel, load_market_panel
+from backend.ai_models import SimplePricePredictor
+
+logger = logging.getLogger(__name__)
+
+# 每批加载到面板中的股票数
+CHUNK_CODES = 500
+
+PREDICTION_COLUMNS = ['code', 'model_name', 'prediction_date', 'prediction_type',
+                      'prediction_value', 'confidence', 'actual_value']
+
+
+class PredictionBackfill:
+    """历史预测回填"""
+
+    def __init__(self, predictor: Optional[SimplePricePredictor] = None, chunk_size: int = CHUNK_CODES):
+        """
+        参数:
+            predictor: 价格预测器
+            chunk_size: 每批加载的股票数（控制面板占用的内存）
+        """
+        self.predictor = predictor or SimplePricePredictor()
+        self.chunk_size = chunk_size
+        self.logger = logging.getLogger(__name__)
+
+    def predict_panel(self,
+                      panel: MarketPanel,
+                      start_date: Optional[date] = None,
+                      end_date: Optional[date] = None) -> pd.DataFrame:
+        """
+        面板上每只股票每个交易日的下一交易日价格预测
+
+        参数:
+            panel: 行情面板（需要 close）
+            start_date: 只返回该日期及之后做出的预测
+            end_date: 只返回该日期及之前做出的预测
+
+        返回:
+            DataFrame，列同 prediction_results 表（另有 close 列为预测当天的收盘价）
+        """
+        close = panel['close']
+        valid = ~np.isnan(close)
+        # 每只股票的有效交易日左移压紧，"下一交易日"是该股票自己的下一根K线
+        order = np.argsort(~valid, axis=1, kind='stable')
+        compact = np.take_along_axis(close, order, axis=1)
+        result = self.predictor.predict_history_arrays(compact)
+        actual = np.full(compact.shape, np.nan)
+        actual[:, :-1] = compact[:, 1:]
+
+        rows, positions = np.nonzero(~np.isnan(result['prediction']))
+        dates = panel.dates[order[rows, positions]]
+        keep = np.ones(len(rows), dtype=bool)
+        if start_date is not None:
+            keep &= dates >= np.datetime64(start_date)
+        if end_date is not None:
+            keep &= dates <= np.datetime64(end_date)
+        rows, positions, dates = rows[keep], positions[keep], dates[keep]
+
+        return pd.DataFrame({
+            'code': np.asarray(panel.codes, dtype=object)[rows],
+            'model_name': self.predictor.MODEL_NAME,
+            'prediction_date': dates.astype(object),
+            'prediction_type': 'price',
+            'prediction_value': result['prediction'][rows, positions],
+            'confidence': result['confidence'][rows, positions],
+            'actual_value': actual[rows, positions],
+            'close': compact[rows, positions]
+        })
+
+    @staticmethod
+    def accuracy(predictions: pd.DataFrame) -> Dict:
+        """
+        有实际值的预测的准确率
+
+        返回:
+            evaluated 评估条数、direction_accuracy 涨跌方向准确率、mean_abs_pct_error 平均绝对百分比误差
+        """
+        done = predictions.dropna(subset=['actual_value'])
+        if done.empty:
+            return {'evaluated': 0, 'direction_accuracy': None, 'mean_abs_pct_error': None}
+        predicted_up = done['prediction_value'].to_numpy() > done['close'].to_numpy()
+        actual_up = done['actual_value'].to_numpy() > done['close'].to_numpy()
+        error = np.abs(done['prediction_value'].to_numpy() / done['actual_value'].to_numpy() - 1)
+        return {
+            'evaluated': int(len(done)),
+            'direction_accuracy': float(np.mean(predicted_up == actual_up)),
+            'mean_abs_pct_error': float(np.nanmean(error[np.isfinite(error)])) if np.isfinite(error).any() else None
+        }
+
+    def run(self,
+            codes: Optional[List[str]] = None,
+            start_date: Optional[date] = None,
+            end_date: Optional[date] = None,
+            db=None) -> Dict:
+        """
+        回填历史预测并写入 prediction_results 表
+
+        参数:
+            codes: 股票代码列表，None表示所有有日线数据的股票
+            start_date: 开始日期（含），默认为全部历史
+            end_date: 结束日期（含）
+            db: 数据库会话，传入时在该会话中写入、由调用方提交；默认新建会话并逐批提交
+
+        返回:
+            任务统计信息（含整体准确率）
+        """
+        started = time.time()
+        own_session = db is None
+        db = db or SessionLocal()
+        try:
+            if codes is None:
+                codes = [c for (c,) in db.query(StockDaily.code).distinct().order_by(StockDaily.code).all()]
+
+            written = 0
+            evaluated = 0
+            hits = 0.0
+            error_sum = 0.0
+            error_count = 0
+            for offset in range(0, len(codes), self.chunk_size):
+                chunk = codes[offset:offset + self.chunk_size]
+                # 结束日期之后的数据只用来取实际值，不参与预测
+                panel = load_market_panel(db, chunk, start_date=start_date, fields=['close'],
+                                          warmup=2 * self.predictor.TREND_WINDOW)
+                if not panel.codes or len(panel.dates) == 0:
+                    continue
+                predictions = self.predict_panel(panel, start_date, end_date)
+                written += upsert_prediction_results(db, predictions[PREDICTION_COLUMNS])
+                if own_session:
+                    db.commit()
+
+                chunk_accuracy = self.accuracy(predictions)
+                if chunk_accuracy['evaluated']:
+                    evaluated += chunk_accuracy['evaluated']
+                    hits += chunk_accuracy['direction_accuracy'] * chunk_accuracy['evaluated']
+                    if chunk_accuracy['mean_abs_pct_error'] is not None:
+                        error_sum += chunk_accuracy['mean_abs_pct_error'] * chunk_accuracy['evaluated']
+                        error_count += chunk_accuracy['evaluated']
+
+            stats = {
+                'codes': len(codes),
+                'model_name': self.predictor.MODEL_NAME,
+                'predictions': written,
+                'evaluated': evaluated,
+                'direction_accuracy': hits / evaluated if evaluated else None,
+                'mean_abs_pct_error': error_sum / error_count if error_count else None,
+                'elapsed': round(time.time() - started, 2)
+            }
+            self.logger.info(
+                f"历史预测回填完成: {stats['codes']} 只股票，写入 {written} 条预测，"
+                f"方向准确率 {stats['direction_accuracy']}，耗时 {stats['elapsed']} 秒"
+            )
+            return stats
+        except Exception:
+            if own_session:
+                db.rollback()
+            raise
+        finally:
+            if own_session:
+                db.close()
+
+
+def backfill_predictions(codes: Optional[List[str]] = None,
+                         start_date: Optional[date] = None,
+                         end_date: Optional[date] = None) -> Dict:
+    """回填历史预测（供API和命令行调用）"""
+    return PredictionBackfill().run(codes, start_date, end_date)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    dates = [datetime.strptime(arg, "%Y%m%d").date() for arg in sys.argv[1:3]]
+    stats = backfill_predictions(None, *dates)
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
@@ -0,0 +1,306 @@
+"""
+预测结果跟踪
+
+每日收盘后依次:
+1. 用一条 UPDATE 语句按 stock_daily 回填此前预测的实际值（该股票下一交易日的收盘价）
+2. 记录当天的预测：SimplePricePredictor 价格预测（全市场）、最近一次批量分析得到的技术信号（全市场）、
+   关注股票的 Gemini 快速信号
+3. 按模型汇总滚动窗口内的涨跌方向准确率和置信度校准，整体替换 prediction_accuracy 表，
+   看板直接读取汇总结果，不扫描 prediction_results
+
+涨跌方向的判断以预测当天的收盘价为基准：价格预测看预测价是否高于当天收盘价，
+信号看买入/卖出方向，观望信号（0）不计入方向准确率。
+
+用法: python -m backend.jobs.prediction_tracker
+"""
+import json
+import time
+from typing import Dict, List, Optional
+import pandas as pd
+import numpy as np
+import logging
+
+from sqlalchemy import and_, exists, func, select, update
+
+from backend.config import settings
+from backend.database import (
+    SessionLocal, StockDaily, PredictionResult, PredictionAccuracy, WatchList
+)
+from backend.database.bulk import upsert_prediction_results, upsert_prediction_accuracy
+from backend.ai_models import SimplePricePredictor
+from backend.ai_models.gemini_analyzer import SIGNAL_FEATURES, quick_signal_inputs
+from backend.analysis.feature_store import feature_store
+from .prediction_backfill import PredictionBackfill
+from .batch_runner import BatchRunner
+
+logger = logging.getLogger(__name__)
+
+TECHNICAL_MODEL = 'technical_signal'
+GEMINI_MODEL = 'gemini_quick_signal'
+
+# Gemini 快速信号到信号值的映射
+GEMINI_SIGNALS = {'BUY': 1, 'HOLD': 0, 'SELL': -1}
+
+# 置信度校准的分组（0-100，每组20）
+CONFIDENCE_BUCKETS = [0, 20, 40, 60, 80, 100]
+
+
+def accuracy_windows() -> List[int]:
+    """配置中的滚动统计窗口"""
+    return sorted({int(w) for w in settings.accuracy_windows.split(',') if w.strip()})
+
+
+class PredictionTracker:
+    """预测结果跟踪"""
+
+    def __init__(self,
+                 predictor: Optional[SimplePricePredictor] = None,
+                 gemini=None,
+                 windows: Optional[List[int]] = None,
+                 gemini_limit: Optional[int] = None):
+        """
+        参数:
+            predictor: 价格预测器
+            gemini: Gemini 分析器，默认按需创建（未配置 API Key 时不记录 Gemini 信号）
+            windows: 滚动统计窗口（交易日数），默认为配置中的 ACCURACY_WINDOWS
+            gemini_limit: 记录 Gemini 快速信号的关注股票数上限，默认为配置中的 TRACKING_GEMINI_LIMIT
+        """
+        self.predictor = predictor or SimplePricePredictor()
+        self.gemini = gemini
+        self.windows = windows or accuracy_windows()
+        self.gemini_limit = settings.tracking_gemini_limit if gemini_limit is None else gemini_limit
+        self.logger = logging.getLogger(__name__)
+
+    def fill_actuals(self, db) -> int:
+        """
+        回填实际值：prediction_results 中尚无实际值、且该股票已有下一交易日数据的预测
+
+        整个回填是一条带相关子查询的 UPDATE 语句，由数据库按 (code, date) 索引完成。
+
+        返回:
+            回填的行数
+        """
+        predictions = PredictionResult.__table__
+        next_day = StockDaily.__table__.alias('next_day')
+        next_bar = StockDaily.__table__.alias('next_bar')
+        later = and_(next_day.c.code == predictions.c.code, next_day.c.date > predictions.c.prediction_date)
+        next_date = select(func.min(next_day.c.date)).where(later).correlate(predictions).scalar_subquery()
+        next_close = select(next_bar.c.close).where(
+            next_bar.c.code == predictions.c.code,
+            next_bar.c.date == next_date
+        ).limit(1).scalar_subquery()
+
+        result = db.execute(
+            update(predictions)
+            .where(predictions.c.actual_value.is_(None), exists(select(next_day.c.id).where(later)))
+            .values(actual_value=next_close)
+        )
+        return result.rowcount or 0
+
+    def record_price_predictions(self, db) -> int:
+        """记录全市场最新交易日的价格预测"""
+        latest = db.query(func.max(StockDaily.date)).scalar()
+        if latest is None:
+            return 0
+        return PredictionBackfill(self.predictor).run(start_date=latest, db=db)['predictions']
+
+    def record_technical_signals(self, db) -> int:
+        """记录最近一次全市场批量分析得到的最新技术信号（按信号日期 upsert，重复记录不会产生新行）"""
+        latest = BatchRunner().results()['latest']
+        if not latest:
+            return 0
+        frame = pd.DataFrame([
+            {
+                'code': code,
+                'prediction_date': pd.Timestamp(item['date']).date(),
+                'prediction_value': item['signal'],
+                'confidence': item['strength'] * 100
+            }
+            for code, item in latest.items()
+        ]).assign(model_name=TECHNICAL_MODEL, prediction_type='signal')
+        return upsert_prediction_results(db, frame)
+
+    def record_gemini_signals(self, db) -> int:
+        """记录关注股票的 Gemini 快速信号"""
+        if self.gemini_limit <= 0:
+            return 0
+        if self.gemini is None:
+            from backend.ai_models import GeminiAnalyzer
+            self.gemini = GeminiAnalyzer()
+        if not self.gemini.client:
+            return 0
+
+        codes = [c for (c,) in db.query(WatchList.code).filter(
+            WatchList.is_active == True
+        ).distinct().order_by(WatchList.code).limit(self.gemini_limit).all()]
+        latest_rows = {}
+        for code in codes:
+            latest = feature_store.latest(db, code, SIGNAL_FEATURES)
+            if latest is not None:
+                latest_rows[code] = latest
+        # 各股票的请求并发进行（并发数受 GEMINI_CONCURRENCY 限制）
+        results = self.gemini.quick_signals([(code, quick_signal_inputs(latest)) for code, latest in latest_rows.items()])
+
+        records = []
+        for (code, latest), result in zip(latest_rows.items(), results):
+            signal = GEMINI_SIGNALS.get(str(result.get('signal', '')).upper())
+            if result.get('status') != 'success' or signal is None:
+                continue
+            try:
+                confidence = float(result.get('strength')) * 10
+            except (TypeError, ValueError):
+                confidence = None
+            records.append({
+                'code': code,
+                'model_name': GEMINI_MODEL,
+                'prediction_date': latest['date'],
+                'prediction_type': 'signal',
+                'prediction_value': signal,
+                'confidence': confidence
+            })
+        return upsert_prediction_results(db, pd.DataFrame(records)) if records else 0
+
+    @staticmethod
+    def summarize(df: pd.DataFrame) -> Dict:
+        """
+        一组已有实际值的预测的准确率和置信度校准
+
+        参数:
+            df: 包含 prediction_type、prediction_value、confidence、actual_value、close（预测当天收盘价）的DataFrame
+        """
+        value = df['prediction_value'].to_numpy(dtype=float)
+        close = df['close'].to_numpy(dtype=float)
+        actual = df['actual_value'].to_numpy(dtype=float)
+        is_price = (df['prediction_type'] == 'price').to_numpy()
+        directional = is_price | (value != 0)
+        predicted_up = np.where(is_price, value > close, value > 0)
+        hits = (predicted_up == (actual > close))[directional]
+        confidence = df['confidence'].to_numpy(dtype=float)[directional]
+
+        calibration = []
+        bucket = np.digitize(confidence, CONFIDENCE_BUCKETS[1:-1])
+        for i, low in enumerate(CONFIDENCE_BUCKETS[:-1]):
+            in_bucket = (bucket == i) & ~np.isnan(confidence)
+            if in_bucket.any():
+                calibration.append({
+                    'confidence': f'{low}-{CONFIDENCE_BUCKETS[i + 1]}',
+                    'count': int(in_bucket.sum()),
+                    'mean_confidence': float(confidence[in_bucket].mean()),
+                    'direction_accuracy': float(hits[in_bucket].mean())
+                })
+
+        error = None
+        if is_price.any():
+            with np.errstate(invalid='ignore', divide='ignore'):
+                errors = np.abs(value[is_price] / actual[is_price] - 1)
+            errors = errors[np.isfinite(errors)]
+            error = float(errors.mean()) if len(errors) else None
+        return {
+            'count': int(len(hits)),
+            'direction_accuracy': float(hits.mean()) if len(hits) else None,
+            'mean_confidence': float(np.nanmean(confidence)) if (~np.isnan(confidence)).any() else None,
+            'mean_abs_pct_error': error,
+            'calibration': json.dumps(calibration, ensure_ascii=False)
+        }
+
+    def refresh_accuracy(self, db) -> int:
+        """
+        重新汇总各模型在每个滚动窗口内的准确率，整体替换 prediction_accuracy 表
+
+        返回:
+            写入的行数
+        """
+        dates = [d for (d,) in db.query(StockDaily.date).distinct().order_by(
+            StockDaily.date.desc()
+        ).limit(max(self.windows)).all()]
+        if not dates:
+            return 0
+        as_of = dates[0]
+        starts = {w: dates[min(w, len(dates)) - 1] for w in self.windows}
+
+        rows = db.query(
+            PredictionResult.model_name, PredictionResult.prediction_type, PredictionResult.prediction_date,
+            PredictionResult.prediction_value, PredictionResult.confidence, PredictionResult.actual_value,
+            StockDaily.close
+        ).join(
+            StockDaily,
+            and_(StockDaily.code == PredictionResult.code, StockDaily.date == PredictionResult.prediction_date)
+        ).filter(
+            PredictionResult.actual_value.isnot(None),
+            PredictionResult.prediction_date >= starts[max(self.windows)]
+        ).all()
+        df = pd.DataFrame(rows, columns=['model_name', 'prediction_type', 'prediction_date', 'prediction_value',
+                                         'confidence', 'actual_value', 'close'])
+
+        records = []
+        for (model_name, prediction_type), group in df.groupby(['model_name', 'prediction_type']):
+            for window in self.windows:
+                recent = group[group['prediction_date'] >= starts[window]]
+                if recent.empty:
+                    continue
+                records.append({
+                    'model_name': model_name,
+                    'prediction_type': prediction_type,
+                    'window_days': window,
+                    'as_of': as_of,
+                    **self.summarize(recent)
+                })
+
+        db.query(PredictionAccuracy).delete(synchronize_session=False)
+        return upsert_prediction_accuracy(db, pd.DataFrame(records)) if records else 0
+
+    def run(self) -> Dict:
+        """
+        执行每日预测跟踪
+
+        返回:
+            任务统计信息
+        """
+        started = time.time()
+        db = SessionLocal()
+        try:
+            filled = self.fill_actuals(db)
+            db.commit()
+
+            recorded = {}
+            for name, record in (
+                (self.predictor.MODEL_NAME, self.record_price_predictions),
+                (TECHNICAL_MODEL, self.record_technical_signals),
+                (GEMINI_MODEL, self.record_gemini_signals),
+            ):
+                try:
+                    recorded[name] = record(db)
+                    db.commit()
+                except Exception as e:
+                    db.rollback()
+                    self.logger.error(f"记录 {name} 预测失败: {e}")
+                    recorded[name] = 0
+
+            summaries = self.refresh_accuracy(db)
+            db.commit()
+
+            stats = {
+                'filled': filled,
+                'recorded': recorded,
+                'accuracy_rows': summaries,
+                'elapsed': round(time.time() - started, 2)
+            }
+            self.logger.info(
+                f"预测跟踪完成: 回填 {filled} 条实际值，记录 {sum(recorded.values())} 条预测，耗时 {stats['elapsed']} 秒"
+            )
+            return stats
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+def track_predictions() -> Dict:
+    """每日预测跟踪（供调度器和API调用）"""
+    return PredictionTracker().run()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(track_predictions(), ensure_ascii=False, indent=2))
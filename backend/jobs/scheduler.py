@@ -0,0 +1,102 @@
+"""
+每日定时任务调度器
+
+在应用的事件循环中运行，到点后把任务放到线程中执行，不阻塞请求处理。
+同一时间的任务按注册顺序依次执行（后面的任务可能依赖前面任务的结果，且都要写同一个数据库），
+不同时间的任务互不影响。
+"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class DailyScheduler:
+    """每日定时任务调度器（只在交易日，即周一到周五运行）"""
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self._jobs: List[Dict] = []
+        self._tasks: List[asyncio.Task] = []
+
+    def add_job(self, name: str, run_at: str, func: Callable[[], object], after: Optional[str] = None):
+        """
+        注册每日任务
+
+        参数:
+            name: 任务名称
+            run_at: 运行时间，格式 HH:MM（同一时间的任务按注册顺序依次执行）
+            func: 无参数的同步函数
+            after: 依赖的任务名称（需在同一时间、更早注册），该任务当天失败或被跳过时不执行
+        """
+        hour, minute = (int(part) for part in run_at.split(':'))
+        if after is not None and not any(
+            job['name'] == after and (job['hour'], job['minute']) == (hour, minute) for job in self._jobs
+        ):
+            raise ValueError(f"任务 {name} 依赖的 {after} 必须在同一时间且更早注册")
+        self._jobs.append({'name': name, 'hour': hour, 'minute': minute, 'func': func, 'after': after})
+
+    def start(self):
+        """启动所有任务（需在事件循环中调用）"""
+        groups: Dict[tuple, List[Dict]] = {}
+        for job in self._jobs:
+            groups.setdefault((job['hour'], job['minute']), []).append(job)
+        for (hour, minute), jobs in groups.items():
+            self._tasks.append(asyncio.create_task(self._run_forever(hour, minute, jobs)))
+            self.logger.info(
+                f"已调度每日任务 {' -> '.join(job['name'] for job in jobs)} @ {hour:02d}:{minute:02d}"
+            )
+
+    async def stop(self):
+        """停止所有任务"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    @staticmethod
+    def next_run(hour: int, minute: int, now: Optional[datetime] = None) -> datetime:
+        """计算下一次运行时间（跳过周末）"""
+        now = now or datetime.now()
+        run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if run <= now:
+            run += timedelta(days=1)
+        while run.weekday() >= 5:
+            run += timedelta(days=1)
+        return run
+
+    async def _run_forever(self, hour: int, minute: int, jobs: List[Dict]):
+        while True:
+            run = self.next_run(hour, minute)
+            await asyncio.sleep((run - datetime.now()).total_seconds())
+            await self.run_jobs(jobs)
+
+    async def run_jobs(self, jobs: List[Dict]) -> Dict[str, bool]:
+        """
+        依次执行一组任务
+
+        返回:
+            任务名称 -> 是否成功（依赖的任务没有成功而跳过的记为失败）
+        """
+        succeeded: Dict[str, bool] = {}
+        for job in jobs:
+            if job['after'] is not None and not succeeded.get(job['after']):
+                self.logger.warning(f"每日任务 {job['name']} 跳过：依赖的任务 {job['after']} 未成功")
+                succeeded[job['name']] = False
+                continue
+            started = datetime.now()
+            try:
+                self.logger.info(f"开始执行每日任务 {job['name']}")
+                await asyncio.to_thread(job['func'])
+                self.logger.info(
+                    f"每日任务 {job['name']} 完成，耗时 {(datetime.now() - started).total_seconds():.1f}s"
+                )
+                succeeded[job['name']] = True
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"每日任务 {job['name']} 失败: {e}", exc_info=True)
+                succeeded[job['name']] = False
+        return succeeded
@@ -0,0 +1,100 @@
+"""
+相似走势索引
+
+按批加载全市场日线面板（收盘价、成交量），把每只股票历史上的所有 N 日窗口
+转换为 z 标准化的形状向量并建立 LSH 索引，保存到 data/processed/similarity。
+每次重建写入新的版本目录，完成后切换当前版本，API 进程中常驻的索引在下一次查询时自动切换。
+
+用法: python -m backend.jobs.similarity_index
+"""
+import json
+import shutil
+import time
+from typing import Dict, List, Optional
+import logging
+
+from backend.config import settings
+from backend.database import SessionLocal, StockDaily
+from backend.analysis.market_panel import load_market_panel
+from backend.analysis.similarity import SimilarityIndex, similarity_search
+
+logger = logging.getLogger(__name__)
+
+# 每批加载到面板中的股票数
+CHUNK_CODES = 500
+
+
+class SimilarityIndexBuilder:
+    """全市场相似走势索引构建"""
+
+    def __init__(self,
+                 window: Optional[int] = None,
+                 stride: Optional[int] = None,
+                 chunk_size: int = CHUNK_CODES):
+        """
+        参数:
+            window: 窗口长度，默认为配置中的 SIMILARITY_WINDOW
+            stride: 窗口滑动的步长，默认为配置中的 SIMILARITY_STRIDE
+            chunk_size: 每批加载的股票数（控制面板占用的内存）
+        """
+        self.window = window or settings.similarity_window
+        self.stride = stride or settings.similarity_stride
+        self.chunk_size = chunk_size
+        self.logger = logging.getLogger(__name__)
+
+    def run(self, codes: Optional[List[str]] = None) -> Dict:
+        """
+        重建索引并保存
+
+        参数:
+            codes: 股票代码列表，None表示所有有日线数据的股票
+
+        返回:
+            任务统计信息
+        """
+        started = time.time()
+        # 每批窗口直接写入新版本目录，内存占用不随窗口总数增长
+        directory = similarity_search.new_version()
+        index = SimilarityIndex(window=self.window, stride=self.stride, directory=directory)
+        db = SessionLocal()
+        try:
+            if codes is None:
+                codes = [c for (c,) in db.query(StockDaily.code).distinct().order_by(StockDaily.code).all()]
+            for offset in range(0, len(codes), self.chunk_size):
+                chunk = codes[offset:offset + self.chunk_size]
+                panel = load_market_panel(db, chunk, fields=['close', 'volume'])
+                if not panel.codes or len(panel.dates) == 0:
+                    continue
+                index.add(panel)
+            index.finalize()
+        except Exception:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+        finally:
+            db.close()
+
+        similarity_search.publish(directory)
+        stats = {
+            'codes': len(index.codes),
+            'windows': index.meta['windows'],
+            'window': self.window,
+            'stride': self.stride,
+            'start_date': index.meta['start_date'],
+            'end_date': index.meta['end_date'],
+            'elapsed': round(time.time() - started, 2)
+        }
+        self.logger.info(
+            f"相似走势索引完成: {stats['codes']} 只股票，{stats['windows']} 个窗口，耗时 {stats['elapsed']} 秒"
+        )
+        return stats
+
+
+def build_similarity_index(codes: Optional[List[str]] = None) -> Dict:
+    """重建全市场相似走势索引（供调度器、API和命令行调用）"""
+    return SimilarityIndexBuilder().run(codes)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    stats = build_similarity_index()
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
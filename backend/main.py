@@ -7,7 +7,12 @@ from contextlib import asynccontextmanager
 import logging
 
 from backend.config import settings
-from backend.api import stock_router, analysis_router, data_router, watchlist_router, gemini_router
+from backend.api import stock_router, analysis_router, data_router, watchlist_router, gemini_router, patterns_router
+from backend.jobs import (
+    DailyScheduler, run_batch_analysis, backtest_queue, scan_patterns, refresh_event_stats, track_predictions,
+    train_model, build_similarity_index
+)
+from backend.analysis.benchmark import sync_indices
 
 # 配置日志
 logging.basicConfig(
@@ -22,9 +27,33 @@ async def lifespan(app: FastAPI):
     """应用生命周期管理"""
     # 启动时执行
     logger.info("AI炒股大师启动中...")
+    scheduler = DailyScheduler()
+    if settings.precompute_enabled:
+        # 收盘后的任务按注册顺序依次执行，避免同时写 SQLite、读到其他任务写了一半的结果
+        # 收盘后用多进程批量计算全市场指标、信号和形态
+        scheduler.add_job("batch_analysis", settings.precompute_time, run_batch_analysis)
+        # 回填预测实际值、记录当天预测（含批量分析得到的最新信号）并汇总各模型的滚动准确率
+        scheduler.add_job("prediction_tracking", settings.precompute_time, track_predictions,
+                          after="batch_analysis")
+        # 同步回测基准指数，回测时只读本地数据
+        scheduler.add_job("index_sync", settings.precompute_time, sync_indices)
+        # 全市场形态扫描，结果写入 pattern_occurrences 表供查询
+        scheduler.add_job("pattern_scan", settings.precompute_time, scan_patterns)
+        # 统计形态和信号出现后的远期收益，供关注股票分析使用
+        scheduler.add_job("event_stats", settings.precompute_time, refresh_event_stats)
+        # 重建相似走势索引，把当天的K线加入可匹配的历史窗口
+        scheduler.add_job("similarity_index", settings.precompute_time, build_similarity_index)
+        if settings.ml_train_enabled:
+            # 用最新数据重新训练涨跌预测模型，API 进程中的模型自动切换到新版本
+            scheduler.add_job("model_training", settings.precompute_time, train_model)
+    scheduler.start()
+    # 恢复上次退出时未完成的回测任务
+    backtest_queue.recover()
     yield
     # 关闭时执行
     logger.info("AI炒股大师关闭中...")
+    await scheduler.stop()
+    backtest_queue.shutdown()
 
 # 创建FastAPI应用
 app = FastAPI(
@@ -49,6 +78,7 @@ app.include_router(analysis_router, prefix="/api/analysis", tags=["分析"])
 app.include_router(data_router, prefix="/api/data", tags=["数据"])
 app.include_router(watchlist_router, prefix="/api/watchlist", tags=["关注列表"])
 app.include_router(gemini_router, prefix="/api/gemini", tags=["Gemini AI"])
+app.include_router(patterns_router, prefix="/api/patterns", tags=["K线形态"])
 
 @app.get("/")
 async def root():
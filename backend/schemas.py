@@ -1,7 +1,7 @@
 """
 Pydantic数据模型定义
 """
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 from datetime import date, datetime
 
@@ -76,6 +76,50 @@ class BacktestResult(BaseModel):
     trades: List[Dict[str, Any]]
     summary: str
 
+class OptimizeRequest(BaseModel):
+    """策略参数优化请求"""
+    params: Dict[str, Any]
+    method: str = "grid"
+    n_samples: int = 200
+    metric: str = "sharpe_ratio"
+    top: int = 20
+    seed: Optional[int] = None
+
+class WalkForwardRequest(BaseModel):
+    """滚动前推分析请求"""
+    params: Dict[str, Any]
+    train_bars: int = 504
+    test_bars: int = 126
+    step: Optional[int] = None
+    anchored: bool = False
+    method: str = "grid"
+    n_samples: int = 200
+    metric: str = "sharpe_ratio"
+    seed: Optional[int] = None
+
+class PortfolioBacktestRequest(BaseModel):
+    """组合回测请求"""
+    start_date: str
+    end_date: str
+    codes: Optional[List[str]] = None
+    initial_capital: float = 1000000
+    max_weight: float = 0.1
+    max_positions: Optional[int] = Field(None, ge=1)
+    rebalance: str = "W"
+    commission: float = 0.0
+    strategy: Optional[Dict[str, Any]] = None
+    benchmark: Optional[str] = None  # 基准指数，如 沪深300、sh000300
+
+class BacktestJobRequest(BaseModel):
+    """回测任务提交请求"""
+    kind: str = "backtest"  # backtest, optimize, walk_forward, portfolio
+    code: Optional[str] = None
+    start_date: str
+    end_date: str
+    timeframe: str = "D"
+    initial_capital: Optional[float] = None
+    params: Dict[str, Any] = {}
+
 class TradeSignalResponse(BaseModel):
     """交易信号响应"""
     code: str
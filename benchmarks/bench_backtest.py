@@ -0,0 +1,90 @@
+"""
+回测引擎性能对比：向量化实现 vs 逐日循环
+
+用法: python benchmarks/bench_backtest.py [年数]
+"""
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.analysis import TechnicalAnalyzer, BacktestEngine, performance
+
+
+def make_bars(n: int, seed: int = 0) -> pd.DataFrame:
+    """生成随机游走的日线数据"""
+    rng = np.random.default_rng(seed)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    open_ = close * (1 + rng.normal(0, 0.005, n))
+    return pd.DataFrame({
+        'date': pd.bdate_range('2000-01-03', periods=n).date,
+        'open': open_,
+        'high': np.maximum(open_, close) * (1 + rng.uniform(0, 0.02, n)),
+        'low': np.minimum(open_, close) * (1 - rng.uniform(0, 0.02, n)),
+        'close': close,
+        'volume': rng.uniform(1e5, 1e7, n)
+    })
+
+
+def timeit(func, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat
+
+
+def check_flat_rolling_sharpe(seed: int = 0):
+    """空仓（资金曲线持平）的窗口滚动夏普必须严格为0"""
+    rng = np.random.default_rng(seed)
+    for _ in range(300):
+        equity = 1e6 * np.exp(np.cumsum(rng.normal(0, 0.02, 400)))
+        start = int(rng.integers(1, 200))
+        equity[start:start + 150] = equity[start - 1]
+        returns = np.diff(equity) / equity[:-1]
+        window = 63
+        sharpe = performance.rolling_sharpe(returns, window)
+        flat = np.array([not returns[i - window + 1:i + 1].any() for i in range(len(returns))])
+        flat[:window - 1] = False
+        assert flat.any() and (sharpe[flat] == 0).all(), sharpe[flat][sharpe[flat] != 0]
+
+
+def main():
+    check_flat_rolling_sharpe()
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    analyzer = TechnicalAnalyzer()
+    df = analyzer.generate_signals(analyzer.calculate_all_indicators(make_bars(years * 252)))
+    engine = BacktestEngine()
+
+    vectorized = engine.run_backtest(df)
+    loop = engine.run_backtest_loop(df)
+    for key in ('total_return', 'win_rate', 'max_drawdown', 'sharpe_ratio', 'total_trades', 'final_value'):
+        assert vectorized[key] == loop[key], key
+    assert vectorized['trades'] == loop['trades']
+
+    t_loop = timeit(lambda: engine.run_backtest_loop(df), 3)
+    t_vec = timeit(lambda: engine.run_backtest(df), 20)
+    t_fast = timeit(lambda: engine.run_backtest(df, record_history=False), 100)
+    prices = df['close'].to_numpy(dtype=float)
+    signal = df['signal_final'].to_numpy()
+    t_core = timeit(lambda: engine.simulate(prices, signal, detailed=False), 100)
+    t_full = timeit(lambda: engine.simulate(prices, signal), 100)
+
+    stops = {'stop_loss': 0.05, 'take_profit': 0.2, 'trailing_stop': 0.1}
+    stopped = engine.run_backtest(df, **stops)
+    assert stopped['trades'] == engine.run_backtest_loop(df, **stops)['trades']
+    t_stops = timeit(lambda: engine.run_backtest(df, record_history=False, **stops), 100)
+
+    print(f"{len(df)} 根K线，{vectorized['total_trades']} 笔交易")
+    print(f"逐日循环:            {t_loop * 1000:8.2f} ms")
+    print(f"向量化:              {t_vec * 1000:8.2f} ms  ({t_loop / t_vec:.0f}x)")
+    print(f"向量化（不含明细）:  {t_fast * 1000:8.2f} ms  ({t_loop / t_fast:.0f}x)")
+    print(f"完整绩效统计耗时:    {(t_full - t_core) * 1000:8.2f} ms")
+    print(f"止损/止盈/移动止损:  {t_stops * 1000:8.2f} ms  ({stopped['total_trades']} 笔交易)")
+
+
+if __name__ == "__main__":
+    main()
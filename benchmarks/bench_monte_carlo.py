@@ -0,0 +1,39 @@
+"""
+蒙特卡洛检验性能测试
+
+用法: python benchmarks/bench_monte_carlo.py [年数] [重抽样次数]
+"""
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.analysis import MonteCarloSimulator
+
+
+def main():
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    simulations = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    rng = np.random.default_rng(0)
+    daily = rng.normal(0.0004, 0.015, years * 252)
+    trades = rng.normal(0.01, 0.08, years * 20)
+
+    simulator = MonteCarloSimulator(simulations, seed=0)
+    for name, run in (
+        ('日收益分块重抽样', lambda: simulator.block_bootstrap(daily)),
+        ('逐笔收益重抽样', lambda: simulator.bootstrap_trades(trades, 20)),
+    ):
+        run()
+        started = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - started
+        interval = result['metrics']['total_return']
+        print(f"{name}: {result['samples']} 个样本 × {simulations} 次，耗时 {elapsed * 1000:.1f} ms，"
+              f"总收益率 {result['confidence']:.0%} 区间 [{interval['lower']:.2%}, {interval['upper']:.2%}]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+K线形态识别性能对比：布尔掩码实现 vs 逐行 iloc 循环
+
+用法: python benchmarks/bench_patterns.py [K线数]
+"""
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.ai_models import PatternRecognizer
+from backend.ai_models.simple_predictor import PATTERN_INFO
+
+
+def make_bars(n: int, seed: int = 0) -> pd.DataFrame:
+    """生成随机游走的日线数据"""
+    rng = np.random.default_rng(seed)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    open_ = close * (1 + rng.normal(0, 0.01, n))
+    return pd.DataFrame({
+        'date': pd.bdate_range('2000-01-03', periods=n).date,
+        'open': open_,
+        'high': np.maximum(open_, close) * (1 + rng.uniform(0, 0.02, n)),
+        'low': np.minimum(open_, close) * (1 - rng.uniform(0, 0.02, n)),
+        'close': close,
+        'volume': rng.uniform(1e5, 1e7, n)
+    })
+
+
+def loop_patterns(df: pd.DataFrame) -> list:
+    """逐行 iloc 访问的参考实现（向量化之前的写法）"""
+    found = {name: [] for name in PATTERN_INFO}
+
+    def add(name, row, i):
+        signal, description = PATTERN_INFO[name]
+        found[name].append({'date': row.get('date', i), 'pattern': name,
+                            'signal': signal, 'description': description})
+
+    for i in range(1, len(df)):
+        row = df.iloc[i]
+        body = abs(row['close'] - row['open'])
+        if (min(row['open'], row['close']) - row['low'] > body * 2 and
+                row['high'] - max(row['open'], row['close']) < body * 0.5):
+            add('hammer', row, i)
+    for i in range(len(df)):
+        row = df.iloc[i]
+        total_range = row['high'] - row['low']
+        if total_range > 0 and abs(row['close'] - row['open']) / total_range < 0.1:
+            add('doji', row, i)
+    engulfing = []
+    for i in range(1, len(df)):
+        curr, prev = df.iloc[i], df.iloc[i - 1]
+        if (prev['close'] < prev['open'] and curr['close'] > curr['open'] and
+                curr['open'] < prev['close'] and curr['close'] > prev['open']):
+            add('bullish_engulfing', curr, i)
+            engulfing.append(found['bullish_engulfing'][-1])
+        elif (prev['close'] > prev['open'] and curr['close'] < curr['open'] and
+              curr['open'] > prev['close'] and curr['close'] < prev['open']):
+            add('bearish_engulfing', curr, i)
+            engulfing.append(found['bearish_engulfing'][-1])
+    for name, sign in (('morning_star', 1), ('evening_star', -1)):
+        for i in range(2, len(df)):
+            first, second, third = df.iloc[i - 2], df.iloc[i - 1], df.iloc[i]
+            if ((first['open'] - first['close']) * sign > 0 and
+                    abs(second['close'] - second['open']) < abs(first['close'] - first['open']) * 0.3 and
+                    (third['close'] - third['open']) * sign > 0 and
+                    (third['close'] - (first['open'] + first['close']) / 2) * sign > 0):
+                add(name, third, i)
+    return found['hammer'] + found['doji'] + engulfing + found['morning_star'] + found['evening_star']
+
+
+def timeit(func, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    df = make_bars(n)
+    recognizer = PatternRecognizer()
+
+    vectorized = recognizer.detect_patterns(df)
+    assert vectorized == loop_patterns(df)
+
+    t_loop = timeit(lambda: loop_patterns(df), 1)
+    t_vec = timeit(lambda: recognizer.detect_patterns(df), 50)
+    t_masks = timeit(lambda: recognizer.masks(df), 200)
+
+    print(f"{n} 根K线，识别到 {len(vectorized)} 个形态")
+    print(f"逐行循环:    {t_loop * 1000:8.2f} ms")
+    print(f"布尔掩码:    {t_vec * 1000:8.2f} ms  ({t_loop / t_vec:.0f}x)")
+    print(f"（仅掩码）:  {t_masks * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
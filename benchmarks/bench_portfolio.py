@@ -0,0 +1,132 @@
+"""
+组合回测性能测试：从数据库读取面板、计算信号面板到组合回测的完整接口路径
+
+信号面板与逐只股票计算指标和信号的参考实现逐项比对。
+
+用法: python benchmarks/bench_portfolio.py [股票数] [年数]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+_DB_DIR = tempfile.mkdtemp(prefix='bench_portfolio_')
+os.environ['DATABASE_URL'] = f"sqlite:///{_DB_DIR}/stock.db"
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.analysis import MarketPanel, TechnicalAnalyzer, SIGNAL_COLUMNS
+from backend.analysis.portfolio import compute_panel_signals
+from backend.analysis.signal_rules import SignalStrategy
+from backend.database import Base, engine
+
+# 引用行情列和非默认指标的自定义策略
+STRATEGY = SignalStrategy.from_dict({'rules': [
+    {'name': 'trend', 'buy': 'close > ma60 and volume_ratio > 1.5', 'sell': 'close < ma60'},
+    {'name': 'rsi', 'buy': 'rsi < 30', 'sell': 'rsi > 70', 'weight': 2},
+    {'name': 'obv', 'buy': 'obv > prev(obv, 5)', 'sell': 'obv < prev(obv, 5)'},
+]})
+
+
+def make_panel(stocks: int, days: int, seed: int = 0) -> MarketPanel:
+    """生成随机游走的行情面板：约5%的交易日停牌，部分股票中途上市"""
+    rng = np.random.default_rng(seed)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, (stocks, days)), axis=1))
+    open_ = close * (1 + rng.normal(0, 0.01, close.shape))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.02, close.shape))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.02, close.shape))
+    volume = rng.uniform(1e5, 1e7, close.shape)
+    missing = rng.random(close.shape) < 0.05
+    missing |= np.arange(days) < rng.integers(0, days // 2, stocks)[:, None] * (rng.random((stocks, 1)) < 0.2)
+    fields = {}
+    for name, values in (('open', open_), ('high', high), ('low', low), ('close', close), ('volume', volume)):
+        values[missing] = np.nan
+        fields[name] = values
+    dates = pd.bdate_range('2010-01-04', periods=days).to_numpy().astype('datetime64[D]')
+    return MarketPanel([f'{i:06d}' for i in range(stocks)], dates, fields)
+
+
+def loop_signals(panel: MarketPanel, rows: range, strategy=None) -> dict:
+    """逐只股票计算指标和信号的参考实现"""
+    analyzer = TechnicalAnalyzer()
+    columns = SIGNAL_COLUMNS
+    if strategy is not None:
+        columns = sorted(strategy.required_columns() & set(analyzer.registry.columns()))
+    result = {'signal': np.full(panel.shape, np.nan), 'strength': np.full(panel.shape, np.nan)}
+    for row in rows:
+        mask = ~np.isnan(panel['close'][row])
+        if not mask.any():
+            continue
+        df = analyzer.calculate_indicators(panel.frame(row), columns)
+        df = analyzer.generate_signals(df, strategy)
+        result['signal'][row, mask] = df['signal_final'].to_numpy(dtype=float)
+        result['strength'][row, mask] = df['signal_strength'].to_numpy(dtype=float)
+    return result
+
+
+def seed_database(panel: MarketPanel):
+    """把面板写入临时 SQLite 数据库的 stock_daily 表"""
+    Base.metadata.create_all(bind=engine)
+    rows, cols = np.nonzero(~np.isnan(panel['close']))
+    dates = panel.dates.astype(str)
+    records = zip(
+        np.asarray(panel.codes)[rows], dates[cols],
+        *(panel[f][rows, cols].tolist() for f in ('open', 'high', 'low', 'close', 'volume'))
+    )
+    with sqlite3.connect(f"{_DB_DIR}/stock.db") as conn:
+        conn.executemany(
+            "INSERT INTO stock_daily (code, date, open, high, low, close, volume) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            records
+        )
+
+
+def main():
+    stocks = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    years = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    panel = make_panel(stocks, years * 252)
+
+    # 信号面板与逐只股票计算的结果一致
+    sample = range(min(stocks, 50))
+    for strategy in (None, STRATEGY):
+        vectorized = compute_panel_signals(panel, strategy=strategy)
+        expected = loop_signals(panel, sample, strategy)
+        for key in ('signal', 'strength'):
+            np.testing.assert_array_equal(vectorized[key][:len(sample)], expected[key][:len(sample)], key)
+
+    started = time.perf_counter()
+    loop_signals(panel, sample)
+    t_loop = (time.perf_counter() - started) / len(sample) * stocks
+    started = time.perf_counter()
+    compute_panel_signals(panel)
+    t_signals = time.perf_counter() - started
+
+    seed_database(panel)
+    from fastapi.testclient import TestClient
+    from backend.main import app
+
+    request = {
+        'start_date': str(panel.dates[120]).replace('-', ''),
+        'end_date': str(panel.dates[-1]).replace('-', ''),
+        'max_weight': 0.05,
+        'max_positions': 30,
+        'rebalance': 'W',
+    }
+    client = TestClient(app)
+    client.post('/api/analysis/portfolio/backtest', json=request)
+    started = time.perf_counter()
+    response = client.post('/api/analysis/portfolio/backtest', json=request)
+    t_route = time.perf_counter() - started
+    assert response.status_code == 200, response.text
+
+    print(f"{stocks} 只股票 × {len(panel.dates)} 个交易日")
+    print(f"信号面板（逐只股票，按 {len(sample)} 只推算）: {t_loop:8.2f} s")
+    print(f"信号面板（整体计算）:                   {t_signals:8.2f} s  ({t_loop / t_signals:.0f}x)")
+    print(f"/portfolio/backtest 完整接口:           {t_route:8.2f} s  ({response.json()['summary']})")
+
+
+if __name__ == "__main__":
+    main()
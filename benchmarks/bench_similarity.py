@@ -0,0 +1,72 @@
+"""
+相似走势搜索性能对比：LSH 近似检索 vs 全量扫描
+
+用法: python benchmarks/bench_similarity.py [股票数] [交易日数] [查询次数]
+"""
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.analysis import MarketPanel
+from backend.analysis.similarity import SimilarityIndex, shape_vectors
+
+CHUNK = 500
+
+
+def make_panel(stocks: int, days: int, seed: int = 0) -> MarketPanel:
+    """生成随机游走的行情面板（带成交量），约5%的交易日停牌"""
+    rng = np.random.default_rng(seed)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, (stocks, days)), axis=1))
+    volume = np.exp(13 + np.cumsum(rng.normal(0, 0.1, (stocks, days)), axis=1) * 0.3)
+    suspended = rng.random(close.shape) < 0.05
+    close[suspended] = np.nan
+    volume[suspended] = np.nan
+    dates = np.datetime64('2000-01-03') + np.arange(days)
+    return MarketPanel([f'{i:06d}' for i in range(stocks)], dates, {'close': close, 'volume': volume})
+
+
+def main():
+    stocks = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 2500
+    queries = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+    build_dir = Path(tempfile.mkdtemp(prefix='bench_similarity_'))
+    index = SimilarityIndex(directory=build_dir / 'index')
+
+    started = time.perf_counter()
+    for offset in range(0, stocks, CHUNK):
+        index.add(make_panel(min(CHUNK, stocks - offset), days, seed=offset))
+    index.finalize()
+    t_build = time.perf_counter() - started
+    nbytes = sum(a.nbytes for a in index.arrays.values())
+
+    probe = make_panel(queries, index.window, seed=10 ** 6)
+    vectors = shape_vectors(probe['close'], probe['volume'], index.window)[:, 0]
+    vectors = vectors[np.isfinite(vectors).all(axis=1)]
+
+    t_lsh = t_exact = 0.0
+    recall = []
+    for vector in vectors:
+        started = time.perf_counter()
+        approx = index.search(vector, k=10)
+        t_lsh += time.perf_counter() - started
+        started = time.perf_counter()
+        exact = index.search(vector, k=10, exact=True)
+        t_exact += time.perf_counter() - started
+        # 近似结果的第10名相似度达到精确结果第10名的比例
+        floor = index.similarity(np.array(exact[-1:]), vector)[0]
+        recall.append(np.mean(index.similarity(np.array(approx), vector) >= floor - 1e-6) if approx else 0)
+
+    print(f"{len(index)} 个窗口（{stocks} 只股票 × {days} 个交易日），索引 {nbytes / 2 ** 20:.0f} MB，建索引 {t_build:.1f} s")
+    print(f"LSH 近似检索: {t_lsh / len(vectors) * 1000:8.2f} ms/次，召回率 {np.mean(recall):.2f}")
+    print(f"全量扫描:     {t_exact / len(vectors) * 1000:8.2f} ms/次  ({t_exact / t_lsh:.0f}x)")
+    shutil.rmtree(build_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+多日趋势预测性能对比：状态递推 vs 逐日重算特征并追加行
+
+用法: python benchmarks/bench_trend.py [预测天数] [批量股票数]
+"""
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.ai_models import SimplePricePredictor
+
+
+def make_bars(n: int, seed: int = 0) -> pd.DataFrame:
+    """生成随机游走的日线数据"""
+    rng = np.random.default_rng(seed)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    return pd.DataFrame({
+        'open': close * (1 + rng.normal(0, 0.01, n)),
+        'high': close * 1.01,
+        'low': close * 0.99,
+        'close': close,
+        'volume': rng.uniform(1e5, 1e7, n)
+    })
+
+
+def loop_trend(predictor: SimplePricePredictor, df: pd.DataFrame, days: int) -> list:
+    """逐日调用 predict_next_day 并 pd.concat 追加预测行的参考实现（改写之前的写法）"""
+    predictions = []
+    current_df = df.copy()
+    for i in range(days):
+        pred = predictor.predict_next_day(current_df)
+        if pred['prediction']:
+            predictions.append({'day': i + 1, 'price': pred['prediction'], 'change': pred['predicted_change']})
+            new_row = current_df.iloc[-1].copy()
+            new_row['close'] = pred['prediction']
+            current_df = pd.concat([current_df, new_row.to_frame().T], ignore_index=True)
+    return predictions
+
+
+def main():
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    stocks = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    predictor = SimplePricePredictor()
+    df = make_bars(250)
+
+    assert predictor.predict_trend(df, days)['predictions'] == loop_trend(predictor, df, days)
+
+    started = time.perf_counter()
+    loop_trend(predictor, df, days)
+    t_loop = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(20):
+        predictor.predict_trend(df, days)
+    t_state = (time.perf_counter() - started) / 20
+
+    rng = np.random.default_rng(1)
+    closes = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, (stocks, 60)), axis=1))
+    started = time.perf_counter()
+    predictor.forecast_closes(closes[:, -predictor.TREND_WINDOW:], days)
+    t_batch = time.perf_counter() - started
+
+    print(f"预测 {days} 天")
+    print(f"逐日追加行:  {t_loop * 1000:8.2f} ms")
+    print(f"状态递推:    {t_state * 1000:8.2f} ms  ({t_loop / t_state:.0f}x)")
+    print(f"批量 {stocks} 只股票: {t_batch * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()